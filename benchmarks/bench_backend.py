@@ -0,0 +1,109 @@
+"""
+Embedded backend (functions/embedded_store.py) against an HTTP SPARQL endpoint on the same
+data: the ontology and the sample data of benchmarks/sample_data.py. The HTTP side is the
+rdflib endpoint of benchmarks/rdflib_endpoint.py, the same query engine behind a socket, so
+the difference is the cost of the round trip and of the JSON encoding and decoding.
+
+It reports
+- the time to load the data: parsing the Turtle files, and loading the pickle of a second start,
+- per-query latency of the final queries of the corpus, sequentially and from 8 threads,
+- whether both backends return the same bindings for every query.
+
+Run from the repository root:
+    python -m benchmarks.bench_backend [--gameweeks 10] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.rdflib_endpoint import ONTOLOGY, RdflibEndpoint, load_graph as load_sample
+from benchmarks.replay import load_corpus
+from benchmarks.sample_data import build_sample_graph
+from functions.embedded_store import EmbeddedStore, load_graph
+from functions.execute_query import EMBEDDED_SCHEME, execute_sparql, set_backend
+
+THREADS = 8
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def timed(url, queries, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            execute_sparql(url, query)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def concurrent(url, queries, repeat):
+    """Queries per second with THREADS threads sending the queries."""
+    work = queries * repeat
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(lambda query: execute_sparql(url, query), work))
+    return len(work) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded vs HTTP query backend")
+    parser.add_argument("--gameweeks", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    queries = [entry["sparql"][-1] for entry in corpus["questions"] if "sparql" in entry]
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = os.path.join(directory, "sample.ttl")
+        build_sample_graph(args.gameweeks).serialize(data, format="turtle")
+        url = f"{EMBEDDED_SCHEME}{ONTOLOGY},{data}"
+
+        start = time.perf_counter()
+        load_graph([ONTOLOGY, data], directory)
+        parsed = time.perf_counter() - start
+        start = time.perf_counter()
+        store = EmbeddedStore.from_url(url, directory)
+        pickled = time.perf_counter() - start
+        print(f"{len(store.graph)} triples: parsed in {parsed:.2f}s, loaded from the pickle in {pickled:.2f}s\n")
+
+        # the graph the endpoint builds, with its triples in the same order: queries with ORDER BY
+        # and LIMIT can cut ties differently on a graph read back from the Turtle file
+        store = EmbeddedStore(load_sample(args.gameweeks))
+        set_backend(url, store)
+        with RdflibEndpoint(gameweeks=args.gameweeks) as endpoint:
+            different = [query for query in queries if execute_sparql(endpoint.url, query) != execute_sparql(url, query)]
+            results = {}
+            for name, target in (("http", endpoint.url), ("embedded", url)):
+                timed(target, queries, 1)  # warm-up
+                latencies = timed(target, queries, args.repeat)
+                results[name] = (
+                    statistics.median(latencies) * 1000,
+                    percentile(latencies, 95) * 1000,
+                    concurrent(target, queries, args.repeat),
+                )
+
+    print(f"{len(queries)} queries x {args.repeat}")
+    print(f"  {'backend':<10}{'p50 ms':>9}{'p95 ms':>9}{f'q/s ({THREADS} threads)':>20}")
+    for name, (p50, p95, throughput) in results.items():
+        print(f"  {name:<10}{p50:>9.2f}{p95:>9.2f}{throughput:>20.0f}")
+    http, embedded = results["http"][0], results["embedded"][0]
+    print(f"\nembedded p50 is {http / embedded:.1f}x faster, {http - embedded:.2f} ms less per query")
+    print(f"store: {store.stats()}")
+    if different:
+        print(f"\n{len(different)} queries with different bindings:")
+        for query in different:
+            print("  " + " ".join(query.split())[:120])
+    else:
+        print("both backends returned the same bindings for every query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Request size and latency of ChatManager.ask over a long simulated session with the unbounded
+history (the old behaviour) and with the token budget under both policies, and the memory
+the stored history takes as a deque of slotted records vs a list of types.Content.
+The model is a FakeClient whose delay grows with the prompt, like Gemini's time to first token.
+
+Run from the repository root:
+    python -m benchmarks.bench_chat_history
+"""
+import time
+import tracemalloc
+
+from google.genai import types
+
+from functions.chat_history import ChatHistory
+from functions.chat_manager import ChatManager
+from functions.llm_client import FakeClient, get_llm, set_llm
+
+TURNS = 200
+CHECKPOINTS = (10, 50, 100, 200)
+BASE_DELAY = 0.0005
+PER_TOKEN_DELAY = 0.000002  # seconds per prompt token, scaled down so the benchmark stays quick
+REPLY = (
+    "Manchester United drew 2-2 at home in that match. Bruno Fernandes scored a penalty in the first half "
+    "and Rashford equalised late on after a corner. The result leaves them seventh in the table with "
+    "twelve points from eight games, three points behind the top four."
+)
+
+
+def fake_gemini(prompt, system_instruction):
+    time.sleep(BASE_DELAY + PER_TOKEN_DELAY * len(prompt) / 4)
+    return REPLY
+
+
+def session(**history):
+    set_llm(FakeClient(fake_gemini))
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.", **history)
+    sizes = {}
+    start = time.perf_counter()
+    for turn in range(1, TURNS + 1):
+        chat.ask(f"Question {turn - 1}: what happened in the match of gameweek {(turn - 1) % 38 + 1} and why?")
+        if turn in CHECKPOINTS:
+            sizes[turn] = chat.last_payload_tokens
+    elapsed = time.perf_counter() - start
+    return chat, sizes, elapsed, get_llm().stats()["chat"]
+
+
+def history_memory(factory):
+    tracemalloc.start()
+    store = factory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del store
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def main():
+    print(f"{TURNS} turns, estimated tokens per request at turn " + ", ".join(map(str, CHECKPOINTS)))
+    for name, history in (
+        ("unbounded", {"max_history_tokens": None}),
+        ("budget 2000, drop", {"history_policy": "drop"}),
+        ("budget 2000, summarize", {"history_policy": "summarize"}),
+    ):
+        chat, sizes, elapsed, llm = session(**history)
+        payloads = chat.payload_stats()
+        stats = chat.history.stats()
+        print(
+            f"  {name:<24} " + "  ".join(f"{sizes[turn]:6d}" for turn in CHECKPOINTS)
+            + f"   max {payloads['max_tokens']:6d}   total {payloads['total_tokens']:8d}   "
+            f"{llm['prompt_tokens'] / llm['calls']:6.0f} words/request   {elapsed * 1000:6.0f} ms   "
+            f"kept {stats['messages']} messages, {stats['summarized']} summarized, {stats['dropped']} dropped"
+        )
+
+    texts = [("user" if i % 2 == 0 else "assistant", REPLY) for i in range(TURNS * 2)]
+
+    def contents():
+        return [types.Content(role=role, parts=[types.Part(text=text)]) for role, text in texts]
+
+    def records():
+        history = ChatHistory(max_tokens=None)
+        for role, text in texts:
+            history.append(role, text)
+        return history
+
+    print(
+        f"memory of {len(texts)} messages (texts shared): list of types.Content "
+        f"{history_memory(contents) / 1024:.0f} KiB, deque of slotted records {history_memory(records) / 1024:.0f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Entity index (functions/entity_index.py) over the sample data served by the rdflib endpoint:
+- build time and size of the index,
+- lookup latency over every player of every squad: exact names, prefixes, fuzzy lookups of
+  misspelled names and resolve of a question naming the player,
+- resolution accuracy of questions with nicknames, surnames and misspelled names,
+- empty-result rate of the queries generated for those questions without and with the resolved
+  IRIs in the prompt. The generator is simulated: without the IRIs it writes the mentioned name
+  as an IRI (:Man_Utd), as the LLM does when it has to guess, with them it uses the first one.
+
+Run from the repository root:
+    python -m benchmarks.bench_entities
+"""
+import re
+import statistics
+import time
+
+from benchmarks.rdflib_endpoint import RdflibEndpoint
+from benchmarks.sample_data import KNOWN_PLAYERS
+from benchmarks.suite import ONTOLOGY, percentile
+from functions.entity_index import ONTOLOGY_PREFIX, TEAM_ALIASES, EntityIndex
+from functions.execute_query import execute_sparql
+from functions.llm_client import FakeClient, set_llm
+from functions.sparql_generator import generate_sparql
+
+HINT_RE = re.compile(r'- "(?P<text>[^"]+)": :(?P<iri>\w+)')
+QUERIES = {
+    "Player": "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?team WHERE {{ :{iri} :playsFor ?team }}",
+    "Team": "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player WHERE {{ :{iri} :hasPlayer ?player }}",
+}
+
+
+def misspell(name):
+    """The name with two letters of its last word swapped or one dropped, the usual typos."""
+    words = name.split()
+    last = words[-1]
+    if len(last) >= 6:
+        last = last[:2] + last[3] + last[2] + last[4:]
+    elif len(last) >= 4:
+        last = last[:-2] + last[-1]
+    words[-1] = last
+    return " ".join(words)
+
+
+def test_set():
+    """(question, mentioned name, expected local name, kind)"""
+    cases = []
+    for team, aliases in TEAM_ALIASES.items():
+        for alias in aliases[:2]:
+            cases.append((f"How many points do {alias} have this season?", alias, team, "Team"))
+    for team, players in KNOWN_PLAYERS.items():
+        for name, *_ in players:
+            label = name.replace("_", " ")
+            surname = label.split()[-1]
+            cases.append((f"How many goals has {surname} scored?", surname, name, "Player"))
+            cases.append((f"Who does {misspell(label)} play for?", misspell(label), name, "Player"))
+    return cases
+
+
+def guess(prompt, system_instruction, mentioned):
+    """The query of the simulated generator: the IRI of the prompt if there is one, else the name as written."""
+    text, kind = mentioned[prompt]
+    hints = {match["text"]: match["iri"] for match in HINT_RE.finditer(system_instruction)}
+    iri = hints.get(text) or next(iter(hints.values()), None) or "_".join(word.capitalize() for word in text.split())
+    return QUERIES[kind].format(iri=iri)
+
+
+def timed(function, items):
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6, percentile(times, 95) * 1e6
+
+
+def main():
+    with RdflibEndpoint() as endpoint:
+        start = time.perf_counter()
+        index = EntityIndex.from_kg(endpoint.url)
+        built = time.perf_counter() - start
+        stats = index.stats()
+        print(f"index: {stats['entities']} entities, {stats['names']} names, built in {built:.2f}s (with the KG query)\n")
+
+        players = [entity for entity in index.entities.values() if entity.kind == "Player"]
+        typos = [(misspell(entity.label), entity) for entity in players]
+        print(f"lookups over the {len(players)} players of the squads")
+        print(f"  {'':<26}{'p50 us':>9}{'p95 us':>9}")
+        for name, function, items in (
+            ("exact", index.lookup, [entity.label for entity in players]),
+            ("prefix (4 letters)", index.complete, [entity.label[:4] for entity in players]),
+            ("fuzzy, misspelled", lambda name: index.fuzzy(name, anchored=True), [typo for typo, _ in typos]),
+            ("resolve, question", index.resolve, [f"How many goals has {typo} scored?" for typo, _ in typos]),
+        ):
+            p50, p95 = timed(function, items)
+            print(f"  {name:<26}{p50:>9.1f}{p95:>9.1f}")
+        found = [index.resolve(f"How many goals has {typo} scored?") for typo, _ in typos]
+        first = sum(bool(mentions) and mentions[0].entities[0] is entity for mentions, (_, entity) in zip(found, typos))
+        print(f"  misspelled players resolved to the right one: {first} of {len(players)}\n")
+
+        cases = test_set()
+        mentioned = {question: (text, kind) for question, text, _, kind in cases}
+        set_llm(FakeClient(lambda prompt, system_instruction: guess(prompt, system_instruction, mentioned)))
+        resolved = 0
+        empty = {"without IRIs": 0, "with IRIs": 0}
+        for question, text, expected, kind in cases:
+            mentions = index.resolve(question)
+            iris = [entity.iri for mention in mentions for entity in mention.entities[:1]]
+            resolved += ONTOLOGY_PREFIX + expected in iris
+            for name, hints in (("without IRIs", None), ("with IRIs", mentions)):
+                query = generate_sparql(None, ONTOLOGY, question, mentions=hints)
+                empty[name] += not execute_sparql(endpoint.url, query)
+        print(f"test set: {len(cases)} questions with nicknames, surnames and misspelled names")
+        print(f"  resolved to the expected entity: {resolved} of {len(cases)}")
+        for name, count in empty.items():
+            print(f"  empty results, {name:<14}{count:>4} ({count / len(cases):.1%})")
+
+
+if __name__ == "__main__":
+    main()
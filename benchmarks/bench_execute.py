@@ -0,0 +1,80 @@
+"""
+Latency and throughput of execute_sparql against a local stub endpoint:
+a new connection per query (the old bare requests.post), the pooled SparqlClient,
+and the AsyncSparqlClient with many queries in flight.
+
+Run from the repository root:
+    python -m benchmarks.bench_execute
+"""
+import asyncio
+import statistics
+import time
+
+import requests
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.execute_query import HEADERS, AsyncSparqlClient, SparqlClient
+
+QUERY = "PREFIX : <http://semanticweb.org/unitedOntology#> SELECT ?player ?team WHERE { ?player :playsFor ?team }"
+RUNS = 200
+
+
+def report(name, timings, elapsed):
+    print(f"{name:<34} mean {statistics.mean(timings):7.2f} ms   p95 {sorted(timings)[int(len(timings) * 0.95)]:7.2f} ms   {len(timings) / elapsed:8.0f} queries/s")
+
+
+def run_sequential(fn):
+    timings = []
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        t = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t) * 1000)
+    return timings, time.perf_counter() - start
+
+
+async def run_concurrent(client, concurrency):
+    timings = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t = time.perf_counter()
+            await client.query(QUERY)
+            timings.append((time.perf_counter() - t) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(RUNS)))
+    return timings, time.perf_counter() - start
+
+
+def main():
+    for delay in (0.0, 0.01):
+        print(f"Endpoint delay {delay * 1000:.0f} ms")
+        with StubEndpoint(delay=delay) as endpoint:
+            def new_connection():
+                response = requests.post(endpoint.url, data=QUERY.encode("utf-8"), headers=HEADERS)
+                response.json()
+
+            report("  new connection per query", *run_sequential(new_connection))
+
+            client = SparqlClient(endpoint.url)
+            report("  pooled SparqlClient", *run_sequential(lambda: client.query(QUERY)))
+            client.close()
+
+            async def concurrent():
+                async_client = AsyncSparqlClient(endpoint.url, pool_size=8)
+                result = await run_concurrent(async_client, 8)
+                await async_client.close()
+                return result
+
+            report("  AsyncSparqlClient, 8 in flight", *asyncio.run(concurrent()))
+
+    with StubEndpoint(failure_rate=0.3) as endpoint:
+        client = SparqlClient(endpoint.url, backoff=0.01)
+        answered = sum(1 for _ in range(RUNS) if client.query(QUERY))
+        print(f"30% of requests fail with 503: {answered}/{RUNS} queries answered after retries ({endpoint.requests} requests)")
+
+
+if __name__ == "__main__":
+    main()
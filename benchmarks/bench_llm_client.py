@@ -0,0 +1,56 @@
+"""
+Cost of building a genai.Client on every call (as the router, generator and beautify
+used to) compared with the shared client, and a turn through the four call sites with
+the FakeClient backend to show the per-purpose latency and token accounting.
+
+Run from the repository root:
+    python -m benchmarks.bench_llm_client
+"""
+import time
+
+from google import genai
+
+from functions.beautify import beautify
+from functions.chat_manager import ChatManager
+from functions.llm_client import FakeClient, get_llm, set_llm
+from functions.router import should_use_kg
+from functions.sparql_generator import generate_sparql
+
+RUNS = 50
+SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player ?team WHERE { ?player :playsFor ?team . }"
+
+
+def fake_gemini(prompt, system_instruction):
+    if "classifier" in system_instruction:
+        return '{"use_kg": true}'
+    if "SPARQL" in system_instruction:
+        return SPARQL
+    return "Bruno Fernandes plays for Manchester United."
+
+
+def main():
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        genai.Client(api_key="benchmark-key")
+    per_client = (time.perf_counter() - start) / RUNS * 1000
+    print(f"genai.Client construction: {per_client:.2f} ms, up to 5 per turn before = {per_client * 5:.2f} ms per turn")
+
+    set_llm(FakeClient(fake_gemini, delay=0.01))
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.")
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        question = "Who plays for Manchester United?"
+        if should_use_kg(None, question):
+            generate_sparql(None, "ontology/simple_test.txt", question)
+            beautify(None, question, [{"player": "Bruno_Fernandes"}])
+        chat.ask("And who is the captain?")
+    print(f"{RUNS} turns with the fake model: {(time.perf_counter() - start) / RUNS * 1000:.1f} ms per turn")
+    for purpose, stats in get_llm().stats().items():
+        print(
+            f"  {purpose:<9} {stats['calls']:4d} calls   {stats['seconds'] / stats['calls'] * 1000:6.1f} ms per call   "
+            f"{stats['prompt_tokens'] / stats['calls']:7.0f} prompt tokens   {stats['output_tokens'] / stats['calls']:4.0f} output tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
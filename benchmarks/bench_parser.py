@@ -0,0 +1,158 @@
+"""
+Fuzz corpus and throughput benchmark of the BGP extraction.
+
+Queries are generated together with the triple patterns they contain, using the constructs
+that broke the old regex tokenisation: string literals with separators, full IRIs with '#'
+and '.', nested groups, OPTIONAL/UNION bodies, FILTER/BIND/VALUES and property paths.
+The extracted triples are compared with the expected ones, and the throughput is compared
+with rdflib's own parser (parseQuery + translateQuery).
+
+Run from the repository root:
+    python -m benchmarks.bench_parser
+"""
+import random
+import time
+from collections import Counter
+
+from rdflib import Literal, URIRef, Variable
+from rdflib.namespace import RDF, XSD
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.algebra import translateQuery
+
+from functions.sparql_parser import ONTOLOGY_PREFIX, parse_bgps
+
+EXTRA_PREFIX = "http://example.org/stats.v2#"
+PROPERTIES = ["playsFor", "hasPlayer", "goalScoredBy", "matchHasTeamStats", "statsOfTeam", "teamGoalsScored", "hasHomeTeam"]
+CLASSES = ["Player", "Team", "Match", "Goal", "TeamMatchStats"]
+STRINGS = ['"Bruno Fernandes"', '"a. b; c, d"', '"{ } # not a comment"', "'single ? quoted'", '"""multi\nline . ;"""']
+
+
+class QueryBuilder:
+    """Builds one random query and the multiset of triples a correct extractor returns."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.expected = []
+        self.variables = [f"?v{i}" for i in range(4)]
+
+    def prop(self):
+        name = self.rng.choice(PROPERTIES)
+        form = self.rng.random()
+        if form < 0.15:
+            return f"<{ONTOLOGY_PREFIX}{name}>", URIRef(ONTOLOGY_PREFIX + name)
+        if form < 0.3:
+            return f"st:{name}.x", URIRef(EXTRA_PREFIX + name + ".x")
+        return f":{name}", URIRef(ONTOLOGY_PREFIX + name)
+
+    def var(self):
+        name = self.rng.choice(self.variables)
+        return name, Variable(name[1:])
+
+    def obj(self):
+        form = self.rng.random()
+        if form < 0.5:
+            return self.var()
+        if form < 0.7:
+            text = self.rng.choice(STRINGS)
+            quote = 3 if text.startswith('"""') else 1
+            return text, Literal(text[quote:-quote])
+        if form < 0.85:
+            number = self.rng.randint(0, 99)
+            return str(number), Literal(str(number), datatype=XSD.integer)
+        name = self.rng.choice(CLASSES)
+        return f":{name}_1", URIRef(ONTOLOGY_PREFIX + name + "_1")
+
+    def triples_block(self):
+        """A subject with a ';' property list and ',' object lists, or a path."""
+        s_text, s = self.var()
+        if self.rng.random() < 0.2:
+            p1_text, p1 = self.prop()
+            p2_text, p2 = self.prop()
+            o_text, o = self.var()
+            if self.rng.random() < 0.5:
+                self.expected += [(s, p1, "_"), ("_", p2, o)]
+                return f"{s_text} {p1_text}/{p2_text} {o_text} ."
+            self.expected.append((o, p1, s))
+            return f"{s_text} ^{p1_text} {o_text} ."
+        parts = []
+        if self.rng.random() < 0.3:
+            name = self.rng.choice(CLASSES)
+            parts.append(f"a :{name}")
+            self.expected.append((s, RDF.type, URIRef(ONTOLOGY_PREFIX + name)))
+        for _ in range(self.rng.randint(1, 3)):
+            p_text, p = self.prop()
+            objects = []
+            for _ in range(self.rng.randint(1, 2)):
+                o_text, o = self.obj()
+                objects.append(o_text)
+                self.expected.append((s, p, o))
+            parts.append(f"{p_text} {' , '.join(objects)}")
+        separator = " ;\n        "
+        return f"{s_text} {separator.join(parts)} ."
+
+    def group(self, depth=0):
+        lines = []
+        for _ in range(self.rng.randint(1, 3)):
+            form = self.rng.random()
+            if depth < 2 and form < 0.15:
+                lines.append(f"OPTIONAL {{ {self.group(depth + 1)} }}")
+            elif depth < 2 and form < 0.25:
+                lines.append(f"{{ {self.group(depth + 1)} }} UNION {{ {self.group(depth + 1)} }}")
+            elif form < 0.35:
+                lines.append(f'FILTER(?v0 != "}} . ;" && CONTAINS(STR(?v1), "{{"))')
+            elif form < 0.4:
+                lines.append('BIND(CONCAT("a", "}") AS ?bound)')
+            elif form < 0.45:
+                lines.append('VALUES ?v3 { :Manchester_United "x . y" }')
+            else:
+                lines.append(self.triples_block())
+        return "\n    ".join(lines)
+
+    def build(self):
+        body = self.group()
+        query = f"""PREFIX : <{ONTOLOGY_PREFIX}>
+PREFIX st: <{EXTRA_PREFIX}>
+# a comment with {{ braces }} and a ?variable
+SELECT DISTINCT ?v0 ?v1 WHERE {{
+    {body}
+}} ORDER BY ?v0 LIMIT 10"""
+        return query, self.expected
+
+
+def canonical(triples):
+    """Replaces the fresh variables introduced for paths and blank nodes by '_'."""
+    def term(t):
+        return "_" if t == "_" or (isinstance(t, Variable) and str(t).startswith("_b")) else t
+    return Counter(tuple(term(t) for t in triple) for triple in triples)
+
+
+def generate_corpus(count, seed=0):
+    rng = random.Random(seed)
+    return [QueryBuilder(rng).build() for _ in range(count)]
+
+
+def main(count=500):
+    corpus = generate_corpus(count)
+
+    failures = [query for query, expected in corpus if canonical(parse_bgps(query)) != canonical(expected)]
+    print(f"Correctness: {count - len(failures)}/{count} generated queries extracted exactly")
+    for query in failures[:3]:
+        print(query)
+        print(parse_bgps(query))
+
+    start = time.perf_counter()
+    for query, _ in corpus:
+        parse_bgps(query)
+    elapsed = time.perf_counter() - start
+    print(f"parse_bgps:                    {count / elapsed:10.0f} queries/s  ({elapsed / count * 1000:.3f} ms per query)")
+
+    sample = corpus[: max(1, count // 10)]
+    start = time.perf_counter()
+    for query, _ in sample:
+        translateQuery(parseQuery(query))
+    elapsed = time.perf_counter() - start
+    print(f"rdflib parseQuery + algebra:   {len(sample) / elapsed:10.0f} queries/s  ({elapsed / len(sample) * 1000:.3f} ms per query)")
+
+
+if __name__ == "__main__":
+    main()
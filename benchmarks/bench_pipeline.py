@@ -0,0 +1,87 @@
+"""
+End-to-end latency of a chat turn with the router and the KG branch run one after the
+other (speculative=False, as main.py used to) and concurrently (speculative=True).
+The LLM is a FakeClient that sleeps a configurable time per purpose, the KG the stub endpoint.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline
+"""
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.chat_manager import ChatManager
+from functions.llm_client import FakeClient, get_llm, set_llm
+from functions.pipeline import TurnPipeline
+
+# seconds per call, roughly the latencies of gemini-2.0-flash seen for each prompt
+DELAYS = {"router": 0.35, "generate": 0.9, "beautify": 0.6, "chat": 0.7}
+KG_DELAY = 0.05
+TURNS = 6
+SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player ?team WHERE { ?player :playsFor ?team . }"
+QUESTIONS = [
+    ("Who plays for Manchester United?", True),
+    ("Tell me a joke about goalkeepers.", False),
+]
+
+
+def fake_gemini(prompt, system_instruction):
+    if "classifier" in system_instruction:
+        time.sleep(DELAYS["router"])
+        use_kg = any(prompt == question and kg for question, kg in QUESTIONS)
+        return '{"use_kg": %s}' % ("true" if use_kg else "false")
+    if "SPARQL" in system_instruction:
+        time.sleep(DELAYS["generate"])
+        return SPARQL
+    if "football assistant" in system_instruction:
+        time.sleep(DELAYS["chat"])
+        return "Why did the goalkeeper get a job at the bank? He was great at saving."
+    time.sleep(DELAYS["beautify"])
+    return "Bruno Fernandes and 19 others play for Manchester United."
+
+
+def run(url, question, speculative):
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.")
+    pipeline = TurnPipeline(
+        None, url, "ontology/simple_test.txt", "ontology/ontology_export.ttl", chat, speculative=speculative
+    )
+    latencies = []
+    for _ in range(TURNS):
+        # the pipeline prints the generated queries like main.py does
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = pipeline.run_sync(question)
+        latencies.append(result.timings["total"])
+    pipeline.close()
+    return latencies, result
+
+
+def main():
+    set_llm(FakeClient(fake_gemini))
+    # parse the ontology once, outside the measured turns
+    from functions.sparql_validator import validate_sparql
+    validate_sparql(SPARQL, "ontology/ontology_export.ttl")
+
+    print(f"LLM delays {DELAYS}, KG delay {KG_DELAY}s, {TURNS} turns each")
+    with StubEndpoint(delay=KG_DELAY) as endpoint:
+        for question, kg in QUESTIONS:
+            kind = "KG question" if kg else "chat question"
+            sequential, result = run(endpoint.url, question, speculative=False)
+            assert result.used_kg == kg and result.reply
+            speculative, result = run(endpoint.url, question, speculative=True)
+            assert result.used_kg == kg and result.reply
+            before = statistics.median(sequential)
+            after = statistics.median(speculative)
+            print(
+                f"{kind:<14} sequential {before * 1000:7.0f} ms   speculative {after * 1000:7.0f} ms   "
+                f"saved {(before - after) * 1000:5.0f} ms ({(1 - after / before) * 100:4.1f}%)"
+            )
+            stages = "   ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in result.timings.items())
+            print(f"  last speculative turn: {stages}")
+    generate = get_llm().stats()["generate"]
+    print(f"generate calls: {generate['calls']} (includes speculative calls for chat questions)")
+
+
+if __name__ == "__main__":
+    main()
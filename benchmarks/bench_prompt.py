@@ -0,0 +1,99 @@
+"""
+Size of the generate_sparql prompt with the whole schema and with the pruned schema and
+similar examples, whether the pruned schema still has what each question needs (recall of
+the classes and properties of a reference query), and the generation latency with a
+FakeClient whose delay grows with the prompt like the time to first token of Gemini does.
+
+Run from the repository root:
+    python -m benchmarks.bench_prompt
+"""
+import statistics
+import time
+
+from functions.llm_client import FakeClient, get_llm, set_llm
+from functions.schema_retrieval import EXAMPLE_BANK, load_schema
+from functions.sparql_generator import build_system_prompt, generate_sparql
+from functions.sparql_validator import validate_sparql
+
+SCHEMA = "ontology/simple_test.txt"
+ONTOLOGY = "ontology/ontology_export.ttl"
+BASE_DELAY = 0.25  # seconds per call
+PER_TOKEN_DELAY = 0.0002  # seconds per prompt token (prefill)
+
+# (question, schema entries a correct query uses)
+LABELLED = [
+    ("How many goals did Manchester United score in gameweek 3?",
+     {"matchGameweek", "matchHasTeamStats", "statsOfTeam", "teamGoalsScored"}),
+    ("Who is the manager of Chelsea?", {"hasCoach"}),
+    ("What is the nationality of Bruno Fernandes?", {"hasNationality"}),
+    ("Show the league table", {"TeamSeasonStats", "seasonStatsOfTeam", "teamPoints"}),
+    ("Which players got a red card?", {"matchStatsOfPlayer", "playerReceivedRedCard"}),
+    ("Who assisted the goals of Rashford?", {"assistedBy", "playerScored", "matchStatsOfPlayer"}),
+    ("How many corners did Arsenal take against Liverpool?", {"corners", "statsOfTeam", "matchHasTeamStats", "hasHomeTeam"}),
+    ("Which matches ended in a draw?", {"hasResult", "Draw"}),
+    ("How many minutes did Casemiro play in gameweek 2?",
+     {"minutesPlayed", "matchStatsOfPlayer", "playerStatsOfMatch", "matchGameweek"}),
+    ("Which team has the most clean sheets?", {"teamCleanSheets", "seasonStatsOfTeam"}),
+    ("When was Haaland born?", {"hasBirthDate"}),
+    ("Who scored penalties this season?", {"isPenaltyGoal", "playerScored", "matchStatsOfPlayer"}),
+    ("What was the ball possession of Everton in their home matches?",
+     {"ballPossession", "statsOfTeam", "matchHasTeamStats", "hasHomeTeam"}),
+    ("Which players play for Tottenham?", {"playsFor"}),
+]
+
+
+def prompt_tokens(question, prune):
+    # the FakeClient counts tokens as whitespace separated words too
+    return len(build_system_prompt(SCHEMA, question, prune).split()) + len(question.split())
+
+
+def fake_gemini(prompt, system_instruction):
+    time.sleep(BASE_DELAY + PER_TOKEN_DELAY * (len(prompt.split()) + len(system_instruction.split())))
+    return EXAMPLE_BANK[0][1]
+
+
+def main():
+    for question, sparql in EXAMPLE_BANK:
+        errors = validate_sparql(sparql, ONTOLOGY)
+        assert errors is None, (question, errors)
+    print(f"example bank: {len(EXAMPLE_BANK)} queries, all valid against the ontology")
+
+    schema = load_schema(SCHEMA)
+    start = time.perf_counter()
+    for _ in range(100):
+        for question, _ in LABELLED:
+            schema.select(question)
+    retrieval_ms = (time.perf_counter() - start) / (100 * len(LABELLED)) * 1000
+
+    full_sizes, pruned_sizes, recalls = [], [], []
+    for question, needed in LABELLED:
+        selected = schema.select(question) or set(schema.by_name)
+        recall = len(needed & selected) / len(needed)
+        full_sizes.append(prompt_tokens(question, prune=False))
+        pruned_sizes.append(prompt_tokens(question, prune=True))
+        recalls.append(recall)
+        missing = ", ".join(sorted(needed - selected))
+        print(f"  {pruned_sizes[-1]:5d} / {full_sizes[-1]:5d} tokens  recall {recall:4.2f}  {question}"
+              + (f"  (missing {missing})" if missing else ""))
+
+    full, pruned = statistics.mean(full_sizes), statistics.mean(pruned_sizes)
+    print(
+        f"mean prompt: {pruned:.0f} tokens pruned vs {full:.0f} full ({(1 - pruned / full) * 100:.0f}% fewer), "
+        f"schema recall {statistics.mean(recalls) * 100:.0f}%, retrieval {retrieval_ms:.3f} ms per question"
+    )
+
+    for prune in (False, True):
+        set_llm(FakeClient(fake_gemini))
+        start = time.perf_counter()
+        for question, _ in LABELLED:
+            generate_sparql(None, SCHEMA, question, prune=prune)
+        elapsed = (time.perf_counter() - start) / len(LABELLED)
+        stats = get_llm().stats()["generate"]
+        print(
+            f"{'pruned' if prune else 'full  '} prompt: {elapsed * 1000:6.1f} ms per generation, "
+            f"{stats['prompt_tokens'] / stats['calls']:.0f} prompt tokens per call"
+        )
+
+
+if __name__ == "__main__":
+    main()
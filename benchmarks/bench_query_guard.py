@@ -0,0 +1,114 @@
+"""
+Query cost guard (functions/query_guard.py) on the rdflib endpoint with the sample data:
+- estimated vs actual rows of the corpus queries and of the example bank (without the default
+  LIMIT, so that the estimate of the whole result is compared): q-error percentiles, and
+  the worst estimates,
+- the issues found and rewrites made, and for the queries with a LIMIT added or a self-join
+  filtered, the rows and execution time of the original and of the rewritten query,
+- queries the LLM writes when it goes wrong (a cartesian product, a scan of the KG, a
+  self-join): issues, estimated cost and whether they are rejected.
+
+Run from the repository root:
+    python -m benchmarks.bench_query_guard [--limit 50] [--max-cost 100000]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.rdflib_endpoint import RdflibEndpoint
+from benchmarks.replay import load_corpus
+from benchmarks.suite import TURTLE_ONTOLOGY, percentile
+from functions.execute_query import execute_sparql
+from functions.query_guard import MAX_COST, KGStatistics, QueryGuard
+from functions.schema_retrieval import EXAMPLE_BANK
+from functions.sparql_validator import validate_sparql
+
+P = "PREFIX : <http://semanticweb.org/unitedOntology#>\n"
+BAD_QUERIES = [
+    ("cartesian product", P + "SELECT ?player ?match WHERE { ?player a :Player . ?match a :Match . ?goal :goalTime ?time }"),
+    ("scan of the KG", P + "SELECT ?s ?p ?o WHERE { ?s ?p ?o . ?s a :Player }"),
+    ("scan joined twice", P + "SELECT * WHERE { ?s ?p ?o . ?o ?q ?x }"),
+    ("self-join", P + "SELECT ?home ?away WHERE {\n?m :matchHasTeamStats ?ts1 ;\n   :matchHasTeamStats ?ts2 .\n"
+                      "?ts1 :teamGoalsScored ?home .\n?ts2 :teamGoalsScored ?away .\n}"),
+]
+
+
+def timed(url, query, runs=3):
+    best, rows = None, None
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = execute_sparql(url, query)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows), best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query cost guard: estimates and rewrites")
+    parser.add_argument("--limit", type=int, default=50, help="default LIMIT, the max_rows of main.py")
+    parser.add_argument("--max-cost", type=float, default=MAX_COST)
+    args = parser.parse_args()
+
+    corpus = [entry["sparql"][-1] for entry in load_corpus()["questions"] if "sparql" in entry]
+    queries = [query for query in dict.fromkeys(corpus + [sparql for _, sparql in EXAMPLE_BANK])
+               if validate_sparql(query, TURTLE_ONTOLOGY) is None]
+    with RdflibEndpoint() as endpoint:
+        start = time.perf_counter()
+        kg = KGStatistics.from_kg(endpoint.url)
+        print(f"KG statistics: {kg.triples} triples, {len(kg.predicates)} predicates, {len(kg.classes)} classes "
+              f"in {time.perf_counter() - start:.2f}s\n")
+
+        estimator = QueryGuard(kg, default_limit=None, max_cost=args.max_cost)
+        check_times, compared = [], []
+        for query in queries:
+            start = time.perf_counter()
+            plan = estimator.check(query)
+            check_times.append(time.perf_counter() - start)
+            if plan.estimated_rows is not None:
+                rows = len(execute_sparql(endpoint.url, plan.query))
+                estimator.record(plan, rows)
+                compared.append((plan.estimated_rows, rows, query))
+        errors = sorted((max(e + 1, a + 1) / min(e + 1, a + 1), e, a, q) for e, a, q in compared)
+        q_errors = [error[0] for error in errors]
+        print(f"{len(queries)} valid corpus and example queries, {len(compared)} without aggregates")
+        print(f"  check: {statistics.median(check_times) * 1000:.3f} ms p50, {percentile(check_times, 95) * 1000:.3f} ms p95")
+        print(f"  q-error (estimated vs actual rows): p50 {statistics.median(q_errors):.2f}, "
+              f"p90 {percentile(q_errors, 90):.2f}, max {q_errors[-1]:.2f}")
+        for error, estimated, actual, query in errors[-3:]:
+            where = " ".join(query.split("WHERE", 1)[-1].split())[:90]
+            print(f"    {estimated:10.1f} estimated {actual:6d} actual   {where}")
+
+        guard = QueryGuard(kg, default_limit=args.limit, max_cost=args.max_cost)
+        changed = []
+        for query in queries:
+            plan = guard.check(query)
+            if plan.changes:
+                changed.append(plan)
+        stats = guard.stats()
+        print(f"\nwith LIMIT {args.limit}: {stats['rewritten']} of {stats['checked']} queries rewritten, "
+              f"issues {stats['issues'] or '{}'}")
+        kinds = {}
+        for plan in changed:
+            for change in plan.changes:
+                kinds[change.split("(")[0].split(" ")[0]] = kinds.get(change.split("(")[0].split(" ")[0], 0) + 1
+        print(f"  rewrites: {kinds}")
+        before = [timed(endpoint.url, plan.original) for plan in changed]
+        after = [timed(endpoint.url, plan.query) for plan in changed]
+        print(f"  {'':<26}{'original':>10}{'rewritten':>11}")
+        print(f"  {'rows, total':<26}{sum(r for r, _ in before):>10}{sum(r for r, _ in after):>11}")
+        print(f"  {'execute ms, total':<26}{sum(t for _, t in before):>10.1f}{sum(t for _, t in after):>11.1f}")
+
+        print("\nqueries gone wrong")
+        for name, query in BAD_QUERIES:
+            plan = guard.check(query)
+            # the rejected ones would keep the endpoint busy for minutes
+            unguarded = "" if plan.rejected else "unguarded: {} rows in {:.0f} ms".format(*timed(endpoint.url, query, runs=1))
+            print(f"  {name:<20} cost {plan.cost:>14,.0f}  {'rejected' if plan.rejected else 'accepted':<9} {unguarded}")
+            for issue in plan.issues:
+                print(f"      {issue[:110]}")
+            if plan.changes and not plan.rejected:
+                print(f"      rewritten: {', '.join(plan.changes)}, {len(execute_sparql(endpoint.url, plan.query))} rows")
+
+
+if __name__ == "__main__":
+    main()
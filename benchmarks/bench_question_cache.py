@@ -0,0 +1,80 @@
+"""
+Hit rate, precision and latency saved by the question cache on a labelled set of
+questions: rephrasings of a cached question must hit and get its query, questions about
+another team, player or gameweek must miss. Generation is simulated with a fixed delay
+standing in for the Gemini round-trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_question_cache
+"""
+import time
+
+from functions.question_cache import QuestionCache
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+GENERATION_DELAY = 1.2  # seconds, a typical generate_sparql call
+
+P = "PREFIX : <http://semanticweb.org/unitedOntology#>\n"
+SEED = {
+    "List all players and the teams they play for": P + "SELECT ?player ?team WHERE { ?player a :Player ; :playsFor ?team . }",
+    "Which teams play in the tournament?": P + "SELECT ?team WHERE { ?tournament :tournamentHasTeam ?team . }",
+    "What matches were played in gameweek 5?": P + "SELECT ?m WHERE { ?m a :Match ; :matchGameweek 5 . }",
+    "Who plays for Manchester United?": P + "SELECT ?player WHERE { ?player :playsFor :Manchester_United . }",
+}
+# (question, the seed question it should be answered by, or None)
+LABELLED = [
+    ("list all the players and the teams they play for", "List all players and the teams they play for"),
+    ("List all players and the teams they play for.", "List all players and the teams they play for"),
+    ("Please list all players and which teams they play for", "List all players and the teams they play for"),
+    ("List every player and the team he plays for", "List all players and the teams they play for"),
+    ("which teams are playing in the tournament", "Which teams play in the tournament?"),
+    ("Which teams play in the tournament this season?", "Which teams play in the tournament?"),
+    ("What matches were played in gameweek 5", "What matches were played in gameweek 5?"),
+    ("Which matches were played in gameweek 5?", "What matches were played in gameweek 5?"),
+    ("What matches were played in gameweek 6?", None),
+    ("who plays for manchester united", "Who plays for Manchester United?"),
+    ("Who plays for Manchester City?", None),
+    ("Who scored the most goals?", None),
+    ("How many yellow cards did Casemiro get?", None),
+]
+
+
+def main():
+    cache = QuestionCache(entity_terms={"united", "city", "arsenal", "chelsea", "liverpool"})
+    for question, sparql in SEED.items():
+        assert cache.remember(question, sparql, ONTOLOGY), question
+
+    right_hits = wrong_hits = missed = 0
+    for question, expected in LABELLED:
+        hit = cache.lookup(question)
+        if hit is None:
+            missed += expected is not None
+            status = "missed" if expected is not None else "ok"
+        elif expected is not None and hit[0] == SEED[expected]:
+            right_hits += 1
+            status = "ok"
+        else:
+            wrong_hits += 1
+            status = "WRONG"
+        print(f"  {status:<6} {'hit ' if hit else 'miss'} {hit[1] if hit else 0:4.2f}  {question}")
+
+    stats = cache.stats()
+    hits = stats["exact_hits"] + stats["similar_hits"]
+    # a wrong hit answers the wrong question, a missed one only costs an LLM call
+    print(f"Precision: {right_hits}/{right_hits + wrong_hits} hits gave the right query")
+    print(f"Recall: {right_hits}/{right_hits + missed} rephrasings were hits")
+    print(f"Hits: {stats['exact_hits']} exact + {stats['similar_hits']} similar, {stats['misses']} misses")
+    print(f"Mean lookup: {stats['mean_lookup_ms']:.3f} ms, saved ~{hits * GENERATION_DELAY:.1f} s of generation at {GENERATION_DELAY} s per call")
+
+    # lookup latency with a large cache
+    for i in range(1000):
+        cache._add(f"How many goals did player number {i} score in gameweek {i % 38}?", SEED["Who plays for Manchester United?"])
+    start = time.perf_counter()
+    for question, _ in LABELLED * 20:
+        cache.lookup(question)
+    elapsed = time.perf_counter() - start
+    print(f"Mean lookup with {len(cache.entries)} cached questions: {elapsed / (len(LABELLED) * 20) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Fraction of KG answers the local renderer writes without the beautify call, on a set of
+result shapes like the ones the generated queries return, and the latency that saves.
+beautify is a FakeClient with a fixed delay standing in for the Gemini round-trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_renderer
+"""
+import time
+
+from functions.answer_renderer import AnswerRenderer, beautify_rendered
+from functions.llm_client import FakeClient, set_llm
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+BEAUTIFY_DELAY = 0.6  # seconds, a typical beautify call
+
+U = "http://semanticweb.org/unitedOntology#"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+
+def iri(name):
+    return {"type": "uri", "value": U + name}
+
+
+def number(value, datatype="integer"):
+    return {"type": "literal", "value": str(value), "datatype": XSD + datatype}
+
+
+def text(value):
+    return {"type": "literal", "value": value}
+
+
+TEAMS = ["Arsenal", "Manchester_City", "Liverpool", "Chelsea", "Tottenham", "Aston_Villa", "Newcastle_United",
+         "Manchester_United", "Brighton", "West_Ham", "Brentford", "Fulham", "Crystal_Palace", "Wolves",
+         "Bournemouth", "Everton", "Nottingham_Forest", "Leeds_United", "Burnley", "Sunderland"]
+PLAYERS = ["Bruno_Fernandes", "Casemiro", "Rashford", "Mainoo", "Onana", "Dalot", "Martinez", "Shaw"]
+
+# (question, bindings, whether the local renderer should answer it)
+CASES = [
+    ("How many goals did Bruno Fernandes score?", [{"goals": number(7)}], True),
+    ("What is the capacity of Old Trafford?", [{"capacity": number(74310)}], True),
+    ("What was the ball possession of United?", [{"possession": number("61.50", "decimal")}], True),
+    ("Who is the coach of Arsenal?", [{"coach": iri("Mikel_Arteta")}], True),
+    ("Was the goal a penalty?", [{"isPenaltyGoal": number("true", "boolean")}], True),
+    ("Who plays for Manchester United?", [{"player": iri(p)} for p in PLAYERS], True),
+    ("Which teams play in the league?", [{"team": iri(t)} for t in TEAMS], True),
+    ("What was the result of the derby?", [{"match": iri("Match_12"), "result": iri("HomeWin")}], True),
+    ("Show the top of the league table",
+     [{"team": iri(t), "points": number(30 - i), "gd": number(12 - i)} for i, t in enumerate(TEAMS[:6])], True),
+    ("List the goals of gameweek 3",
+     [{"scorer": iri(p), "time": text(f"{10 + i * 9}'"), "team": iri("Manchester_United")} for i, p in enumerate(PLAYERS[:4])],
+     True),
+    ("When was Casemiro born?", [{"birth": text("1992-02-23")}], True),
+    ("What is the nationality of the United players?",
+     [{"player": iri(p), "nationality": text(n)} for p, n in zip(PLAYERS, ["Portugal", "Brazil", "England", "England"])],
+     True),
+    ("Show the full league table",
+     [{"team": iri(t), "played": number(10), "wins": number(7), "draws": number(2), "points": number(23 - i)}
+      for i, t in enumerate(TEAMS)], False),
+    ("List every goal of the season", [{"goal": iri(f"Goal_{i}"), "team": iri(TEAMS[i % 20])} for i in range(80)], False),
+    ("Why did United lose to City?", [{"home_goals": number(0), "away_goals": number(3)}], False),
+    ("Tell me about the match stats", [{"stats": {"type": "bnode", "value": "b0"}}], False),
+    ("Describe the career of Bruno Fernandes", [{"team": iri("Sporting_CP")}, {"team": iri("Manchester_United")}], False),
+    ("What does the club history say?", [{"history": text("Founded in 1878 as Newton Heath LYR Football Club, "
+                                                            "the club changed its name to Manchester United in 1902 "
+                                                            "and moved to Old Trafford in 1910.")}], False),
+]
+
+
+def main():
+    set_llm(FakeClient(lambda prompt, system_instruction: "A sentence written by the model.", delay=BEAUTIFY_DELAY))
+    renderer = AnswerRenderer(ONTOLOGY)
+
+    wrong = 0
+    start = time.perf_counter()
+    for question, bindings, expected in CASES:
+        before = renderer.local
+        answer = beautify_rendered(renderer, None, question, bindings)
+        local = renderer.local > before
+        wrong += local != expected
+        print(f"  {'local' if local else 'llm  '} {'ok   ' if local == expected else 'WRONG'} {question}")
+        if local and len(bindings) <= 2:
+            print("        " + answer.replace("\n", "\n        "))
+    elapsed = time.perf_counter() - start
+
+    stats = renderer.stats()
+    print(
+        f"{len(CASES)} answers: {stats['local']} rendered locally ({stats['local_rate'] * 100:.0f}%), "
+        f"{stats['fallbacks']} by the LLM, {wrong} not as expected"
+    )
+    print(
+        f"local render {stats['mean_render_ms']:.3f} ms vs beautify {stats['mean_beautify_ms']:.0f} ms, "
+        f"saved ~{stats['saved_s']:.1f}s: {elapsed:.1f}s for the set vs {len(CASES) * BEAUTIFY_DELAY:.1f}s with beautify alone"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Local SPARQL repair (functions/sparql_repair.py) before and after:
+- the corpus replayed through the pipeline without and with the repairer (recorded LLM answers,
+  rdflib endpoint with the sample data): retry rate, LLM generate calls and turn latency,
+  overall and for the questions whose first query fails validation,
+- the corrupted corpus: every valid corpus query with one term broken the way the LLM breaks
+  them (a property without its first word, a misspelled class, an object property with its
+  arguments swapped), how many of them the repairer fixes, how many back to the original
+  query, and how long a repair takes.
+
+Run from the repository root:
+    python -m benchmarks.bench_repair [--scale 0.1] [--rounds 2]
+"""
+import argparse
+import re
+import statistics
+
+from benchmarks.rdflib_endpoint import RdflibEndpoint
+from benchmarks.replay import ReplayClient, load_corpus
+from benchmarks.suite import CHAT_PROMPT, ONTOLOGY, TURTLE_ONTOLOGY, percentile
+from functions.chat_manager import ChatManager
+from functions.llm_client import set_llm
+from functions.pipeline import TurnPipeline
+from functions.sparql_parser import canonicalize_query
+from functions.sparql_repair import SparqlRepairer
+from functions.sparql_validator import validate_sparql
+
+PNAME_RE = re.compile(r":([a-z]+)([A-Z]\w*)")
+CLASS_RE = re.compile(r"\ba :([A-Z]\w*)")
+FORWARD_RE = re.compile(r"(\?\w+) :(playsFor|hasPlayer|coachesTeam) (\?\w+|:\w+)")
+
+
+def run_corpus(corpus, url, repairer, rounds):
+    pipeline = TurnPipeline(None, url, ONTOLOGY, TURTLE_ONTOLOGY, ChatManager(api_key=None, system_prompt=CHAT_PROMPT),
+                            repairer=repairer, log=lambda message: None)
+    failing = {entry["question"] for entry in corpus["questions"] if len(entry.get("sparql", [])) > 1}
+    totals, failing_totals, kg_turns, retried, repaired = [], [], 0, 0, 0
+    for _ in range(rounds):
+        for entry in corpus["questions"]:
+            result = pipeline.run_sync(entry["question"])
+            totals.append(result.timings["total"])
+            if entry["question"] in failing:
+                failing_totals.append(result.timings["total"])
+            if result.used_kg:
+                kg_turns += 1
+                retried += result.retries > 0
+                repaired += result.repaired
+    pipeline.close()
+    return {
+        "retry rate": retried / kg_turns,
+        "repair rate": repaired / kg_turns,
+        "total p50 ms": statistics.median(totals) * 1000,
+        "total p95 ms": percentile(totals, 95) * 1000,
+        "failing questions p50 ms": statistics.median(failing_totals) * 1000,
+    }
+
+
+def corruptions(query):
+    """Yields (kind, broken query) for the ways the query can be broken."""
+    for match in PNAME_RE.finditer(query):
+        # teamGoalsScored -> goalsScored
+        rest = match.group(2)
+        yield "property", query[:match.start()] + ":" + rest[0].lower() + rest[1:] + query[match.end():]
+    for match in CLASS_RE.finditer(query):
+        yield "class", query[:match.start(1)] + match.group(1) + "s" + query[match.end(1):]
+    for match in FORWARD_RE.finditer(query):
+        s, p, o = match.groups()
+        yield "reversed", query[:match.start()] + f"{o} :{p} {s}" + query[match.end():]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SPARQL repair before and after")
+    parser.add_argument("--scale", type=float, default=0.1, help="factor of the recorded LLM latencies")
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    repairer = SparqlRepairer(TURTLE_ONTOLOGY)
+    with RdflibEndpoint() as endpoint:
+        results = {}
+        for name, with_repairer in (("LLM retry", None), ("local repair", repairer)):
+            client = ReplayClient(corpus, scale=args.scale)
+            set_llm(client)
+            results[name] = run_corpus(corpus, endpoint.url, with_repairer, args.rounds)
+            results[name]["generate calls"] = client.stats().get("generate", {}).get("calls", 0)
+
+    print(f"corpus, {args.rounds} rounds, LLM latency x{args.scale}")
+    print(f"  {'':<28}{'LLM retry':>12}{'local repair':>14}")
+    for metric in results["LLM retry"]:
+        before, after = results["LLM retry"][metric], results["local repair"][metric]
+        print(f"  {metric:<28}{before:>12.3f}{after:>14.3f}")
+
+    valid = [entry["sparql"][-1] for entry in corpus["questions"] if "sparql" in entry]
+    valid = [query for query in valid if validate_sparql(query, TURTLE_ONTOLOGY) is None]
+    counts = {}
+    repairer = SparqlRepairer(TURTLE_ONTOLOGY)
+    for query in valid:
+        original = canonicalize_query(query)[0]
+        for kind, broken in corruptions(query):
+            if validate_sparql(broken, TURTLE_ONTOLOGY) is None:
+                # still valid, e.g. a class the rules don't look at
+                continue
+            stats = counts.setdefault(kind, [0, 0, 0])
+            repair = repairer.repair(broken)
+            stats[0] += 1
+            stats[1] += repair is not None
+            stats[2] += repair is not None and canonicalize_query(repair.query)[0] == original
+    print("\ncorrupted corpus queries that fail validation")
+    print(f"  {'kind':<12}{'queries':>9}{'repaired':>10}{'original':>10}")
+    for kind, (total, fixed, restored) in counts.items():
+        print(f"  {kind:<12}{total:>9}{fixed:>10}{restored:>10}")
+    stats = repairer.stats()
+    print(f"  {stats['mean_ms']:.2f} ms per repair attempt")
+
+
+if __name__ == "__main__":
+    main()
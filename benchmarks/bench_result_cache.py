@@ -0,0 +1,65 @@
+"""
+Hit rate and latency of the result cache on a stream of repeated questions, where
+the same query comes back with other whitespace, prefix names and variable names.
+The endpoint is the local stub with a delay standing in for GraphDB.
+
+Run from the repository root:
+    python -m benchmarks.bench_result_cache
+"""
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.execute_query import execute_sparql
+from functions.result_cache import ResultCache, execute_sparql_cached
+
+VARIANTS = [
+    """PREFIX : <http://semanticweb.org/unitedOntology#>
+    SELECT ?player ?team WHERE { ?player :playsFor ?team }""",
+    """PREFIX u: <http://semanticweb.org/unitedOntology#>
+select ?p ?t
+where {
+    ?p u:playsFor ?t .   # who plays where
+}""",
+    """PREFIX : <http://semanticweb.org/unitedOntology#>
+    SELECT ?g WHERE { ?g a :Goal }""",
+    """PREFIX : <http://semanticweb.org/unitedOntology#>
+    SELECT ?m ?w WHERE { ?m :matchGameweek ?w }""",
+]
+QUESTIONS = 300
+
+
+def main():
+    rng = random.Random(0)
+    stream = [rng.choice(VARIANTS) for _ in range(QUESTIONS)]
+    with StubEndpoint(delay=0.02) as endpoint, tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        for query in stream:
+            execute_sparql(endpoint.url, query)
+        uncached = time.perf_counter() - start
+
+        cache = ResultCache(path=os.path.join(cache_dir, "results.sqlite"))
+        start = time.perf_counter()
+        for query in stream:
+            execute_sparql_cached(cache, endpoint.url, query)
+        cached = time.perf_counter() - start
+        stats = cache.stats()
+        cache.close()
+
+        # a new process starts with an empty memory tier, but the sqlite file is still there
+        restarted = ResultCache(path=os.path.join(cache_dir, "results.sqlite"))
+        for query in VARIANTS:
+            execute_sparql_cached(restarted, endpoint.url, query)
+        restarted_stats = restarted.stats()
+        restarted.close()
+
+    print(f"{QUESTIONS} queries, {len(VARIANTS)} variants ({len(VARIANTS) - 1} distinct after canonicalisation)")
+    print(f"  without cache: {uncached / QUESTIONS * 1000:7.2f} ms per query")
+    print(f"  with cache:    {cached / QUESTIONS * 1000:7.2f} ms per query   {stats['hits']} hits / {stats['misses']} misses")
+    print(f"  after restart: {restarted_stats['hits']} hits / {restarted_stats['misses']} misses from the sqlite file")
+
+
+if __name__ == "__main__":
+    main()
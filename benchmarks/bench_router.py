@@ -0,0 +1,114 @@
+"""
+Accuracy of the local router on a labelled set of questions that aren't in its seed examples,
+how many LLM router calls it saves and what it costs per question. Unsure questions go to
+the LLM router, played by a FakeClient that knows the labels and waits like Gemini would.
+
+Run from the repository root:
+    python -m benchmarks.bench_router
+"""
+import time
+
+from functions.llm_client import FakeClient, get_llm, set_llm
+from functions.local_router import LocalRouter, should_use_kg_routed
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+ROUTER_DELAY = 0.35  # seconds, a typical should_use_kg call
+
+# (question, needs the KG)
+LABELLED = [
+    ("Who scored for Chelsea in gameweek 4?", True),
+    ("Which players have received a red card?", True),
+    ("How many assists does Bruno Fernandes have?", True),
+    ("Who is the manager of Tottenham?", True),
+    ("What was the score between Arsenal and Liverpool?", True),
+    ("Which team has the most clean sheets?", True),
+    ("Where does Everton play its home matches?", True),
+    ("How many points does Manchester City have?", True),
+    ("List all the goals scored from free kicks", True),
+    ("Who was the referee of the match in gameweek 7?", True),
+    ("How many shots on target did Newcastle have?", True),
+    ("What is the goal difference of Aston Villa?", True),
+    ("Which players play as CB for Brighton?", True),
+    ("When was the match between Fulham and Brentford?", True),
+    ("How many fouls did Casemiro commit this season?", True),
+    ("Who are the top scorers of the league?", True),
+    ("Which team won the most home matches?", True),
+    ("What shirt number does Rashford wear?", True),
+    ("What is the height of the Wolves goalkeeper?", True),
+    ("How many passes did Bournemouth complete?", True),
+    ("Did West Ham win their last game?", True),
+    ("Who assisted the first goal against Sunderland?", True),
+    ("Which players were substituted in the derby?", True),
+    ("Tell me about Manchester City", True),
+    ("Who is the oldest player in the squad?", True),
+    ("Hey there", False),
+    ("Thank you!", False),
+    ("How are you today?", False),
+    ("What is your purpose?", False),
+    ("Tell me something funny", False),
+    ("Goodbye", False),
+    ("Can you explain how you work?", False),
+    ("What is a SPARQL query?", False),
+    ("Good evening!", False),
+    ("Who created you?", False),
+    ("What is the weather like?", False),
+    ("Nice, thanks for the help", False),
+    ("Explain the rules of football", False),
+    ("Write a haiku about rain", False),
+    ("What language do you speak?", False),
+    ("Can we talk about something else?", False),
+    ("That's interesting", False),
+    ("What is the meaning of life?", False),
+    ("Please repeat your last answer", False),
+    ("Why do people love football so much?", False),
+]
+LABELS = dict(LABELLED)
+
+
+def fake_router(prompt, system_instruction):
+    time.sleep(ROUTER_DELAY)
+    return '{"use_kg": %s}' % ("true" if LABELS[prompt] else "false")
+
+
+def main():
+    set_llm(FakeClient(fake_router))
+    start = time.perf_counter()
+    router = LocalRouter.from_ontology(ONTOLOGY)
+    print(f"vocabulary of {len(router.vocabulary)} terms, router built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    local_right = local_wrong = right = 0
+    start = time.perf_counter()
+    for question, use_kg in LABELLED:
+        probability = router.probability(question)
+        fallbacks = router.fallbacks
+        answer = should_use_kg_routed(router, None, question)
+        if router.fallbacks > fallbacks:
+            status = "llm"
+        elif answer == use_kg:
+            local_right += 1
+            status = "ok"
+        else:
+            local_wrong += 1
+            status = "WRONG"
+        right += answer == use_kg
+        print(f"  {status:<5} {probability:6.3f}  {'kg  ' if use_kg else 'chat'}  {question}")
+    elapsed = time.perf_counter() - start
+
+    stats = router.stats()
+    local = stats["local_kg"] + stats["local_chat"]
+    llm_calls = get_llm().stats().get("router", {}).get("calls", 0)
+    print(
+        f"{len(LABELLED)} questions: {local} decided locally ({stats['local_rate'] * 100:.0f}%), "
+        f"{local_right}/{local} of them right, {llm_calls} sent to the LLM"
+    )
+    print(f"accuracy with the LLM fallback: {right}/{len(LABELLED)} ({right / len(LABELLED) * 100:.1f}%)")
+    print(
+        f"LLM calls saved: {stats['llm_calls_saved']} (~{stats['llm_calls_saved'] * ROUTER_DELAY:.1f}s), "
+        f"local decision {stats['mean_local_us']:.0f} us, {elapsed:.1f}s for the whole set "
+        f"vs {len(LABELLED) * ROUTER_DELAY:.1f}s with the LLM alone"
+    )
+    assert local_wrong <= 2, "the local router got too many confident decisions wrong"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Load test of server.py: N sessions at the same time, each asking TURNS questions over its
+WebSocket one after the other, with a mix of KG and chat questions. Reports the turn latency
+(p50/p95/p99, and the time to the first streamed chunk), the throughput and how often the
+LLM/GraphDB limits made calls wait. A last round asks the same questions over GET /chat.
+
+The server runs in its own process with a FakeClient (sleeping per purpose, a bit faster than
+gemini-2.0-flash to keep the run short) and the stub endpoint as GraphDB.
+
+Run from the repository root:
+    python -m benchmarks.bench_server
+"""
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.stub_endpoint import StubEndpoint
+
+DELAYS = {"router": 0.1, "generate": 0.3, "beautify": 0.2, "chat": 0.25}
+CHUNK_DELAY = 0.005
+KG_DELAY = 0.05
+SESSIONS = [1, 10, 50, 100]
+TURNS = 4
+LIMITS = {"llm_limit": 32, "kg_limit": 16, "session_llm_limit": 2, "session_kg_limit": 1}
+SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player ?team WHERE { ?player :playsFor ?team . }"
+# the numbers make every question different, so the question cache doesn't answer them
+QUESTIONS = [
+    "Who plays for Manchester United in gameweek {n}?",
+    "Tell me a joke about goalkeeper number {n}.",
+    "Which players of Manchester United scored in match {n}?",
+    "What do you think about tactic number {n}?",
+]
+
+
+def fake_gemini(prompt, system_instruction):
+    if "classifier" in system_instruction:
+        time.sleep(DELAYS["router"])
+        return '{"use_kg": %s}' % ("true" if "Manchester United" in prompt else "false")
+    if "SPARQL" in system_instruction:
+        time.sleep(DELAYS["generate"])
+        return SPARQL
+    if "football assistant" in system_instruction.lower() or "Decide when" in system_instruction:
+        time.sleep(DELAYS["chat"])
+        return "Why did the goalkeeper get a job at the bank? He was great at saving."
+    time.sleep(DELAYS["beautify"])
+    return "Bruno Fernandes and 19 others play for Manchester United this season."
+
+
+def _serve(graphdb_url, ports):
+    from functions.llm_client import FakeClient, set_llm
+    from server import ChatServer
+
+    set_llm(FakeClient(fake_gemini, chunk_delay=CHUNK_DELAY))
+    server = ChatServer(None, graphdb_url, persist=False, workers=256, **LIMITS)
+
+    async def run():
+        async with server.start("127.0.0.1", 0) as ws_server:
+            ports.put(ws_server.sockets[0].getsockname()[1])
+            await ws_server.serve_forever()
+
+    asyncio.run(run())
+
+
+async def session(url, index, latencies, first_chunks):
+    async with connect(url, compression=None, open_timeout=30, max_size=None) as ws:
+        json.loads(await ws.recv())
+        for turn in range(TURNS):
+            question = QUESTIONS[(index + turn) % len(QUESTIONS)].format(n=index * TURNS + turn)
+            start = time.perf_counter()
+            first = None
+            await ws.send(json.dumps({"question": question}))
+            while True:
+                message = json.loads(await ws.recv())
+                if message["type"] == "chunk" and first is None:
+                    first = time.perf_counter() - start
+                if message["type"] in ("answer", "error"):
+                    break
+            assert message["type"] == "answer" and message["reply"], message
+            latencies.append(time.perf_counter() - start)
+            first_chunks.append(first if first is not None else latencies[-1])
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name, latencies, first_chunks, elapsed):
+    print(
+        f"  {name:<16} p50 {percentile(latencies, 50) * 1000:6.0f} ms  p95 {percentile(latencies, 95) * 1000:6.0f} ms  "
+        f"p99 {percentile(latencies, 99) * 1000:6.0f} ms  first chunk p50 "
+        f"{statistics.median(first_chunks) * 1000:5.0f} ms  {len(latencies) / elapsed:6.1f} turns/s"
+    )
+
+
+async def load(port):
+    for sessions in SESSIONS:
+        latencies, first_chunks = [], []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            session(f"ws://127.0.0.1:{port}/ws?session=ws-{sessions}-{i}", i, latencies, first_chunks)
+            for i in range(sessions)
+        ))
+        report(f"{sessions} sessions", latencies, first_chunks, time.perf_counter() - start)
+
+    sessions = SESSIONS[1]
+    latencies = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        async def http_session(i):
+            for turn in range(TURNS):
+                question = QUESTIONS[(i + turn) % len(QUESTIONS)].format(n=10_000 + i * TURNS + turn)
+                start = time.perf_counter()
+                response = await client.get("/chat", params={"session": f"http-{i}", "q": question})
+                response.raise_for_status()
+                assert response.json()["reply"]
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(http_session(i) for i in range(sessions)))
+        report(f"HTTP, {sessions} sess.", latencies, latencies, time.perf_counter() - start)
+        stats = (await client.get("/stats")).json()
+
+    print(f"server: {stats['sessions']} sessions, {stats['turns']} turns, {stats['errors']} errors")
+    for kind, limit in stats["limits"].items():
+        print(f"  {kind:<4} limit {limit['limit']:>3}: {limit['waits']} calls waited, {limit['wait_s']:.1f}s in total")
+    router = stats["local_router"]
+    print(f"  local router decided {router['local_kg'] + router['local_chat']} turns, {router['llm_calls_saved']} LLM calls saved")
+
+
+def main():
+    print(f"LLM delays {DELAYS}, KG delay {KG_DELAY}s, {TURNS} turns per session, limits {LIMITS}")
+    with StubEndpoint(delay=KG_DELAY) as endpoint:
+        ports = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_serve, args=(endpoint.url, ports), daemon=True)
+        server.start()
+        try:
+            asyncio.run(load(ports.get(timeout=60)))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
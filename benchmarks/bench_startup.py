@@ -0,0 +1,92 @@
+"""
+Startup of main.py (see main.startup_steps and startup.Warmup) on the rdflib endpoint with the
+sample data and the recorded LLM answers. Every run is a fresh interpreter, so that the imports
+are cold:
+- time to the prompt, with the eager startup (STARTUP=eager, everything built before the
+  prompt) and the background one,
+- latency of the first KG question, from the enter key to the answer, after the user took
+  0, 1 or 3 seconds to type it: the part spent waiting for the warm-up and the turn itself,
+- the import time of main.py before the prompt, as -X importtime reports it.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--runs 3]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+QUESTION = "How many goals has Erling Haaland scored this season?"
+THINK_SECONDS = (0.0, 1.0, 3.0)
+
+
+def child(url, background, think):
+    """One startup: prints the seconds to the prompt, waited for the warm-up and of the first turn."""
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter() - start
+    from functions.startup import Warmup
+
+    # the recorded answers stand in for Gemini, as the shared client (see llm_client.set_llm)
+    from benchmarks.replay import ReplayClient, load_corpus
+    from functions.llm_client import set_llm
+    set_llm(ReplayClient(load_corpus(), scale=0.1))
+    start = time.perf_counter()
+    steps = main.startup_steps(None, url, "ontology/simple_test.txt", "ontology/ontology_export.ttl", "", lambda *a: None)
+    warmup = Warmup(steps, background=background).start()
+    prompt = imported + time.perf_counter() - start
+    time.sleep(think)
+    enter = time.perf_counter()
+    pipeline = warmup.result("pipeline")
+    result = pipeline.run_sync(QUESTION)
+    answered = time.perf_counter() - enter
+    pipeline.close()
+    print(json.dumps({"prompt": prompt, "waited": warmup.waited, "first_turn": answered,
+                      "turn": result.timings["total"], "used_kg": result.used_kg}))
+
+
+def import_time():
+    """Milliseconds of the imports of python -c 'import main', from -X importtime."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            capture_output=True, text=True).stderr
+    top = [line.split("|") for line in output.splitlines() if line.startswith("import time:") and "| " in line]
+    return sum(int(fields[1]) for fields in top if not fields[2].startswith("  ") and fields[1].strip().isdigit()) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup: time to the prompt and latency of the first turn")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", nargs=3, metavar=("URL", "MODE", "THINK"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        url, mode, think = args.child
+        child(url, mode == "background", float(think))
+        return
+
+    from benchmarks.rdflib_endpoint import RdflibEndpoint
+
+    print(f"imports of 'import main': {import_time():.0f} ms\n")
+    print(f"first question: {QUESTION!r}, median of {args.runs} fresh processes")
+    print(f"  {'startup':<12}{'typing s':>9}{'prompt ms':>11}{'waited ms':>11}{'turn ms':>9}{'first answer ms':>17}")
+    with RdflibEndpoint() as endpoint:
+        for mode in ("eager", "background"):
+            for think in THINK_SECONDS:
+                runs = []
+                for _ in range(args.runs):
+                    output = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.bench_startup", "--child", endpoint.url, mode, str(think)],
+                        capture_output=True, text=True,
+                    )
+                    if output.returncode:
+                        raise RuntimeError(output.stderr)
+                    runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+                median = {key: statistics.median(run[key] for run in runs) * 1000
+                          for key in ("prompt", "waited", "turn", "first_turn")}
+                print(f"  {mode:<12}{think:>9.0f}{median['prompt']:>11.0f}{median['waited']:>11.0f}"
+                      f"{median['turn']:>9.0f}{median['first_turn']:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Memory and latency of reading a large SPARQL result: the whole JSON body with
+execute_sparql, the streamed bindings of every format, and a streamed prefix
+capped at BEAUTIFY_MAX_ROWS rows as main.py hands it to beautify.
+
+Run from the repository root:
+    python -m benchmarks.bench_stream
+"""
+import time
+import tracemalloc
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.execute_query import SparqlClient
+from main import BEAUTIFY_MAX_ROWS
+
+QUERY = "PREFIX : <http://semanticweb.org/unitedOntology#> SELECT ?player ?team WHERE { ?player :playsFor ?team }"
+ROWS = 200_000
+
+
+def measure(name, fn):
+    # timed without tracemalloc, which slows allocations down a lot
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<36} {rows:8d} rows   {elapsed * 1000:9.1f} ms   peak {peak / 2 ** 20:8.1f} MiB")
+
+
+def main():
+    with StubEndpoint(rows=ROWS) as endpoint:
+        client = SparqlClient(endpoint.url)
+        measure("execute_sparql (whole body)", lambda: len(client.query(QUERY)))
+        for format in ("json", "tsv", "csv"):
+            measure(f"query_stream, {format}", lambda: sum(1 for _ in client.query_stream(QUERY, format=format)))
+        measure(f"query_stream, json, limit={BEAUTIFY_MAX_ROWS}", lambda: len(list(client.query_stream(QUERY, limit=BEAUTIFY_MAX_ROWS))))
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
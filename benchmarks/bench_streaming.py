@@ -0,0 +1,99 @@
+"""
+Time until the user sees the first words of an answer with the blocking calls (the whole
+answer) and with the streaming ones (the first chunk), for ChatManager.ask, beautify and a
+whole KG turn through the pipeline. The model is a FakeClient that answers after a delay and
+then streams one word per chunk_delay, roughly like Gemini does.
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming
+"""
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.beautify import beautify, beautify_stream
+from functions.chat_manager import ChatManager
+from functions.llm_client import FakeClient, get_llm, set_llm
+from functions.pipeline import TurnPipeline
+from functions.sparql_validator import validate_sparql
+
+FIRST_TOKEN_DELAY = 0.3
+CHUNK_DELAY = 0.01
+RUNS = 5
+SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player ?team WHERE { ?player :playsFor ?team . }"
+ANSWER = (
+    "Twenty players play for Manchester United this season, among them Bruno Fernandes, Casemiro, "
+    "Rashford, Mainoo and Onana, with Bruno Fernandes as the captain of the team and the main penalty taker."
+)
+
+
+def fake_gemini(prompt, system_instruction):
+    if "classifier" in system_instruction:
+        return '{"use_kg": true}'
+    if "SPARQL" in system_instruction:
+        return SPARQL
+    return ANSWER
+
+
+def timed(call):
+    """(seconds to the first chunk, seconds to the whole answer) of a blocking call or a generator."""
+    start = time.perf_counter()
+    result = call()
+    if isinstance(result, str) or result is None:
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+    first = None
+    for _ in result:
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def report(name, samples):
+    first = statistics.median(s[0] for s in samples)
+    total = statistics.median(s[1] for s in samples)
+    print(f"  {name:<22} first words {first * 1000:6.0f} ms   whole answer {total * 1000:6.0f} ms")
+
+
+def main():
+    set_llm(FakeClient(fake_gemini, delay=FIRST_TOKEN_DELAY, chunk_delay=CHUNK_DELAY))
+    print(f"model: first chunk after {FIRST_TOKEN_DELAY * 1000:.0f} ms, then a word every {CHUNK_DELAY * 1000:.0f} ms, "
+          f"{len(ANSWER.split())} words")
+
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.")
+    report("ChatManager.ask", [timed(lambda: chat.ask("Tell me about United")) for _ in range(RUNS)])
+    report("ChatManager.ask_stream", [timed(lambda: chat.ask_stream("Tell me about United")) for _ in range(RUNS)])
+    assert chat.history.messages[-1].text == ANSWER, "the streamed reply must be saved to the history"
+
+    rows = [{"player": "Bruno_Fernandes", "team": "Manchester_United"}]
+    report("beautify", [timed(lambda: beautify(None, "Who plays for United?", rows)) for _ in range(RUNS)])
+    report("beautify_stream", [timed(lambda: beautify_stream(None, "Who plays for United?", rows)) for _ in range(RUNS)])
+
+    validate_sparql(SPARQL, "ontology/ontology_export.ttl")
+    with StubEndpoint() as endpoint:
+        for on_text in (None, lambda kind, chunk: None):
+            pipeline = TurnPipeline(
+                None, endpoint.url, "ontology/simple_test.txt", "ontology/ontology_export.ttl",
+                ChatManager(api_key=None, system_prompt="You are a football assistant."), on_text=on_text,
+            )
+            samples = []
+            for _ in range(RUNS):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = pipeline.run_sync("Who plays for Manchester United?")
+                total = result.timings["total"]
+                samples.append((result.timings.get("first_token", total), total))
+            pipeline.close()
+            report("KG turn, " + ("streamed" if on_text else "blocking"), samples)
+
+    for purpose, stats in get_llm().stats().items():
+        if stats["streams"]:
+            print(
+                f"  {purpose:<9} {stats['streams']} streamed calls, mean time to first token "
+                f"{stats['first_token_seconds'] / stats['streams'] * 1000:.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-stage breakdown of KG and chat turns from the spans of functions/tracing.py (time, LLM
+tokens, validation errors, retries, rows), and the cost of the instrumentation: the same
+turns with tracing off, with the spans kept in memory and with the spans written as JSON
+lines and as OTLP JSON. The model is a FakeClient without delays, so that the overhead isn't
+hidden by the sleeps; the first generated query of one question fails validation to show a retry.
+
+Run from the repository root:
+    python -m benchmarks.bench_tracing
+"""
+import json
+import os
+import statistics
+import tempfile
+
+from benchmarks.stub_endpoint import StubEndpoint
+from functions.chat_manager import ChatManager
+from functions.llm_client import FakeClient, set_llm
+from functions.pipeline import TurnPipeline
+from functions.sparql_validator import validate_sparql
+from functions.tracing import JsonLinesExporter, MemoryExporter, tracer
+
+TURNS = 60
+SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player ?team WHERE { ?player :playsFor ?team . }"
+WRONG_SPARQL = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?player WHERE { ?player :playsForTeam ?team . }"
+QUESTIONS = [
+    "Who plays for Manchester United?",
+    "Which players of Manchester United are in the squad?",
+    "Tell me a joke about goalkeepers.",
+]
+
+
+def fake_gemini(prompt, system_instruction):
+    if "classifier" in system_instruction:
+        return '{"use_kg": %s}' % ("true" if "Manchester United" in prompt else "false")
+    if "SPARQL" in system_instruction:
+        if "squad" in prompt and "failed validation" not in prompt:
+            return WRONG_SPARQL
+        return SPARQL
+    if "football assistant" in system_instruction:
+        return "Why did the goalkeeper get a job at the bank? He was great at saving."
+    return "Bruno Fernandes and 19 others play for Manchester United this season."
+
+
+def run_turns(url):
+    pipeline = TurnPipeline(
+        None, url, "ontology/simple_test.txt", "ontology/ontology_export.ttl",
+        ChatManager(api_key=None, system_prompt="You are a football assistant."), log=lambda message: None,
+    )
+    latencies = []
+    for i in range(TURNS):
+        result = pipeline.run_sync(QUESTIONS[i % len(QUESTIONS)])
+        assert result.reply
+        latencies.append(result.timings["total"])
+    pipeline.close()
+    return statistics.median(latencies)
+
+
+def main():
+    set_llm(FakeClient(fake_gemini))
+    validate_sparql(SPARQL, "ontology/ontology_export.ttl")
+
+    with StubEndpoint() as endpoint, tempfile.TemporaryDirectory() as directory:
+        run_turns(endpoint.url)  # warm-up
+        baseline = run_turns(endpoint.url)
+        print(f"{TURNS} turns, median turn with tracing off {baseline * 1000:.2f} ms")
+
+        memory = MemoryExporter()
+        exporters = [
+            ("in memory", memory),
+            ("JSON lines", JsonLinesExporter(os.path.join(directory, "trace.jsonl"))),
+            ("OTLP JSON", JsonLinesExporter(os.path.join(directory, "trace.otlp.jsonl"), otlp=True)),
+        ]
+        for name, exporter in exporters:
+            tracer.add_exporter(exporter)
+            traced = run_turns(endpoint.url)
+            tracer.remove_exporter(exporter)
+            print(f"  {name:<11} {traced * 1000:6.2f} ms per turn, overhead {(traced - baseline) * 1000:+.2f} ms")
+
+        print("\nper stage, from the in-memory spans:")
+        print(f"  {'span':<18}{'count':>6}{'mean ms':>9}  attributes (summed)")
+        for name, stats in sorted(memory.summary().items(), key=lambda item: -item[1]["total_ms"]):
+            extra = {key: value for key, value in stats.items()
+                     if key not in ("count", "errors", "total_ms", "mean_ms", "attempt") and value}
+            extra = "  ".join(f"{key}={value:g}" for key, value in extra.items())
+            print(f"  {name:<18}{stats['count']:>6}{stats['mean_ms']:>9.3f}  {extra}")
+
+        for name, exporter in exporters[1:]:
+            exporter.close()
+            with open(exporter.file.name) as f:
+                lines = f.readlines()
+            record = json.loads(lines[0])
+            print(f"\n{name}: {len(lines)} spans, e.g. {json.dumps(record)[:300]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of validate_many against a loop of validate_sparql calls, on the generated queries
+of bench_validation (with repeats, like n-best candidates of the same question) and on the
+queries of the benchmark corpus. Checks that both give the same errors for every query, and
+shows the structured errors of a failing query.
+
+Run from the repository root:
+    python -m benchmarks.bench_validate_many [--queries 2000] [--processes 4]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.bench_validation import ONTOLOGY, generate_queries
+from benchmarks.replay import load_corpus
+from functions.sparql_validator import validate_many, validate_sparql
+
+
+def best_of(function, runs=3):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="validate_many vs validate_sparql")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=max(2, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    # a fifth of the batch are repeats, as when several samples of the LLM agree
+    generated = generate_queries(args.queries * 4 // 5)
+    rng = random.Random(0)
+    batch = generated + [rng.choice(generated) for _ in range(args.queries - len(generated))]
+    corpus = [sparql for entry in load_corpus()["questions"] for sparql in entry.get("sparql", [])]
+    validate_sparql(corpus[0], ONTOLOGY)
+    print(f"{os.cpu_count()} CPUs, {len(batch)} generated queries ({len(generated)} distinct), {len(corpus)} corpus queries\n")
+
+    for name, queries in (("generated", batch), ("corpus", corpus)):
+        expected = [validate_sparql(query, ONTOLOGY) for query in queries]
+        results = validate_many(queries, ONTOLOGY, processes=1)
+        mismatches = sum(result.messages() != messages for result, messages in zip(results, expected))
+        loop = best_of(lambda: [validate_sparql(query, ONTOLOGY) for query in queries])
+        batched = best_of(lambda: validate_many(queries, ONTOLOGY, processes=1))
+        print(f"{name}: {sum(not result.ok for result in results)} of {len(queries)} queries fail, "
+              f"{mismatches} differ from validate_sparql")
+        print(f"  {'validate_sparql loop':<36}{loop / len(queries) * 1000:8.3f} ms per query")
+        print(f"  {'validate_many, in process':<36}{batched / len(queries) * 1000:8.3f} ms per query")
+        if len(set(queries)) >= 256:
+            pooled = best_of(lambda: validate_many(queries, ONTOLOGY, processes=args.processes), runs=1)
+            print(f"  {f'validate_many, {args.processes} new processes':<36}{pooled / len(queries) * 1000:8.3f} ms per query")
+            with ProcessPoolExecutor(max_workers=args.processes) as executor:
+                validate_many(queries, ONTOLOGY, processes=args.processes, executor=executor)
+                kept = best_of(lambda: validate_many(queries, ONTOLOGY, processes=args.processes, executor=executor))
+            print(f"  {f'validate_many, {args.processes} kept processes':<36}{kept / len(queries) * 1000:8.3f} ms per query")
+
+    failing = next(result for result in validate_many(corpus, ONTOLOGY) if not result.ok)
+    print("\nerrors of a failing corpus query:")
+    print(json.dumps(failing.to_dict()["violations"], indent=2)[:1200])
+
+
+if __name__ == "__main__":
+    main()
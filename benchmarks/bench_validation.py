@@ -0,0 +1,162 @@
+"""
+Benchmark of the per-call latency of validate_sparql.
+It also checks, on a corpus of generated queries, that the native validation
+engine returns the same errors as the rdflib rule queries.
+
+Run from the repository root:
+    python -m benchmarks.bench_validation
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from rdflib.namespace import RDFS
+
+from functions.ontology_store import clear_ontology_cache, load_ontology
+from functions.sparql_validator import prepare_rules, rule_timings, validate_sparql
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+RUNS = 30
+
+QUERIES = [
+    """
+    PREFIX : <http://semanticweb.org/unitedOntology#>
+    SELECT ?player ?team
+    WHERE {
+        ?team a :Team .
+        ?player a :Player .
+        ?team :hasPlayer ?player .
+    }
+    """,
+    """
+    PREFIX : <http://semanticweb.org/unitedOntology#>
+    SELECT DISTINCT ?home_team ?away_team ?home_goals ?away_goals
+    WHERE {
+    ?m a ?Match ;
+        :matchHasTeamStats ?ts1 ;
+        :matchHasTeamStats ?ts2 ;
+        :matchGameweek ?gameweek ;
+        :hasHomeTeam ?home_team ;
+        :hasAwayTeam ?away_team.
+    ?ts1 :statsOfTeam ?home_team ;
+            :teamGoalsScored ?home_goals .
+    ?ts2 :statsOfTeam ?away_team ;
+            :teamGoalsScored ?away_goals .
+    }
+    """,
+]
+
+
+def time_calls(fn, runs=RUNS):
+    """Returns the latency of every call of fn in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<40} mean {statistics.mean(timings):8.2f} ms   median {statistics.median(timings):8.2f} ms")
+
+
+def generate_queries(count, seed=0):
+    """
+    Generates random queries over the ontology's properties and classes, with shared
+    variables, type triples and a few misspelled properties, so that every rule fires.
+    """
+    graph = load_ontology(ONTOLOGY).graph
+    prefix = "http://semanticweb.org/unitedOntology#"
+    properties = sorted({p for p in graph.subjects(RDFS.domain)} | {p for p in graph.subjects(RDFS.range)})
+    properties = [":" + p[len(prefix):] for p in properties if p.startswith(prefix)]
+    classes = sorted({c for c in graph.subjects(RDFS.subClassOf)})
+    classes = [":" + c[len(prefix):] for c in classes if c.startswith(prefix)]
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        variables = [f"?v{i}" for i in range(rng.randint(2, 5))]
+        patterns = []
+        for _ in range(rng.randint(1, 6)):
+            p = rng.choice(properties)
+            if rng.random() < 0.1:
+                p = p + "s"
+            patterns.append(f"{rng.choice(variables)} {p} {rng.choice(variables)} .")
+        for v in rng.sample(variables, rng.randint(0, len(variables))):
+            patterns.append(f"{v} a {rng.choice(classes)} .")
+        rng.shuffle(patterns)
+        body = "\n        ".join(patterns)
+        queries.append(f"""
+    PREFIX : <{prefix}>
+    SELECT * WHERE {{
+        {body}
+    }}""")
+    return queries
+
+
+def check_parity(queries):
+    """Returns the queries for which the two engines disagree."""
+    mismatches = []
+    for query in queries:
+        with contextlib.redirect_stdout(io.StringIO()):
+            native = validate_sparql(query, ONTOLOGY, engine="native")
+            reference = validate_sparql(query, ONTOLOGY, engine="rdflib")
+        if sorted(native or []) != sorted(reference or []):
+            mismatches.append(query)
+    return mismatches
+
+
+def main():
+    # the builtin rules are parsed on first use, not at import; parse them here, once, outside the timed calls
+    start = time.perf_counter()
+    prepare_rules()
+    print(f"Rule queries prepared in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for i, query in enumerate(QUERIES, start=1):
+        print(f"Query {i}")
+
+        def parse_every_call():
+            # the behaviour before the shared store: the ontology is parsed on every call
+            clear_ontology_cache()
+            validate_sparql(query, ONTOLOGY, engine="rdflib")
+
+        report("  parse on every call", time_calls(parse_every_call))
+
+        clear_ontology_cache()
+        load_ontology(ONTOLOGY)
+        report("  shared ontology store", time_calls(lambda: validate_sparql(query, ONTOLOGY, engine="rdflib")))
+        report("  native engine", time_calls(lambda: validate_sparql(query, ONTOLOGY), runs=RUNS * 10))
+
+    print("rdflib rule timings")
+    for name, timing in rule_timings().items():
+        print(f"  {name:<38} mean {timing['mean_ms']:8.2f} ms   max {timing['max_ms']:8.2f} ms   ({timing['calls']} runs)")
+
+    corpus = generate_queries(200)
+    mismatches = check_parity(corpus)
+    print(f"Parity: {len(corpus) - len(mismatches)}/{len(corpus)} generated queries give the same errors with both engines")
+    for query in mismatches[:3]:
+        print(query)
+    native_timings = time_calls(lambda: [validate_sparql(q, ONTOLOGY) for q in corpus], runs=5)
+    print(f"  native engine over the corpus: {statistics.mean(native_timings) / len(corpus):.3f} ms per query")
+
+    # cold start: a new process either parses the turtle file or loads the pickled graph
+    with tempfile.TemporaryDirectory() as cache_dir:
+        clear_ontology_cache()
+        load_ontology(ONTOLOGY, cache_dir)
+
+        def cold_start(cache):
+            clear_ontology_cache()
+            load_ontology(ONTOLOGY, cache)
+
+        print("Cold start")
+        report("  parse turtle", time_calls(lambda: cold_start(None)))
+        report("  load binary cache", time_calls(lambda: cold_start(cache_dir)))
+        print(f"  cache size: {os.path.getsize(os.path.join(cache_dir, os.path.basename(ONTOLOGY) + '.pickle'))} bytes")
+
+
+if __name__ == "__main__":
+    main()
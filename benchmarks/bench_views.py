@@ -0,0 +1,154 @@
+"""
+Season views (functions/season_views.py) on the rdflib endpoint with the sample data:
+- build time and size of the views, and an incremental update (the views of 9 gameweeks
+  updated with the 10th) against a full rebuild of the 10 gameweeks: time and equal results,
+- the league table, goals and assists of the views against the season stats nodes of the KG,
+- answer latency of the questions the views answer, and the questions they must leave to the
+  pipeline,
+- the corpus replayed through the full pipeline of the suite without and with the views:
+  latency of the view questions and of the others, LLM calls and endpoint requests.
+
+Run from the repository root:
+    python -m benchmarks.bench_views [--scale 0.1]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.rdflib_endpoint import RdflibEndpoint
+from benchmarks.replay import ReplayClient, load_corpus
+from benchmarks.suite import make_pipeline, percentile
+from functions.execute_query import execute_sparql
+from functions.llm_client import set_llm
+from functions.season_views import SeasonViews
+
+TEAM_STATS_QUERY = """PREFIX : <http://semanticweb.org/unitedOntology#>
+SELECT ?team ?points ?difference WHERE {
+  ?stats a :TeamSeasonStats ; :seasonStatsOfTeam ?team ; :teamPoints ?points ; :teamGoalDifference ?difference .
+}"""
+PLAYER_STATS_QUERY = """PREFIX : <http://semanticweb.org/unitedOntology#>
+SELECT ?player ?goals ?assists WHERE {
+  ?stats a :PlayerSeasonStats ; :seasonStatsOfPlayer ?player ;
+         :playerGoalsScoredSeason ?goals ; :playerAssistsSeason ?assists .
+}"""
+VIEW_QUESTIONS = [
+    "Show the league table", "Show the top 5 of the league table", "Where is Liverpool in the table?",
+    "Who are the top scorers of the season?", "Top 3 scorers of Man Utd", "Who has the most assists this season?",
+    "What is Arsenal's form?", "How is the form of Spurs?",
+]
+PIPELINE_QUESTIONS = [
+    "Who scored the most goals against Arsenal?", "Which team has the most goals?",
+    "Who has the most goals in gameweek 3?", "What is their form?", "Who plays for Manchester United?",
+    "What position does Saka play?",
+]
+
+
+def snapshot(views):
+    """The answers of the views, by team and player IRI, for comparing two of them."""
+    table = {views.teams[t]: tuple(views.table[column][t] for column in views.table) for t in range(len(views.teams))}
+    players = {views.players[p]: (views.goals[p], views.assists[p]) for p in range(len(views.players))}
+    results = {views.teams[t]: [(gameweek, views.teams[opponent], *rest) for gameweek, opponent, *rest in results]
+               for t, results in enumerate(views.results)}
+    return table, players, results
+
+
+def check_against_kg(views, url):
+    """Rows of the season stats nodes the views disagree with."""
+    table = views.table
+    index = views.team_index
+    wrong = 0
+    for row in execute_sparql(url, TEAM_STATS_QUERY):
+        t = index[row["team"]["value"]]
+        points = 3 * table["wins"][t] + table["draws"][t]
+        difference = table["goals_for"][t] - table["goals_against"][t]
+        wrong += (points, difference) != (int(row["points"]["value"]), int(row["difference"]["value"]))
+    teams = len(index)
+    players = 0
+    for row in execute_sparql(url, PLAYER_STATS_QUERY):
+        p = views.player_index.get(row["player"]["value"])
+        counts = (views.goals[p], views.assists[p]) if p is not None else (0, 0)
+        wrong += counts != (int(row["goals"]["value"]), int(row["assists"]["value"]))
+        players += 1
+    return teams, players, wrong
+
+
+def replay(corpus, url, scale, views):
+    """Every corpus question once through the full pipeline, without the views if views is None."""
+    client = ReplayClient(corpus, scale=scale)
+    set_llm(client)
+    pipeline = make_pipeline(url, True)
+    pipeline.views = views
+    totals, answered = {}, set()
+    try:
+        for entry in corpus["questions"]:
+            result = pipeline.run_sync(entry["question"])
+            totals[entry["question"]] = result.timings["total"]
+            if result.view:
+                answered.add(entry["question"])
+    finally:
+        pipeline.close()
+    calls = sum(stats["calls"] for stats in client.stats().values())
+    return totals, answered, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Season views: updates, correctness and latency")
+    parser.add_argument("--scale", type=float, default=0.1, help="factor of the recorded LLM latencies")
+    args = parser.parse_args()
+
+    with RdflibEndpoint(gameweeks=9) as endpoint:
+        start = time.perf_counter()
+        views = SeasonViews.from_kg(endpoint.url)
+        built = time.perf_counter() - start
+    stats = views.stats()
+    print(f"views of 9 gameweeks: {stats['teams']} teams, {stats['players']} players, {stats['matches']} matches, "
+          f"built in {built:.2f}s (with the KG queries)")
+
+    with RdflibEndpoint(gameweeks=10) as endpoint:
+        start = time.perf_counter()
+        applied = views.update(endpoint.url)
+        updated = time.perf_counter() - start
+        start = time.perf_counter()
+        rebuilt = SeasonViews.from_kg(endpoint.url)
+        rebuild = time.perf_counter() - start
+        print(f"gameweek 10: update {updated * 1000:.0f} ms ({applied} matches and goals applied), "
+              f"full rebuild {rebuild * 1000:.0f} ms, same views: {snapshot(views) == snapshot(rebuilt)}")
+        print(f"update again with nothing new: {views.update(endpoint.url)} applied")
+
+        teams, players, wrong = check_against_kg(views, endpoint.url)
+        print(f"against the season stats of the KG: {teams} teams and {players} players, {wrong} different\n")
+
+        times = {}
+        for question in VIEW_QUESTIONS + PIPELINE_QUESTIONS:
+            samples = []
+            for _ in range(50):
+                start = time.perf_counter()
+                answer = views.answer(question)
+                samples.append(time.perf_counter() - start)
+            times[question] = (statistics.median(samples) * 1000, answer)
+        print(f"  {'question':<46}{'view':>14}{'ms':>8}")
+        for question, (ms, answer) in times.items():
+            print(f"  {question:<46}{answer.view if answer else '-':>14}{ms:>8.3f}")
+        hits = [ms for ms, answer in times.values() if answer]
+        print(f"  answered {len(hits)} of {len(VIEW_QUESTIONS)} view questions, "
+              f"{sum(bool(answer) for question, (_, answer) in times.items() if question in PIPELINE_QUESTIONS)} "
+              f"of the {len(PIPELINE_QUESTIONS)} others\n")
+
+        corpus = load_corpus()
+        print(f"corpus replayed once through the full pipeline, LLM latency x{args.scale}")
+        print(f"  {'':<16}{'view q p50 ms':>15}{'other p50 ms':>14}{'other p95 ms':>14}{'LLM calls':>11}{'KG requests':>13}")
+        viewed = None
+        # with the views first, it finds the questions they answer
+        for name, with_views in (("with views", views), ("without views", None)):
+            requests = endpoint.requests
+            totals, answered, calls = replay(corpus, endpoint.url, args.scale, with_views)
+            viewed = answered if viewed is None else viewed
+            view_times = [seconds for question, seconds in totals.items() if question in viewed]
+            other = [seconds for question, seconds in totals.items() if question not in viewed]
+            # the requests of the pipeline's setup (entity index, KG statistics, views) are included
+            print(f"  {name:<16}{statistics.median(view_times) * 1000:>15.2f}{statistics.median(other) * 1000:>14.1f}"
+                  f"{percentile(other, 95) * 1000:>14.1f}{calls:>11}{endpoint.requests - requests:>13}")
+        print(f"  {len(viewed)} of {len(corpus['questions'])} corpus questions answered by the views")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Local stand-in for GraphDB that really answers the queries: an HTTP SPARQL endpoint over an
+rdflib graph holding the ontology and the sample data of benchmarks/sample_data.py. It takes
+the query as a POST body (application/sparql-query or a query= form) or as ?query=, and answers
+in SPARQL JSON, or CSV if asked for. Like stub_endpoint, the server runs in its own process.
+"""
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.stub_endpoint import _Server
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+FORMATS = {"application/sparql-results+json": "json", "text/csv": "csv"}
+
+
+def load_graph(gameweeks=10, seed=2025, ontology=ONTOLOGY):
+    from rdflib import Graph
+    from benchmarks.sample_data import build_sample_graph
+
+    graph = Graph()
+    graph.parse(ontology, format="turtle")
+    return build_sample_graph(gameweeks, seed, graph)
+
+
+def _serve(port, ready, requests, delay, gameweeks, seed):
+    graph = load_graph(gameweeks, seed)
+    # rdflib's query engine isn't meant to be used from several threads at once
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _query(self, query):
+            with requests.get_lock():
+                requests.value += 1
+            if delay:
+                time.sleep(delay)
+            content_type = self.headers.get("Accept", "")
+            if content_type not in FORMATS:
+                content_type = "application/sparql-results+json"
+            try:
+                with lock:
+                    body = graph.query(query).serialize(format=FORMATS[content_type])
+            except Exception as e:
+                body = f"MALFORMED QUERY: {e}".encode("utf-8")
+                self.send_response(400)
+                self.send_header("Content-Type", "text/plain")
+            else:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                body = parse_qs(body).get("query", [""])[0]
+            self._query(body)
+
+        def do_GET(self):
+            self._query(parse_qs(urlsplit(self.path).query).get("query", [""])[0])
+
+        def log_message(self, format, *args):
+            pass
+
+    server = _Server(("127.0.0.1", 0), Handler)
+    port.value = server.server_address[1]
+    ready.set()
+    server.serve_forever()
+
+
+class RdflibEndpoint:
+    """Use as a context manager, the endpoint is at .url and .requests counts the queries it got."""
+
+    def __init__(self, delay=0.0, gameweeks=10, seed=2025):
+        self._port = multiprocessing.Value("i", 0)
+        self._requests = multiprocessing.Value("i", 0)
+        self._ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(self._port, self._ready, self._requests, delay, gameweeks, seed),
+            daemon=True,
+        )
+        self.url = None
+
+    @property
+    def requests(self):
+        return self._requests.value
+
+    def __enter__(self):
+        self._process.start()
+        self._ready.wait()
+        self.url = f"http://127.0.0.1:{self._port.value}/repositories/united"
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,119 @@
+"""
+Recorded LLM answers for the benchmark suite. benchmarks/fixtures/corpus.json holds, for every
+question of the corpus, what the model answered to the router, the generator (one query per
+attempt: a first query that fails validation makes the pipeline retry), beautify and the chat,
+and the mean latency of each kind of call. ReplayClient answers from it, RecordingClient
+writes it from a real model (python -m benchmarks.suite --record).
+"""
+import json
+import threading
+import time
+
+from functions.llm_client import DEFAULT_MODEL, LLMClient, _text_of
+
+CORPUS = "benchmarks/fixtures/corpus.json"
+
+
+def load_corpus(path=CORPUS) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _PurposeClient(LLMClient):
+    """Keeps the purpose of the current call, which _generate doesn't get, in a thread local."""
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    def generate(self, contents, config=None, model=DEFAULT_MODEL, purpose="other"):
+        self.local.purpose = purpose
+        return super().generate(contents, config, model, purpose)
+
+    def generate_stream(self, contents, config=None, model=DEFAULT_MODEL, purpose="other"):
+        self.local.purpose = purpose
+        yield from super().generate_stream(contents, config, model, purpose)
+
+    @staticmethod
+    def is_retry(prompt):
+        # the pipeline's prompt after a failed validation, see TurnPipeline.query_kg
+        return prompt.startswith("The previous SPARQL query failed validation")
+
+
+class ReplayClient(_PurposeClient):
+    """
+    Answers with the recorded text of the corpus question found in the last message, after the
+    recorded latency times scale. Calls for a question the corpus doesn't know are counted in
+    .unknown and answered with None, like an empty Gemini answer.
+    """
+
+    def __init__(self, corpus: dict, scale=1.0):
+        super().__init__()
+        self.latency = {purpose: ms / 1000 * scale for purpose, ms in corpus["latency_ms"].items()}
+        # the longest questions first, so that a question isn't taken for one it contains
+        self.entries = sorted(corpus["questions"], key=lambda entry: -len(entry["question"]))
+        self.unknown = 0
+
+    def find(self, prompt):
+        for entry in self.entries:
+            if entry["question"] in prompt:
+                return entry
+        return None
+
+    def _generate(self, contents, config, model):
+        purpose = getattr(self.local, "purpose", "other")
+        prompt = _text_of(contents[-1:])
+        if self.latency.get(purpose):
+            time.sleep(self.latency[purpose])
+        entry = self.find(prompt)
+        text = None
+        if entry is None:
+            self.unknown += 1
+        elif purpose == "router":
+            text = entry["router"]
+        elif purpose == "generate" and "sparql" in entry:
+            text = entry["sparql"][-1] if self.is_retry(prompt) else entry["sparql"][0]
+        elif purpose == "beautify":
+            text = entry.get("answer")
+        elif purpose == "chat":
+            text = entry.get("chat")
+        return text, len(prompt.split()), len((text or "").split())
+
+
+class RecordingClient(_PurposeClient):
+    """Passes the calls on to client and records the answers for the question being asked (.question)."""
+
+    def __init__(self, client: LLMClient, corpus: dict):
+        super().__init__()
+        self.client = client
+        self.corpus = corpus
+        self.entries = {entry["question"]: entry for entry in corpus["questions"]}
+        self.question = None
+        self.seconds = {}
+
+    def _generate(self, contents, config, model):
+        purpose = getattr(self.local, "purpose", "other")
+        start = time.perf_counter()
+        text, prompt_tokens, output_tokens = self.client._generate(contents, config, model)
+        self.seconds.setdefault(purpose, []).append(time.perf_counter() - start)
+        entry = self.entries.get(self.question)
+        if entry is not None and text is not None:
+            if purpose == "router":
+                entry["router"] = text
+            elif purpose == "generate":
+                if not self.is_retry(_text_of(contents[-1:])):
+                    entry["sparql"] = []
+                entry.setdefault("sparql", []).append(text.strip())
+            elif purpose == "beautify":
+                entry["answer"] = text
+            elif purpose == "chat":
+                entry["chat"] = text
+        return text, prompt_tokens, output_tokens
+
+    def save(self, path=CORPUS):
+        for purpose, seconds in self.seconds.items():
+            if purpose in self.corpus["latency_ms"]:
+                self.corpus["latency_ms"][purpose] = round(sum(seconds) / len(seconds) * 1000)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.corpus, f, indent=2, ensure_ascii=False)
+            f.write("\n")
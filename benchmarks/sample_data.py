@@ -0,0 +1,308 @@
+"""
+Sample Premier League data following the ontology: 20 teams with their coaches, stadiums and
+squads, the matches of the first gameweeks with goals, assists, cards and team/player match
+statistics, and the season statistics (league table, scorers) derived from them. The data is
+generated from a seed, so every run gets the same graph.
+
+    python -m benchmarks.sample_data [path] [--gameweeks N]   writes it as Turtle
+"""
+import argparse
+import math
+import random
+from collections import defaultdict
+
+from rdflib import RDF, RDFS, Graph, Literal, Namespace
+from rdflib.namespace import XSD
+
+U = Namespace("http://semanticweb.org/unitedOntology#")
+SEASON = U["Premier_League_2025_26"]
+
+TEAMS = [
+    ("Arsenal", "ARS", "Emirates_Stadium", 60704, "Mikel_Arteta"),
+    ("Aston_Villa", "AVL", "Villa_Park", 42640, "Unai_Emery"),
+    ("Bournemouth", "BOU", "Vitality_Stadium", 11307, "Andoni_Iraola"),
+    ("Brentford", "BRE", "Gtech_Community_Stadium", 17250, "Keith_Andrews"),
+    ("Brighton", "BHA", "Amex_Stadium", 31876, "Fabian_Hurzeler"),
+    ("Burnley", "BUR", "Turf_Moor", 21944, "Scott_Parker"),
+    ("Chelsea", "CHE", "Stamford_Bridge", 40173, "Enzo_Maresca"),
+    ("Crystal_Palace", "CRY", "Selhurst_Park", 25486, "Oliver_Glasner"),
+    ("Everton", "EVE", "Hill_Dickinson_Stadium", 52888, "David_Moyes"),
+    ("Fulham", "FUL", "Craven_Cottage", 29589, "Marco_Silva"),
+    ("Leeds_United", "LEE", "Elland_Road", 37645, "Daniel_Farke"),
+    ("Liverpool", "LIV", "Anfield", 61276, "Arne_Slot"),
+    ("Manchester_City", "MCI", "Etihad_Stadium", 53400, "Pep_Guardiola"),
+    ("Manchester_United", "MUN", "Old_Trafford", 74310, "Ruben_Amorim"),
+    ("Newcastle_United", "NEW", "St_James_Park", 52305, "Eddie_Howe"),
+    ("Nottingham_Forest", "NFO", "City_Ground", 30404, "Sean_Dyche"),
+    ("Sunderland", "SUN", "Stadium_of_Light", 49000, "Regis_Le_Bris"),
+    ("Tottenham", "TOT", "Tottenham_Hotspur_Stadium", 62850, "Thomas_Frank"),
+    ("West_Ham", "WHU", "London_Stadium", 62500, "Nuno_Espirito_Santo"),
+    ("Wolves", "WOL", "Molineux", 31750, "Rob_Edwards"),
+]
+
+# (name, position, nationality, birth date); the rest of a squad is generated
+KNOWN_PLAYERS = {
+    "Manchester_United": [
+        ("Senne_Lammens", "GK", "Belgium", "2002-07-07"),
+        ("Diogo_Dalot", "RB", "Portugal", "1999-03-18"),
+        ("Harry_Maguire", "CB", "England", "1993-03-05"),
+        ("Lisandro_Martinez", "CB", "Argentina", "1998-01-18"),
+        ("Luke_Shaw", "LB", "England", "1995-07-12"),
+        ("Casemiro", "CDM", "Brazil", "1992-02-23"),
+        ("Kobbie_Mainoo", "CM", "England", "2005-04-19"),
+        ("Bruno_Fernandes", "CAM", "Portugal", "1994-09-08"),
+        ("Bryan_Mbeumo", "RW", "Cameroon", "1999-08-07"),
+        ("Matheus_Cunha", "LW", "Brazil", "1999-05-27"),
+        ("Benjamin_Sesko", "ST", "Slovenia", "2003-05-31"),
+        ("Amad_Diallo", "RW", "Ivory Coast", "2002-07-11"),
+        ("Mason_Mount", "CAM", "England", "1999-01-10"),
+        ("Manuel_Ugarte", "CDM", "Uruguay", "2001-04-11"),
+        ("Leny_Yoro", "CB", "France", "2005-11-13"),
+        ("Patrick_Dorgu", "LWB", "Denmark", "2004-10-26"),
+        ("Joshua_Zirkzee", "CF", "Netherlands", "2001-05-22"),
+        ("Altay_Bayindir", "GK", "Turkey", "1998-04-14"),
+    ],
+    "Arsenal": [("Bukayo_Saka", "RW", "England", "2001-09-05"), ("Martin_Odegaard", "CAM", "Norway", "1998-12-17"),
+                ("Viktor_Gyokeres", "ST", "Sweden", "1998-06-04"), ("Declan_Rice", "CM", "England", "1999-01-14")],
+    "Liverpool": [("Mohamed_Salah", "RW", "Egypt", "1992-06-15"), ("Virgil_van_Dijk", "CB", "Netherlands", "1991-07-08"),
+                  ("Florian_Wirtz", "CAM", "Germany", "2003-05-03"), ("Alexander_Isak", "ST", "Sweden", "1999-09-21")],
+    "Manchester_City": [("Erling_Haaland", "ST", "Norway", "2000-07-21"), ("Phil_Foden", "CAM", "England", "2000-05-28"),
+                        ("Rodri", "CDM", "Spain", "1996-06-22")],
+    "Chelsea": [("Cole_Palmer", "CAM", "England", "2002-05-06"), ("Enzo_Fernandez", "CM", "Argentina", "2001-01-17")],
+    "Tottenham": [("Dominic_Solanke", "ST", "England", "1997-09-14"), ("Mohammed_Kudus", "RW", "Ghana", "2000-08-02")],
+    "Newcastle_United": [("Bruno_Guimaraes", "CM", "Brazil", "1997-11-16"), ("Anthony_Gordon", "LW", "England", "2001-02-24")],
+    "Aston_Villa": [("Ollie_Watkins", "ST", "England", "1995-12-30"), ("Morgan_Rogers", "CAM", "England", "2002-07-26")],
+}
+SQUAD_POSITIONS = ["GK", "RB", "CB", "CB", "LB", "CDM", "CM", "CAM", "RW", "LW", "ST", "GK", "CB", "CM", "RW", "ST", "LB", "CF"]
+NATIONALITIES = ["England", "France", "Spain", "Brazil", "Portugal", "Netherlands", "Germany", "Argentina", "Belgium", "Norway"]
+# chance of a player of the position scoring a team's goal, relative to the others
+SCORING_WEIGHT = {"ST": 8, "CF": 7, "RW": 5, "LW": 5, "CAM": 5, "CM": 2, "CDM": 1, "RB": 1, "LB": 1, "LWB": 1,
+                  "CB": 1, "GK": 0}
+
+
+def label(name):
+    return Literal(name.replace("_", " "))
+
+
+def integer(value):
+    return Literal(value, datatype=XSD.integer)
+
+
+def schedule(teams, gameweeks):
+    """Round robin pairings (circle method), home and away alternating: a list of gameweeks of (home, away)."""
+    teams = list(teams)
+    rounds = []
+    for week in range(gameweeks):
+        pairs = []
+        for i in range(len(teams) // 2):
+            home, away = teams[i], teams[-1 - i]
+            pairs.append((home, away) if (week + i) % 2 == 0 else (away, home))
+        rounds.append(pairs)
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds
+
+
+def build_sample_graph(gameweeks=10, seed=2025, graph=None) -> Graph:
+    """The sample data of the first gameweeks of the season (added to graph if given)."""
+    rng = random.Random(seed)
+    g = graph if graph is not None else Graph()
+    g.bind("", U)
+    g.add((SEASON, RDF.type, U.League))
+    g.add((SEASON, RDFS.label, Literal("Premier League 2025-26")))
+
+    squads = {}
+    strength = {}
+    for name, code, stadium, capacity, coach in TEAMS:
+        team = U[name]
+        strength[name] = rng.uniform(0.8, 2.0)
+        g.add((team, RDF.type, U.Team))
+        g.add((team, RDFS.label, label(name)))
+        g.add((team, U.teamHasCode, Literal(code)))
+        g.add((team, U.playsInTournament, SEASON))
+        g.add((SEASON, U.tournamentHasTeam, team))
+        g.add((U[stadium], RDF.type, U.Stadium))
+        g.add((U[stadium], RDFS.label, label(stadium)))
+        g.add((U[stadium], U.hasCapacity, integer(capacity)))
+        g.add((team, U.homeStadium, U[stadium]))
+        g.add((U[stadium], U.stadiumOfTeam, team))
+        g.add((U[coach], RDF.type, U.Coach))
+        g.add((U[coach], RDFS.label, label(coach)))
+        g.add((team, U.hasCoach, U[coach]))
+        g.add((U[coach], U.coachesTeam, team))
+
+        known = KNOWN_PLAYERS.get(name, [])
+        squad = list(known)
+        for i, position in enumerate(SQUAD_POSITIONS[len(known):], start=len(known) + 1):
+            birth = f"{rng.randint(1990, 2006)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            squad.append((f"{name}_Player_{i}", position, rng.choice(NATIONALITIES), birth))
+        squads[name] = []
+        for player_name, position, nationality, birth in squad:
+            player = U[player_name]
+            g.add((player, RDF.type, U.Player))
+            g.add((player, RDFS.label, label(player_name)))
+            g.add((player, U.playsFor, team))
+            g.add((team, U.hasPlayer, player))
+            g.add((player, U.hasPosition, U[position]))
+            g.add((player, U.hasNationality, Literal(nationality)))
+            g.add((player, U.hasBirthDate, Literal(birth)))
+            squads[name].append((player_name, position))
+
+    table = defaultdict(lambda: defaultdict(int))
+    players = defaultdict(lambda: defaultdict(int))
+    for week, pairs in enumerate(schedule([t[0] for t in TEAMS], gameweeks), start=1):
+        for number, (home, away) in enumerate(pairs, start=1):
+            add_match(g, rng, week, number, home, away, squads, strength, table, players)
+
+    for name, row in table.items():
+        stats = U[f"{name}_Season_Stats"]
+        g.add((stats, RDF.type, U.TeamSeasonStats))
+        g.add((stats, U.seasonStatsOfTeam, U[name]))
+        g.add((U[name], U.teamHasSeasonStats, stats))
+        g.add((stats, U.teamSeasonStatsOfTournament, SEASON))
+        for prop, key in (("teamMatchesPlayed", "played"), ("teamWins", "wins"), ("teamDraws", "draws"),
+                          ("teamLosses", "losses"), ("teamGoalsFor", "for"), ("teamGoalsAgainst", "against"),
+                          ("teamCleanSheets", "clean_sheets"), ("teamYellowCardsSeason", "yellow")):
+            g.add((stats, U[prop], integer(row[key])))
+        g.add((stats, U.teamGoalDifference, integer(row["for"] - row["against"])))
+        g.add((stats, U.teamPoints, integer(3 * row["wins"] + row["draws"])))
+
+    for player_name, row in players.items():
+        stats = U[f"{player_name}_Season_Stats"]
+        g.add((stats, RDF.type, U.PlayerSeasonStats))
+        g.add((stats, U.seasonStatsOfPlayer, U[player_name]))
+        g.add((U[player_name], U.playerHasSeasonStats, stats))
+        g.add((stats, U.playerSeasonStatsOfTournament, SEASON))
+        for prop, key in (("playerGoalsScoredSeason", "goals"), ("playerAssistsSeason", "assists"),
+                          ("playerMatchesPlayed", "matches"), ("playerMinutesPlayedSeason", "minutes"),
+                          ("playerYellowCardsSeason", "yellow")):
+            g.add((stats, U[prop], integer(row[key])))
+    return g
+
+
+def add_match(g, rng, week, number, home, away, squads, strength, table, players):
+    match = U[f"Match_GW{week}_{number}"]
+    g.add((match, RDF.type, U.Match))
+    g.add((match, RDFS.label, Literal(f"{home.replace('_', ' ')} vs {away.replace('_', ' ')}")))
+    g.add((match, U.matchGameweek, integer(week)))
+    g.add((match, U.matchDate, Literal(f"2025-{8 + (week + 1) // 5:02d}-{1 + (week * 7) % 28:02d}")))
+    g.add((match, U.matchPartOfTournament, SEASON))
+    g.add((SEASON, U.tournamentHasMatch, match))
+    g.add((match, U.hasHomeTeam, U[home]))
+    g.add((match, U.hasAwayTeam, U[away]))
+    for team in (home, away):
+        g.add((match, U.matchHasTeam, U[team]))
+        g.add((U[team], U.participatesInMatch, match))
+    stadium = next(t[2] for t in TEAMS if t[0] == home)
+    g.add((match, U.matchHasStadium, U[stadium]))
+
+    goals = {home: poisson(rng, strength[home] * 0.8 + 0.3), away: poisson(rng, strength[away] * 0.7)}
+    result = "HomeWin" if goals[home] > goals[away] else "AwayWin" if goals[home] < goals[away] else "Draw"
+    g.add((match, U.hasResult, U[result]))
+
+    # the starting eleven of each team play, scorers and assistants come from them
+    lineups = {team: squads[team][:11] for team in (home, away)}
+    player_stats = {}
+    for team, lineup in lineups.items():
+        for player_name, _ in lineup:
+            stats = U[f"{player_name}_GW{week}_Stats"]
+            player_stats[player_name] = stats
+            minutes = 90 if rng.random() > 0.2 else rng.randint(45, 89)
+            g.add((stats, RDF.type, U.PlayerMatchStats))
+            g.add((stats, U.matchStatsOfPlayer, U[player_name]))
+            g.add((U[player_name], U.playerHasMatchStats, stats))
+            g.add((stats, U.playerStatsOfMatch, match))
+            g.add((match, U.matchHasPlayerStats, stats))
+            g.add((stats, U.minutesPlayed, integer(minutes)))
+            players[player_name]["matches"] += 1
+            players[player_name]["minutes"] += minutes
+
+    minutes = sorted(rng.randint(1, 90) for _ in range(goals[home] + goals[away]))
+    scoring = [home] * goals[home] + [away] * goals[away]
+    rng.shuffle(scoring)
+    for order, (minute, team) in enumerate(zip(minutes, scoring), start=1):
+        lineup = lineups[team]
+        scorer = rng.choices([p for p, _ in lineup], [SCORING_WEIGHT.get(pos, 1) for _, pos in lineup])[0]
+        goal = U[f"Goal_GW{week}_{number}_{order}"]
+        g.add((goal, RDF.type, U.Goal))
+        g.add((goal, U.goalInMatch, match))
+        g.add((goal, U.goalForTeam, U[team]))
+        g.add((goal, U.goalScoredBy, U[scorer]))
+        g.add((U[scorer], U.scorerOfGoal, goal))
+        g.add((goal, U.goalTime, Literal(f"{minute}'")))
+        g.add((goal, U.goalOrderInMatch, integer(order)))
+        g.add((goal, U.isPenaltyGoal, Literal(rng.random() < 0.1)))
+        g.add((goal, U.isOwnGoal, Literal(False)))
+        g.add((player_stats[scorer], U.playerScored, goal))
+        players[scorer]["goals"] += 1
+        if rng.random() < 0.7:
+            assistant = rng.choice([p for p, pos in lineup if p != scorer and pos != "GK"])
+            assist = U[f"Assist_GW{week}_{number}_{order}"]
+            g.add((assist, RDF.type, U.Assist))
+            g.add((assist, U.assistForGoal, goal))
+            g.add((assist, U.assistInMatch, match))
+            g.add((assist, U.assistTime, Literal(f"{minute}'")))
+            g.add((goal, U.assistedBy, U[assistant]))
+            g.add((player_stats[assistant], U.playerAssisted, assist))
+            players[assistant]["assists"] += 1
+
+    possession = round(rng.uniform(35, 65), 1)
+    for team, other, share in ((home, away, possession), (away, home, round(100 - possession, 1))):
+        stats = U[f"{team}_GW{week}_Stats"]
+        yellow = rng.randint(0, 4)
+        shots = goals[team] + rng.randint(4, 14)
+        on_target = min(shots, goals[team] + rng.randint(1, 5))
+        g.add((stats, RDF.type, U.TeamMatchStats))
+        g.add((stats, U.statsOfTeam, U[team]))
+        g.add((stats, U.teamStatsOfMatch, match))
+        g.add((match, U.matchHasTeamStats, stats))
+        g.add((stats, U.teamGoalsScored, integer(goals[team])))
+        g.add((stats, U.goalsConceded, integer(goals[other])))
+        g.add((stats, U.ballPossession, Literal(f"{share:.1f}", datatype=XSD.decimal)))
+        g.add((stats, U.corners, integer(rng.randint(1, 11))))
+        g.add((stats, U.teamTotalShots, integer(shots)))
+        g.add((stats, U.teamShotsOnTarget, integer(on_target)))
+        g.add((stats, U.teamYellowCards, integer(yellow)))
+        for _ in range(yellow):
+            booked = rng.choice(lineups[team])[0]
+            card = U[f"YellowCard_GW{week}_{booked}"]
+            g.add((card, RDF.type, U.YellowCard))
+            g.add((card, U.yellowCardTime, Literal(f"{rng.randint(1, 90)}'")))
+            g.add((player_stats[booked], U.playerReceivedYellowCard, card))
+            players[booked]["yellow"] += 1
+
+        row = table[team]
+        row["played"] += 1
+        row["for"] += goals[team]
+        row["against"] += goals[other]
+        row["yellow"] += yellow
+        row["clean_sheets"] += goals[other] == 0
+        if goals[team] > goals[other]:
+            row["wins"] += 1
+        elif goals[team] == goals[other]:
+            row["draws"] += 1
+        else:
+            row["losses"] += 1
+
+
+def poisson(rng, mean):
+    """Knuth's method, enough for the few goals of a match."""
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the sample league data as Turtle")
+    parser.add_argument("path", nargs="?", default="benchmarks/fixtures/sample_data.ttl")
+    parser.add_argument("--gameweeks", type=int, default=10)
+    args = parser.parse_args()
+    graph = build_sample_graph(args.gameweeks)
+    graph.serialize(args.path, format="turtle")
+    print(f"{len(graph)} triples written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
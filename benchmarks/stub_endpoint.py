@@ -0,0 +1,137 @@
+"""
+Local stand-in for a GraphDB SPARQL endpoint, so that the transport can be measured
+without a real triplestore. It answers every query with the same JSON result after
+an optional delay (in JSON, TSV or CSV depending on the Accept header), and can fail
+a fraction of the requests, or the first fail_first of them, with status (a 503 by default).
+The server runs in its own process so that it doesn't compete with the client for the GIL.
+"""
+import json
+import multiprocessing
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_result(rows):
+    return {
+        "head": {"vars": ["player", "team"]},
+        "results": {
+            "bindings": [
+                {
+                    "player": {"type": "uri", "value": f"http://semanticweb.org/unitedOntology#Player_{i}"},
+                    "team": {"type": "uri", "value": "http://semanticweb.org/unitedOntology#Manchester_United"},
+                }
+                for i in range(rows)
+            ]
+        },
+    }
+
+
+def make_bodies(rows):
+    """The same result serialised in every format the endpoint can answer with, by content type."""
+    result = make_result(rows)
+    tsv = ["?player\t?team"]
+    csv = ["player,team"]
+    for binding in result["results"]["bindings"]:
+        tsv.append(f"<{binding['player']['value']}>\t<{binding['team']['value']}>")
+        csv.append(f"{binding['player']['value']},{binding['team']['value']}")
+    return {
+        "application/sparql-results+json": json.dumps(result).encode("utf-8"),
+        "text/tab-separated-values": ("\n".join(tsv) + "\n").encode("utf-8"),
+        "text/csv": ("\r\n".join(csv) + "\r\n").encode("utf-8"),
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections when many clients connect at once
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # clients that stop reading early (streaming with a row cap) close the connection
+        pass
+
+
+def _serve(port, ready, requests, connections, delay, rows, failure_rate, seed, fail_first, status):
+    bodies = make_bodies(rows)
+    rng = random.Random(seed)
+
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive needs HTTP/1.1 and a Content-Length on every answer
+        protocol_version = "HTTP/1.1"
+        # headers and body are sent separately, without this delayed ACKs add ~40 ms per answer
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            # one handler per connection, kept alive between its requests
+            with connections.get_lock():
+                connections.value += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with requests.get_lock():
+                requests.value += 1
+                number = requests.value
+            if delay:
+                time.sleep(delay)
+            if number <= fail_first or failure_rate and rng.random() < failure_rate:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            content_type = self.headers.get("Accept", "")
+            if content_type not in bodies:
+                content_type = "application/sparql-results+json"
+            body = bodies[content_type]
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = _Server(("127.0.0.1", 0), Handler)
+    port.value = server.server_address[1]
+    ready.set()
+    server.serve_forever()
+
+
+class StubEndpoint:
+    """
+    Use as a context manager, the endpoint is at .url, .requests counts the requests it got
+    and .connections the connections they came on.
+    """
+
+    def __init__(self, delay=0.0, rows=20, failure_rate=0.0, seed=0, fail_first=0, status=503):
+        self._port = multiprocessing.Value("i", 0)
+        self._requests = multiprocessing.Value("i", 0)
+        self._connections = multiprocessing.Value("i", 0)
+        self._ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(self._port, self._ready, self._requests, self._connections, delay, rows, failure_rate, seed,
+                  fail_first, status),
+            daemon=True,
+        )
+        self.url = None
+
+    @property
+    def requests(self):
+        return self._requests.value
+
+    @property
+    def connections(self):
+        return self._connections.value
+
+    def __enter__(self):
+        self._process.start()
+        self._ready.wait()
+        self.url = f"http://127.0.0.1:{self._port.value}/repositories/united"
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,269 @@
+"""
+End-to-end benchmark suite: replays the question corpus (benchmarks/fixtures/corpus.json)
+through the whole pipeline, with the LLM answering from the recorded fixtures (see replay.py)
+and GraphDB replaced by an rdflib endpoint holding the sample data (see rdflib_endpoint.py).
+
+It reports
+- extract_bgps_from_sparql, validate_sparql and execute_sparql on the corpus queries,
+- per-stage (from the tracing spans) and total latency of the turns, with the bare pipeline
+  and with the caches, local router, renderer, repairer, entity index, query guard and season
+  views of main.py,
+- the validation throughput, the retry rate, the validation failure rate and the empty-result rate,
+and compares the numbers with the saved baseline: a metric more than --tolerance worse than
+its baseline is a regression, and the suite exits with 1.
+
+Run from the repository root:
+    python -m benchmarks.suite                    compare with benchmarks/baselines/suite.json
+    python -m benchmarks.suite --save-baseline    save this run as the baseline
+    python -m benchmarks.suite --record           record the fixtures again with GEMINI_API_KEY
+The fixture latencies are multiplied by --scale (default 0.1) to keep the run short.
+Baselines depend on the machine, save one before comparing on a new one.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.rdflib_endpoint import RdflibEndpoint
+from benchmarks.replay import CORPUS, RecordingClient, ReplayClient, load_corpus
+from functions.answer_renderer import AnswerRenderer
+from functions.chat_manager import ChatManager
+from functions.entity_index import EntityIndex
+from functions.execute_query import execute_sparql
+from functions.llm_client import get_llm, set_llm
+from functions.local_router import LocalRouter
+from functions.pipeline import TurnPipeline
+from functions.query_guard import KGStatistics, QueryGuard
+from functions.question_cache import QuestionCache
+from functions.result_cache import ResultCache
+from functions.season_views import SeasonViews
+from functions.sparql_repair import SparqlRepairer
+from functions.sparql_validator import extract_bgps_from_sparql, validate_sparql
+from functions.tracing import MemoryExporter, tracer
+
+ONTOLOGY = "ontology/simple_test.txt"
+TURTLE_ONTOLOGY = "ontology/ontology_export.ttl"
+BASELINE = "benchmarks/baselines/suite.json"
+CHAT_PROMPT = (
+    "You are a helpful assistant specialized in football and knowledge graph reasoning about Premier League 25-26. "
+    "Decide when to create SPARQL queries based on user questions."
+)
+MICRO_REPEAT = 200
+EXECUTE_REPEAT = 10
+STAGES = ["views", "router", "resolve", "generate", "validate", "repair", "guard", "execute", "render", "beautify", "chat"]
+KG_STAGES = {"kg", "resolve", "generate", "validate", "repair", "guard", "validate.native", "validate.rule", "execute", "llm.generate"}
+# differences below this many ms are noise, whatever the ratio
+NOISE_MS = 0.05
+
+
+def timed_per_call(function, items, repeat, runs=5):
+    """Best of runs of the mean seconds per call of function over items, repeated, without the GC."""
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for item in items:
+                    function(item)
+            elapsed = (time.perf_counter() - start) / (repeat * len(items))
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best
+
+
+def micro(corpus, url):
+    queries = [sparql for entry in corpus["questions"] for sparql in entry.get("sparql", [])]
+    final = [entry["sparql"][-1] for entry in corpus["questions"] if "sparql" in entry]
+    validate_sparql(queries[0], TURTLE_ONTOLOGY)
+    metrics = {
+        "extract_bgps_from_sparql_ms": timed_per_call(extract_bgps_from_sparql, queries, MICRO_REPEAT) * 1000,
+        "validate_sparql_ms": timed_per_call(lambda q: validate_sparql(q, TURTLE_ONTOLOGY), queries, MICRO_REPEAT // 4) * 1000,
+    }
+    latencies = []
+    for _ in range(EXECUTE_REPEAT):
+        for query in final:
+            start = time.perf_counter()
+            execute_sparql(url, query)
+            latencies.append(time.perf_counter() - start)
+    metrics["execute_sparql_p50_ms"] = statistics.median(latencies) * 1000
+    metrics["execute_sparql_p95_ms"] = percentile(latencies, 95) * 1000
+    return metrics
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def make_pipeline(url, full):
+    chat = ChatManager(api_key=None, system_prompt=CHAT_PROMPT, keep_history=True)
+    if not full:
+        return TurnPipeline(None, url, ONTOLOGY, TURTLE_ONTOLOGY, chat, log=lambda message: None)
+    entity_index = EntityIndex.from_kg(url)
+    return TurnPipeline(
+        None, url, ONTOLOGY, TURTLE_ONTOLOGY, chat, result_cache=ResultCache(),
+        question_cache=QuestionCache(entity_terms=entity_index.name_terms()),
+        local_router=LocalRouter.from_ontology(TURTLE_ONTOLOGY), renderer=AnswerRenderer(TURTLE_ONTOLOGY),
+        repairer=SparqlRepairer(TURTLE_ONTOLOGY), entity_index=entity_index,
+        query_guard=QueryGuard(KGStatistics.from_kg(url), default_limit=50), views=SeasonViews.from_kg(url),
+        log=lambda message: None,
+    )
+
+
+def end_to_end(corpus, url, full, rounds):
+    """Every question of the corpus, rounds times, in one conversation."""
+    pipeline = make_pipeline(url, full)
+    spans = MemoryExporter()
+    tracer.add_exporter(spans)
+    totals, kg_turns, retried, empty, wrong_route = [], 0, 0, 0, 0
+    try:
+        for _ in range(rounds):
+            for entry in corpus["questions"]:
+                result = pipeline.run_sync(entry["question"])
+                totals.append(result.timings["total"])
+                wrong_route += result.used_kg != entry["use_kg"]
+                if result.used_kg:
+                    kg_turns += 1
+                    retried += result.retries > 0
+                    empty += not result.bindings
+    finally:
+        tracer.remove_exporter(spans)
+        pipeline.close()
+
+    # the KG stages of chat turns are cancelled speculative branches, they aren't counted
+    used_kg = {span.trace_id: span.attributes.get("used_kg") for span in spans.spans if span.name == "turn"}
+    summary = {}
+    for span in spans.spans:
+        if span.name in KG_STAGES and not used_kg.get(span.trace_id):
+            continue
+        if span.status == "ok":
+            stats = summary.setdefault(span.name, {"seconds": [], "errors": 0})
+            stats["seconds"].append(span.duration)
+            stats["errors"] += span.attributes.get("errors", 0) > 0
+    metrics = {
+        "total_p50_ms": statistics.median(totals) * 1000,
+        "total_p95_ms": percentile(totals, 95) * 1000,
+    }
+    # medians, a few turns that waited on another thread don't move them
+    for stage in STAGES:
+        if stage in summary:
+            metrics[f"{stage}_p50_ms"] = statistics.median(summary[stage]["seconds"]) * 1000
+    validate = summary.get("validate", {"seconds": [], "errors": 0})
+    validations = len(validate["seconds"])
+    info = {
+        "turns": len(totals),
+        "kg_turns": kg_turns,
+        "wrong_routes": wrong_route,
+        "validations": validations,
+        "validations_per_s": validations / sum(validate["seconds"]) if validations else 0.0,
+    }
+    metrics["retry_rate"] = retried / kg_turns if kg_turns else 0.0
+    metrics["validation_failure_rate"] = validate["errors"] / validations if validations else 0.0
+    metrics["empty_result_rate"] = empty / kg_turns if kg_turns else 0.0
+    return metrics, info
+
+
+def compare(metrics, baseline, tolerance):
+    """Prints every metric next to its baseline; returns the names of the regressions."""
+    regressions = []
+    print(f"\n{'metric':<44}{'baseline':>11}{'now':>11}{'change':>9}")
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<44}{'-':>11}{value:>11.3f}")
+            continue
+        change = (value - base) / base if base else (0.0 if value == base else float("inf"))
+        # rates are compared in absolute terms, latencies relative to the baseline
+        if name.endswith("_rate"):
+            worse = value - base > tolerance / 10
+        else:
+            worse = change > tolerance and value - base > NOISE_MS
+        regressions += [name] if worse else []
+        print(f"{name:<44}{base:>11.3f}{value:>11.3f}{change * 100:>8.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def record(corpus, url):
+    """Asks the real model every question of the corpus and saves its answers as the new fixtures."""
+    recorder = RecordingClient(get_llm(os.getenv("GEMINI_API_KEY")), corpus)
+    set_llm(recorder)
+    chat = ChatManager(api_key=None, system_prompt=CHAT_PROMPT, keep_history=False)
+    pipeline = TurnPipeline(None, url, ONTOLOGY, TURTLE_ONTOLOGY, chat, speculative=False, log=lambda message: None)
+    for entry in corpus["questions"]:
+        recorder.question = entry["question"]
+        result = pipeline.run_sync(entry["question"])
+        print(f"  {'kg  ' if result.used_kg else 'chat'} retries {result.retries} {entry['question']}")
+    pipeline.close()
+    recorder.save()
+    print(f"fixtures saved to {CORPUS}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite with recorded fixtures")
+    parser.add_argument("--scale", type=float, default=0.1, help="factor of the recorded LLM latencies")
+    parser.add_argument("--rounds", type=int, default=2, help="times the corpus is asked")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="slowdown counted as a regression")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--record", action="store_true", help="record the fixtures with the real model")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    with RdflibEndpoint() as endpoint:
+        if args.record:
+            from dotenv import load_dotenv
+            load_dotenv()
+            record(corpus, endpoint.url)
+            return
+
+        client = ReplayClient(corpus, scale=args.scale)
+        set_llm(client)
+        print(f"{len(corpus['questions'])} questions x {args.rounds} rounds, LLM latency x{args.scale}")
+        metrics = {f"micro.{name}": value for name, value in micro(corpus, endpoint.url).items()}
+        for config in ("bare", "full"):
+            stage_metrics, info = end_to_end(corpus, endpoint.url, config == "full", args.rounds)
+            metrics.update({f"{config}.{name}": value for name, value in stage_metrics.items()})
+            print(
+                f"{config}: {info['turns']} turns, {info['kg_turns']} on the KG, {info['wrong_routes']} routed wrongly, "
+                f"{info['validations']} validations ({info['validations_per_s']:.0f}/s while validating)"
+            )
+        if client.unknown:
+            print(f"{client.unknown} LLM calls for questions without fixtures")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["metrics"]
+        if (saved["scale"], saved["rounds"]) != (args.scale, args.rounds):
+            print(f"\nthe baseline was saved with --scale {saved['scale']} --rounds {saved['rounds']}, "
+                  f"the end-to-end numbers aren't comparable")
+    regressions = compare(metrics, baseline, args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+                "machine": f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}",
+                "scale": args.scale,
+                "rounds": args.rounds,
+                "metrics": metrics,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import re
+import time
+from rdflib import RDFS, URIRef
+from functions.beautify import beautify
+from functions.ontology_store import load_ontology
+from functions.text_utils import CAMEL_RE
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+INTEGER_TYPES = {XSD + t for t in ("integer", "int", "long", "short", "nonNegativeInteger", "positiveInteger")}
+DECIMAL_TYPES = {XSD + t for t in ("decimal", "float", "double")}
+# questions that want an explanation rather than the data
+PROSE_RE = re.compile(r"^\s*(why|explain|describe|compare|summari[sz]e|tell me about|what do you think)\b", re.I)
+
+
+def humanize(name: str) -> str:
+    """Manchester_United -> Manchester United, HomeWin -> Home Win, home_goals / homeGoals -> Home goals"""
+    words = [w for w in name.split("_") if w] if "_" in name else CAMEL_RE.findall(name)
+    if not words:
+        return name
+    if name[:1].isupper():
+        # individuals and classes keep the capitals of their names
+        return " ".join(words)
+    return " ".join(w.lower() for w in words).capitalize()
+
+
+def format_table(headers, rows) -> str:
+    """A plain text table, columns padded to their widest value."""
+    widths = [max(len(header), *(len(row[i]) for row in rows)) for i, header in enumerate(headers)]
+    lines = [
+        " | ".join(header.ljust(width) for header, width in zip(headers, widths)),
+        "-+-".join("-" * width for width in widths),
+    ]
+    lines.extend(" | ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+    return "\n".join(lines)
+
+
+class AnswerRenderer:
+    """
+    Turns the bindings of common result shapes into the answer text without a model call:
+    a single value, a list of values, a single row and a small table. IRIs are shown by their
+    rdfs:label in the ontology, or by their local name made readable. render returns None
+    for anything it can't render confidently (no rows, too many rows or columns, blank nodes,
+    long texts, questions asking for an explanation), and beautify is used instead.
+    """
+
+    def __init__(self, ontology_path: str = None, cache_dir: str = None, max_list=20, max_rows=15, max_columns=4,
+                 max_value_length=120):
+        self.labels = {}
+        if ontology_path:
+            graph = load_ontology(ontology_path, cache_dir).graph
+            for subject, label in graph.subject_objects(RDFS.label):
+                if isinstance(subject, URIRef):
+                    self.labels[str(subject)] = str(label)
+        self.max_list = max_list
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+        self.max_value_length = max_value_length
+        self.local = 0
+        self.fallbacks = 0
+        self.render_time = 0.0
+        self.beautify_time = 0.0
+
+    def label(self, iri: str) -> str:
+        label = self.labels.get(iri)
+        if label is None:
+            label = iri.rsplit("#", 1)[-1].rsplit("/", 1)[-1]
+        return humanize(label)
+
+    def value(self, term: dict):
+        """The display text of a binding value, or None if it can't be shown as is."""
+        kind = term.get("type")
+        value = term.get("value", "")
+        if kind == "uri":
+            return self.label(value)
+        if kind not in ("literal", "typed-literal"):
+            return None
+        datatype = term.get("datatype")
+        try:
+            if datatype in INTEGER_TYPES:
+                return str(int(value))
+            if datatype in DECIMAL_TYPES:
+                return f"{float(value):.2f}".rstrip("0").rstrip(".")
+        except ValueError:
+            return None
+        if datatype == XSD + "boolean":
+            return "yes" if value in ("true", "1") else "no"
+        if datatype == XSD + "dateTime":
+            return value.replace("T", " ").rstrip("Z")
+        if len(value) > self.max_value_length:
+            return None
+        return value
+
+    def render(self, question: str, bindings):
+        start = time.perf_counter()
+        try:
+            text = self._render(question, bindings)
+        finally:
+            self.render_time += time.perf_counter() - start
+        if text is None:
+            self.fallbacks += 1
+        else:
+            self.local += 1
+        return text
+
+    def _render(self, question, bindings):
+        if not bindings or PROSE_RE.match(question):
+            return None
+        columns = []
+        for binding in bindings:
+            for var in binding:
+                if var not in columns:
+                    columns.append(var)
+        if len(columns) > self.max_columns:
+            return None
+        rows = []
+        for binding in bindings:
+            row = []
+            for var in columns:
+                term = binding.get(var)
+                text = "" if term is None else self.value(term)
+                if text is None:
+                    return None
+                row.append(text)
+            rows.append(row)
+        headers = [humanize(var) for var in columns]
+
+        if len(rows) == 1 and len(columns) == 1:
+            return f"{headers[0]}: {rows[0][0]}"
+        if len(columns) == 1:
+            if len(rows) > self.max_list:
+                return None
+            values = list(dict.fromkeys(row[0] for row in rows))
+            return f"{headers[0]} ({len(values)}):\n" + "\n".join(f"- {value}" for value in values)
+        if len(rows) == 1:
+            return "\n".join(f"{header}: {value}" for header, value in zip(headers, rows[0]))
+        if len(rows) > self.max_rows:
+            return None
+        return format_table(headers, rows)
+
+    def stats(self) -> dict:
+        answers = self.local + self.fallbacks
+        mean_beautify = self.beautify_time / self.fallbacks if self.fallbacks else 0.0
+        return {
+            "local": self.local,
+            "fallbacks": self.fallbacks,
+            "local_rate": self.local / answers if answers else 0.0,
+            "mean_render_ms": self.render_time / answers * 1000 if answers else 0.0,
+            "mean_beautify_ms": mean_beautify * 1000,
+            # every local answer saves one beautify call
+            "saved_s": self.local * mean_beautify,
+        }
+
+
+def beautify_rendered(renderer: AnswerRenderer, api_key, query, answer):
+    """beautify behind the local renderer; the time of the beautify calls is recorded."""
+    text = renderer.render(query, answer)
+    if text is not None:
+        return text
+    start = time.perf_counter()
+    text = beautify(api_key, query, answer)
+    renderer.beautify_time += time.perf_counter() - start
+    return text
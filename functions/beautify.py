@@ -1,10 +1,8 @@
-from google import genai
-from google.genai import types
+from functions.llm_client import get_llm
+
+def _beautify_request(query, answer):
+    from google.genai import types
 
-def beautify(api_key, query, answer):
-    # connect with the genai client
-    client = genai.Client(api_key=api_key)
-    
     prompt = f"""
         The user asked this question: 
         {query}
@@ -19,16 +17,25 @@ def beautify(api_key, query, answer):
     ]
 
     config=types.GenerateContentConfig(max_output_tokens=300)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-001",
-        contents=messages,
-        config=config
-    )
+    return messages, config
 
-    if not response or not response.candidates:
-        return False
 
-    text = response.candidates[0].content.parts[0].text
+def beautify(api_key, query, answer):
+    # the shared genai client
+    llm = get_llm(api_key)
+
+    messages, config = _beautify_request(query, answer)
+    text = llm.generate(messages, config, purpose="beautify")
+
+    if text is None:
+        return False
 
     return text
-     
\ No newline at end of file
+
+
+def beautify_stream(api_key, query, answer):
+    """Like beautify, but yields the answer in chunks as the model writes it."""
+    llm = get_llm(api_key)
+
+    messages, config = _beautify_request(query, answer)
+    yield from llm.generate_stream(messages, config, purpose="beautify")
@@ -0,0 +1,127 @@
+import re
+from collections import deque
+
+POLICIES = ("summarize", "drop")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of Gemini's tokenizer, about four characters per token."""
+    return (len(text) + 3) // 4
+
+
+class Message:
+    """One turn of the conversation; converted to types.Content only when a request is built."""
+    __slots__ = ("role", "text", "tokens")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+    def to_content(self) -> "types.Content":
+        from google.genai import types
+
+        return types.Content(role=self.role, parts=[types.Part(text=self.text)])
+
+
+def extractive_summary(summary: str, messages, max_tokens: int) -> str:
+    """
+    Folds messages into the running summary without a model call: the first sentence of
+    every message, the oldest sentences are dropped once the summary is over max_tokens.
+    """
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        first = SENTENCE_RE.split(message.text.strip(), 1)[0]
+        lines.append(f"{message.role}: {first}")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatHistory:
+    """
+    Conversation history kept under a token budget. The most recent keep_recent messages are
+    always sent verbatim; once the history is over max_tokens the oldest messages are removed
+    and, with the "summarize" policy, folded into a rolling summary of at most summary_tokens
+    that is sent in front of the remaining messages and counts against the budget (the "drop"
+    policy forgets them). max_tokens=None keeps everything.
+    summarizer(summary, messages, max_tokens) returns the new summary, see extractive_summary.
+    """
+
+    def __init__(self, max_tokens=2000, keep_recent=6, policy="summarize", summary_tokens=300,
+                 summarizer=extractive_summary):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown history policy {policy!r}, expected one of {POLICIES}")
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.policy = policy
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.messages = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.summarized = 0
+        self.dropped = 0
+        # the types.Content of the messages, built on the first request that needs them
+        self._contents = None
+
+    def append(self, role: str, text: str):
+        message = Message(role, text)
+        self.messages.append(message)
+        self.tokens += message.tokens
+        if self._contents is not None:
+            self._contents.append(message.to_content())
+        self._enforce()
+
+    def clear(self):
+        self.messages.clear()
+        self.tokens = 0
+        self.summary = ""
+        self._contents = None
+
+    def _enforce(self):
+        if self.max_tokens is None:
+            return
+        # the summary is sent too, so its share of the budget is kept free
+        limit = self.max_tokens - (self.summary_tokens if self.policy == "summarize" else 0)
+        removed = []
+        while self.tokens > limit and len(self.messages) > self.keep_recent:
+            message = self.messages.popleft()
+            self.tokens -= message.tokens
+            removed.append(message)
+            if self._contents is not None:
+                self._contents.popleft()
+        if not removed:
+            return
+        if self.policy == "summarize":
+            self.summary = self.summarizer(self.summary, removed, self.summary_tokens)
+            self.summarized += len(removed)
+        else:
+            self.dropped += len(removed)
+
+    def contents(self) -> list:
+        """The messages to send, behind the summary of the older ones if there is one."""
+        if self._contents is None:
+            self._contents = deque(message.to_content() for message in self.messages)
+        if not self.summary:
+            return list(self._contents)
+        from google.genai import types
+
+        summary = types.Content(
+            role="user", parts=[types.Part(text=f"Summary of the earlier conversation:\n{self.summary}")]
+        )
+        return [summary, *self._contents]
+
+    def payload_tokens(self) -> int:
+        """Estimated tokens of contents()."""
+        return self.tokens + (estimate_tokens(self.summary) + 8 if self.summary else 0)
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self.messages),
+            "tokens": self.tokens,
+            "summary_tokens": estimate_tokens(self.summary),
+            "summarized": self.summarized,
+            "dropped": self.dropped,
+        }
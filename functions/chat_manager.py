@@ -1,49 +1,93 @@
 # functions/chat_manager.py
-from google import genai
-from google.genai import types
+from functions.chat_history import ChatHistory, estimate_tokens
+from functions.llm_client import DEFAULT_MODEL, get_llm
+
+
+def _config(system_prompt):
+    from google.genai import types
+
+    return types.GenerateContentConfig(system_instruction=system_prompt)
+
 
 class ChatManager:
-    def __init__(self, api_key: str, system_prompt: str, model="gemini-2.0-flash-001", keep_history=True):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key: str, system_prompt: str, model=DEFAULT_MODEL, keep_history=True,
+                 max_history_tokens=2000, keep_recent=6, history_policy="summarize"):
+        self.client = get_llm(api_key)
         self.system_prompt = system_prompt
         self.model = model
         self.keep_history = keep_history
-        self.messages = []  # conversation history
+        # conversation history, kept under max_history_tokens (see ChatHistory)
+        self.history = ChatHistory(max_history_tokens, keep_recent, history_policy)
+        # estimated tokens of the requests sent by ask, system prompt included: running totals,
+        # so that a long session keeps no per-turn list
+        self.payloads = 0
+        self.payload_tokens = 0
+        self.max_payload_tokens = 0
+        self.last_payload_tokens = 0
 
         # Configuration for the model
-        self.config = types.GenerateContentConfig(
-            system_instruction=self.system_prompt
-        )
+        self.config = _config(self.system_prompt)
+
+    @property
+    def messages(self):
+        """The conversation history as sent to the model."""
+        return self.history.contents()
 
     def add_message(self, role: str, text: str):
         """Adds a message to the chat history."""
-        msg = types.Content(role=role, parts=[types.Part(text=text)])
-        self.messages.append(msg)
-
         # If we don’t want history, only keep the latest user message
         if not self.keep_history and role == "user":
-            self.messages = [msg]
+            self.history.clear()
+        self.history.append(role, text)
+
+    def _count_payload(self):
+        tokens = estimate_tokens(self.system_prompt) + self.history.payload_tokens()
+        self.payloads += 1
+        self.payload_tokens += tokens
+        self.max_payload_tokens = max(self.max_payload_tokens, tokens)
+        self.last_payload_tokens = tokens
+
+    def payload_stats(self) -> dict:
+        """The number of chat requests and their estimated tokens: mean, max and total."""
+        return {
+            "requests": self.payloads,
+            "mean_tokens": self.payload_tokens / self.payloads if self.payloads else 0.0,
+            "max_tokens": self.max_payload_tokens,
+            "total_tokens": self.payload_tokens,
+        }
 
     def ask(self, prompt: str):
         """Send the user's prompt to Gemini and return the model's response."""
         self.add_message("user", prompt)
 
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=self.messages,
-            config=self.config
-        )
+        self._count_payload()
+        reply_text = self.client.generate(self.history.contents(), self.config, model=self.model, purpose="chat")
 
-        if response is None or not response.candidates:
+        if reply_text is None:
             return "⚠️ No valid response from model."
 
-        reply_text = response.candidates[0].content.parts[0].text
-
         # Add the assistant’s reply to history
         self.add_message("assistant", reply_text)
         return reply_text
 
+    def ask_stream(self, prompt: str):
+        """Like ask, but yields the reply in chunks as they arrive; the whole reply is added to history."""
+        self.add_message("user", prompt)
+
+        self._count_payload()
+        chunks = []
+        for chunk in self.client.generate_stream(self.history.contents(), self.config, model=self.model, purpose="chat"):
+            chunks.append(chunk)
+            yield chunk
+
+        if not chunks:
+            yield "⚠️ No valid response from model."
+            return
+
+        # Add the assistant’s reply to history
+        self.add_message("assistant", "".join(chunks))
+
     def add_dynamic_system_prompt(self, new_instruction: str):
         """Updates the system instruction dynamically."""
         self.system_prompt += "\n" + new_instruction
-        self.config = types.GenerateContentConfig(system_instruction=self.system_prompt)
+        self.config = _config(self.system_prompt)
@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functions.llm_client import LLMClient
+
+KINDS = ("llm", "kg")
+
+
+class Limits:
+    """
+    The number of LLM and GraphDB calls that may run at the same time (None for no limit),
+    with the number of calls that had to wait for a slot and the time they waited.
+    """
+
+    def __init__(self, llm=None, kg=None):
+        self.semaphores = {
+            kind: threading.BoundedSemaphore(limit) if limit else None for kind, limit in zip(KINDS, (llm, kg))
+        }
+        self.limits = dict(zip(KINDS, (llm, kg)))
+        self.lock = threading.Lock()
+        self.waits = {kind: 0 for kind in KINDS}
+        self.wait_time = {kind: 0.0 for kind in KINDS}
+
+    def acquire(self, kind):
+        semaphore = self.semaphores[kind]
+        if semaphore is None:
+            return
+        if semaphore.acquire(blocking=False):
+            return
+        start = time.perf_counter()
+        semaphore.acquire()
+        with self.lock:
+            self.waits[kind] += 1
+            self.wait_time[kind] += time.perf_counter() - start
+
+    def release(self, kind):
+        if self.semaphores[kind] is not None:
+            self.semaphores[kind].release()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {kind: {"limit": self.limits[kind], "waits": self.waits[kind], "wait_s": self.wait_time[kind]}
+                    for kind in KINDS}
+
+
+# limits of the whole process, and of the session the current code runs for
+_global_limits = Limits()
+session_limits = contextvars.ContextVar("session_limits", default=None)
+
+
+def set_global_limits(limits: Limits):
+    global _global_limits
+    _global_limits = limits
+
+
+def global_limits() -> Limits:
+    return _global_limits
+
+
+@contextmanager
+def slot(kind: str):
+    """
+    Holds an LLM ("llm") or GraphDB ("kg") call slot of the current session and of the process.
+    The session's slot is taken first, so a session waiting on its own limit doesn't hold a
+    global slot that other sessions could use.
+    """
+    session = session_limits.get()
+    process = _global_limits
+    if session is not None:
+        session.acquire(kind)
+    try:
+        process.acquire(kind)
+        try:
+            yield
+        finally:
+            process.release(kind)
+    finally:
+        if session is not None:
+            session.release(kind)
+
+
+class LimitedClient(LLMClient):
+    """Wraps the shared LLM client so that every call holds an "llm" slot (see slot)."""
+
+    def __init__(self, client: LLMClient):
+        super().__init__()
+        self.client = client
+
+    def _generate(self, contents, config, model):
+        with slot("llm"):
+            return self.client._generate(contents, config, model)
+
+    def _generate_stream(self, contents, config, model):
+        with slot("llm"):
+            yield from self.client._generate_stream(contents, config, model)
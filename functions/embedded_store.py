@@ -0,0 +1,129 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from rdflib import BNode, Graph, Literal
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.util import guess_format
+from functions.execute_query import EMBEDDED_SCHEME, QueryBackend
+from functions.ontology_store import read_graph_cache, write_graph_cache
+from functions.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# parsed queries kept per store, most of the generated queries come back (retries, cached questions)
+MAX_PREPARED = 256
+
+
+def term_binding(term) -> dict:
+    """The SPARQL JSON form of an rdflib term, as GraphDB writes it."""
+    if isinstance(term, Literal):
+        binding = {"type": "literal", "value": str(term)}
+        if term.language:
+            binding["xml:lang"] = term.language
+        elif term.datatype is not None:
+            binding["datatype"] = str(term.datatype)
+        return binding
+    if isinstance(term, BNode):
+        return {"type": "bnode", "value": str(term)}
+    return {"type": "uri", "value": str(term)}
+
+
+def _cache_file(cache_dir: str, paths) -> str:
+    digest = hashlib.sha1("\n".join(paths).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"embedded-{digest}.pickle")
+
+
+def load_graph(paths, cache_dir: str = None) -> Graph:
+    """
+    Parses the RDF files into one graph. If cache_dir is given, the graph is pickled there
+    and the next process loads the pickle instead, as long as none of the files changed.
+    """
+    paths = tuple(os.path.abspath(path) for path in paths)
+    mtimes = tuple(os.stat(path).st_mtime_ns for path in paths)
+    cache_file = _cache_file(cache_dir, paths) if cache_dir else None
+    graph = read_graph_cache(cache_file, paths, mtimes) if cache_file else None
+    if graph is None:
+        graph = Graph()
+        for path in paths:
+            graph.parse(path, format=guess_format(path) or "turtle")
+        if cache_file:
+            write_graph_cache(cache_file, paths, mtimes, graph)
+    return graph
+
+
+class EmbeddedStore(QueryBackend):
+    """
+    The KG held in process: queries are answered by rdflib on an in-memory graph, without
+    the HTTP round trip and the JSON encoding and decoding of an endpoint. The bindings have
+    the same shape as GraphDB's, so the rest of the pipeline doesn't know the difference.
+    Use it for read-mostly data small enough to fit in memory; GraphDB stays the backend
+    for the full KG.
+    """
+
+    def __init__(self, graph: Graph, max_prepared=MAX_PREPARED):
+        self.graph = graph
+        self.max_prepared = max_prepared
+        self._prepared = OrderedDict()
+        # rdflib's query engine isn't meant to be used from several threads at once
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.prepared_hits = 0
+        self.errors = 0
+
+    @classmethod
+    def from_files(cls, paths, cache_dir: str = None, **kwargs) -> "EmbeddedStore":
+        return cls(load_graph(paths, cache_dir), **kwargs)
+
+    @classmethod
+    def from_url(cls, url: str, cache_dir: str = None, **kwargs) -> "EmbeddedStore":
+        """Store for an "embedded:" url, e.g. embedded:ontology/ontology_export.ttl,data/kg.ttl"""
+        paths = [path for path in url[len(EMBEDDED_SCHEME):].split(",") if path]
+        if not paths:
+            raise ValueError(f"No RDF files in {url!r}")
+        return cls.from_files(paths, cache_dir, **kwargs)
+
+    def _prepare(self, query):
+        prepared = self._prepared.get(query)
+        if prepared is not None:
+            self._prepared.move_to_end(query)
+            self.prepared_hits += 1
+            return prepared
+        prepared = prepareQuery(query)
+        self._prepared[query] = prepared
+        if len(self._prepared) > self.max_prepared:
+            self._prepared.popitem(last=False)
+        return prepared
+
+    def query_stream(self, query, limit=None, format="json"):
+        """
+        Yields the bindings of the query, at most limit of them. The result is computed under
+        the lock before the first binding is yielded, format is ignored.
+        """
+        try:
+            with self.lock:
+                self.queries += 1
+                result = self.graph.query(self._prepare(query))
+                if result.type != "SELECT":
+                    return
+                variables = [str(var) for var in result.vars]
+                rows = list(itertools.islice(result, limit))
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            logger.error("Error querying the embedded store: %s", e)
+            return
+        current_span().set(backend="embedded")
+        for row in rows:
+            yield {var: term_binding(term) for var, term in zip(variables, row) if term is not None}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "triples": len(self.graph),
+                "queries": self.queries,
+                "prepared_hits": self.prepared_hits,
+                "errors": self.errors,
+            }
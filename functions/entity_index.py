@@ -0,0 +1,371 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from functions.execute_query import execute_sparql
+from functions.text_utils import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+ONTOLOGY_PREFIX = "http://semanticweb.org/unitedOntology#"
+# the kinds of KG resources users mention by name
+ENTITY_CLASSES = ("Team", "Player", "Coach", "Stadium", "Referee")
+PEOPLE = {"Player", "Coach", "Referee"}
+
+ENTITIES_QUERY = f"""
+PREFIX : <{ONTOLOGY_PREFIX}>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT ?entity ?label ?type ?code ?team WHERE {{
+    VALUES ?type {{ {" ".join(":" + name for name in ENTITY_CLASSES)} }}
+    ?entity a ?type ; rdfs:label ?label .
+    OPTIONAL {{ ?entity :teamHasCode ?code }}
+    OPTIONAL {{ ?entity :playsFor|:coachesTeam ?club . ?club rdfs:label ?team }}
+}}
+"""
+
+# what fans call the clubs, by the local name of the team
+TEAM_ALIASES = {
+    "Arsenal": ["Gunners", "The Arsenal"],
+    "Aston_Villa": ["Villa", "Villans"],
+    "Bournemouth": ["Cherries", "AFC Bournemouth"],
+    "Brentford": ["Bees"],
+    "Brighton": ["Seagulls", "Brighton and Hove Albion", "Brighton & Hove Albion"],
+    "Burnley": ["Clarets"],
+    "Chelsea": ["Blues", "CFC"],
+    "Crystal_Palace": ["Palace", "Eagles"],
+    "Everton": ["Toffees"],
+    "Fulham": ["Cottagers"],
+    "Leeds_United": ["Leeds"],
+    "Liverpool": ["Reds", "LFC", "Pool"],
+    "Manchester_City": ["Man City", "City", "Man C", "MCFC", "Citizens"],
+    "Manchester_United": ["Man Utd", "Man United", "Man U", "United", "MUFC", "Red Devils"],
+    "Newcastle_United": ["Newcastle", "Magpies", "Toon", "NUFC"],
+    "Nottingham_Forest": ["Forest", "Nottm Forest", "Notts Forest"],
+    "Sunderland": ["Black Cats"],
+    "Tottenham": ["Spurs", "Tottenham Hotspur", "THFC"],
+    "West_Ham": ["Hammers", "West Ham United", "Irons"],
+    "Wolves": ["Wolverhampton", "Wolverhampton Wanderers"],
+}
+
+WORD_RE = re.compile(r"[^\W_]+")
+# typos allowed in a fuzzy match, by the length of the name
+FUZZY_DISTANCES = ((8, 2), (4, 1))
+# a fuzzy match of words of a question needs this share of their letters right, "Home" isn't Howe
+MIN_FUZZY_SIMILARITY = 0.8
+# a prefix match needs this many letters, and this share of the shortest name it completes:
+# "Stadium" doesn't name the Stadium of Light
+MIN_PREFIX_LENGTH = 4
+MIN_PREFIX_SHARE = 0.5
+# the end of a sentence, after which a capital says nothing about a name
+SENTENCE_END_RE = re.compile(r"[.!?]")
+MAX_CANDIDATES = 3
+
+
+def alias_terms(aliases=TEAM_ALIASES) -> set:
+    """The words of the team names and aliases, the name_terms of the clubs without the KG."""
+    names = [local_name.replace("_", " ") for local_name in aliases] + [name for names in aliases.values() for name in names]
+    return {word for name in names for word in WORD_RE.findall(normalize_name(name))
+            if word not in STOPWORDS and len(word) > 1}
+
+
+def normalize_name(name: str) -> str:
+    """Lower case, accents and punctuation removed: "Martin Ødegaard" -> "martin odegaard"."""
+    name = unicodedata.normalize("NFKD", name.replace("ø", "o").replace("Ø", "O"))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(WORD_RE.findall(name.lower()))
+
+
+class Entity:
+    """A KG resource users mention by name: its IRI, label, class and team (for people)."""
+
+    __slots__ = ("iri", "label", "kind", "team")
+
+    def __init__(self, iri: str, label: str, kind: str, team: str = None):
+        self.iri = iri
+        self.label = label
+        self.kind = kind
+        self.team = team
+
+    @property
+    def name(self) -> str:
+        """The IRI as the generator writes it, :Manchester_United"""
+        return ":" + self.iri[len(ONTOLOGY_PREFIX):] if self.iri.startswith(ONTOLOGY_PREFIX) else f"<{self.iri}>"
+
+    def __repr__(self):
+        return f"Entity({self.name})"
+
+
+class Mention:
+    """Words of a question that name entities: the text, its offsets, the candidates and how they were found."""
+
+    __slots__ = ("text", "start", "end", "entities", "match")
+
+    def __init__(self, text, start, end, entities, match):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.entities = entities
+        # "exact", "fuzzy" or "prefix"
+        self.match = match
+
+    def __repr__(self):
+        return f"Mention({self.text!r} -> {', '.join(entity.name for entity in self.entities)}, {self.match})"
+
+
+class _Node:
+    __slots__ = ("children", "entities")
+
+    def __init__(self):
+        self.children = {}
+        # (entity, strict) of the aliases that end here
+        self.entities = None
+
+
+class EntityIndex:
+    """
+    Names, labels and aliases of the teams, players, coaches, stadiums and referees of the KG,
+    in a dict for exact lookups and a character trie for prefix and fuzzy lookups (Levenshtein
+    distance, computed one trie level at a time so that whole subtrees are pruned).
+    resolve finds the entities a question mentions, so that their IRIs can be given to the
+    generator instead of leaving it to guess them.
+    Single-word aliases that aren't a full label (surnames, first names, nicknames like
+    "United") only count when they are capitalized in the question. The first word of a
+    sentence is capitalized anyway, so it is only matched exactly, never fuzzy or by prefix.
+    """
+
+    def __init__(self):
+        self.entities = {}
+        self.exact = {}
+        self.root = _Node()
+        self.max_words = 1
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.resolved = 0
+        self.lookup_time = 0.0
+
+    @classmethod
+    def from_kg(cls, graphdb_url: str, aliases=TEAM_ALIASES) -> "EntityIndex":
+        """Index of the entities of the KG at graphdb_url, with aliases (local name -> names) added."""
+        index = cls()
+        start = time.perf_counter()
+        rows = execute_sparql(graphdb_url, ENTITIES_QUERY)
+        if not rows:
+            logger.warning("No entities found in the KG, names in the questions won't be resolved")
+        for row in rows:
+            index.add(
+                row["entity"]["value"],
+                row["label"]["value"],
+                row["type"]["value"].rsplit("#", 1)[-1],
+                code=row.get("code", {}).get("value"),
+                team=row.get("team", {}).get("value"),
+            )
+        for local_name, names in aliases.items():
+            entity = index.entities.get(ONTOLOGY_PREFIX + local_name)
+            if entity is not None:
+                for name in names:
+                    index.add_alias(name, entity)
+        logger.info("Entity index: %d entities, %d names in %.2fs",
+                    len(index.entities), len(index.exact), time.perf_counter() - start)
+        return index
+
+    def add(self, iri, label, kind, code=None, team=None) -> Entity:
+        """Adds an entity under its label, its code and, for people, their first and last names."""
+        entity = self.entities.get(iri)
+        if entity is None:
+            entity = Entity(iri, label, kind, team)
+            self.entities[iri] = entity
+        self.add_alias(label, entity, strict=False)
+        if code:
+            self.add_alias(code, entity)
+        words = label.split()
+        if kind in PEOPLE and len(words) > 1 and not any(word.isdigit() for word in words):
+            self.add_alias(words[0], entity)
+            self.add_alias(words[-1], entity)
+            # van Dijk, de Bruyne
+            if words[-2].islower():
+                self.add_alias(" ".join(words[-2:]), entity, strict=False)
+        return entity
+
+    def add_alias(self, name, entity, strict=None):
+        """strict aliases need a capital in the question; by default the single-word ones are."""
+        key = normalize_name(name)
+        if not key:
+            return
+        if strict is None:
+            strict = " " not in key
+        candidates = self.exact.setdefault(key, [])
+        for i, (known, known_strict) in enumerate(candidates):
+            if known is entity:
+                candidates[i] = (entity, known_strict and strict)
+                break
+        else:
+            candidates.append((entity, strict))
+        self.max_words = max(self.max_words, key.count(" ") + 1)
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.entities = candidates
+
+    # lookups
+    def lookup(self, name: str) -> list:
+        """The entities with exactly this name (case, accents and punctuation ignored)."""
+        return [entity for entity, _ in self.exact.get(normalize_name(name), ())]
+
+    def complete(self, prefix: str, limit=10) -> list:
+        """The entities with a name starting with prefix, shortest names first."""
+        return self._complete(normalize_name(prefix), limit)[0]
+
+    def _complete(self, key, limit):
+        """The completions of the normalized key and the length of the shortest name among them."""
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return [], 0
+        found = []
+        shortest = 0
+        length = len(key)
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for node in level:
+                for entity, _ in node.entities or ():
+                    if entity not in found:
+                        found.append(entity)
+                        shortest = shortest or length
+                next_level.extend(node.children.values())
+            level = next_level
+            length += 1
+        return found[:limit], shortest
+
+    def fuzzy(self, name: str, max_distance: int = None, anchored=False) -> list:
+        """
+        (distance, entity) of the names within max_distance edits of name, closest first.
+        An edit is an insertion, a deletion, a substitution or two letters swapped (Mbuemo).
+        With anchored, only the names with the same first letter are searched, a small part
+        of the trie: people rarely get the first letter of a name wrong.
+        """
+        key = normalize_name(name)
+        if max_distance is None:
+            max_distance = next((d for length, d in FUZZY_DISTANCES if len(key) >= length), 0)
+        found = {}
+        first_row = list(range(len(key) + 1))
+        # a row of the edit distance matrix per trie node, from the row of its parent
+        children = self.root.children
+        if anchored:
+            children = {key[:1]: children[key[:1]]} if key[:1] in children else {}
+        stack = [(child, char, first_row, None, None) for char, child in children.items()]
+        while stack:
+            node, char, previous, before, previous_char = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                cost = min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (key[i - 1] != char))
+                if i > 1 and before is not None and key[i - 1] == previous_char and key[i - 2] == char:
+                    cost = min(cost, before[i - 2] + 1)
+                row.append(cost)
+            if node.entities and row[-1] <= max_distance:
+                for entity, _ in node.entities:
+                    if row[-1] < found.get(entity, max_distance + 1):
+                        found[entity] = row[-1]
+            if min(row) <= max_distance:
+                stack.extend((child, next_char, row, previous, char) for next_char, child in node.children.items())
+        return sorted(((distance, entity) for entity, distance in found.items()), key=lambda item: (item[0], item[1].label))
+
+    def resolve(self, question: str) -> list:
+        """
+        The Mentions of the question: the longest runs of words that are a name, then the
+        capitalized words within a typo or two of a name, then those that start only one name.
+        """
+        start = time.perf_counter()
+        words = [(m.group(), m.start(), m.end()) for m in WORD_RE.finditer(question)]
+        keys = [normalize_name(word) for word, _, _ in words]
+        mentions = []
+        i = 0
+        while i < len(words):
+            mention = self._match(question, words, keys, i)
+            if mention is None:
+                i += 1
+                continue
+            mentions.append(mention)
+            i = mention[1]
+        with self.lock:
+            self.lookups += 1
+            self.resolved += len(mentions)
+            self.lookup_time += time.perf_counter() - start
+        return [mention for mention, _ in mentions]
+
+    def _match(self, question, words, keys, i):
+        """The mention starting at word i and the index of the word after it, or None."""
+        capitalized = words[i][0][:1].isupper()
+        first = i == 0 or SENTENCE_END_RE.search(question, words[i - 1][2], words[i][1]) is not None
+        proper = capitalized and not first and keys[i] not in STOPWORDS and len(keys[i]) >= 4
+        for n in range(min(self.max_words, len(words) - i), 0, -1):
+            candidates = self.exact.get(" ".join(keys[i:i + n]))
+            if candidates:
+                entities = [entity for entity, strict in candidates if not strict or capitalized]
+                if entities:
+                    return self._mention(question, words, i, n, entities, "exact"), i + n
+            if n == 2 and proper and words[i + 1][0][:1].isupper():
+                # "Bruno Fernandez" is Bruno Fernandes rather than Bruno and Enzo Fernandez
+                mention = self._fuzzy(question, words, keys, i, n)
+                if mention is not None:
+                    return mention, i + n
+        if not proper:
+            return None
+        mention = self._fuzzy(question, words, keys, i, 1)
+        if mention is not None:
+            return mention, i + 1
+        completions, shortest = self._complete(keys[i], limit=2)
+        if len(completions) == 1 and len(keys[i]) >= max(MIN_PREFIX_LENGTH, MIN_PREFIX_SHARE * shortest):
+            return self._mention(question, words, i, 1, completions, "prefix"), i + 1
+        return None
+
+    def _fuzzy(self, question, words, keys, i, n):
+        key = " ".join(keys[i:i + n])
+        matches = self.fuzzy(key, anchored=True)
+        if not matches:
+            return None
+        best = matches[0][0]
+        if best > (1 - MIN_FUZZY_SIMILARITY) * len(key):
+            return None
+        return self._mention(question, words, i, n, [entity for distance, entity in matches if distance == best], "fuzzy")
+
+    @staticmethod
+    def _mention(question, words, i, n, entities, match):
+        start, end = words[i][1], words[i + n - 1][2]
+        # teams and people before stadiums
+        entities = sorted(entities, key=lambda entity: entity.kind not in PEOPLE and entity.kind != "Team")
+        return Mention(question[start:end], start, end, entities[:MAX_CANDIDATES], match)
+
+    def name_terms(self, kinds=("Team", "Player")) -> set:
+        """
+        The words of the names and aliases of the entities of kinds, e.g. the entity_terms of a
+        QuestionCache, so that a question about Arsenal isn't given the query about Chelsea.
+        """
+        with self.lock:
+            names = [name for name, candidates in self.exact.items()
+                     if any(entity.kind in kinds for entity, _ in candidates)]
+        return {word for name in names for word in WORD_RE.findall(name)
+                if word not in STOPWORDS and len(word) > 1 and not word.isdigit()}
+
+    def stats(self) -> dict:
+        return {
+            "entities": len(self.entities),
+            "names": len(self.exact),
+            "questions": self.lookups,
+            "mentions": self.resolved,
+            "mean_ms": self.lookup_time / self.lookups * 1000 if self.lookups else 0.0,
+        }
+
+
+def format_mentions(mentions) -> str:
+    """The prompt lines for the resolved mentions, e.g. - "Man Utd": :Manchester_United (Team)"""
+    lines = []
+    for mention in mentions:
+        options = []
+        for entity in mention.entities:
+            details = entity.kind if entity.team is None else f"{entity.kind}, {entity.team}"
+            options.append(f"{entity.name} ({details})")
+        lines.append(f'- "{mention.text}": {" or ".join(options)}')
+    return "\n".join(lines)
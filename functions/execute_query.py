@@ -1,29 +1,233 @@
+import asyncio
+import codecs
+import itertools
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from functions.sparql_results import RESULT_FORMATS
+from functions.tracing import current_span
 
-def execute_sparql(url, query):
-    
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'Accept': 'application/sparql-results+json',
+    'Content-Type': 'application/sparql-query',
+}
+STREAM_CHUNK_SIZE = 64 * 1024
+# GraphDB answers with these when it is overloaded or restarting, so they are retried
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class QueryBackend:
     """
-    Function that takes a triplestore url and a sparql query and executes the query
+    Where execute_sparql sends its queries. Backends implement query_stream, which yields the
+    bindings as SPARQL JSON binding dicts ({"var": {"type": "uri", "value": ...}}), and log
+    and swallow their errors: a failed query has no bindings.
     """
-    headers = {
-        'Accept': 'application/sparql-results+json',
-        'Content-Type': 'application/sparql-query',
-    }
-    data = {
-        'query': query
-    }
-    try:
-        response = requests.post(url, data=query.encode('utf-8'), headers=headers)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Error querying GraphDB: {e}")
-        return []
-    
+
+    def query(self, query):
+        """Executes the query and returns its bindings, or [] if it failed."""
+        return list(self.query_stream(query))
+
+    def query_stream(self, query, limit=None, format="json"):
+        """Yields at most limit bindings of the query; format is a hint for remote backends."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SparqlClient(QueryBackend):
+    """
+    Client for a SPARQL endpoint that keeps its connections alive between queries.
+    Requests time out after connect_timeout/read_timeout seconds, and 5xx answers and
+    connection errors are retried up to max_retries times with exponential backoff. A read
+    timeout isn't: the query reached GraphDB, and sending a slow query again only adds load.
+    """
+
+    def __init__(self, url, connect_timeout=3.05, read_timeout=30, max_retries=2, backoff=0.5, pool_size=10):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            other=0,
+            status=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def query(self, query):
+        """Executes the query and returns its bindings, or [] if it failed."""
+        try:
+            response = self.session.post(self.url, data=query.encode('utf-8'), timeout=self.timeout)
+            _record_retries(response)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Error querying GraphDB: %s", e)
+            return []
+        return _bindings(response)
+
+    def query_stream(self, query, limit=None, format="json"):
+        """
+        Executes the query and yields its bindings while the response is still being read,
+        so that large results are never held in memory. At most limit bindings are yielded,
+        the rest of the response isn't downloaded. format is one of RESULT_FORMATS.
+        """
+        accept, parser = RESULT_FORMATS[format]
+        try:
+            response = self.session.post(
+                self.url,
+                data=query.encode('utf-8'),
+                headers={'Accept': accept},
+                timeout=self.timeout,
+                stream=True,
+            )
+            _record_retries(response)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Error querying GraphDB: %s", e)
+            return
+        with response:
+            chunks = codecs.iterdecode(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), "utf-8")
+            try:
+                yield from itertools.islice(parser(chunks), limit)
+            except requests.exceptions.RequestException as e:
+                logger.error("Error reading the GraphDB response: %s", e)
+            except ValueError:
+                logger.error("Error decoding the response from SPARQL endpoint.")
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncSparqlClient:
+    """
+    asyncio version of SparqlClient on top of httpx, so that many queries can be in
+    flight at the same time over at most pool_size connections. Like SparqlClient, it
+    retries 5xx answers and failed connections, not read timeouts or other transport errors.
+    """
+
+    def __init__(self, url, connect_timeout=3.05, read_timeout=30, max_retries=2, backoff=0.5, pool_size=10):
+        import httpx
+
+        self._httpx = httpx
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def query(self, query):
+        """Executes the query and returns its bindings, or [] if it failed."""
+        httpx = self._httpx
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.post(self.url, content=query.encode('utf-8'))
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt == self.max_retries:
+                    logger.error("Error querying GraphDB: %s", e)
+                    return []
+            except httpx.TransportError as e:
+                logger.error("Error querying GraphDB: %s", e)
+                return []
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+            current_span().add("http_retries")
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.error("Error querying GraphDB: %s", e)
+            return []
+        return _bindings(response)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class _MissingEndpoint(QueryBackend):
+    """The backend of an unset endpoint URL (no GRAPH_DB_ENDPOINT): every query fails, and is logged."""
+
+    def query_stream(self, query, limit=None, format="json"):
+        logger.error("Error querying GraphDB: no endpoint URL, set GRAPH_DB_ENDPOINT")
+        return iter(())
+
+
+def _record_retries(response):
+    """Adds the requests urllib3 retried (5xx answers, connection errors) to the current span."""
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        current_span().add("http_retries", len(retries.history))
+
+
+def _bindings(response):
     try:
         results = response.json()
     except ValueError:
-        print("Error decoding JSON response from SPARQL endpoint.")
+        logger.error("Error decoding JSON response from SPARQL endpoint.")
         return []
     bindings = results.get("results", {}).get("bindings", [])
     return bindings
 
+
+# one client per endpoint, shared by every execute_sparql call
+_clients = {}
+_clients_lock = threading.Lock()
+# "embedded:a.ttl,b.ttl" is the KG held in process (see embedded_store.EmbeddedStore)
+EMBEDDED_SCHEME = "embedded:"
+
+
+def get_client(url) -> QueryBackend:
+    """Returns the shared backend of an endpoint, creating it on first use."""
+    if not url:
+        return _MissingEndpoint()
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            if url.startswith(EMBEDDED_SCHEME):
+                from functions.embedded_store import EmbeddedStore
+
+                client = EmbeddedStore.from_url(url)
+            else:
+                client = SparqlClient(url)
+            _clients[url] = client
+        return client
+
+
+def set_backend(url, backend: QueryBackend):
+    """Makes execute_sparql send the queries for url to backend, e.g. an EmbeddedStore loaded at startup."""
+    with _clients_lock:
+        previous = _clients.get(url)
+        _clients[url] = backend
+    if previous is not None and previous is not backend:
+        previous.close()
+
+
+def execute_sparql(url, query):
+
+    """
+    Function that takes a triplestore url and a sparql query and executes the query
+    """
+    return get_client(url).query(query)
+
+
+def execute_sparql_stream(url, query, limit=None, format="json"):
+    """
+    Like execute_sparql, but yields the bindings as they are parsed and stops after limit rows.
+    """
+    return get_client(url).query_stream(query, limit, format)
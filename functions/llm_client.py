@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import defaultdict
+from functions.tracing import tracer
+
+DEFAULT_MODEL = "gemini-2.0-flash-001"
+
+
+class LLMClient:
+    """
+    Interface of the language model used by the router, the generator, beautify and the chat.
+    Backends implement _generate; generate records the latency and token counts of every call,
+    grouped by purpose ("router", "generate", "beautify", "chat", ...).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = defaultdict(lambda: {
+            "calls": 0, "seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0, "streams": 0, "first_token_seconds": 0.0,
+        })
+
+    def generate(self, contents, config=None, model=DEFAULT_MODEL, purpose="other"):
+        """Returns the text of the model's answer to contents, or None if there is no answer."""
+        with tracer.span(f"llm.{purpose}", model=model) as span:
+            start = time.perf_counter()
+            text, prompt_tokens, output_tokens = self._generate(contents, config, model)
+            self._record(purpose, time.perf_counter() - start, prompt_tokens, output_tokens)
+            span.set(prompt_tokens=prompt_tokens or 0, output_tokens=output_tokens or 0)
+        return text
+
+    def generate_stream(self, contents, config=None, model=DEFAULT_MODEL, purpose="other"):
+        """
+        Yields the text of the model's answer in chunks as they arrive. The time to the first
+        chunk is recorded separately from the time of the whole answer.
+        """
+        start = time.perf_counter()
+        first_token = None
+        prompt_tokens = output_tokens = 0
+        # the consumer runs between the chunks, so the span isn't made the current one
+        with tracer.span(f"llm.{purpose}", current=False, model=model, stream=True) as span:
+            try:
+                for text, prompt_tokens, output_tokens in self._generate_stream(contents, config, model):
+                    if not text:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    yield text
+            finally:
+                seconds = time.perf_counter() - start
+                first_token = first_token if first_token is not None else seconds
+                self._record(purpose, seconds, prompt_tokens, output_tokens, first_token)
+                span.set(prompt_tokens=prompt_tokens or 0, output_tokens=output_tokens or 0,
+                         first_token_ms=first_token * 1000)
+
+    def _generate(self, contents, config, model):
+        """Returns (text or None, prompt tokens, output tokens)."""
+        raise NotImplementedError
+
+    def _generate_stream(self, contents, config, model):
+        """Yields (text chunk, prompt tokens, output tokens so far); by default one chunk."""
+        yield self._generate(contents, config, model)
+
+    def _record(self, purpose, seconds, prompt_tokens, output_tokens, first_token=None):
+        with self.lock:
+            stats = self.calls[purpose]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["output_tokens"] += output_tokens or 0
+            if first_token is not None:
+                stats["streams"] += 1
+                stats["first_token_seconds"] += first_token
+
+    def stats(self) -> dict:
+        """Calls, total latency and tokens per purpose."""
+        with self.lock:
+            return {purpose: dict(stats) for purpose, stats in self.calls.items()}
+
+
+class GeminiClient(LLMClient):
+    """Gemini through google-genai. The SDK client, and its HTTP connections, are created once."""
+
+    def __init__(self, api_key: str):
+        super().__init__()
+        from google import genai
+
+        self.client = genai.Client(api_key=api_key)
+
+    def _generate(self, contents, config, model):
+        response = self.client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config
+        )
+        usage = getattr(response, "usage_metadata", None) if response else None
+        prompt_tokens = usage.prompt_token_count if usage else 0
+        output_tokens = usage.candidates_token_count if usage else 0
+        if not response or not response.candidates:
+            return None, prompt_tokens, output_tokens
+        return response.candidates[0].content.parts[0].text, prompt_tokens, output_tokens
+
+    def _generate_stream(self, contents, config, model):
+        prompt_tokens = output_tokens = 0
+        for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                # the counts are cumulative, the last chunk has the totals
+                prompt_tokens = usage.prompt_token_count or prompt_tokens
+                output_tokens = usage.candidates_token_count or output_tokens
+            text = None
+            if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+                text = chunk.candidates[0].content.parts[0].text
+            yield text, prompt_tokens, output_tokens
+
+
+def _text_of(contents):
+    texts = []
+    for content in contents or []:
+        for part in content.parts or []:
+            if part.text:
+                texts.append(part.text)
+    return "\n".join(texts)
+
+
+class FakeClient(LLMClient):
+    """
+    Local stand-in for Gemini in tests and benchmarks. responder(prompt, system_instruction)
+    returns the answer text; every call waits delay seconds to imitate the network round-trip.
+    Tokens are counted as whitespace separated words. A streamed answer comes one word at a
+    time, chunk_delay seconds apart, after the delay.
+    """
+
+    def __init__(self, responder=None, delay=0.0, chunk_delay=0.0):
+        super().__init__()
+        self.responder = responder or (lambda prompt, system_instruction: "")
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+
+    def _answer(self, contents, config):
+        prompt = _text_of(contents)
+        system_instruction = getattr(config, "system_instruction", None) or ""
+        text = self.responder(prompt, system_instruction)
+        return text, len(prompt.split()) + len(str(system_instruction).split()), len((text or "").split())
+
+    def _generate(self, contents, config, model):
+        if self.delay:
+            time.sleep(self.delay)
+        text, prompt_tokens, output_tokens = self._answer(contents, config)
+        if text and self.chunk_delay:
+            # a blocking call returns once the model has written every chunk
+            time.sleep(self.chunk_delay * (len(text.split(" ")) - 1))
+        return text, prompt_tokens, output_tokens
+
+    def _generate_stream(self, contents, config, model):
+        if self.delay:
+            time.sleep(self.delay)
+        text, prompt_tokens, output_tokens = self._answer(contents, config)
+        for i, word in enumerate((text or "").split(" ")):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield (" " + word if i else word), prompt_tokens, i + 1
+
+
+# the client shared by every call site
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm(api_key: str = None) -> LLMClient:
+    """Returns the shared LLM client, creating a GeminiClient on first use."""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = GeminiClient(api_key)
+        return _llm
+
+
+def set_llm(client: LLMClient):
+    """Replaces the shared LLM client, e.g. with a FakeClient."""
+    global _llm
+    with _llm_lock:
+        _llm = client
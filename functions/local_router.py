@@ -0,0 +1,337 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from rdflib import OWL, RDF, RDFS
+from functions.ontology_store import load_ontology
+from functions.text_utils import STOPWORDS, _stem, normalize_question, split_label
+from functions.router import should_use_kg
+
+logger = logging.getLogger(__name__)
+
+# the clubs of the Premier League 25-26; the ontology has no team individuals
+TEAM_NAMES = (
+    "Arsenal", "Aston Villa", "Bournemouth", "Brentford", "Brighton", "Burnley", "Chelsea",
+    "Crystal Palace", "Everton", "Fulham", "Leeds United", "Liverpool", "Manchester City",
+    "Manchester United", "Newcastle United", "Nottingham Forest", "Sunderland", "Tottenham",
+    "West Ham", "Wolves",
+)
+# words of the ontology labels that say nothing about the question
+GENERIC_TERMS = {"has", "is", "in", "of", "for", "by", "human", "entry", "data", "creation", "url"}
+
+# labelled questions the model starts from, True when the KG is needed
+SEED_EXAMPLES = [
+    ("Who plays for Manchester United?", True),
+    ("How many goals did Bruno Fernandes score this season?", True),
+    ("Which player has the most assists?", True),
+    ("What was the result of the match in gameweek 3?", True),
+    ("Who is the coach of Arsenal?", True),
+    ("List the matches played at Old Trafford", True),
+    ("How many yellow cards did Casemiro get?", True),
+    ("Which team conceded the fewest goals?", True),
+    ("What is the capacity of the stadium of Liverpool?", True),
+    ("Who scored a penalty against Chelsea?", True),
+    ("What formation did City use in their last lineup?", True),
+    ("Show the league table", True),
+    ("How many minutes did the goalkeeper play?", True),
+    ("Who refereed the derby?", True),
+    ("Which players were in the starting lineup?", True),
+    ("What is the nationality of the top scorer?", True),
+    ("How tall is Haaland?", True),
+    ("Which team had the highest ball possession?", True),
+    ("How many own goals were scored?", True),
+    ("Who won the award for player of the month?", True),
+    ("Hi!", False),
+    ("Hello, how are you?", False),
+    ("Thanks a lot", False),
+    ("Tell me a joke", False),
+    ("What can you do?", False),
+    ("Who are you?", False),
+    ("Explain what the offside rule is", False),
+    ("What does a knowledge graph mean?", False),
+    ("Good morning", False),
+    ("Bye", False),
+    ("Can you help me?", False),
+    ("Why is football called the beautiful game?", False),
+    ("What is your name?", False),
+    ("Write a short poem about football", False),
+    ("Ok great", False),
+    ("What is the history of the sport?", False),
+    ("How does VAR work in general?", False),
+    ("Summarise what we talked about", False),
+    ("Translate that into Italian", False),
+    ("Are you a robot?", False),
+]
+# held-out labelled questions, never learned, that calibrate the thresholds of the local decisions
+CALIBRATION_EXAMPLES = [
+    ("Who scored the most goals for Chelsea?", True),
+    ("How many assists does Saka have?", True),
+    ("Which team is top of the league?", True),
+    ("What was the score of Arsenal against Liverpool?", True),
+    ("Who plays in goal for Everton?", True),
+    ("How many red cards has Tottenham received?", True),
+    ("Who is the manager of Manchester City?", True),
+    ("Which players scored in gameweek 5?", True),
+    ("How many points does Newcastle have?", True),
+    ("Who assisted the most goals this season?", True),
+    ("What is the height of Virgil van Dijk?", True),
+    ("Which stadium does Brentford play at?", True),
+    ("What position does Rice play?", True),
+    ("Who is Bruno Fernandes?", True),
+    ("Tell me about Bukayo Saka", True),
+    ("thanks", False),
+    ("Thank you!", False),
+    ("hello", False),
+    ("hey there", False),
+    ("cheers", False),
+    ("see you later", False),
+    ("Who won the World Cup in 2022?", False),
+    ("Who is the best player ever?", False),
+    ("Who is the coach of Real Madrid?", False),
+    ("How many Ballon d'Or has Messi won?", False),
+    ("What is the capital of France?", False),
+    ("Which country hosts the next World Cup?", False),
+    ("Who is the greatest goalkeeper of all time?", False),
+    ("Who plays for Barcelona?", False),
+    ("What are the rules of cricket?", False),
+    ("How old are you?", False),
+    ("What is the weather like today?", False),
+]
+# a local KG decision needs a team name or this many words of the ontology vocabulary: football
+# words alone ("player", "coach", "won") are in questions about other leagues too
+MIN_VOCAB_HITS = 2
+# the chat probability is never trusted above this, whatever the calibration
+MAX_CHAT_THRESHOLD = 0.5
+
+
+def ontology_vocabulary(ontology_path: str, cache_dir: str = None) -> set:
+    """
+    The stemmed words of the class and property labels and of the individuals of the ontology,
+    plus the team names, e.g. goal, assist, gameweek, yellow, card, united.
+    """
+    graph = load_ontology(ontology_path, cache_dir).graph
+    labels = set()
+    for kind in (OWL.Class, OWL.ObjectProperty, OWL.DatatypeProperty):
+        for subject in graph.subjects(RDF.type, kind):
+            label = graph.value(subject, RDFS.label)
+            labels.add(str(label) if label is not None else str(subject).rsplit("#", 1)[-1])
+    for subject in graph.subjects(RDF.type, OWL.NamedIndividual):
+        labels.add(str(subject).rsplit("#", 1)[-1])
+
+    vocabulary = set()
+    for label in labels:
+        for word in split_label(label):
+            if len(word) > 2 and word.isalpha() and word not in STOPWORDS and word not in GENERIC_TERMS:
+                vocabulary.add(_stem(word))
+    for team in TEAM_NAMES:
+        vocabulary.update(_stem(word) for word in normalize_question(team).split())
+    return vocabulary
+
+
+class LocalRouter:
+    """
+    Local stage in front of should_use_kg. A multinomial naive Bayes model over the words of the
+    question, plus features for words of the ontology vocabulary, team names and numbers, gives
+    the probability that the question needs the KG. decide answers locally only when the model
+    is confident and the features back it: KG with a probability >= threshold and a team name or
+    MIN_VOCAB_HITS ontology words, chat with a probability <= chat_threshold and no sign of the
+    KG at all (no ontology word, team or capitalised name, see chat_evidence);
+    otherwise it returns None and the LLM router is asked. The thresholds are calibrated on the
+    held-out calibration examples (see calibrate), threshold being the lowest KG threshold allowed.
+    The LLM's answers are learned, so the model improves while the chatbot runs; only the last
+    max_learned of them are kept (and saved to path), the older ones are forgotten by the model.
+    """
+
+    def __init__(self, vocabulary=(), examples=SEED_EXAMPLES, threshold=0.95, path=None, max_learned=1000,
+                 calibration=CALIBRATION_EXAMPLES):
+        self.vocabulary = set(vocabulary)
+        self.teams = {normalize_question(team) for team in TEAM_NAMES}
+        self.min_threshold = threshold
+        self.threshold = threshold
+        self.chat_threshold = 1 - threshold
+        self.path = path
+        self.max_learned = max_learned
+        self.lock = threading.Lock()
+        self.word_counts = {True: Counter(), False: Counter()}
+        self.totals = {True: 0, False: 0}
+        self.documents = {True: 0, False: 0}
+        self.known_features = set()
+        self.learned = deque()
+        self.local_kg = 0
+        self.local_chat = 0
+        self.fallbacks = 0
+        self.local_time = 0.0
+        for question, use_kg in examples:
+            self._learn(question, use_kg)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    learned = [(str(question), bool(use_kg)) for question, use_kg in json.load(f)[-max_learned:]]
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("Ignoring the learned router examples in %s: %s", path, e)
+                learned = []
+            for question, use_kg in learned:
+                self._learn(question, use_kg)
+                self.learned.append((question, use_kg))
+        if calibration:
+            self.calibrate(calibration)
+
+    @classmethod
+    def from_ontology(cls, ontology_path: str, cache_dir: str = None, **kwargs):
+        return cls(ontology_vocabulary(ontology_path, cache_dir), **kwargs)
+
+    def features(self, question: str) -> list:
+        normalized = normalize_question(question)
+        words = normalized.split()
+        features = [_stem(word) for word in words]
+        # the vocabulary features count once per hit, so several KG terms add up
+        features.extend("__vocab__" for word in features if word in self.vocabulary)
+        padded = f" {normalized} "
+        features.extend("__team__" for team in self.teams if f" {team} " in padded)
+        if any(word.isdigit() for word in words):
+            features.append("__number__")
+        return features
+
+    def _learn(self, question, use_kg):
+        features = self.features(question)
+        self.word_counts[use_kg].update(features)
+        self.totals[use_kg] += len(features)
+        self.documents[use_kg] += 1
+        self.known_features.update(features)
+
+    def _forget(self, question, use_kg):
+        features = self.features(question)
+        counts = self.word_counts[use_kg]
+        counts.subtract(features)
+        self.totals[use_kg] -= len(features)
+        self.documents[use_kg] -= 1
+        for feature in set(features):
+            if counts[feature] <= 0:
+                del counts[feature]
+                if feature not in self.word_counts[not use_kg]:
+                    self.known_features.discard(feature)
+
+    def learn(self, question: str, use_kg: bool):
+        """Adds a labelled question, e.g. the LLM router's answer, forgetting the oldest learned one past max_learned."""
+        with self.lock:
+            self._learn(question, use_kg)
+            self.learned.append((question, use_kg))
+            while len(self.learned) > self.max_learned:
+                self._forget(*self.learned.popleft())
+
+    @staticmethod
+    def kg_evidence(features) -> bool:
+        """True if the features name a team or enough ontology words for a local KG decision."""
+        return "__team__" in features or features.count("__vocab__") >= MIN_VOCAB_HITS
+
+    @staticmethod
+    def chat_evidence(question, features) -> bool:
+        """
+        True if nothing in the question points to the KG, for a local chat decision: no ontology
+        word, no team and no capitalised word but the first, e.g. a player ("Tell me about Saka").
+        """
+        if "__vocab__" in features or "__team__" in features:
+            return False
+        return not any(word[:1].isupper() and word != "I" for word in question.split()[1:])
+
+    def calibrate(self, examples=CALIBRATION_EXAMPLES, margin=0.01):
+        """
+        Sets the thresholds from held-out labelled questions: the lowest KG threshold (not below
+        min_threshold) and the highest chat threshold (not above MAX_CHAT_THRESHOLD) at which none
+        of them is decided the wrong way locally. Returns the two thresholds.
+        """
+        kg = [self.min_threshold]
+        chat = [MAX_CHAT_THRESHOLD]
+        for question, use_kg in examples:
+            features = self.features(question)
+            probability = self._probability(features)
+            if not use_kg and self.kg_evidence(features):
+                kg.append(min(probability + margin, 1.0 + margin))
+            elif use_kg and self.chat_evidence(question, features):
+                chat.append(probability - margin)
+        with self.lock:
+            self.threshold = max(kg)
+            self.chat_threshold = min(chat)
+        return self.threshold, self.chat_threshold
+
+    def probability(self, question: str) -> float:
+        """Probability that the question needs the KG."""
+        return self._probability(self.features(question))
+
+    def _probability(self, features) -> float:
+        with self.lock:
+            vocabulary_size = len(self.known_features) + 1
+            documents = self.documents[True] + self.documents[False]
+            scores = {}
+            for label in (True, False):
+                score = math.log((self.documents[label] + 1) / (documents + 2))
+                denominator = self.totals[label] + vocabulary_size
+                counts = self.word_counts[label]
+                for feature in features:
+                    score += math.log((counts.get(feature, 0) + 1) / denominator)
+                scores[label] = score
+        difference = scores[False] - scores[True]
+        if difference > 700:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(difference))
+
+    def decide(self, question: str):
+        """True or False if the model is confident, None if the LLM has to decide."""
+        start = time.perf_counter()
+        features = self.features(question)
+        probability = self._probability(features)
+        if probability >= self.threshold and self.kg_evidence(features):
+            decision = True
+        elif probability <= self.chat_threshold and self.chat_evidence(question, features):
+            decision = False
+        else:
+            decision = None
+        # the router is shared by the sessions of the server
+        with self.lock:
+            self.local_time += time.perf_counter() - start
+            if decision is True:
+                self.local_kg += 1
+            elif decision is False:
+                self.local_chat += 1
+            else:
+                self.fallbacks += 1
+        return decision
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            learned = list(self.learned)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(learned, f)
+
+    def stats(self) -> dict:
+        with self.lock:
+            local_kg, local_chat, fallbacks = self.local_kg, self.local_chat, self.fallbacks
+            local_time, learned = self.local_time, len(self.learned)
+        local = local_kg + local_chat
+        decisions = local + fallbacks
+        return {
+            "learned": learned,
+            "local_kg": local_kg,
+            "local_chat": local_chat,
+            "fallbacks": fallbacks,
+            # every local decision is a router call that didn't go to the LLM
+            "llm_calls_saved": local,
+            "local_rate": local / decisions if decisions else 0.0,
+            "mean_local_us": local_time / decisions * 1e6 if decisions else 0.0,
+        }
+
+
+def should_use_kg_routed(router: LocalRouter, api_key: str, question: str) -> bool:
+    """should_use_kg behind the local router; the LLM's answer on unsure questions is learned."""
+    use_kg = router.decide(question)
+    if use_kg is not None:
+        return use_kg
+    use_kg = should_use_kg(api_key, question)
+    router.learn(question, use_kg)
+    return use_kg
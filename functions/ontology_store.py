@@ -0,0 +1,117 @@
+import logging
+import os
+import pickle
+import threading
+from rdflib import Graph, URIRef, Dataset
+from functions.validation_engine import ValidationIndex
+
+logger = logging.getLogger(__name__)
+
+ONT_GRAPH = URIRef("http://example.org/ontology")
+
+# loaded ontologies, keyed by absolute path
+_ontologies = {}
+_ontologies_lock = threading.Lock()
+
+
+class Ontology:
+    """
+    A parsed ontology schema that is shared between validation calls.
+    Holds the ontology graph, a dataset that already contains it (so that each
+    validation only has to add and later remove its own query graph) and the
+    indexes used by the native validation engine.
+    """
+
+    def __init__(self, path: str, mtime: int, graph: Graph):
+        self.path = path
+        self.mtime = mtime
+        self.graph = graph
+        # the dataset is shared, so only one query graph may live in it at a time
+        self.lock = threading.Lock()
+        self._dataset = None
+        self._index = None
+
+    @property
+    def dataset(self) -> Dataset:
+        """Dataset holding the ontology graph, used by the SPARQL constraint queries."""
+        if self._dataset is None:
+            dataset = Dataset()
+            dataset.add_graph(self.graph)
+            dataset.default_graph = self.graph
+            self._dataset = dataset
+        return self._dataset
+
+    @property
+    def index(self) -> ValidationIndex:
+        """Domain, range and subclass indexes of the ontology, built on first use."""
+        if self._index is None:
+            self._index = ValidationIndex(self.graph)
+        return self._index
+
+
+def _cache_file(cache_dir: str, path: str) -> str:
+    name = os.path.basename(path)
+    return os.path.join(cache_dir, f"{name}.pickle")
+
+
+def read_graph_cache(cache_file: str, path, mtime):
+    """
+    Returns the pickled graph if the cache file belongs to this version of the source, the path
+    and mtime given to write_graph_cache (or tuples of them for a graph of several files).
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            cached_path, cached_mtime, graph = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if cached_path != path or cached_mtime != mtime:
+        return None
+    return graph
+
+
+def write_graph_cache(cache_file: str, path, mtime, graph: Graph):
+    """Pickles the graph with the path and mtime of its source, replacing the cache file atomically."""
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + ".tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            pickle.dump((path, mtime, graph), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning("Could not write graph cache %s: %s", cache_file, e)
+
+
+def load_ontology(path: str, cache_dir: str = None) -> Ontology:
+    """
+    Returns the ontology stored at path, parsing it only the first time it is requested
+    or when the file has been modified since.
+    If cache_dir is given, the parsed graph is also pickled there so that a fresh
+    process can skip parsing the turtle file.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+
+    with _ontologies_lock:
+        ontology = _ontologies.get(path)
+        if ontology is not None and ontology.mtime == mtime:
+            return ontology
+
+        graph = None
+        cache_file = _cache_file(cache_dir, path) if cache_dir else None
+        if cache_file:
+            graph = read_graph_cache(cache_file, path, mtime)
+        if graph is None:
+            graph = Graph(identifier=ONT_GRAPH)
+            graph.parse(path, format="turtle")
+            if cache_file:
+                write_graph_cache(cache_file, path, mtime, graph)
+
+        ontology = Ontology(path, mtime, graph)
+        _ontologies[path] = ontology
+        return ontology
+
+
+def clear_ontology_cache():
+    """Forgets every loaded ontology, the next load_ontology call parses again."""
+    with _ontologies_lock:
+        _ontologies.clear()
@@ -0,0 +1,335 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functions.beautify import beautify, beautify_stream
+from functions.concurrency import slot
+from functions.question_cache import generate_sparql_cached
+from functions.result_cache import execute_sparql_cached
+from functions.router import should_use_kg
+from functions.sparql_generator import generate_sparql
+from functions.execute_query import execute_sparql_stream
+from functions.sparql_validator import validate_sparql
+from functions.tracing import current_span, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class TurnCancelled(Exception):
+    """Raised inside a speculative KG branch once the router decided the KG isn't needed."""
+
+
+class _DeferredLog:
+    """
+    Holds the messages of a speculative branch until the router has answered:
+    they are printed if the branch is used and dropped if it is cancelled.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.released = False
+
+    def __call__(self, message):
+        with self.lock:
+            if not self.released:
+                self.buffer.append(message)
+                return
+        self.output(message)
+
+    def release(self):
+        with self.lock:
+            self.released = True
+            buffer, self.buffer = self.buffer, []
+        for message in buffer:
+            self.output(message)
+
+
+class TurnResult:
+    def __init__(self):
+        self.used_kg = False
+        self.sparql = None
+        self.bindings = []
+        # the text of the answer, None if there is none
+        self.reply = None
+        self.retries = 0
+        self.repaired = False
+        # the season view that answered the question, if one did
+        self.view = None
+        self.started = time.perf_counter()
+        # seconds spent in every stage, and in the whole turn
+        self.timings = {}
+
+
+class TurnPipeline:
+    """
+    Runs one chat turn: router, then either the chat model, or SPARQL generation, validation,
+    execution and beautify. With speculative=True the KG branch (up to and including the
+    execution of the query) starts at the same time as the router, so when the router says
+    "use the KG" its round-trip is hidden behind generation. If the router says no, the branch
+    stops at its next stage; a stage already running in its thread finishes in the background.
+    With a local_router (see local_router.LocalRouter), questions it is sure about skip both.
+    With on_text, the chat and beautify answers are streamed: on_text(kind, chunk) is called with
+    kind "chat" or "beautify" for every chunk as it arrives.
+    With a renderer (see answer_renderer.AnswerRenderer), results it can render skip beautify.
+    With a repairer (see sparql_repair.SparqlRepairer), queries that fail validation are first
+    fixed locally; the LLM is only asked again when the repair fails.
+    With an entity_index (see entity_index.EntityIndex), the teams and players the question
+    names are resolved to their IRIs, which are given to the generator.
+    With a query_guard (see query_guard.QueryGuard), valid queries are rewritten (LIMIT, join
+    order, self-joins) before execution, and those estimated too expensive go back to the LLM.
+    With views (see season_views.SeasonViews), the questions a season view answers (league
+    table, top scorers and assists, form) are answered from it, before the router.
+    The blocking stages run in the pipeline's own threads (or in executor, shared by the
+    pipelines of a server), so a turn doesn't wait for them; the stages run in the context of
+    the turn, e.g. with the session's concurrency limits (see concurrency.slot).
+    Progress messages go to log (default: this module's logger, at INFO level). Every turn
+    is traced (see tracing.tracer): a "turn" span with the views, router, resolve, generate,
+    validate, repair, guard, execute, render, beautify and chat stages as children.
+    """
+
+    def __init__(self, api_key, graphdb_url, ontology_path, turtle_ontology, chat, result_cache=None,
+                 question_cache=None, cache_dir=None, max_retries=3, max_rows=50, speculative=True,
+                 local_router=None, on_text=None, renderer=None, repairer=None, entity_index=None, query_guard=None,
+                 views=None, executor=None, log=None):
+        self.api_key = api_key
+        self.graphdb_url = graphdb_url
+        self.ontology_path = ontology_path
+        self.turtle_ontology = turtle_ontology
+        self.chat = chat
+        self.result_cache = result_cache
+        self.question_cache = question_cache
+        self.cache_dir = cache_dir
+        self.max_retries = max_retries
+        self.max_rows = max_rows
+        self.speculative = speculative
+        self.local_router = local_router
+        self.on_text = on_text
+        self.renderer = renderer
+        self.repairer = repairer
+        self.entity_index = entity_index
+        self.query_guard = query_guard
+        self.views = views
+        self.log = log or logger.info
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="turn")
+
+    def _in_thread(self, function, *args):
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(context.run, function, *args))
+
+    def _stream(self, kind, chunks, result):
+        """Passes the chunks to on_text as they arrive and returns the whole text."""
+        start = time.perf_counter()
+        text = []
+        for chunk in chunks:
+            if not text:
+                now = time.perf_counter()
+                result.timings[f"{kind}_first_token"] = now - start
+                # what the user waits for before the answer starts
+                result.timings["first_token"] = now - result.started
+            text.append(chunk)
+            self.on_text(kind, chunk)
+        return "".join(text)
+
+    def query_kg(self, user_input, result, log=None, cancelled=None):
+        """
+        Generates, validates and executes the SPARQL query of a question (blocking).
+        Returns False if the question couldn't be turned into SPARQL.
+        """
+        with tracer.span("kg") as span:
+            answered = self._query_kg(user_input, result, log or self.log, cancelled)
+            span.set(retries=result.retries, repaired=result.repaired, rows=len(result.bindings), answered=answered)
+        return answered
+
+    def _query_kg(self, user_input, result, log, cancelled):
+        def check():
+            if cancelled is not None and cancelled.is_set():
+                raise TurnCancelled()
+
+        start = time.perf_counter()
+        mentions = None
+        if self.entity_index is not None:
+            with tracer.span("resolve") as span:
+                mentions = self.entity_index.resolve(user_input)
+                span.set(mentions=len(mentions))
+            if mentions:
+                log(f"Entities: {', '.join(f'{m.text} -> {m.entities[0].name}' for m in mentions)}")
+        errors = None
+        for attempt in range(self.max_retries):
+            check()
+            plan = None
+            with tracer.span("generate", attempt=attempt + 1):
+                if attempt == 0 and self.question_cache is not None:
+                    sparql_query = generate_sparql_cached(
+                        self.question_cache, self.api_key, self.ontology_path, user_input, mentions
+                    )
+                elif attempt == 0:
+                    sparql_query = generate_sparql(self.api_key, self.ontology_path, user_input, mentions=mentions)
+                else:
+                    prompt_for_llm = (
+                        f"The previous SPARQL query failed validation with these errors: {errors}. "
+                        f"Please correct and regenerate a valid SPARQL query for: {user_input}"
+                    )
+                    sparql_query = generate_sparql(self.api_key, self.ontology_path, prompt_for_llm, mentions=mentions)
+            log(f"\nAttempt {attempt + 1} — SPARQL generated:\n{sparql_query}\n")
+
+            # validate the query
+            with tracer.span("validate", attempt=attempt + 1) as span:
+                errors = validate_sparql(sparql_query, self.turtle_ontology, self.cache_dir)
+                span.set(errors=len(errors) if isinstance(errors, list) else int(errors is not None))
+            if errors == "Input not SPARQL":
+                result.timings["generate"] = time.perf_counter() - start
+                return False
+            if errors and self.repairer is not None:
+                with tracer.span("repair", attempt=attempt + 1) as span:
+                    repair = self.repairer.repair(sparql_query)
+                    span.set(repaired=repair is not None)
+                if repair is not None:
+                    log(f"Validation failed, repaired locally ({', '.join(repair.changes)}):\n{repair.query}\n")
+                    sparql_query, errors = repair.query, None
+                    result.repaired = True
+            if not errors and self.query_guard is not None:
+                with tracer.span("guard", attempt=attempt + 1) as span:
+                    plan = self.query_guard.check(sparql_query)
+                    span.set(estimated_rows=plan.estimated_rows, cost=plan.cost, issues=len(plan.issues),
+                             rejected=plan.rejected)
+                if plan.rejected:
+                    errors = [plan.error]
+                elif plan.changes:
+                    log(f"Query rewritten ({', '.join(plan.changes)}):\n{plan.query}\n")
+                    sparql_query = plan.query
+            if not errors:
+                log("SPARQL validated successfully.")
+                check()
+                if self.question_cache is not None:
+                    self.question_cache.remember(user_input, sparql_query, self.turtle_ontology)
+                break
+            log(f"Validation failed (attempt {attempt + 1}/{self.max_retries}): {errors}")
+        check()
+        result.timings["generate"] = time.perf_counter() - start
+        result.retries = attempt
+
+        start = time.perf_counter()
+        result.sparql = sparql_query
+        with tracer.span("execute") as span, slot("kg"):
+            if plan is not None and plan.rejected:
+                log("Query rejected by the cost guard, not executed.")
+                result.bindings = []
+            elif self.result_cache is not None:
+                result.bindings = execute_sparql_cached(self.result_cache, self.graphdb_url, sparql_query, limit=self.max_rows)
+            else:
+                result.bindings = list(execute_sparql_stream(self.graphdb_url, sparql_query, limit=self.max_rows))
+            span.set(rows=len(result.bindings))
+            if plan is not None and not plan.rejected:
+                span.set(estimated_rows=plan.estimated_rows)
+                self.query_guard.record(plan, len(result.bindings))
+        result.timings["execute"] = time.perf_counter() - start
+        return True
+
+    async def run(self, user_input) -> TurnResult:
+        result = TurnResult()
+        with tracer.span("turn") as span:
+            await self._run(user_input, result)
+            span.set(used_kg=result.used_kg, retries=result.retries, rows=len(result.bindings),
+                     answered=bool(result.reply))
+        return result
+
+    async def _run(self, user_input, result):
+        turn_start = result.started
+
+        if self.views is not None:
+            with tracer.span("views") as span:
+                answer = self.views.answer(user_input)
+                span.set(view=answer.view if answer is not None else "")
+            if answer is not None:
+                result.used_kg = True
+                result.view = answer.view
+                result.bindings = answer.bindings
+                self.chat.add_message('user', user_input)
+                self.log(f"Answered from the {answer.view} view.")
+                result.reply = self._stream("beautify", [answer.text], result) if self.on_text is not None else answer.text
+                self.chat.add_message("assistant", result.reply)
+                result.timings["total"] = time.perf_counter() - turn_start
+                return
+
+        async def route():
+            start = time.perf_counter()
+            with tracer.span("router"):
+                use_kg = await self._in_thread(should_use_kg, self.api_key, user_input)
+            result.timings["router"] = time.perf_counter() - start
+            if self.local_router is not None:
+                self.local_router.learn(user_input, use_kg)
+            return use_kg
+
+        kg_task = None
+        cancelled = threading.Event()
+        log = _DeferredLog(self.log)
+        # obvious questions are routed locally, without the LLM router and without speculation
+        use_kg = self.local_router.decide(user_input) if self.local_router is not None else None
+        current_span().set(route="llm" if use_kg is None else "local")
+        if use_kg is None:
+            if self.speculative:
+                kg_task = asyncio.ensure_future(self._in_thread(self.query_kg, user_input, result, log, cancelled))
+            use_kg = await route()
+
+        if not use_kg:
+            if kg_task is not None:
+                cancelled.set()
+                kg_task.cancel()
+            start = time.perf_counter()
+            with tracer.span("chat"):
+                if self.on_text is not None:
+                    result.reply = await self._in_thread(self._stream, "chat", self.chat.ask_stream(user_input), result)
+                else:
+                    result.reply = await self._in_thread(self.chat.ask, user_input)
+            result.timings["chat"] = time.perf_counter() - start
+            result.timings["total"] = time.perf_counter() - turn_start
+            return
+
+        result.used_kg = True
+        self.chat.add_message('user', user_input)
+        self.log("Querying the Knowledge Graph...")
+        log.release()
+        if kg_task is None:
+            kg_task = asyncio.ensure_future(self._in_thread(self.query_kg, user_input, result, log, cancelled))
+        answered = await kg_task
+
+        if not answered:
+            self.log("Cannot answer the question..")
+        elif result.bindings:
+            start = time.perf_counter()
+            rendered = None
+            if self.renderer is not None:
+                with tracer.span("render") as span:
+                    rendered = self.renderer.render(user_input, result.bindings)
+                    span.set(rendered=rendered is not None)
+            if rendered is not None:
+                result.reply = self._stream("beautify", [rendered], result) if self.on_text is not None else rendered
+            else:
+                with tracer.span("beautify", rows=len(result.bindings)):
+                    if self.on_text is not None:
+                        chunks = beautify_stream(self.api_key, user_input, result.bindings)
+                        result.reply = await self._in_thread(self._stream, "beautify", chunks, result) or None
+                    else:
+                        # beautify returns False when the model gave no answer
+                        result.reply = await self._in_thread(beautify, self.api_key, user_input, result.bindings) or None
+            if rendered is None and self.renderer is not None:
+                self.renderer.beautify_time += time.perf_counter() - start
+            result.timings["beautify"] = time.perf_counter() - start
+            if result.reply is not None:
+                self.chat.add_message("assistant", result.reply)
+        else:
+            self.log("Did not find any results.")
+        result.timings["total"] = time.perf_counter() - turn_start
+
+    def run_sync(self, user_input) -> TurnResult:
+        return asyncio.run(self.run(user_input))
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,401 @@
+import logging
+import statistics
+import threading
+import time
+from collections import defaultdict
+from itertools import combinations
+from rdflib import URIRef, Variable
+from rdflib.namespace import RDF
+from functions.execute_query import execute_sparql
+from functions.sparql_parser import parse_patterns
+
+logger = logging.getLogger(__name__)
+
+PREDICATES_QUERY = """
+SELECT ?p (COUNT(*) AS ?triples) (COUNT(DISTINCT ?s) AS ?subjects) (COUNT(DISTINCT ?o) AS ?objects)
+WHERE { ?s ?p ?o }
+GROUP BY ?p
+"""
+NODES_QUERY = """
+SELECT (COUNT(DISTINCT ?s) AS ?subjects) (COUNT(DISTINCT ?o) AS ?objects)
+WHERE { ?s ?p ?o }
+"""
+CLASSES_QUERY = """
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+SELECT ?class (COUNT(?s) AS ?instances)
+WHERE { ?s rdf:type ?class }
+GROUP BY ?class
+"""
+
+# LIMIT added to SELECT queries that have none
+DEFAULT_LIMIT = 1000
+# queries whose best join order goes through more intermediate rows than this are rejected
+MAX_COST = 100_000
+# the triples of these groups only filter rows, they don't add any
+FILTER_GROUPS = {"EXISTS", "MINUS"}
+AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX", "SAMPLE", "GROUP_CONCAT"}
+# how far from a variable the self-join check looks for what tells two variables apart
+SIGNATURE_DEPTH = 3
+# estimated vs actual row counts kept for the stats
+MAX_ESTIMATES = 1000
+
+
+def _variables(triple) -> set:
+    return {term for term in triple if isinstance(term, Variable)}
+
+
+class KGStatistics:
+    """
+    Triple counts of the KG the cost estimates are based on: for every predicate the number
+    of triples and of distinct subjects and objects, and the number of instances of every class.
+    """
+
+    def __init__(self, predicates: dict, classes: dict, subjects: int = None, objects: int = None):
+        # predicate -> (triples, distinct subjects, distinct objects)
+        self.predicates = predicates
+        self.classes = classes
+        self.triples = sum(counts[0] for counts in predicates.values())
+        # distinct subjects and objects of the whole KG, at least those of the largest predicate
+        self.subjects = subjects or max((counts[1] for counts in predicates.values()), default=0)
+        self.objects = objects or max((counts[2] for counts in predicates.values()), default=0)
+
+    @classmethod
+    def from_kg(cls, graphdb_url: str) -> "KGStatistics":
+        start = time.perf_counter()
+        predicates = {}
+        for row in execute_sparql(graphdb_url, PREDICATES_QUERY):
+            predicates[URIRef(row["p"]["value"])] = tuple(
+                int(row[key]["value"]) for key in ("triples", "subjects", "objects")
+            )
+        classes = {URIRef(row["class"]["value"]): int(row["instances"]["value"])
+                   for row in execute_sparql(graphdb_url, CLASSES_QUERY)}
+        nodes = execute_sparql(graphdb_url, NODES_QUERY)
+        subjects, objects = (int(nodes[0][key]["value"]) for key in ("subjects", "objects")) if nodes else (None, None)
+        if not predicates:
+            logger.warning("No KG statistics, every query will be estimated as empty")
+        logger.info("KG statistics: %d predicates, %d classes in %.2fs",
+                    len(predicates), len(classes), time.perf_counter() - start)
+        return cls(predicates, classes, subjects, objects)
+
+    def pattern_rows(self, triple, bound) -> float:
+        """Estimated rows of a triple pattern once the variables in bound have a value."""
+        s, p, o = triple
+
+        def is_bound(term):
+            return not isinstance(term, Variable) or term in bound
+
+        if not is_bound(p):
+            rows, subjects, objects = self.triples, self.subjects, self.objects
+        elif p == RDF.type and not isinstance(o, Variable):
+            # instances of the class
+            rows = subjects = self.classes.get(o, 0)
+            objects = 1
+        elif isinstance(p, Variable):
+            rows = self.triples / max(len(self.predicates), 1)
+            subjects, objects = self.subjects, self.objects
+        else:
+            # a predicate the KG doesn't have matches nothing
+            rows, subjects, objects = self.predicates.get(p, (0, 0, 0))
+        if is_bound(s):
+            rows /= max(subjects, 1)
+        if is_bound(o):
+            rows /= max(objects, 1)
+        return rows
+
+
+class JoinPlan:
+    """The order the triples are joined in, the rows after each join, their sum (the cost) and the cartesian products."""
+
+    __slots__ = ("order", "rows", "cost", "cartesian", "unbounded")
+
+    def __init__(self, order, rows, cost, cartesian, unbounded):
+        self.order = order
+        self.rows = rows
+        self.cost = cost
+        # triples joined with the rows so far without a shared variable
+        self.cartesian = cartesian
+        # triples evaluated with none of their terms known, a scan of the whole KG
+        self.unbounded = unbounded
+
+
+class QueryPlan:
+    """
+    What QueryGuard.check found out about a query: the query to execute (rewritten), the
+    estimated rows of its result (None for aggregates, ASK, ...) and the cost of its best join
+    order, the issues found, the rewrites made, and the error given to the generator if the
+    query is rejected.
+    """
+
+    __slots__ = ("original", "query", "estimated_rows", "cost", "issues", "changes", "error")
+
+    def __init__(self, original, query, estimated_rows, cost, issues, changes, error=None):
+        self.original = original
+        self.query = query
+        self.estimated_rows = estimated_rows
+        self.cost = cost
+        self.issues = issues
+        self.changes = changes
+        self.error = error
+
+    @property
+    def rejected(self) -> bool:
+        return self.error is not None
+
+    def __repr__(self):
+        return f"<QueryPlan ~{self.estimated_rows} rows, cost {self.cost:.0f}, {'rejected' if self.rejected else 'accepted'}>"
+
+    def to_dict(self) -> dict:
+        return {
+            "estimated_rows": self.estimated_rows,
+            "cost": self.cost,
+            "issues": self.issues,
+            "changes": self.changes,
+            "error": self.error,
+        }
+
+
+class QueryGuard:
+    """
+    Looks at the triple patterns of a generated query before it is sent to the triplestore,
+    with row counts estimated from the KGStatistics (independent patterns, uniform values):
+    - flags patterns that share no variable with the rest (a cartesian product of their rows),
+      patterns with no term known (?s ?p ?o, a scan of the whole KG), and a property joined
+      twice from the same subject into variables nothing tells apart (every pair returned);
+    - adds FILTER(?a != ?b) for the latter when both patterns are in the WHERE clause itself;
+    - reorders the consecutive triple blocks of every group by selectivity, the most selective
+      first and then those joined to what is already bound, when that lowers the estimated cost
+      (for the stores that evaluate a BGP in the order it is written);
+    - adds LIMIT default_limit to SELECT queries without one;
+    - rejects the query when the cost of its best join order is above max_cost.
+    record(plan, rows) keeps the estimated vs actual row counts, which stats() reports.
+    """
+
+    def __init__(self, kg_statistics: KGStatistics, default_limit=DEFAULT_LIMIT, max_cost=MAX_COST):
+        self.kg = kg_statistics
+        self.default_limit = default_limit
+        self.max_cost = max_cost
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.rewritten = 0
+        self.issues = defaultdict(int)
+        self.estimates = []
+
+    def plan_join(self, triples, bound=()) -> JoinPlan:
+        """Greedy join order: the pattern with the fewest rows given the variables bound so far, connected ones first."""
+        bound = set(bound)
+        remaining = list(range(len(triples)))
+        order, rows, cartesian, unbounded = [], 1.0, [], []
+        cost = 0.0
+        while remaining:
+            connected = [i for i in remaining if _variables(triples[i]) & bound]
+            candidates = connected or remaining
+            best = min(candidates, key=lambda i: (self.kg.pattern_rows(triples[i], bound), i))
+            triple = triples[best]
+            if order and not connected and _variables(triple):
+                cartesian.append(triple)
+            if all(isinstance(term, Variable) and term not in bound for term in triple):
+                unbounded.append(triple)
+            rows *= self.kg.pattern_rows(triple, bound)
+            cost += rows
+            bound |= _variables(triple)
+            order.append(best)
+            remaining.remove(best)
+        return JoinPlan(order, rows, cost, cartesian, unbounded)
+
+    def written_cost(self, triples, bound=()) -> float:
+        """The estimated cost of joining the triples in the order given."""
+        bound = set(bound)
+        rows, cost = 1.0, 0.0
+        for triple in triples:
+            rows *= self.kg.pattern_rows(triple, bound)
+            cost += rows
+            bound |= _variables(triple)
+        return cost
+
+    def check(self, query: str) -> QueryPlan:
+        patterns = parse_patterns(query)
+        issues, edits, changes = [], [], []
+        required, optional = [], []
+        for triple, group in zip(patterns.triples, patterns.triple_groups):
+            kinds = patterns.group_path(group) if group is not None else []
+            if FILTER_GROUPS & set(kinds):
+                continue
+            (optional if "OPTIONAL" in kinds else required).append(triple)
+
+        join = self.plan_join(required)
+        rows, cost = join.rows, join.cost
+        bound = set().union(*map(_variables, required)) if required else set()
+        for triple in optional:
+            # a left join keeps the rows without a match
+            rows *= max(1.0, self.kg.pattern_rows(triple, bound))
+            cost += rows
+            bound |= _variables(triple)
+
+        if join.cartesian:
+            issues.append("disconnected patterns: " + ", ".join(self._text(triple) for triple in join.cartesian)
+                          + " share no variable with the rest of the query")
+        for triple in join.unbounded:
+            issues.append(f"unbounded pattern: {self._text(triple)}")
+
+        for a, b, group in self._self_joins(patterns):
+            issues.append(f"self-join: ?{a} and ?{b} can be the same value")
+            if patterns.groups[group][0] == "WHERE" and patterns.where_span is not None:
+                end = len(query[:patterns.where_span[1]].rstrip())
+                edits.append((end, end, f"\n  FILTER(?{a} != ?{b})"))
+                changes.append(f"FILTER(?{a} != ?{b})")
+                # every row was one of the pair
+                rows /= 2
+
+        for start, end, text in self._reorders(query, patterns):
+            edits.append((start, end, text))
+        if len(edits) > len(changes):
+            changes.append("reordered")
+
+        tokens = patterns.tokens[patterns.modifiers:]
+        limit = next((int(tokens[i + 1].value) for i, token in enumerate(tokens[:-1])
+                      if token.is_word("LIMIT") and tokens[i + 1].kind == "NUMBER"), None)
+        if (patterns.form == "SELECT" and limit is None and self.default_limit
+                and not any(token.is_word("LIMIT", "VALUES") for token in tokens)):
+            edits.append((len(query), len(query), f"\nLIMIT {self.default_limit}"))
+            changes.append(f"LIMIT {self.default_limit}")
+            limit = self.default_limit
+
+        rewritten = query
+        for start, end, text in sorted(edits, key=lambda edit: -edit[0]):
+            rewritten = rewritten[:start] + text + rewritten[end:]
+
+        estimated = None
+        if patterns.form == "SELECT" and not self._aggregates(patterns):
+            estimated = rows if limit is None else min(rows, limit)
+        error = None
+        if cost > self.max_cost:
+            error = (f"The query is too expensive to run: its patterns go through about {cost:,.0f} rows"
+                     + (f" ({'; '.join(issues)})" if issues else "")
+                     + ". Join every pattern to the others through a shared variable and bind the entities "
+                       "the question is about.")
+        plan = QueryPlan(query, rewritten, estimated, cost, issues, changes, error)
+
+        with self.lock:
+            self.checked += 1
+            self.rejected += plan.rejected
+            self.rewritten += bool(changes)
+            for issue in issues:
+                self.issues[issue.split(":", 1)[0]] += 1
+        return plan
+
+    def record(self, plan: QueryPlan, rows: int):
+        """Keeps the actual row count of an executed plan next to its estimate."""
+        if plan.estimated_rows is None:
+            return
+        with self.lock:
+            self.estimates.append((plan.estimated_rows, rows))
+            del self.estimates[:-MAX_ESTIMATES]
+
+    def _self_joins(self, patterns):
+        """(a, b, group) for the properties joined twice from a subject into interchangeable variables ?a and ?b."""
+        triples = patterns.triples
+        objects = defaultdict(list)
+        for triple, group in zip(triples, patterns.triple_groups):
+            s, p, o = triple
+            if isinstance(o, Variable) and not isinstance(p, Variable) and p != RDF.type:
+                objects[(s, p)].append((o, group))
+        found = []
+        for (s, p), pairs in objects.items():
+            for (a, group_a), (b, group_b) in combinations(pairs, 2):
+                if a == b or group_a != group_b:
+                    continue
+                if any(str(a) in names or str(b) in names for names in patterns.filters):
+                    continue
+                exclude = {(s, p, a), (s, p, b)}
+                if self._signature(a, triples, exclude, SIGNATURE_DEPTH) == self._signature(b, triples, exclude, SIGNATURE_DEPTH):
+                    found.append((a, b, group_a))
+        return found
+
+    def _signature(self, term, triples, exclude, depth):
+        """The patterns around a variable up to depth, without its name, the names of the variables around it."""
+        if not isinstance(term, Variable):
+            return str(term)
+        if depth == 0:
+            return "?"
+        edges = []
+        for triple in triples:
+            if triple in exclude:
+                continue
+            s, p, o = triple
+            if s == term:
+                edges.append(("out", str(p), self._signature(o, triples, exclude | {triple}, depth - 1)))
+            if o == term:
+                edges.append(("in", str(p), self._signature(s, triples, exclude | {triple}, depth - 1)))
+        return tuple(sorted(edges, key=repr))
+
+    def _reorders(self, query, patterns):
+        """(start, end, text) edits that put the triple blocks of every run of them in their best order."""
+        tokens = patterns.tokens
+        runs = []
+        for statement in patterns.statements:
+            previous = runs[-1][-1] if runs else None
+            # blocks of the same group separated by a single dot
+            if (previous is not None and previous[0] == statement[0] and previous[2] < len(tokens)
+                    and tokens[previous[2]].is_punct(".")
+                    and statement[1] == previous[2] + 1):
+                runs[-1].append(statement)
+            else:
+                runs.append([statement])
+        for run in runs:
+            if len(run) < 2 or patterns.groups[run[0][0]][0] in FILTER_GROUPS:
+                continue
+            blocks = [patterns.triples[first:end] for _, _, _, first, end in run]
+            if any(not block for block in blocks):
+                continue
+            order = self._block_order(blocks)
+            if order == list(range(len(run))):
+                continue
+            written = self.written_cost([triple for block in blocks for triple in block])
+            best = self.written_cost([triple for i in order for triple in blocks[i]])
+            if best >= written:
+                continue
+            spans = [(tokens[start].start, tokens[end - 1].end) for _, start, end, _, _ in run]
+            parts = []
+            for position, i in enumerate(order):
+                parts.append(query[spans[i][0]:spans[i][1]])
+                if position + 1 < len(spans):
+                    parts.append(query[spans[position][1]:spans[position + 1][0]])
+            yield spans[0][0], spans[-1][1], "".join(parts)
+
+    def _block_order(self, blocks) -> list:
+        """Greedy order of the blocks, like plan_join with a block's own best join as its rows."""
+        bound = set()
+        remaining = list(range(len(blocks)))
+        order = []
+        while remaining:
+            connected = [i for i in remaining if set().union(*map(_variables, blocks[i])) & bound]
+            best = min(connected or remaining, key=lambda i: (self.plan_join(blocks[i], bound).rows, i))
+            bound |= set().union(*map(_variables, blocks[best]))
+            order.append(best)
+            remaining.remove(best)
+        return order
+
+    @staticmethod
+    def _aggregates(patterns) -> bool:
+        tokens = patterns.tokens
+        return any(token.is_word("GROUP") or (token.is_word(*AGGREGATES) and i + 1 < len(tokens) and tokens[i + 1].is_punct("("))
+                   for i, token in enumerate(tokens))
+
+    @staticmethod
+    def _text(triple) -> str:
+        return " ".join(f"?{term}" if isinstance(term, Variable) else term.n3() for term in triple)
+
+    def stats(self) -> dict:
+        with self.lock:
+            estimates = list(self.estimates)
+        # q-error: how many times the estimate is off, either way
+        errors = [max(estimated + 1, actual + 1) / min(estimated + 1, actual + 1) for estimated, actual in estimates]
+        return {
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "rewritten": self.rewritten,
+            "issues": dict(self.issues),
+            "executed": len(estimates),
+            "median_q_error": statistics.median(errors) if errors else None,
+        }
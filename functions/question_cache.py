@@ -0,0 +1,166 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functions.sparql_generator import generate_sparql
+from functions.sparql_validator import validate_sparql
+from functions.text_utils import _stem, content_terms, normalize_question
+from functions.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionCache:
+    """
+    Cache of question -> SPARQL pairs, so that repeated questions skip the LLM.
+    A lookup first tries the normalised question text, then a TF-IDF cosine similarity
+    over the content words of the cached questions (no model, no network). A similar
+    question is only a hit if its similarity is at least threshold and it mentions the same
+    numbers and entity terms (e.g. gameweek 5 must not answer gameweek 6).
+    Only queries that pass validate_sparql are stored (see remember).
+    """
+
+    def __init__(self, threshold=0.85, max_entries=1000, path=None, entity_terms=()):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.entity_terms = {_stem(t) for t in entity_terms}
+        self.entries = OrderedDict()  # normalised question -> (terms, sparql)
+        self.postings = defaultdict(set)  # term -> normalised questions that contain it
+        self.lock = threading.Lock()
+        # concurrent sessions may save at the same time
+        self.save_lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+        self.generation_time = 0.0
+        self.generations = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    entries = [(str(question), str(sparql)) for question, sparql in json.load(f)]
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("Ignoring the question cache in %s: %s", path, e)
+                entries = []
+            for question, sparql in entries:
+                self._add(question, sparql)
+
+    def _idf(self, term):
+        return math.log((len(self.entries) + 1) / (len(self.postings.get(term, ())) + 1)) + 1
+
+    def _vector(self, terms):
+        vector = {t: (1 + math.log(n)) * self._idf(t) for t, n in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    def _guarded(self, terms):
+        """The terms that must be identical for two questions to share a query."""
+        return {t for t in terms if t.isdigit() or t in self.entity_terms}
+
+    def lookup(self, question: str):
+        """Returns (sparql, similarity) of the best cached question, or None."""
+        start = time.perf_counter()
+        try:
+            normalized = normalize_question(question)
+            with self.lock:
+                entry = self.entries.get(normalized)
+                if entry is not None:
+                    self.entries.move_to_end(normalized)
+                    self.exact_hits += 1
+                    return entry[1], 1.0
+
+                terms = content_terms(normalized)
+                candidates = set()
+                for term in terms:
+                    candidates |= self.postings.get(term, set())
+                query_vector = self._vector(terms)
+                guarded = self._guarded(terms)
+                best, best_score = None, 0.0
+                for candidate in candidates:
+                    candidate_terms, sparql = self.entries[candidate]
+                    if self._guarded(candidate_terms) != guarded:
+                        continue
+                    vector = self._vector(candidate_terms)
+                    score = sum(w * vector.get(t, 0.0) for t, w in query_vector.items())
+                    if score > best_score:
+                        best, best_score = candidate, score
+                if best is None or best_score < self.threshold:
+                    self.misses += 1
+                    return None
+                self.entries.move_to_end(best)
+                self.similar_hits += 1
+                return self.entries[best][1], best_score
+        finally:
+            self.lookup_time += time.perf_counter() - start
+
+    def remember(self, question: str, sparql: str, ontology) -> bool:
+        """Stores the pair if the query passes validate_sparql against the ontology."""
+        if validate_sparql(sparql, ontology) is not None:
+            return False
+        with self.lock:
+            self._add(question, sparql)
+        self.save()
+        return True
+
+    def _add(self, question, sparql):
+        normalized = normalize_question(question)
+        if normalized in self.entries:
+            self._remove(normalized)
+        terms = content_terms(normalized)
+        self.entries[normalized] = (terms, sparql)
+        for term in terms:
+            self.postings[term].add(normalized)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, normalized):
+        terms, _ = self.entries.pop(normalized)
+        for term in terms:
+            self.postings[term].discard(normalized)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.save_lock:
+            # taken under save_lock, so that an older snapshot never overwrites a newer one
+            with self.lock:
+                pairs = [(question, sparql) for question, (_, sparql) in self.entries.items()]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(pairs, f)
+            os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        mean_generation = self.generation_time / self.generations if self.generations else 0.0
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "mean_lookup_ms": self.lookup_time / lookups * 1000 if lookups else 0.0,
+            "mean_generation_ms": mean_generation * 1000,
+            # every hit saves one LLM generation
+            "saved_s": hits * mean_generation,
+        }
+
+
+def generate_sparql_cached(cache: QuestionCache, api_key: str, ontology_path: str, question: str, mentions=None) -> str:
+    """generate_sparql behind the question cache; the generation time of misses is recorded."""
+    cached = cache.lookup(question)
+    current_span().set(question_cache="hit" if cached is not None else "miss")
+    if cached is not None:
+        return cached[0]
+    start = time.perf_counter()
+    sparql = generate_sparql(api_key, ontology_path, question, mentions=mentions)
+    cache.generation_time += time.perf_counter() - start
+    cache.generations += 1
+    return sparql
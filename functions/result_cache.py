@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functions.execute_query import execute_sparql_stream
+from functions.sparql_parser import canonicalize_query
+from functions.tracing import current_span
+
+
+class ResultCache:
+    """
+    Cache of the bindings of executed SPARQL queries.
+    Queries are keyed by their canonical text (see sparql_parser.canonicalize_query), so the
+    same question asked with other whitespace, prefix names or variable names is a hit; the
+    bindings are stored with canonical variable names and renamed back on every hit.
+    Entries expire after ttl seconds and the least recently used ones are evicted after
+    max_entries. If path is given, entries are also kept in a sqlite file that survives restarts.
+    """
+
+    def __init__(self, max_entries=256, ttl=600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, bindings)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, stored_at REAL, used_at REAL, bindings TEXT)"
+            )
+            self.db.commit()
+
+    @staticmethod
+    def _key(url, query, limit):
+        canonical, variables = canonicalize_query(query)
+        text = f"{url}\n{limit}\n{canonical}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest(), variables
+
+    def get(self, url, query, limit=None):
+        """Returns the cached bindings of the query, or None."""
+        key, variables = self._key(url, query, limit)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None and self.db is not None:
+                entry = self._db_get(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        canonical_names = {v: k for k, v in variables.items()}
+        return [{canonical_names.get(var, var): value for var, value in binding.items()} for binding in entry[1]]
+
+    def put(self, url, query, bindings, limit=None):
+        key, variables = self._key(url, query, limit)
+        bindings = [{variables.get(var, var): value for var, value in binding.items()} for binding in bindings]
+        entry = (time.time(), bindings)
+        with self.lock:
+            self._remember(key, entry)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (key, entry[0], entry[0], json.dumps(bindings)),
+                )
+                self._db_evict()
+                self.db.commit()
+
+    def invalidate(self):
+        """Drops every entry, e.g. after the data of the knowledge graph has been reloaded."""
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM results")
+                self.db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _db_get(self, key, now):
+        row = self.db.execute("SELECT stored_at, bindings FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > self.ttl:
+            self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.db.commit()
+            return None
+        self.db.execute("UPDATE results SET used_at = ? WHERE key = ?", (now, key))
+        self.db.commit()
+        return row[0], json.loads(row[1])
+
+    def _db_evict(self):
+        self.db.execute(
+            "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY used_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+
+def execute_sparql_cached(cache: ResultCache, url, query, limit=None):
+    """
+    execute_sparql_stream in front of a ResultCache: returns the cached bindings if the query
+    (or an equivalent one) was executed before, otherwise executes it and caches the bindings.
+    Empty results aren't cached, because a failed request also returns no bindings.
+    """
+    bindings = cache.get(url, query, limit)
+    current_span().set(result_cache="hit" if bindings is not None else "miss")
+    if bindings is not None:
+        return bindings
+    bindings = list(execute_sparql_stream(url, query, limit=limit))
+    if bindings:
+        cache.put(url, query, bindings, limit)
+    return bindings
@@ -1,10 +1,11 @@
 
-from google import genai
-from google.genai import types
+from functions.llm_client import get_llm
 
 def should_use_kg(api_key: str, question: str) -> bool:
     """Asks Gemini if the question needs the KG."""
-    client = genai.Client(api_key=api_key)
+    from google.genai import types
+
+    llm = get_llm(api_key)
 
     router_prompt = """
     You are a classifier. Decide if the following question needs information
@@ -19,15 +20,11 @@ def should_use_kg(api_key: str, question: str) -> bool:
 
     config = types.GenerateContentConfig(system_instruction=router_prompt)
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-001",
-        contents=messages,
-        config=config
-    )
+    text = llm.generate(messages, config, purpose="router")
 
-    if not response or not response.candidates:
+    if not text:
         return False
 
-    text = response.candidates[0].content.parts[0].text.strip().lower()
+    text = text.strip().lower()
 
     return "true" in text
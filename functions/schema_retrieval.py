@@ -0,0 +1,243 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from functions.text_utils import _stem, content_terms, normalize_question, split_label
+
+CLASS_RE = re.compile(r"^class\s+(\w+)\s*\((.*?)\)\s*:(.*)$")
+INSTANCE_RE = re.compile(r"^(\w+)\s*=\s*(\w+)\(")
+COMMENT_RE = re.compile(r'comment\s*=\s*"([^"]*)"')
+INVERSE_RE = re.compile(r"nverse_property\s*=\s*(\w+)")
+# ranges of datatype properties
+DATATYPES = {"str", "int", "float", "bool"}
+
+# words of questions that the schema names differently
+SYNONYMS = {
+    "manager": ["coach"], "boss": ["coach"], "tall": ["height"], "born": ["birth"], "age": ["birth"],
+    "country": ["nationality"], "table": ["point", "season"], "standing": ["point", "season"],
+    "scorer": ["goal", "scor"], "score": ["goal", "scor"], "assisted": ["assist"], "booking": ["yellow", "card"],
+    "sent": ["red", "card"], "game": ["match"], "fixture": ["match"], "round": ["gameweek"], "week": ["gameweek"],
+    "possession": ["possession", "ball"], "won": ["win", "result"], "lost": ["loss", "result"],
+    "clean": ["clean", "sheet"], "squad": ["player"], "against": ["match"], "versus": ["match"], "vs": ["match"],
+    "between": ["match"],
+}
+# keyed like the terms of a question
+_SYNONYMS = {_stem(word): [_stem(t) for t in targets] for word, targets in SYNONYMS.items()}
+
+P = "PREFIX : <http://semanticweb.org/unitedOntology#>\n"
+# question -> SPARQL pairs that the few-shot examples are picked from
+EXAMPLE_BANK = [
+    ("List all players and the teams they play for.",
+     P + "SELECT ?player ?team\nWHERE {\n?player a :Player ;\n        :playsFor ?team .\n}"),
+    ("List all features of a Manchester United, with goals they scored and conceded",
+     P + "\nSELECT DISTINCT ?home_team ?away_team ?home_goals ?away_goals \nWHERE {\n"
+         "?m a :Match ;\n    :matchHasTeamStats ?ts1 ;\n    :matchHasTeamStats ?ts2 ;\n"
+         "    :matchGameweek ?gameweek ;\n    :hasHomeTeam ?home_team ;\n    :hasAwayTeam ?away_team.\n"
+         "?ts1 :statsOfTeam ?home_team ;\n        :teamGoalsScored ?home_goals .\n"
+         "?ts2 :statsOfTeam ?away_team ;\n        :teamGoalsScored ?away_goals .\n    \n"
+         "FILTER(?home_team = :Manchester_United || ?away_team = :Manchester_United)\n} ORDER BY ASC(?gameweek)"),
+    ("Who is the coach of Arsenal?",
+     P + "SELECT ?coach\nWHERE {\n:Arsenal :hasCoach ?coach .\n}"),
+    ("Which matches were played in gameweek 5?",
+     P + "SELECT ?match ?home ?away\nWHERE {\n?match a :Match ;\n       :matchGameweek 5 ;\n"
+         "       :hasHomeTeam ?home ;\n       :hasAwayTeam ?away .\n}"),
+    ("Show the league table with points and goal difference.",
+     P + "SELECT ?team ?points ?gd\nWHERE {\n?stats a :TeamSeasonStats ;\n       :seasonStatsOfTeam ?team ;\n"
+         "       :teamPoints ?points ;\n       :teamGoalDifference ?gd .\n}\nORDER BY DESC(?points) DESC(?gd)"),
+    ("Who scored the most goals?",
+     P + "SELECT ?player (COUNT(?goal) AS ?goals)\nWHERE {\n?stats :matchStatsOfPlayer ?player ;\n"
+         "       :playerScored ?goal .\n}\nGROUP BY ?player\nORDER BY DESC(?goals)\nLIMIT 10"),
+    ("Which goals were assisted by Bruno Fernandes?",
+     P + "SELECT ?goal ?time\nWHERE {\n?goal :assistedBy :Bruno_Fernandes ;\n      :goalTime ?time .\n}"),
+    ("How many yellow cards did Casemiro receive?",
+     P + "SELECT (COUNT(?card) AS ?cards)\nWHERE {\n?stats :matchStatsOfPlayer :Casemiro ;\n"
+         "       :playerReceivedYellowCard ?card .\n}"),
+    ("What was the ball possession of each team in gameweek 1?",
+     P + "SELECT ?team ?possession\nWHERE {\n?match :matchGameweek 1 ;\n       :matchHasTeamStats ?ts .\n"
+         "?ts :statsOfTeam ?team ;\n    :ballPossession ?possession .\n}"),
+    ("What is the nationality and birth date of the players of Chelsea?",
+     P + "SELECT ?player ?nationality ?birth\nWHERE {\n?player :playsFor :Chelsea ;\n"
+         "        :hasNationality ?nationality ;\n        :hasBirthDate ?birth .\n}"),
+    ("Which matches ended in a home win?",
+     P + "SELECT ?match\nWHERE {\n?match :hasResult :HomeWin .\n}"),
+    ("How many minutes did each player of Liverpool play?",
+     P + "SELECT ?player (SUM(?minutes) AS ?total)\nWHERE {\n?player :playsFor :Liverpool ;\n"
+         "        :playerHasMatchStats ?stats .\n?stats :minutesPlayed ?minutes .\n}\nGROUP BY ?player"),
+]
+
+
+class SchemaEntry:
+    __slots__ = ("name", "kind", "line", "parents", "domain", "range", "inverse", "terms")
+
+    def __init__(self, name, kind, line):
+        self.name = name
+        self.kind = kind  # "class", "property" or "instance"
+        self.line = line
+        self.parents = []
+        self.domain = None
+        self.range = None
+        self.inverse = None
+        self.terms = Counter()
+
+
+def _name_terms(name):
+    return {_stem(word) for word in split_label(name)}
+
+
+class SchemaIndex:
+    """
+    The classes, properties and instances of the schema file used in the generator prompt,
+    indexed by the stemmed words of their names and comments, so that a question only gets
+    the part of the schema it is about (see select).
+    """
+
+    def __init__(self, text: str):
+        self.header = []
+        self.entries = []
+        self.by_name = {}
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            match = CLASS_RE.match(stripped)
+            instance = INSTANCE_RE.match(stripped)
+            if match:
+                name, arguments, rest = match.groups()
+                if ">>" in arguments:
+                    entry = SchemaEntry(name, "property", stripped)
+                    domain, range_ = arguments.split(">>", 1)
+                    entry.domain = domain.strip()
+                    entry.range = range_.split(",")[0].strip()
+                else:
+                    entry = SchemaEntry(name, "class", stripped)
+                    entry.parents = [p.strip() for p in arguments.split(",") if p.strip() != "Thing"]
+                inverse = INVERSE_RE.search(rest)
+                entry.inverse = inverse.group(1) if inverse else None
+                comment = COMMENT_RE.search(rest)
+                comment_terms = content_terms(normalize_question(comment.group(1))) if comment else Counter()
+            elif instance:
+                name, parent = instance.groups()
+                entry = SchemaEntry(name, "instance", stripped)
+                entry.parents = [parent]
+                comment_terms = Counter()
+            else:
+                self.header.append(stripped)
+                continue
+            # words of the name count more than words of the comment
+            for term in _name_terms(name):
+                entry.terms[term] += 2.0
+            for term in comment_terms:
+                entry.terms[term] += 0.5
+            self.entries.append(entry)
+            self.by_name[name] = entry
+
+        documents = Counter()
+        for entry in self.entries:
+            documents.update(entry.terms.keys())
+        self.idf = {term: math.log((len(self.entries) + 1) / (n + 1)) + 1 for term, n in documents.items()}
+        self.properties_of = {}
+        for entry in self.entries:
+            if entry.kind == "property":
+                self.properties_of.setdefault(entry.domain, []).append(entry)
+                self.properties_of.setdefault(entry.range, []).append(entry)
+            elif entry.kind == "instance":
+                self.properties_of.setdefault(entry.parents[0], []).append(entry)
+
+    def question_terms(self, question: str) -> set:
+        terms = set(content_terms(normalize_question(question)))
+        for term in list(terms):
+            terms.update(_SYNONYMS.get(term, ()))
+        return terms
+
+    def scores(self, question: str) -> dict:
+        terms = self.question_terms(question)
+        scores = {}
+        for entry in self.entries:
+            score = sum(weight * self.idf[term] for term, weight in entry.terms.items() if term in terms)
+            if score:
+                scores[entry.name] = score
+        return scores
+
+    def select(self, question: str, max_matches=8, min_ratio=0.3):
+        """
+        The names of the schema entries the question needs: the best matching classes and
+        properties, the domain, range and inverse of every matched property, the properties
+        and instances of every matched class, and the classes on the other side of them.
+        Returns None if nothing matches, then the whole schema has to be sent.
+        """
+        scores = self.scores(question)
+        if not scores:
+            return None
+        best = max(scores.values())
+        matched = [name for name, score in sorted(scores.items(), key=lambda item: -item[1])
+                   if score >= best * min_ratio][:max_matches]
+
+        selected = set()
+        for name in matched:
+            entry = self.by_name[name]
+            selected.add(name)
+            if entry.kind == "property":
+                selected.update(n for n in (entry.domain, entry.range, entry.inverse) if n in self.by_name)
+            elif entry.kind == "class":
+                for related in self.properties_of.get(name, ()):
+                    selected.add(related.name)
+                    if related.kind == "property":
+                        selected.update(n for n in (related.domain, related.range) if n in self.by_name)
+            else:
+                selected.update(entry.parents)
+        # neighbouring classes: the object properties that link a selected class to another
+        # class, so that the joins between them (e.g. Match - TeamMatchStats - Team) are there
+        for name in list(selected):
+            if self.by_name[name].kind != "class":
+                continue
+            for related in self.properties_of.get(name, ()):
+                if related.kind == "property" and related.range not in DATATYPES:
+                    selected.add(related.name)
+                    selected.update(n for n in (related.domain, related.range) if n in self.by_name)
+        # superclasses, e.g. Human for the properties a Player inherits
+        for name in list(selected):
+            entry = self.by_name[name]
+            if entry.kind == "class":
+                selected.update(p for p in entry.parents if p in self.by_name)
+        return selected
+
+    def render(self, selected=None) -> str:
+        """The schema text restricted to the selected entries, in the order of the file."""
+        lines = list(self.header)
+        lines.extend(entry.line for entry in self.entries if selected is None or entry.name in selected)
+        return "\n".join(lines)
+
+
+def select_examples(question: str, k=2, bank=EXAMPLE_BANK):
+    """The k examples of the bank whose questions are the most similar to the question (cosine)."""
+    terms = content_terms(normalize_question(question))
+
+    def similarity(example):
+        other = content_terms(normalize_question(example[0]))
+        dot = sum(n * other[t] for t, n in terms.items())
+        norm = math.sqrt(sum(n * n for n in terms.values())) * math.sqrt(sum(n * n for n in other.values()))
+        return dot / norm if norm else 0.0
+
+    # sorted is stable, so with no overlap at all the first examples of the bank are used
+    return sorted(bank, key=similarity, reverse=True)[:k]
+
+
+# schema indexes, keyed by absolute path
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def load_schema(path: str) -> SchemaIndex:
+    """Returns the index of the schema file, reading it again only after it was modified."""
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    with _schemas_lock:
+        cached = _schemas.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r") as f:
+        schema = SchemaIndex(f.read())
+    with _schemas_lock:
+        _schemas[path] = (mtime, schema)
+    return schema
@@ -0,0 +1,415 @@
+import logging
+import threading
+import time
+from array import array
+from functions.answer_renderer import format_table
+from functions.entity_index import ONTOLOGY_PREFIX, TEAM_ALIASES, WORD_RE, normalize_name
+from functions.execute_query import execute_sparql
+from functions.text_utils import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+PREFIXES = f"""
+PREFIX : <{ONTOLOGY_PREFIX}>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+# the played matches, with the goals of both teams, but those in {known} (a FILTER of the matches
+# the views have); by IRI and not by gameweek, so that a postponed match played late is found too
+MATCHES_QUERY = PREFIXES + """
+SELECT ?match ?gameweek ?home ?away ?home_goals ?away_goals WHERE {{
+    ?match a :Match ; :matchGameweek ?gameweek ; :hasHomeTeam ?home ; :hasAwayTeam ?away ;
+           :matchHasTeamStats ?home_stats , ?away_stats .
+    ?home_stats :statsOfTeam ?home ; :teamGoalsScored ?home_goals .
+    ?away_stats :statsOfTeam ?away ; :teamGoalsScored ?away_goals .
+    {known}
+}}
+"""
+# the goals of the KG, but those in {known} (a FILTER of the goals the views have); by IRI and not
+# by match, so that a goal loaded after its match was applied is found too
+GOALS_QUERY = PREFIXES + """
+SELECT ?goal ?scorer ?assistant ?own_goal WHERE {{
+    ?goal a :Goal ; :goalInMatch ?match ; :goalScoredBy ?scorer .
+    OPTIONAL {{ ?goal :assistedBy ?assistant }}
+    OPTIONAL {{ ?goal :isOwnGoal ?own_goal }}
+    {known}
+}}
+"""
+# the labels of the teams and players in {entities}, those of the matches and goals just fetched
+NAMES_QUERY = PREFIXES + """
+SELECT ?entity ?type ?label ?team WHERE {{
+    VALUES ?entity {{ {entities} }}
+    VALUES ?type {{ :Team :Player }}
+    ?entity a ?type ; rdfs:label ?label .
+    OPTIONAL {{ ?entity :playsFor ?team }}
+}}
+"""
+
+XSD_INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+# counters of the league table, one array per column indexed like SeasonViews.teams
+TABLE_COLUMNS = ("played", "wins", "draws", "losses", "goals_for", "goals_against")
+TOP_PLAYERS = 10
+MAX_ROWS = 50
+FORM_MATCHES = 5
+
+# what a question says to ask for a view, as normalized words; a question may name one team
+VIEW_PHRASES = {
+    "league_table": ("league table", "table", "standings", "league standings", "league position", "position",
+                     "ranking", "rankings"),
+    "top_scorers": ("top scorer", "top scorers", "top goalscorer", "top goalscorers", "leading scorer",
+                    "leading scorers", "most goals", "scored the most", "scored the most goals", "golden boot"),
+    "top_assists": ("most assists", "top assister", "top assisters", "assist leader", "assist leaders",
+                    "assists leader", "assists leaders", "assisted the most", "most assists provided"),
+    "form": ("form", "recent form", "last five", "last 5", "recent results", "last five results", "last 5 results",
+             "last five matches", "last 5 matches", "last five games", "last 5 games"),
+}
+# views that can't be answered without a team
+TEAM_VIEWS = {"form"}
+# the other words a question answered by a view may contain; any other word (a gameweek, "against",
+# "conceded", "team", ...) means the question asks for something else and goes to the generator
+FILLER = STOPWORDS | {"s", "current", "currently", "season", "premier", "league", "top", "pl", "right", "now",
+                      "whole", "full", "latest", "player", "players", "up", "standing", "doing", "been", "sit",
+                      "sits", "stand", "stands", "goals", "assists", "scorers", "results"}
+
+
+def _uri(iri: str) -> dict:
+    return {"type": "uri", "value": iri}
+
+
+def _integer(value: int) -> dict:
+    return {"type": "literal", "datatype": XSD_INTEGER, "value": str(value)}
+
+
+def _phrases():
+    phrases = []
+    for view, texts in VIEW_PHRASES.items():
+        for text in texts:
+            phrases.append((tuple(text.split()), view))
+    # the longest phrases first, "last 5 results" before "last 5"
+    phrases.sort(key=lambda phrase: -len(phrase[0]))
+    return phrases
+
+
+PHRASES = _phrases()
+
+
+class ViewAnswer:
+    """The answer of a view: its name, the rows as SPARQL JSON bindings and the text shown."""
+
+    __slots__ = ("view", "bindings", "text")
+
+    def __init__(self, view, bindings, text):
+        self.view = view
+        self.bindings = bindings
+        self.text = text
+
+    def __repr__(self):
+        return f"<ViewAnswer {self.view}, {len(self.bindings)} rows>"
+
+
+class SeasonViews:
+    """
+    Season aggregates kept in process so that the common questions about them are answered
+    without the generator and the triplestore: the league table (arrays of counters per team),
+    the goals and assists of every player (arrays indexed by player) and the results of every
+    team in gameweek order (for its form). The views are computed from the matches and goals
+    of the KG, not from its season stats nodes, so that they can be updated one match at a time:
+    update asks the KG for the matches and the goals the views don't have, whatever their
+    gameweek or match, applies them (apply_match, apply_goal) and names their teams and players.
+    answer returns a ViewAnswer for the questions that ask for a view and nothing else (see
+    VIEW_PHRASES and FILLER), None for any other question.
+    """
+
+    def __init__(self, aliases=TEAM_ALIASES):
+        self.aliases = aliases
+        self.lock = threading.Lock()
+        self.teams = []
+        self.team_index = {}
+        self.team_labels = []
+        self.table = {column: array("i") for column in TABLE_COLUMNS}
+        # per team: (gameweek, opponent index, home, goals for, goals against) of every match played
+        self.results = []
+        self.players = []
+        self.player_index = {}
+        self.player_labels = []
+        self.player_teams = array("i")
+        self.goals = array("i")
+        self.assists = array("i")
+        self.matches = set()
+        self.goals_seen = set()
+        self.gameweek = 0
+        # normalized team name -> (team index, strict), strict names need a capital in the question
+        self.names = {}
+        self.hits = {}
+        self.misses = 0
+        self.answer_time = 0.0
+        self.updates = 0
+        self.update_time = 0.0
+
+    @classmethod
+    def from_kg(cls, graphdb_url: str, aliases=TEAM_ALIASES) -> "SeasonViews":
+        views = cls(aliases)
+        views.update(graphdb_url)
+        return views
+
+    # updates
+    def update(self, graphdb_url: str) -> int:
+        """Applies the matches and goals of the KG the views don't have yet, returns how many."""
+        start = time.perf_counter()
+        with self.lock:
+            known_matches = ", ".join(f"<{match}>" for match in self.matches)
+            known_goals = ", ".join(f"<{goal}>" for goal in self.goals_seen)
+        matches = execute_sparql(graphdb_url, MATCHES_QUERY.format(
+            known=f"FILTER(?match NOT IN ({known_matches}))" if known_matches else ""))
+        goals = execute_sparql(graphdb_url, GOALS_QUERY.format(
+            known=f"FILTER(?goal NOT IN ({known_goals}))" if known_goals else ""))
+        entities = " ".join(dict.fromkeys(
+            [f"<{row[key]['value']}>" for row in matches for key in ("home", "away")]
+            + [f"<{row[key]['value']}>" for row in goals for key in ("scorer", "assistant") if key in row]))
+        names = execute_sparql(graphdb_url, NAMES_QUERY.format(entities=entities)) if entities else []
+        applied = 0
+        with self.lock:
+            for row in names:
+                team = row.get("team")
+                self.set_label(row["entity"]["value"], row["label"]["value"], row["type"]["value"].endswith("#Team"),
+                               team["value"] if team else None)
+            for row in matches:
+                applied += self.apply_match(
+                    row["match"]["value"], int(row["gameweek"]["value"]), row["home"]["value"], row["away"]["value"],
+                    int(row["home_goals"]["value"]), int(row["away_goals"]["value"]),
+                )
+            for row in goals:
+                assistant = row.get("assistant")
+                own_goal = row.get("own_goal", {}).get("value") in ("true", "1")
+                applied += self.apply_goal(
+                    row["goal"]["value"], row["scorer"]["value"], assistant["value"] if assistant else None, own_goal
+                )
+            self.updates += 1
+            self.update_time += time.perf_counter() - start
+        logger.info("Season views: %d matches and goals applied in %.2fs", applied, time.perf_counter() - start)
+        return applied
+
+    def apply_match(self, match, gameweek, home, away, home_goals, away_goals) -> bool:
+        """Adds a played match to the table and the results, False if it was applied before."""
+        if match in self.matches:
+            return False
+        self.matches.add(match)
+        self.gameweek = max(self.gameweek, gameweek)
+        h, a = self._team(home), self._team(away)
+        for team, opponent, is_home, scored, conceded in ((h, a, True, home_goals, away_goals),
+                                                            (a, h, False, away_goals, home_goals)):
+            self.table["played"][team] += 1
+            self.table["goals_for"][team] += scored
+            self.table["goals_against"][team] += conceded
+            column = "wins" if scored > conceded else "draws" if scored == conceded else "losses"
+            self.table[column][team] += 1
+            results = self.results[team]
+            results.append((gameweek, opponent, is_home, scored, conceded))
+            if len(results) > 1 and results[-2][0] > gameweek:
+                # a postponed match played late
+                results.sort(key=lambda result: result[0])
+        return True
+
+    def apply_goal(self, goal, scorer, assistant=None, own_goal=False) -> bool:
+        """Counts a goal for its scorer (unless it is an own goal) and its assistant."""
+        if goal in self.goals_seen:
+            return False
+        self.goals_seen.add(goal)
+        if not own_goal:
+            self.goals[self._player(scorer)] += 1
+        if assistant is not None:
+            self.assists[self._player(assistant)] += 1
+        return True
+
+    def set_label(self, iri, label, is_team, team=None):
+        """Names a team, or a player and the team they play for."""
+        if is_team:
+            index = self._team(iri)
+            self.team_labels[index] = label
+            self._add_name(label, index, strict=False)
+        else:
+            index = self._player(iri)
+            self.player_labels[index] = label
+            if team is not None:
+                self.player_teams[index] = self._team(team)
+
+    def _team(self, iri) -> int:
+        index = self.team_index.get(iri)
+        if index is None:
+            index = len(self.teams)
+            self.team_index[iri] = index
+            self.teams.append(iri)
+            self.team_labels.append(iri.rsplit("#", 1)[-1].replace("_", " "))
+            for column in self.table.values():
+                column.append(0)
+            self.results.append([])
+            for name in self.aliases.get(iri[len(ONTOLOGY_PREFIX):], ()):
+                self._add_name(name, index)
+        return index
+
+    def _player(self, iri) -> int:
+        index = self.player_index.get(iri)
+        if index is None:
+            index = len(self.players)
+            self.player_index[iri] = index
+            self.players.append(iri)
+            self.player_labels.append(iri.rsplit("#", 1)[-1].replace("_", " "))
+            self.player_teams.append(-1)
+            self.goals.append(0)
+            self.assists.append(0)
+        return index
+
+    def _add_name(self, name, index, strict=None):
+        key = tuple(normalize_name(name).split())
+        if key:
+            self.names[key] = (index, len(key) == 1 if strict is None else strict)
+
+    # questions
+    def answer(self, question: str):
+        """The ViewAnswer of the question, or None if no view answers it."""
+        start = time.perf_counter()
+        with self.lock:
+            match = self._match(question)
+            answer = None
+            if match is not None:
+                view, team, count = match
+                answer = getattr(self, "_" + view)(team, count)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits[answer.view] = self.hits.get(answer.view, 0) + 1
+            self.answer_time += time.perf_counter() - start
+        return answer
+
+    def _match(self, question):
+        """(view, team index or None, number or None) if the question asks for a view and nothing else."""
+        words = WORD_RE.findall(question)
+        keys = [normalize_name(word) for word in words]
+        used = [False] * len(keys)
+        views, teams, numbers = set(), set(), []
+        max_name = max((len(name) for name in self.names), default=1)
+        i = 0
+        while i < len(keys):
+            for n in range(min(max_name, len(keys) - i), 0, -1):
+                found = self.names.get(tuple(keys[i:i + n]))
+                if found is not None and (not found[1] or words[i][:1].isupper()):
+                    teams.add(found[0])
+                    used[i:i + n] = [True] * n
+                    i += n
+                    break
+            else:
+                i += 1
+        # "top 3 scorers" is "top scorers" with a number
+        words_only = [i for i, key in enumerate(keys) if not key.isdigit()]
+        for phrase, view in PHRASES:
+            n = len(phrase)
+            for j in range(len(words_only) - n + 1):
+                span = words_only[j:j + n]
+                if not any(used[i] for i in span) and tuple(keys[i] for i in span) == phrase:
+                    views.add(view)
+                    for i in span:
+                        used[i] = True
+        for i, key in enumerate(keys):
+            if used[i]:
+                continue
+            if key.isdigit():
+                numbers.append(int(key))
+            elif key not in FILLER:
+                return None
+        if len(views) != 1 or len(teams) > 1 or len(numbers) > 1:
+            return None
+        view = views.pop()
+        team = teams.pop() if teams else None
+        if view in TEAM_VIEWS and team is None:
+            return None
+        count = numbers[0] if numbers and 0 < numbers[0] <= MAX_ROWS else None
+        if numbers and count is None:
+            return None
+        return view, team, count
+
+    def _standings(self) -> list:
+        table = self.table
+        return sorted(
+            range(len(self.teams)),
+            key=lambda t: (-(3 * table["wins"][t] + table["draws"][t]),
+                           -(table["goals_for"][t] - table["goals_against"][t]),
+                           -table["goals_for"][t], self.team_labels[t]),
+        )
+
+    def _league_table(self, team, count):
+        if not self.teams:
+            return None
+        table = self.table
+        positions = list(enumerate(self._standings(), start=1))
+        if team is not None:
+            positions = [(position, t) for position, t in positions if t == team]
+        elif count is not None:
+            positions = positions[:count]
+        headers = ["Pos", "Team", "P", "W", "D", "L", "GF", "GA", "GD", "Pts"]
+        rows, bindings = [], []
+        for position, t in positions:
+            values = [table[column][t] for column in TABLE_COLUMNS]
+            played, wins, draws, losses, goals_for, goals_against = values
+            difference, points = goals_for - goals_against, 3 * wins + draws
+            rows.append([str(position), self.team_labels[t], *map(str, values),
+                         f"{difference:+d}" if difference else "0", str(points)])
+            binding = {"position": _integer(position), "team": _uri(self.teams[t])}
+            binding.update((column, _integer(value)) for column, value in zip(TABLE_COLUMNS, values))
+            binding["goal_difference"] = _integer(difference)
+            binding["points"] = _integer(points)
+            bindings.append(binding)
+        return ViewAnswer("league_table", bindings, format_table(headers, rows))
+
+    def _top_players(self, view, counts, header, team, count):
+        players = [p for p in range(len(self.players)) if counts[p] and (team is None or self.player_teams[p] == team)]
+        if not players:
+            return None
+        players.sort(key=lambda p: (-counts[p], self.player_labels[p]))
+        players = players[:count or TOP_PLAYERS]
+        rows, bindings = [], []
+        for p in players:
+            club = self.player_teams[p]
+            rows.append([self.player_labels[p], self.team_labels[club] if club >= 0 else "", str(counts[p])])
+            binding = {"player": _uri(self.players[p]), header.lower(): _integer(counts[p])}
+            if club >= 0:
+                binding["team"] = _uri(self.teams[club])
+            bindings.append(binding)
+        return ViewAnswer(view, bindings, format_table(["Player", "Team", header], rows))
+
+    def _top_scorers(self, team, count):
+        return self._top_players("top_scorers", self.goals, "Goals", team, count)
+
+    def _top_assists(self, team, count):
+        return self._top_players("top_assists", self.assists, "Assists", team, count)
+
+    def _form(self, team, count):
+        results = self.results[team][-(count or FORM_MATCHES):]
+        if not results:
+            return None
+        rows, bindings, letters = [], [], []
+        for gameweek, opponent, is_home, scored, conceded in results:
+            letter = "W" if scored > conceded else "D" if scored == conceded else "L"
+            letters.append(letter)
+            rows.append([str(gameweek), f"{self.team_labels[opponent]} ({'H' if is_home else 'A'})",
+                         f"{scored}-{conceded}", letter])
+            bindings.append({"gameweek": _integer(gameweek), "opponent": _uri(self.teams[opponent]),
+                             "goals_for": _integer(scored), "goals_against": _integer(conceded),
+                             "result": {"type": "literal", "value": letter}})
+        text = f"Form of {self.team_labels[team]}: {' '.join(letters)}\n" + format_table(
+            ["GW", "Opponent", "Score", "Result"], rows)
+        return ViewAnswer("form", bindings, text)
+
+    def stats(self) -> dict:
+        answered = sum(self.hits.values())
+        questions = answered + self.misses
+        return {
+            "teams": len(self.teams),
+            "players": len(self.players),
+            "matches": len(self.matches),
+            "gameweek": self.gameweek,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": answered / questions if questions else 0.0,
+            "mean_answer_ms": self.answer_time / questions * 1000 if questions else 0.0,
+            "updates": self.updates,
+            "mean_update_ms": self.update_time / self.updates * 1000 if self.updates else 0.0,
+        }
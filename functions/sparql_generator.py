@@ -1,15 +1,42 @@
 # functions/sparql_generator.py
-from google import genai
-from google.genai import types
+from functions.llm_client import get_llm
+from functions.schema_retrieval import EXAMPLE_BANK, load_schema, select_examples
 
-def generate_sparql(api_key: str, ontology_path: str, question: str) -> str:
-    """Uses Gemini to create a SPARQL query based on the ontology."""
-    with open(ontology_path, "r") as f:
-        ontology_text = f.read()
+# few-shot examples given with every question
+EXAMPLES_PER_PROMPT = 2
+
+
+def format_examples(examples) -> str:
+    return "\n\n".join(f"Q: {question}\nA:\n{sparql}" for question, sparql in examples)
+
+
+def build_system_prompt(ontology_path: str, question: str, prune: bool = True, mentions=None) -> str:
+    """
+    The generator's system prompt. With prune, only the part of the schema the question is
+    about (see schema_retrieval.SchemaIndex.select) and the most similar examples of the
+    example bank are included; otherwise the whole schema and the first two examples.
+    mentions are the entities of the question found by entity_index.EntityIndex.resolve,
+    their IRIs are given so that the model doesn't have to guess them.
+    """
+    schema = load_schema(ontology_path)
+    if prune:
+        ontology_text = schema.render(schema.select(question))
+        examples = select_examples(question, EXAMPLES_PER_PROMPT)
+    else:
+        ontology_text = schema.render()
+        examples = EXAMPLE_BANK[:EXAMPLES_PER_PROMPT]
+    entities = ""
+    if mentions:
+        # entity_index imports execute_query (and requests), only needed when there are mentions
+        from functions.entity_index import format_mentions
 
-    client = genai.Client(api_key=api_key)
+        lines = format_mentions(mentions).replace("\n", "\n    ")
+        entities = f"""
+    The question mentions these entities, use their IRIs:
+    {lines}
+"""
 
-    system_prompt = f"""
+    return f"""
     You are an expert in Semantic Web and SPARQL query generation.
 
     Here is the ontology schema:
@@ -17,53 +44,30 @@ def generate_sparql(api_key: str, ontology_path: str, question: str) -> str:
 
     Here are some SPARQL examples:
 
-    Q: List all players and the teams they play for.
-    A:
-    PREFIX : <http://semanticweb.org/unitedOntology#>
-    SELECT ?player ?team
-    WHERE {{
-    ?player a :Player ;
-            :playsFor ?team .
-    }}
-
-    Example 2:
-    Q: List all features of a Manchester United, with goals they scored and conceded
-    A:
-    PREFIX : <http://semanticweb.org/unitedOntology#>
-
-    SELECT DISTINCT ?home_team ?away_team ?home_goals ?away_goals 
-    WHERE {{
-    ?m a ?Match ;
-        :matchHasTeamStats ?ts1 ;
-        :matchHasTeamStats ?ts2 ;
-        :matchGameweek ?gameweek ;
-        :hasHomeTeam ?home_team ;
-        :hasAwayTeam ?away_team.
-    ?ts1 :statsOfTeam ?home_team ;
-            :teamGoalsScored ?home_goals .
-    ?ts2 :statsOfTeam ?away_team ;
-            :teamGoalsScored ?away_goals .
-        
-    FILTER(?home_team = :Manchester_United || ?away_team = :Manchester_United)
-    }} ORDER BY ASC(?gameweek)
-
+    {format_examples(examples)}
+{entities}
     Task:
     - Given a natural language question, generate a valid SPARQL 1.1 SELECT query.
     - Use prefix : <http://semanticweb.org/unitedOntology#>
     - Return only one SPARQL query — no explanations, NO MARKDOWN, no commentary.
     """
 
+
+def generate_sparql(api_key: str, ontology_path: str, question: str, prune: bool = True, mentions=None) -> str:
+    """Uses Gemini to create a SPARQL query based on the ontology."""
+    from google.genai import types
+
+    llm = get_llm(api_key)
+
+    system_prompt = build_system_prompt(ontology_path, question, prune, mentions)
+
     messages = [types.Content(role="user", parts=[types.Part(text=question)])]
 
     config = types.GenerateContentConfig(system_instruction=system_prompt)
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-001",
-        contents=messages,
-        config=config
-    )
+    text = llm.generate(messages, config, purpose="generate")
 
-    if not response or not response.candidates:
+    if not text:
         return "⚠️ Could not generate SPARQL."
 
-    return response.candidates[0].content.parts[0].text.strip()
+    return text.strip()
@@ -0,0 +1,570 @@
+import re
+from rdflib import Literal, URIRef, Variable
+from rdflib.namespace import RDF, RDFS, OWL, XSD, SKOS
+
+ONTOLOGY_PREFIX = "http://semanticweb.org/unitedOntology#"
+
+# prefixes that are resolved even if the query forgets to declare them
+WELL_KNOWN_PREFIXES = {
+    "rdf": str(RDF),
+    "rdfs": str(RDFS),
+    "owl": str(OWL),
+    "xsd": str(XSD),
+    "skos": str(SKOS),
+}
+
+# One alternative per token kind. Tried in order at every position, so the scan is a single
+# linear pass over the query; anything unknown becomes a one character PUNCT token.
+TOKEN_RE = re.compile(
+    r"""
+    (?P<WS>\s+|\#[^\n]*)
+    |(?P<IRI><[^<>"{}|^`\\\s]*>)
+    |(?P<STRING>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\"|'''(?:[^'\\]|\\.|'(?!''))*'''|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<LANG>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+    |(?P<VAR>[?$]\w+)
+    |(?P<BNODE>_:\w(?:[\w.-]*[\w-])?)
+    |(?P<PNAME>(?:[A-Za-z_](?:[\w.-]*[\w-])?)?:(?:(?:[\w:%-]|\\.)(?:(?:[\w.:%-]|\\.)*(?:[\w:%-]|\\.))?)?)
+    |(?P<NUMBER>[+-]?(?:\d*\.\d+(?:[eE][+-]?\d+)?|\d+\.\d*[eE][+-]?\d+|\d+(?:[eE][+-]?\d+)?))
+    |(?P<WORD>[A-Za-z_]\w*)
+    |(?P<ANON>\[\s*\])
+    |(?P<NIL>\(\s*\))
+    |(?P<PUNCT>\^\^|&&|\|\||!=|<=|>=|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# keywords that only introduce a nested group pattern
+GROUP_KEYWORDS = {"OPTIONAL", "MINUS", "UNION", "LATERAL"}
+# keywords followed by an expression in parentheses
+EXPRESSION_KEYWORDS = {"FILTER", "BIND", "HAVING"}
+QUERY_FORMS = {"SELECT", "ASK", "CONSTRUCT", "DESCRIBE"}
+
+
+class Token:
+    __slots__ = ("kind", "value", "start", "end")
+
+    def __init__(self, kind, value, start, end):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def is_word(self, *words) -> bool:
+        return self.kind == "WORD" and self.value.upper() in words
+
+    def is_punct(self, *values) -> bool:
+        return self.kind == "PUNCT" and self.value in values
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def tokenize(query_str: str) -> list:
+    """Splits a SPARQL query into tokens, dropping whitespace and comments."""
+    tokens = []
+    for m in TOKEN_RE.finditer(query_str):
+        kind = m.lastgroup
+        if kind != "WS":
+            tokens.append(Token(kind, m.group(), m.start(), m.end()))
+    return tokens
+
+
+class _BGPParser:
+    """
+    Recursive descent over the tokens of a query that collects the triple patterns of every
+    group pattern (nested groups, OPTIONAL, UNION, MINUS, GRAPH, subqueries and EXISTS).
+    The parser is lenient: tokens it doesn't understand are skipped instead of raising,
+    because the queries come from an LLM and the validator reports the problems itself.
+    """
+
+    def __init__(self, tokens, default_prefix):
+        self.tokens = tokens
+        self.i = 0
+        self.prefixes = dict(WELL_KNOWN_PREFIXES)
+        self.prefixes[""] = default_prefix
+        self.base = ""
+        self.triples = []
+        # the token of the predicate of every triple, None if it isn't a single IRI
+        self.verbs = []
+        self.verb = None
+        # the group pattern of every triple, an index into groups: (keyword, index of the parent group)
+        self.triple_groups = []
+        self.groups = []
+        self.group_stack = []
+        self.group_kind = None
+        # (group, first token, end token, first triple, end triple) of every subject and its property list
+        self.statements = []
+        # (first token, end token) of every FILTER
+        self.filters = []
+        self.fresh = 0
+        # the variable of every blank node label, _:b is the same node wherever it is used
+        self.bnodes = {}
+        # character offsets of the content of the WHERE clause
+        self.where_span = None
+        # SELECT, ASK, CONSTRUCT or DESCRIBE
+        self.form = None
+
+    # helpers
+    def peek(self, offset=0):
+        j = self.i + offset
+        return self.tokens[j] if j < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def new_variable(self) -> Variable:
+        self.fresh += 1
+        return Variable(f"_b{self.fresh}")
+
+    def skip_balanced(self, open_, close):
+        """Skips a balanced (...) or {...} block, the current token being its opening one."""
+        depth = 0
+        while self.peek() is not None:
+            token = self.next()
+            if token.is_punct(open_):
+                depth += 1
+            elif token.is_punct(close):
+                depth -= 1
+                if depth == 0:
+                    return
+            elif open_ == "(" and token.is_punct("{"):
+                # EXISTS { ... } inside an expression
+                self.i -= 1
+                self.group_kind = "EXISTS"
+                self.group()
+
+    def skip_expression(self):
+        """Skips a constraint: a bracketted expression or a function call."""
+        token = self.peek()
+        if token is None:
+            return
+        if token.is_word("NOT"):
+            self.next()
+            token = self.peek()
+        if token is not None and token.is_word("EXISTS"):
+            self.next()
+            if self.peek() is not None and self.peek().is_punct("{"):
+                self.group_kind = "EXISTS"
+                self.group()
+            return
+        if token.is_punct("("):
+            self.skip_balanced("(", ")")
+            return
+        self.next()
+        if self.peek() is not None and self.peek().is_punct("("):
+            self.skip_balanced("(", ")")
+
+    # terms
+    def resolve(self, pname: str) -> URIRef:
+        prefix, _, local = pname.partition(":")
+        local = re.sub(r"\\(.)", r"\1", local)
+        namespace = self.prefixes.get(prefix)
+        if namespace is None:
+            # undeclared prefix, assume the ontology namespace as the LLM usually means it
+            namespace = self.prefixes[""]
+        return URIRef(namespace + local)
+
+    def term(self):
+        """Parses a variable, IRI, literal, blank node or collection and returns it as a term."""
+        token = self.peek()
+        if token is None:
+            return None
+        kind = token.kind
+        if kind == "VAR":
+            self.next()
+            return Variable(token.value[1:])
+        if kind == "IRI":
+            self.next()
+            return URIRef(self.base + token.value[1:-1]) if ":" not in token.value else URIRef(token.value[1:-1])
+        if kind == "PNAME":
+            self.next()
+            return self.resolve(token.value)
+        if kind == "STRING":
+            self.next()
+            quote = 3 if token.value[:3] in ('"""', "'''") else 1
+            value = token.value[quote:-quote]
+            nxt = self.peek()
+            if nxt is not None and nxt.kind == "LANG":
+                self.next()
+                return Literal(value, lang=nxt.value[1:])
+            if nxt is not None and nxt.is_punct("^^"):
+                self.next()
+                datatype = self.term()
+                return Literal(value, datatype=datatype if isinstance(datatype, URIRef) else None)
+            return Literal(value)
+        if kind == "NUMBER":
+            self.next()
+            value = token.value
+            if "e" in value.lower():
+                return Literal(value, datatype=XSD.double)
+            if "." in value:
+                return Literal(value, datatype=XSD.decimal)
+            return Literal(value, datatype=XSD.integer)
+        if token.is_word("TRUE", "FALSE"):
+            self.next()
+            return Literal(token.value.lower() == "true", datatype=XSD.boolean)
+        if kind in ("ANON", "NIL"):
+            self.next()
+            return self.new_variable()
+        if kind == "BNODE":
+            # a labelled blank node is a variable of the pattern, like [], not an IRI to validate
+            self.next()
+            if token.value not in self.bnodes:
+                self.bnodes[token.value] = self.new_variable()
+            return self.bnodes[token.value]
+        if token.is_punct("["):
+            self.next()
+            subject = self.new_variable()
+            self.property_list(subject)
+            if self.peek() is not None and self.peek().is_punct("]"):
+                self.next()
+            return subject
+        if token.is_punct("("):
+            # collection, the rdf:first/rdf:rest structure isn't validated
+            self.next()
+            while self.peek() is not None and not self.peek().is_punct(")", "}"):
+                if self.term() is None:
+                    self.next()
+            if self.peek() is not None and self.peek().is_punct(")"):
+                self.next()
+            return self.new_variable()
+        return None
+
+    # property paths
+    def path(self):
+        alternatives = [self.path_sequence()]
+        while self.peek() is not None and self.peek().is_punct("|"):
+            self.next()
+            alternatives.append(self.path_sequence())
+        return alternatives[0] if len(alternatives) == 1 else ("alt", alternatives)
+
+    def path_sequence(self):
+        elements = [self.path_element()]
+        while self.peek() is not None and self.peek().is_punct("/"):
+            self.next()
+            elements.append(self.path_element())
+        return elements[0] if len(elements) == 1 else ("seq", elements)
+
+    def path_element(self):
+        inverse = False
+        if self.peek() is not None and self.peek().is_punct("^"):
+            self.next()
+            inverse = True
+        token = self.peek()
+        if token is None:
+            element = None
+        elif token.kind == "WORD" and token.value == "a":
+            self.next()
+            element = RDF.type
+        elif token.is_punct("!"):
+            # negated property set, nothing to validate
+            self.next()
+            if self.peek() is not None and self.peek().is_punct("("):
+                self.skip_balanced("(", ")")
+            else:
+                self.path_element()
+            element = None
+        elif token.is_punct("("):
+            self.next()
+            element = self.path()
+            if self.peek() is not None and self.peek().is_punct(")"):
+                self.next()
+        elif token.kind in ("VAR", "IRI", "PNAME"):
+            element = self.term()
+        else:
+            return None
+        # path modifiers ? * + keep the property of the element
+        while self.peek() is not None and self.peek().is_punct("?", "*", "+"):
+            self.next()
+        return ("inv", element) if inverse else element
+
+    def add_path(self, s, path, o):
+        if path is None:
+            return
+        if isinstance(path, tuple):
+            kind, value = path
+            if kind == "inv":
+                self.add_path(o, value, s)
+            elif kind == "alt":
+                for alternative in value:
+                    self.add_path(s, alternative, o)
+            elif kind == "seq":
+                current = s
+                for element in value[:-1]:
+                    nxt = self.new_variable()
+                    self.add_path(current, element, nxt)
+                    current = nxt
+                self.add_path(current, value[-1], o)
+            return
+        self.triples.append((s, path, o))
+        self.verbs.append(self.verb)
+        self.triple_groups.append(self.group_stack[-1] if self.group_stack else None)
+
+    # triples
+    def property_list(self, subject):
+        """Parses 'verb objects (; verb objects)*' for the given subject."""
+        while True:
+            token = self.peek()
+            if token is None or token.is_punct(".", "}", "]"):
+                return
+            if token.is_punct(";"):
+                self.next()
+                continue
+            start = self.i
+            verb = self.path()
+            if self.i == start:
+                return
+            verb_token = self.tokens[start] if self.i == start + 1 and self.tokens[start].kind in ("IRI", "PNAME") else None
+            while True:
+                obj = self.term()
+                if obj is None:
+                    break
+                # set again after every object, a blank node object has its own property list
+                self.verb = verb_token
+                self.add_path(subject, verb, obj)
+                if self.peek() is not None and self.peek().is_punct(","):
+                    self.next()
+                    continue
+                break
+            if self.peek() is None or not self.peek().is_punct(";"):
+                return
+
+    def group(self):
+        """Parses a group pattern, the current token being its opening brace."""
+        kind, self.group_kind = self.group_kind or "GROUP", None
+        self.groups.append((kind, self.group_stack[-1] if self.group_stack else None))
+        self.group_stack.append(len(self.groups) - 1)
+        try:
+            self._group()
+        finally:
+            self.group_stack.pop()
+
+    def _group(self):
+        self.next()
+        while self.peek() is not None:
+            token = self.peek()
+            if token.is_punct("}"):
+                self.next()
+                return
+            if token.is_punct("{"):
+                self.group()
+            elif token.is_punct("."):
+                self.next()
+            elif token.is_word(*GROUP_KEYWORDS):
+                self.group_kind = token.value.upper()
+                self.next()
+            elif token.is_word("GRAPH", "SERVICE"):
+                self.next()
+                if self.peek() is not None and self.peek().is_word("SILENT"):
+                    self.next()
+                self.term()
+            elif token.is_word(*EXPRESSION_KEYWORDS):
+                start = self.i
+                self.next()
+                self.skip_expression()
+                if token.is_word("FILTER"):
+                    self.filters.append((start, self.i))
+            elif token.is_word("VALUES"):
+                self.values()
+            elif token.is_word("SELECT"):
+                self.subquery()
+            else:
+                start = self.i
+                first = len(self.triples)
+                subject = self.term()
+                if subject is not None:
+                    self.property_list(subject)
+                if self.i == start:
+                    # not a triple, skip the token
+                    self.next()
+                else:
+                    self.statements.append((self.group_stack[-1], start, self.i, first, len(self.triples)))
+
+    def values(self):
+        self.next()
+        while self.peek() is not None and not self.peek().is_punct("{"):
+            self.next()
+        if self.peek() is not None:
+            self.skip_balanced("{", "}")
+
+    def subquery(self):
+        """{ SELECT ... WHERE { ... } modifiers }, the modifiers are skipped up to the closing brace."""
+        while self.peek() is not None and not self.peek().is_punct("{"):
+            if self.peek().is_punct("("):
+                self.skip_balanced("(", ")")
+            else:
+                self.next()
+        if self.peek() is None:
+            return
+        self.group_kind = "SELECT"
+        self.group()
+        while self.peek() is not None and not self.peek().is_punct("}"):
+            token = self.peek()
+            if token.is_punct("("):
+                self.skip_balanced("(", ")")
+            elif token.is_word("VALUES"):
+                self.values()
+            else:
+                self.next()
+
+    def query(self):
+        """Reads the prologue and parses the WHERE clause of the query."""
+        form = None
+        while self.peek() is not None:
+            token = self.peek()
+            if token.is_word("PREFIX"):
+                self.next()
+                name, iri = self.next(), self.next()
+                if name is not None and iri is not None and name.kind == "PNAME" and iri.kind == "IRI":
+                    self.prefixes[name.value[:-1]] = iri.value[1:-1]
+            elif token.is_word("BASE"):
+                self.next()
+                iri = self.next()
+                if iri is not None and iri.kind == "IRI":
+                    self.base = iri.value[1:-1]
+            elif token.is_word(*QUERY_FORMS):
+                form = token.value.upper()
+                self.next()
+            elif token.is_word("WHERE"):
+                self.next()
+            elif token.is_punct("{"):
+                if form == "CONSTRUCT" and (self.i == 0 or not self.tokens[self.i - 1].is_word("WHERE")):
+                    # construct template, the pattern comes after it
+                    self.skip_balanced("{", "}")
+                    form = None
+                    continue
+                self.form = form
+                self.group_kind = "WHERE"
+                self.group()
+                closing = self.tokens[self.i - 1]
+                end = closing.start if closing.is_punct("}") else closing.end
+                self.where_span = (token.end, end)
+                return
+            elif token.is_punct("("):
+                self.skip_balanced("(", ")")
+            else:
+                self.next()
+
+
+def parse_bgps(query_str: str, default_prefix: str = ONTOLOGY_PREFIX) -> list:
+    """
+    Returns every triple pattern in the WHERE clause of a query as (subject, predicate, object)
+    rdflib terms, with prefixed names resolved against the PREFIX declarations.
+    Variables and blank nodes are rdflib Variables, 'a' is rdf:type and property paths are
+    expanded into plain triples (sequences through fresh variables, inverses swapped).
+    """
+    parser = _BGPParser(tokenize(query_str), default_prefix)
+    parser.query()
+    return parser.triples
+
+
+def locate_terms(query_str: str, default_prefix: str = ONTOLOGY_PREFIX):
+    """
+    Returns where the terms of a query are in its text, so that they can be rewritten:
+    the (triple, token of its predicate) pairs of parse_bgps, the token being None when the
+    predicate is a path or 'a', the (token, IRI) pairs of every IRI and prefixed name of the
+    WHERE clause, and the declared prefixes.
+    """
+    parser = _BGPParser(tokenize(query_str), default_prefix)
+    parser.query()
+    iris = []
+    if parser.where_span is not None:
+        start, end = parser.where_span
+        for token in parser.tokens:
+            if start <= token.start < end and token.kind in ("IRI", "PNAME"):
+                iri = parser.resolve(token.value) if token.kind == "PNAME" else URIRef(token.value[1:-1])
+                iris.append((token, iri))
+    return list(zip(parser.triples, parser.verbs)), iris, parser.prefixes
+
+
+class QueryPatterns:
+    """
+    The structure of a query that the cost guard (see query_guard) works on: the triples of
+    parse_bgps with the group pattern of each, the (keyword, parent) of every group, the
+    statements (a subject and its property list) as token ranges with the triples they
+    contain, the variables of every FILTER, and the tokens of the query.
+    modifiers is the index of the first token after the WHERE clause (ORDER BY, LIMIT, ...).
+    """
+
+    __slots__ = ("tokens", "triples", "triple_groups", "groups", "statements", "filters", "form",
+                 "where_span", "modifiers", "prefixes")
+
+    def __init__(self, parser):
+        self.tokens = parser.tokens
+        self.triples = parser.triples
+        self.triple_groups = parser.triple_groups
+        self.groups = parser.groups
+        self.statements = parser.statements
+        self.filters = [
+            {token.value[1:] for token in parser.tokens[start:end] if token.kind == "VAR"}
+            for start, end in parser.filters
+        ]
+        self.form = parser.form
+        self.where_span = parser.where_span
+        self.modifiers = parser.i
+        self.prefixes = parser.prefixes
+
+    def group_path(self, group) -> list:
+        """The keywords of the group and of the groups around it, innermost first."""
+        kinds = []
+        while group is not None:
+            kind, group = self.groups[group]
+            kinds.append(kind)
+        return kinds
+
+
+def parse_patterns(query_str: str, default_prefix: str = ONTOLOGY_PREFIX) -> QueryPatterns:
+    """Parses the query like parse_bgps and returns its QueryPatterns."""
+    parser = _BGPParser(tokenize(query_str), default_prefix)
+    parser.query()
+    return QueryPatterns(parser)
+
+
+def where_block_span(query_str: str):
+    """Returns the (start, end) character offsets of the content of the WHERE clause, or None."""
+    parser = _BGPParser(tokenize(query_str), ONTOLOGY_PREFIX)
+    parser.query()
+    return parser.where_span
+
+
+def canonicalize_query(query_str: str):
+    """
+    Returns a canonical text of the query, so that queries that only differ in whitespace,
+    comments, keyword case, prefix names, variable names or a final dot get the same text, and the
+    mapping from the query's variable names to the canonical ones (?v0, ?v1, ... in order
+    of first appearance).
+    Prefixed names are written as full IRIs; undeclared prefixes are kept as they are.
+    """
+    tokens = tokenize(query_str)
+    prefixes = {}
+    variables = {}
+    parts = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.is_word("PREFIX") and i + 2 < len(tokens) and tokens[i + 1].kind == "PNAME" and tokens[i + 2].kind == "IRI":
+            prefixes[tokens[i + 1].value[:-1]] = tokens[i + 2].value[1:-1]
+            i += 3
+            continue
+        kind = token.kind
+        if token.is_punct(".") and i + 1 < len(tokens) and tokens[i + 1].is_punct("}"):
+            # the last triple of a group may or may not end with a dot
+            i += 1
+            continue
+        if kind == "VAR":
+            name = token.value[1:]
+            if name not in variables:
+                variables[name] = f"v{len(variables)}"
+            parts.append("?" + variables[name])
+        elif kind == "PNAME":
+            prefix, _, local = token.value.partition(":")
+            namespace = prefixes.get(prefix, WELL_KNOWN_PREFIXES.get(prefix))
+            parts.append(f"<{namespace}{local}>" if namespace is not None else token.value)
+        elif kind == "WORD" and token.value != "a":
+            parts.append(token.value.upper())
+        else:
+            parts.append(token.value)
+        i += 1
+    return " ".join(parts), variables
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from difflib import SequenceMatcher
+from rdflib import OWL, RDF, RDFS, URIRef
+from functions.ontology_store import load_ontology
+from functions.sparql_parser import locate_terms
+from functions.sparql_validator import _query_triples, validate_sparql
+from functions.validation_engine import find_violations
+
+logger = logging.getLogger(__name__)
+
+PROPERTY_TYPES = (OWL.ObjectProperty, OWL.DatatypeProperty, RDF.Property)
+CLASS_TYPES = (OWL.Class, RDFS.Class)
+# the rules whose violations may come from a property used the wrong way round
+DIRECTION_RULES = {"Domain Rule", "Range Rule", "Double Range Rule", "Double Domain Rule", "domain-range rule"}
+# a name at least this similar to one of the ontology (0..1) is taken for a misspelling of it
+MIN_SIMILARITY = 0.75
+# names that contain each other, e.g. goalsScored and teamGoalsScored, are this similar at least
+CONTAINED_SIMILARITY = 0.9
+MIN_CONTAINED_LENGTH = 5
+MAX_CANDIDATES = 5
+# a query is rewritten at most this many times, one term at a time
+MAX_ROUNDS = 3
+
+
+def similarity(a: str, b: str) -> float:
+    """How close two names are, from 0 to 1, ignoring case."""
+    a, b = a.lower(), b.lower()
+    matcher = SequenceMatcher(None, a, b)
+    if min(len(a), len(b)) >= MIN_CONTAINED_LENGTH and (a in b or b in a):
+        return max(CONTAINED_SIMILARITY, matcher.ratio())
+    return matcher.ratio()
+
+
+def _local_name(iri) -> str:
+    return str(iri).rsplit("#", 1)[-1].rsplit("/", 1)[-1]
+
+
+class Repair:
+    """A query the repairer fixed, with the changes it made, e.g. ["goalsScored -> teamGoalsScored"]."""
+
+    def __init__(self, query: str, changes: list):
+        self.query = query
+        self.changes = changes
+
+    def __repr__(self):
+        return f"<Repair {', '.join(self.changes)}>"
+
+
+class SparqlRepairer:
+    """
+    Fixes queries that failed validation because of a single wrong term, without asking the
+    LLM again: properties and classes that aren't in the ontology are replaced by the closest
+    names of the ontology (by edit distance to their local names and labels), and a property
+    whose domain and range don't fit is turned around (its owl:inverseOf, or ^property).
+    Every rewrite is validated with the native engine and kept only if it removes errors
+    without adding any; repair returns the fixed query once it passes validate_sparql, None
+    if it doesn't get there.
+    """
+
+    def __init__(self, ontology_path: str, cache_dir: str = None, min_similarity=MIN_SIMILARITY, max_rounds=MAX_ROUNDS):
+        self.ontology_path = ontology_path
+        self.cache_dir = cache_dir
+        self.min_similarity = min_similarity
+        self.max_rounds = max_rounds
+        store = load_ontology(ontology_path, cache_dir)
+        graph = store.graph
+        self.index = store.index
+        self.properties = {p for t in PROPERTY_TYPES for p in graph.subjects(RDF.type, t) if isinstance(p, URIRef)}
+        # literals can't be subjects, these are never turned around
+        self.datatype_properties = set(graph.subjects(RDF.type, OWL.DatatypeProperty))
+        self.classes = {c for t in CLASS_TYPES for c in graph.subjects(RDF.type, t) if isinstance(c, URIRef)}
+        self.names = {}
+        for term in self.properties | self.classes:
+            names = {_local_name(term)}
+            names.update(str(label) for label in graph.objects(term, RDFS.label))
+            self.names[term] = names
+        self.inverses = {}
+        for p, q in graph.subject_objects(OWL.inverseOf):
+            self.inverses.setdefault(p, q)
+            self.inverses.setdefault(q, p)
+        # closest ontology terms of the unknown names seen so far; the cache and the counters are
+        # shared by the sessions of the server, changed under the lock
+        self.lock = threading.Lock()
+        self._candidates = {}
+        self.repaired = 0
+        self.failed = 0
+        self.repair_time = 0.0
+
+    def candidates(self, term, vocabulary) -> list:
+        """The terms of vocabulary whose names are close to the name of term, closest first."""
+        key = (term, vocabulary is self.classes)
+        with self.lock:
+            candidates = self._candidates.get(key)
+        if candidates is not None:
+            return candidates
+        name = _local_name(term)
+        scored = []
+        for candidate in vocabulary:
+            if candidate == term:
+                continue
+            score = max(similarity(name, other) for other in self.names[candidate])
+            if score >= self.min_similarity:
+                scored.append((score, str(candidate)))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        candidates = [(score, URIRef(candidate)) for score, candidate in scored[:MAX_CANDIDATES]]
+        with self.lock:
+            # another session may have scored the same name meanwhile
+            return self._candidates.setdefault(key, candidates)
+
+    def repair(self, query: str):
+        """Returns a Repair of the query, or None if it can't be fixed locally."""
+        start = time.perf_counter()
+        repair = None
+        try:
+            repair = self._repair(query)
+        finally:
+            with self.lock:
+                self.repair_time += time.perf_counter() - start
+                if repair is None:
+                    self.failed += 1
+                else:
+                    self.repaired += 1
+        if repair is not None:
+            logger.debug("Repaired the query locally: %s", ", ".join(repair.changes))
+        return repair
+
+    def _repair(self, query):
+        triples = _query_triples(query)
+        if triples is None:
+            return None
+        violations = find_violations(self.index, triples)
+        changes = []
+        for _ in range(self.max_rounds):
+            if not violations:
+                break
+            best = None
+            for rewritten, change in self._rewrites(query, violations):
+                rewritten_triples = _query_triples(rewritten)
+                if rewritten_triples is None:
+                    continue
+                remaining = find_violations(self.index, rewritten_triples)
+                # a rewrite must not add errors of its own
+                if set(remaining) <= set(violations) and len(remaining) < len(violations):
+                    if best is None or len(remaining) < len(best[2]):
+                        best = (rewritten, change, remaining)
+                        if not remaining:
+                            break
+            if best is None:
+                return None
+            query, change, violations = best
+            changes.append(change)
+        if violations or not changes:
+            return None
+        # the registered rules may be more than the native engine checks
+        if validate_sparql(query, self.ontology_path, self.cache_dir) is not None:
+            return None
+        return Repair(query, changes)
+
+    def _rewrites(self, query, violations):
+        """Yields (rewritten query, change) for every plausible fix of the violations, most likely first."""
+        located, iris, prefixes = locate_terms(query)
+        rewrites = []
+        unknown = {violation.terms["p"] for violation in violations if violation.rule == "incorrect property rule"}
+        for p in unknown:
+            tokens = [token for token, iri in iris if iri == p]
+            for score, candidate in self.candidates(p, self.properties):
+                rewrites.append((score, tokens, candidate, f"{_local_name(p)} -> {_local_name(candidate)}"))
+
+        misused = set()
+        unknown_classes = set()
+        for violation in violations:
+            if violation.rule in DIRECTION_RULES:
+                misused.update(violation.terms[key] for key in ("p", "q") if key in violation.terms)
+                cls = violation.terms.get("class")
+                if cls is not None and cls not in self.classes:
+                    unknown_classes.add(cls)
+        for cls in unknown_classes:
+            tokens = [token for token, iri in iris if iri == cls]
+            for score, candidate in self.candidates(cls, self.classes):
+                rewrites.append((score, tokens, candidate, f"{_local_name(cls)} -> {_local_name(candidate)}"))
+        for (s, p, o), token in located:
+            if token is None or p not in misused:
+                continue
+            if p not in self.datatype_properties:
+                # used with its subject and object swapped
+                inverse = self.inverses.get(p)
+                change = f"{_local_name(p)} reversed" + (f" -> {_local_name(inverse)}" if inverse is not None else "")
+                rewrites.append((CONTAINED_SIMILARITY, [token], inverse if inverse is not None else "^", change))
+            # or confused with a property of a similar name
+            for score, candidate in self.candidates(p, self.properties):
+                rewrites.append((score, [token], candidate, f"{_local_name(p)} -> {_local_name(candidate)}"))
+
+        rewrites.sort(key=lambda rewrite: -rewrite[0])
+        for _, tokens, replacement, change in rewrites:
+            if tokens:
+                yield self._replace(query, tokens, replacement, prefixes), change
+
+    @staticmethod
+    def _replace(query, tokens, replacement, prefixes):
+        """The query with every token replaced by the IRI replacement, or inverted if it is "^"."""
+        parts = []
+        end = len(query)
+        for token in sorted(tokens, key=lambda token: -token.start):
+            if replacement == "^":
+                text = "^" + token.value
+            else:
+                text = f"<{replacement}>"
+                if token.kind == "PNAME":
+                    prefix = token.value.partition(":")[0]
+                    namespace = prefixes.get(prefix)
+                    if namespace and replacement.startswith(namespace) and replacement[len(namespace):].isidentifier():
+                        text = f"{prefix}:{replacement[len(namespace):]}"
+            parts.append(query[token.end:end])
+            parts.append(text)
+            end = token.start
+        parts.append(query[:end])
+        return "".join(reversed(parts))
+
+    def stats(self) -> dict:
+        with self.lock:
+            repaired, failed, repair_time = self.repaired, self.failed, self.repair_time
+        return {
+            "repaired": repaired,
+            "failed": failed,
+            "mean_ms": repair_time / (repaired + failed) * 1000 if repaired + failed else 0.0,
+        }
@@ -0,0 +1,153 @@
+import csv
+import json
+import re
+
+# Incremental parsers of the SPARQL result formats. Each one takes an iterable of text
+# chunks (e.g. the decoded body of a streamed response) and yields the bindings one at a
+# time, in the shape of application/sparql-results+json: {"var": {"type": ..., "value": ...}}
+
+BINDINGS_RE = re.compile(r'"bindings"\s*:\s*\[')
+JSON_WHITESPACE = " \t\r\n,"
+
+
+def iter_json_bindings(chunks):
+    """Yields the bindings of an application/sparql-results+json body without loading it all."""
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+
+    # skip the head up to the start of the bindings array
+    while True:
+        match = BINDINGS_RE.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = next(chunks, None)
+        if chunk is None:
+            # no bindings, e.g. the result of an ASK query
+            return
+        buffer += chunk
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in JSON_WHITESPACE:
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        if pos < len(buffer):
+            try:
+                binding, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the binding continues in the next chunk
+                pass
+            else:
+                yield binding
+                pos = end
+                continue
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Unexpected end of SPARQL JSON results")
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def _lines(chunks):
+    """Splits text chunks into lines, keeping the line endings."""
+    rest = ""
+    for chunk in chunks:
+        text = rest + chunk
+        start = 0
+        end = text.find("\n")
+        while end != -1:
+            yield text[start:end + 1]
+            start = end + 1
+            end = text.find("\n", start)
+        rest = text[start:]
+    if rest:
+        yield rest
+
+
+TSV_TERM_RE = re.compile(
+    r'^(?:<(?P<iri>[^>]*)>'
+    r'|_:(?P<bnode>\S+)'
+    r'|"(?P<literal>(?:[^"\\]|\\.)*)"(?:@(?P<lang>[A-Za-z0-9-]+)|\^\^<(?P<datatype>[^>]*)>)?)$'
+)
+TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", '"': '"', "'": "'", "\\": "\\"}
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+
+def _tsv_term(text):
+    """Converts a term in the turtle-like syntax of the TSV results to its JSON form."""
+    match = TSV_TERM_RE.match(text)
+    if match is None:
+        # abbreviated numbers and booleans
+        if text in ("true", "false"):
+            return {"type": "literal", "value": text, "datatype": XSD + "boolean"}
+        if re.fullmatch(r"[+-]?\d+", text):
+            datatype = "integer"
+        elif re.fullmatch(r"[+-]?\d*\.\d+", text):
+            datatype = "decimal"
+        else:
+            datatype = "double"
+        return {"type": "literal", "value": text, "datatype": XSD + datatype}
+    if match.group("iri") is not None:
+        return {"type": "uri", "value": match.group("iri")}
+    if match.group("bnode") is not None:
+        return {"type": "bnode", "value": match.group("bnode")}
+    term = {"type": "literal", "value": re.sub(r"\\(.)", lambda m: TSV_ESCAPES.get(m.group(1), m.group(1)), match.group("literal"))}
+    if match.group("lang"):
+        term["xml:lang"] = match.group("lang")
+    elif match.group("datatype"):
+        term["datatype"] = match.group("datatype")
+    return term
+
+
+def iter_tsv_bindings(chunks):
+    """Yields the bindings of a text/tab-separated-values body."""
+    lines = _lines(chunks)
+    header = next(lines, None)
+    if header is None:
+        return
+    variables = [v.strip()[1:] for v in header.rstrip("\r\n").split("\t")]
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        binding = {}
+        for var, value in zip(variables, line.split("\t")):
+            if value:
+                binding[var] = _tsv_term(value)
+        yield binding
+
+
+def iter_csv_bindings(chunks):
+    """
+    Yields the bindings of a text/csv body. CSV results carry no term types,
+    so values that look like IRIs are returned as uris and the rest as plain literals.
+    """
+    reader = csv.reader(_lines(chunks))
+    variables = next(reader, None)
+    if variables is None:
+        return
+    for row in reader:
+        if not row:
+            continue
+        binding = {}
+        for var, value in zip(variables, row):
+            if not value:
+                continue
+            if value.startswith(("http://", "https://", "urn:")):
+                binding[var] = {"type": "uri", "value": value}
+            elif value.startswith("_:"):
+                binding[var] = {"type": "bnode", "value": value[2:]}
+            else:
+                binding[var] = {"type": "literal", "value": value}
+        yield binding
+
+
+# result format -> (Accept header, parser)
+RESULT_FORMATS = {
+    "json": ("application/sparql-results+json", iter_json_bindings),
+    "tsv": ("text/tab-separated-values", iter_tsv_bindings),
+    "csv": ("text/csv", iter_csv_bindings),
+}
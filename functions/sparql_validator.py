@@ -1,5 +1,17 @@
-from rdflib import Graph, Namespace, URIRef, Dataset
-import re
+from rdflib import Graph, Namespace, URIRef, Variable
+from rdflib.namespace import OWL, RDF, RDFS
+import logging
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functions.ontology_store import load_ontology
+from functions.sparql_parser import parse_bgps, where_block_span
+from functions.tracing import tracer
+from functions.validation_engine import ConstraintViolation, find_violations
+
+logger = logging.getLogger(__name__)
 
 RDFS_TYPE = Namespace("http://www.w3.org/2000/01/rdf-schema#type")
 # Reserved namespace for query variables
@@ -8,76 +20,22 @@ QQ = Namespace("http://example.org/query-vars#")
 def extract_where_block(query_str: str) -> str:
     """
     Extracts the full WHERE block content, even if multi-line or nested.
+    Braces inside strings, IRIs and comments are ignored (see sparql_parser.tokenize).
     """
-    # Normalize whitespace and case for detection
-    query_norm = query_str.replace("\n", " ").replace("\r", " ")
-    
-    # Find the starting point of WHERE {
-    where_start = re.search(r"\bWHERE\s*{", query_norm, re.IGNORECASE)
-    if not where_start:
+    span = where_block_span(query_str)
+    if span is None:
         return ""
+    start, end = span
+    return query_str[start:end].strip()
 
-    start_index = where_start.end()
-    brace_count = 1
-    i = start_index
-    content = []
-
-    # Traverse characters to find matching closing brace
-    while i < len(query_norm) and brace_count > 0:
-        c = query_norm[i]
-        if c == "{":
-            brace_count += 1
-        elif c == "}":
-            brace_count -= 1
-        if brace_count > 0:
-            content.append(c)
-        i += 1
-
-    return "".join(content).strip()
-
-def extract_bgps_from_sparql(query_str):
+def extract_bgps_from_sparql(query_str, ontology_prefix="http://semanticweb.org/unitedOntology#"):
     """
     Extracts Basic Graph Patterns (BGPs) from a SPARQL query.
-    Returns a list of (subject, predicate, object) triples.
-    Handles ; , and . syntaxes correctly.
+    Returns a list of (subject, predicate, object) rdflib terms, taken from every group
+    pattern of the WHERE clause (OPTIONAL, UNION, nested groups, subqueries, ...).
+    Declared PREFIXes are resolved, ontology_prefix is used for ':' if it isn't declared.
     """
-    where_content = extract_where_block(query_str)
-    if not where_content:
-        return []
-
-    # Clean up irrelevant clauses
-    where_content = re.sub(
-        r"(FILTER|OPTIONAL|GROUP BY|ORDER BY|BIND|VALUES|GRAPH)[^{]*",
-        "",
-        where_content,
-        flags=re.IGNORECASE,
-    )
-
-    tokens = re.split(r"(\s*[\.;,]\s*)", where_content)
-    triples = []
-    current_subject = None
-    last_predicate = None
-
-    for token in tokens:
-        token = token.strip()
-        if not token or token in {".", ";", ","}:
-            continue
-
-        parts = token.split()
-        if len(parts) >= 3:  # full triple s p o
-            s, p, o = parts[:3]
-            current_subject = s
-            last_predicate = p
-            triples.append((s, p, o))
-        elif len(parts) == 2:  # subject omitted (after ;)
-            p, o = parts
-            triples.append((current_subject, p, o))
-            last_predicate = p
-        elif len(parts) == 1:  # object list (after ,)
-            o = parts[0]
-            triples.append((current_subject, last_predicate, o))
-
-    return triples
+    return parse_bgps(query_str, ontology_prefix)
 
 def create_query_graph_from_sparql(query_str, ontology_prefix="http://semanticweb.org/unitedOntology#"):
     """
@@ -85,22 +43,29 @@ def create_query_graph_from_sparql(query_str, ontology_prefix="http://semanticwe
     Replaces variables with qq: namespace and 'a' with rdf:type.
     """
     QUERY_GRAPH = URIRef("http://example.org/query")
+    triples = _query_triples(query_str, ontology_prefix)
+    if triples is None:
+        return None
     g = Graph(identifier=QUERY_GRAPH)
-    EX = Namespace(ontology_prefix)
-    triples = extract_bgps_from_sparql(query_str)
+    for triple in triples:
+        g.add(triple)
+    return g
+
+def _query_triples(query_str, ontology_prefix="http://semanticweb.org/unitedOntology#"):
+    """The triples of the query graph as a set, or None if the query has no BGPs."""
+    triples = extract_bgps_from_sparql(query_str, ontology_prefix)
     if triples == []:
         return None
-    for s, p, o in triples:
-        subj = URIRef(QQ[s[1:]]) if s.startswith("?") else URIRef(ontology_prefix + s.replace(":", ""))
-        pred = URIRef(RDFS_TYPE) if p == "a" else URIRef(ontology_prefix + p.replace(":", ""))
-        if o.startswith("?"):
-            obj = URIRef(QQ[o[1:]])
-        elif ":" in o:
-            obj = URIRef(ontology_prefix + o.replace(":", ""))
-        else:
-            obj = URIRef(QQ[o])
-        g.add((subj, pred, obj))
-    return g
+    return {
+        (_query_term(s), URIRef(RDFS_TYPE) if p == RDF.type else _query_term(p), _query_term(o))
+        for s, p, o in triples
+    }
+
+def _query_term(term):
+    """Variables become IRIs in the qq: namespace, IRIs and literals are kept."""
+    if isinstance(term, Variable):
+        return URIRef(QQ[str(term)])
+    return term
 
 # domain rule: If the domain of a property p is a class C, 
 # then the subject of any triple using p as a predicate must be a member of class C.
@@ -232,89 +197,302 @@ incorrect_property_rule = """
 
 """
 
-def validate_sparql(query, ontology):
+class Rule:
+    """
+    A named SPARQL constraint. The query is parsed and translated to algebra once, by
+    prepare, and every row it returns is an error described by message. Custom rules are
+    prepared when they are registered; the builtin ones only run with engine="rdflib", so
+    they are prepared by prepare_rules or the first time they run (parsing them took most
+    of the import time of this module).
+    """
+
+    def __init__(self, name: str, query: str, message: str, builtin: bool = False):
+        self.name = name
+        self.message = message
+        self.builtin = builtin
+        self.text = query
+        self._prepared = None
+        if not builtin:
+            # run by every validation, and a mistake in the query is reported by register_rule
+            self.prepare()
+        # how long the rule takes, so that slow rules can be spotted; the rules are shared by the
+        # stores of every ontology, so the counters are changed under the lock
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def prepare(self):
+        """Parses the query, once; returns the prepared query."""
+        if self._prepared is None:
+            # rdflib's SPARQL parser is only imported once a rule is prepared
+            from rdflib.plugins.sparql import prepareQuery
+
+            self._prepared = prepareQuery(self.text, initNs=RULE_NAMESPACES)
+        return self._prepared
+
+    def run(self, dataset) -> list:
+        """Runs the rule against the dataset and returns its error messages."""
+        return [violation.message for violation in self.violations(dataset)]
+
+    def violations(self, dataset) -> list:
+        """Runs the rule against the dataset and returns a ConstraintViolation for every row."""
+        start = time.perf_counter()
+        violations = []
+        for row in dataset.query(self.prepare()):
+            terms = {str(k): v for k, v in row.asdict().items()}
+            violations.append(ConstraintViolation(self.name, self.message.format(**terms), terms))
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.calls += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+        return violations
+
+
+RULE_NAMESPACES = {"rdfs": RDFS, "owl": OWL}
+
+# registry of the rules, in the order they are checked
+RULES = {}
+
+
+def register_rule(name: str, query: str, message: str, builtin: bool = False) -> Rule:
+    """
+    Adds a constraint query to the validator. message is formatted with the variables of
+    every row the query returns, e.g. "The property {p} isn't defined".
+    Rules that aren't builtin are also run when validating with the native engine.
+    """
+    rule = Rule(name, query, message, builtin)
+    RULES[name] = rule
+    return rule
+
+
+def unregister_rule(name: str):
+    RULES.pop(name, None)
+
+
+def prepare_rules():
+    """Parses the queries of the registered rules not parsed yet, e.g. before validating with engine="rdflib"."""
+    for rule in RULES.values():
+        rule.prepare()
+
+
+def rule_timings() -> dict:
+    """Returns the number of runs, and the mean and max run time in ms of every rule."""
+    timings = {}
+    for name, rule in list(RULES.items()):
+        with rule.lock:
+            calls, total_time, max_time = rule.calls, rule.total_time, rule.max_time
+        timings[name] = {
+            "calls": calls,
+            "mean_ms": total_time / calls * 1000 if calls else 0.0,
+            "max_ms": max_time * 1000,
+        }
+    return timings
+
+
+register_rule(
+    "Domain Rule",
+    domain_rule_query,
+    "The property {p} has range {domain}, but its subject {s} is a {class}, which isn't a subclass of {domain}",
+    builtin=True,
+)
+register_rule(
+    "Range Rule",
+    range_rule_query,
+    "The property {p} has range {range}, but its object {o} is a {class}, which isn't a subclass of {range}",
+    builtin=True,
+)
+register_rule(
+    "Double Range Rule",
+    double_range_rule,
+    "The property {p} has range {rangep}, and {q} has range {rangeq} and these are incompatible.",
+    builtin=True,
+)
+register_rule(
+    "Double Domain Rule",
+    double_domain_rule,
+    "The property {p} has domain {domp}, and {q} has domain {domq} and these are incompatible.",
+    builtin=True,
+)
+register_rule(
+    "domain-range rule",
+    domain_range_rule,
+    "The property {p} has range {rangep}, and {q} has domain {domq} and these are incompatible. ",
+    builtin=True,
+)
+register_rule(
+    "incorrect property rule",
+    incorrect_property_rule,
+    "The property {p} isn't defined in the ontology. Please only use properties from the ontology, or from a standard source like rdf:, rdfs:, owl:, or skos:.",
+    builtin=True,
+)
+
+
+def validate_sparql(query, ontology, cache_dir=None, engine="native"):
     """
-    Function that validates a SPARQL query, using the ontology schema and some SPARQL constraints
+    Function that validates a SPARQL query, using the ontology schema and some SPARQL constraints.
+    The ontology file is parsed once and shared between calls (see ontology_store.load_ontology).
+    engine="native" checks the builtin constraints with the precomputed indexes of validation_engine,
+    engine="rdflib" runs the registered SPARQL constraint queries (reference implementation).
     """
     
-    # create an rdflib Graph and parse the ontology schema
-    ONT_GRAPH = URIRef("http://example.org/ontology")
-    ontology_graph = Graph(identifier=ONT_GRAPH)
-    ontology_graph.parse(ontology, format="turtle")
     # create a graph from the query 
-    query_graph = create_query_graph_from_sparql(query)
-    if query_graph is None:
+    triples = _query_triples(query)
+    if triples is None:
         return "Input not SPARQL"
-    #print(f"Triples in query graph: {len(query_graph)}")
-    #for r in query_graph:
-    #   print(r)
-    # create an rdflib dataset to combine the two graphs
-    dataset = Dataset()
-    dataset.add_graph(ontology_graph)
-    dataset.add_graph(query_graph)
-    dataset.default_graph = ontology_graph
-    
-    error_messages = []
-
-    # query the dataset with SPARQL constraints
-    print("Checking Domain Rule: ") 
-    results = dataset.query(domain_rule_query)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} has range {row['domain']}, but its subject {row['s']} is a {row['class']}, which isn't a subclass of {row['domain']}"
-            error_messages.append(message)
-    else:
-        print("Rule Passed!")
-    
-    print("Checking Range Rule") 
-    results = dataset.query(range_rule_query)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} has range {row['range']}, but its object {row['o']} is a {row['class']}, which isn't a subclass of {row['range']}"
-            error_messages.append(message)
-    else:
-        print("Rule Passed!")
-    
-    print("Checking Double Range Rule")
-    results = dataset.query(double_range_rule)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} has range {row['rangep']}, and {row['q']} has range {row['rangeq']} and these are incompatible." 
-            error_messages.append(message)
-    else:
-        print("Rule Passed!")
-
-    print("Checking Double Domain Rule")
-    results = dataset.query(double_domain_rule)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} has domain {row['domp']}, and {row['q']} has domain {row['domq']} and these are incompatible."
-            error_messages.append(message)
-    else:
-        print("Rule Passed!")
-
-    print("Checking domain-range rule")
-    results = dataset.query(domain_range_rule)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} has range {row['rangep']}, and {row['q']} has domain {row['domq']} and these are incompatible. "
-            error_messages.append(message)
-    else:
-        print("Rule Passed!")
+    store = load_ontology(ontology, cache_dir)
+    error_messages = [violation.message for violation in _violations(triples, store, engine)]
+    if error_messages != []:
+        return error_messages
+    return None
 
 
-    print("Checking incorrect property rule")
-    results = dataset.query(incorrect_property_rule)
-    if results:
-        for row in results:
-            message = f"The property {row['p']} isn't defined in the ontology. Please only use properties from the ontology, or from a standard source like rdf:, rdfs:, owl:, or skos:."
-            error_messages.append(message)
+def _violations(triples, store, engine):
+    """The ConstraintViolations of the query graph made of triples."""
+    if engine == "native":
+        with tracer.span("validate.native", triples=len(triples)) as span:
+            violations = find_violations(store.index, triples)
+            span.set(errors=len(violations))
+        rules = [rule for rule in RULES.values() if not rule.builtin]
+    elif engine == "rdflib":
+        violations = []
+        rules = list(RULES.values())
     else:
-        print("Rule Passed!")
+        raise ValueError(f"Unknown validation engine: {engine}")
+
+    if rules:
+        query_graph = Graph(identifier=URIRef("http://example.org/query"))
+        for triple in triples:
+            query_graph.add(triple)
+        # add the query graph to the dataset that already holds the ontology schema
+        with store.lock:
+            dataset = store.dataset
+            dataset.add_graph(query_graph)
+            try:
+                violations += _rule_violations(dataset, rules)
+            finally:
+                dataset.remove_graph(query_graph)
+    return violations
+
+
+def _rule_violations(dataset, rules):
+    violations = []
+    for rule in rules:
+        logger.debug("Checking %s", rule.name)
+        with tracer.span("validate.rule", rule=rule.name) as span:
+            found = rule.violations(dataset)
+            span.set(errors=len(found))
+        if found:
+            violations += found
+        else:
+            logger.debug("%s passed", rule.name)
+    return violations
 
-    if error_messages != []:
-        return error_messages
-    return None
+
+# batches with at least this many distinct queries are spread over processes by validate_many
+PROCESS_BATCH = 256
+# chunks per worker process, so that a slow chunk doesn't leave the other workers idle
+CHUNKS_PER_PROCESS = 4
+
+
+class ValidationResult:
+    """
+    The outcome of one query of validate_many: its ConstraintViolations, is_sparql=False if
+    the query has no graph pattern, and error if the validator raised on it.
+    """
+
+    __slots__ = ("query", "violations", "is_sparql", "error")
+
+    def __init__(self, query, violations=(), is_sparql=True, error=None):
+        self.query = query
+        self.violations = list(violations)
+        self.is_sparql = is_sparql
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.is_sparql and self.error is None and not self.violations
+
+    def messages(self):
+        """What validate_sparql returns for the query: None, "Input not SPARQL" or the error messages."""
+        if not self.is_sparql:
+            return "Input not SPARQL"
+        messages = [violation.message for violation in self.violations]
+        if self.error is not None:
+            messages.append(self.error)
+        return messages or None
+
+    def to_dict(self) -> dict:
+        return {
+            "query": self.query,
+            "ok": self.ok,
+            "is_sparql": self.is_sparql,
+            "error": self.error,
+            "violations": [violation.to_dict() for violation in self.violations],
+        }
+
+    def __repr__(self):
+        state = "ok" if self.ok else self.error or (f"{len(self.violations)} violations" if self.is_sparql else "not SPARQL")
+        return f"<ValidationResult {state}>"
+
+
+def validate_many(queries, ontology, cache_dir=None, engine="native", processes=None, executor=None) -> list:
+    """
+    Validates a batch of queries (e.g. the n-best candidates of one question, or a corpus)
+    against one ontology and returns a ValidationResult per query, in order.
+    The ontology and its indexes are loaded once for the whole batch and identical queries
+    are validated once. Batches of at least PROCESS_BATCH distinct queries are split over
+    processes worker processes (default os.cpu_count(), 1 keeps the batch in this process),
+    or over executor, a ProcessPoolExecutor with that many workers that the caller keeps
+    between batches. The workers are forked after the indexes are built, so they don't build
+    them again; rules registered after the executor was created aren't known to its workers.
+    A query the validator raises on gets a result with .error instead of failing the batch.
+    """
+    if engine not in ("native", "rdflib"):
+        raise ValueError(f"Unknown validation engine: {engine}")
+    queries = list(queries)
+    distinct = list(dict.fromkeys(queries))
+    # built before the workers are forked, so that they inherit it
+    load_ontology(ontology, cache_dir).index
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    with tracer.span("validate.batch", queries=len(queries), distinct=len(distinct)) as span:
+        if len(distinct) < PROCESS_BATCH or (executor is None and processes <= 1):
+            results = _validate_chunk(distinct, ontology, cache_dir, engine)
+        else:
+            size = -(-len(distinct) // (processes * CHUNKS_PER_PROCESS))
+            chunks = [distinct[i:i + size] for i in range(0, len(distinct), size)]
+            validate = functools.partial(_validate_chunk, ontology=ontology, cache_dir=cache_dir, engine=engine)
+            pool = executor or ProcessPoolExecutor(max_workers=processes)
+            try:
+                results = [result for chunk in pool.map(validate, chunks) for result in chunk]
+            finally:
+                if executor is None:
+                    pool.shutdown()
+            span.set(processes=processes, chunks=len(chunks))
+        span.set(errors=sum(not result.ok for result in results))
+
+    by_query = dict(zip(distinct, results))
+    return [by_query[query] for query in queries]
+
+
+def _validate_chunk(queries, ontology, cache_dir, engine):
+    """Validates queries in this process; runs in the workers of validate_many too."""
+    store = load_ontology(ontology, cache_dir)
+    results = []
+    for query in queries:
+        try:
+            triples = _query_triples(query)
+            if triples is None:
+                results.append(ValidationResult(query, is_sparql=False))
+            else:
+                results.append(ValidationResult(query, _violations(triples, store, engine)))
+        except Exception as e:
+            logger.error("Error validating a query of the batch: %s", e)
+            results.append(ValidationResult(query, error=f"{type(e).__name__}: {e}"))
+    return results
 
 
 
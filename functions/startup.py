@@ -0,0 +1,199 @@
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from functions.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class ImportRecord:
+    """One module imported while an ImportTimer was installed, with the seconds of its import."""
+
+    __slots__ = ("name", "self_time", "cumulative", "depth", "thread")
+
+    def __init__(self, name, self_time, cumulative, depth, thread):
+        self.name = name
+        self.self_time = self_time
+        self.cumulative = cumulative
+        self.depth = depth
+        self.thread = thread
+
+    def __repr__(self):
+        return f"ImportRecord({self.name!r}, self={self.self_time * 1000:.1f}ms, cumulative={self.cumulative * 1000:.1f}ms)"
+
+
+class ImportTimer:
+    """
+    Times the imports of the process, like python -X importtime but from inside the program
+    and only for the modules imported after install(). It is a finder at the front of
+    sys.meta_path: it asks the other finders for the module's spec and wraps the exec_module
+    of its loader, so that the time of finding and executing a module, with (cumulative) and
+    without (self) the modules it imports, is recorded for every module and thread.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def install(self) -> "ImportTimer":
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        start = time.perf_counter()
+        spec = None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        loader = spec.loader if spec is not None else None
+        # builtin and frozen modules are imported by importer classes shared by every module
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        found = time.perf_counter() - start
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module):
+            stack = self._stack()
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - start + found
+                children = stack.pop()
+                if stack:
+                    stack[-1] += cumulative
+                with self.lock:
+                    self.records.append(ImportRecord(
+                        name, cumulative - children, cumulative, len(stack), threading.current_thread().name))
+                # the loader is the module's __loader__, it gets its own exec_module back
+                del loader.exec_module
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+    def _stack(self) -> list:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def total(self, thread=None) -> float:
+        """Seconds of the imports started by the top-level import statements, of one thread or of all."""
+        with self.lock:
+            return sum(r.cumulative for r in self.records if r.depth == 0 and thread in (None, r.thread))
+
+    def by_package(self) -> dict:
+        """Self seconds of the imports summed by top-level package, the slowest first."""
+        packages = defaultdict(float)
+        with self.lock:
+            for record in self.records:
+                packages[record.name.partition(".")[0]] += record.self_time
+        return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+    def report(self, limit=10) -> str:
+        """The packages by import time and the slowest modules, in the layout of -X importtime."""
+        with self.lock:
+            records = list(self.records)
+        lines = [f"imports: {len(records)} modules, {self.total() * 1000:.0f} ms"]
+        for thread in dict.fromkeys(r.thread for r in records):
+            lines.append(f"  {self.total(thread) * 1000:8.0f} ms  in {thread}")
+        lines.append(f"  {'self ms':>8} | package")
+        for package, seconds in list(self.by_package().items())[:limit]:
+            lines.append(f"  {seconds * 1000:8.1f} | {package}")
+        lines.append(f"  {'self ms':>8} | {'cumulative':>10} | module")
+        for record in sorted(records, key=lambda r: -r.self_time)[:limit]:
+            lines.append(f"  {record.self_time * 1000:8.1f} | {record.cumulative * 1000:10.1f} | "
+                         f"{'  ' * record.depth}{record.name}")
+        return "\n".join(lines)
+
+
+class Warmup:
+    """
+    Runs the startup steps, a list of (name, function), one after the other on a background
+    thread, so that the program can take input while the ontology indexes are loaded and the
+    clients are created. result(name) waits for a step and returns what its function returned
+    (or raises what it raised). Every function is called with the Warmup, and gets the results
+    of the earlier steps with result too.
+    With background=False, start() runs them all before returning, the eager startup.
+    optional(name) is result(name) for the steps that may fail: None if the step raised.
+    The seconds of every step are in timings, and those the caller spent waiting in waited.
+    """
+
+    def __init__(self, steps, background=True):
+        self.steps = list(steps)
+        self.background = background
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+        self.done = {name: threading.Event() for name, _ in self.steps}
+        self.waited = 0.0
+        self.started = None
+        self.finished = None
+        self.thread = None
+
+    def start(self) -> "Warmup":
+        self.started = time.perf_counter()
+        if self.background:
+            self.thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self.thread.start()
+        else:
+            self._run()
+        return self
+
+    def _run(self):
+        for name, function in self.steps:
+            start = time.perf_counter()
+            try:
+                with tracer.span("warmup", step=name):
+                    self.results[name] = function(self)
+            except Exception as e:
+                logger.warning("Warm-up of the %s failed: %s", name, e)
+                self.errors[name] = e
+            finally:
+                self.timings[name] = time.perf_counter() - start
+                self.done[name].set()
+        self.finished = time.perf_counter()
+
+    def result(self, name):
+        event = self.done[name]
+        if not event.is_set():
+            start = time.perf_counter()
+            event.wait()
+            self.waited += time.perf_counter() - start
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def optional(self, name, default=None):
+        """The result of a step the program can do without, default if it failed (it was logged by _run)."""
+        try:
+            return self.result(name)
+        except Exception:
+            return default
+
+    def is_done(self) -> bool:
+        return self.finished is not None
+
+    def report(self) -> str:
+        """The seconds of every step, and how long the caller waited for them."""
+        total = (self.finished or time.perf_counter()) - self.started
+        lines = [f"warm-up: {total * 1000:.0f} ms {'in the background' if self.background else 'before the prompt'}, "
+                 f"waited for {self.waited * 1000:.0f} ms"]
+        for name, _ in self.steps:
+            seconds = self.timings.get(name)
+            state = f"{seconds * 1000:8.0f} ms" if seconds is not None else f"{'running':>11}"
+            lines.append(f"  {state}  {name}{'  (failed)' if name in self.errors else ''}")
+        return "\n".join(lines)
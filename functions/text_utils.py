@@ -0,0 +1,38 @@
+import re
+from collections import Counter
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "for", "to", "by", "with", "from", "and", "or",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have", "had",
+    "what", "which", "who", "whom", "whose", "how", "many", "much", "when", "where",
+    "me", "my", "i", "you", "your", "can", "could", "would", "please", "tell", "show", "give",
+    "list", "all", "this", "that", "these", "those", "there", "their", "its", "it", "so", "far",
+    "every", "each", "any", "he", "she", "they", "them", "his", "her", "him", "we", "our",
+}
+WORD_RE = re.compile(r"[a-z0-9]+")
+CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def normalize_question(question: str) -> str:
+    """Lower case, punctuation removed and whitespace collapsed."""
+    return " ".join(WORD_RE.findall(question.lower()))
+
+
+def _stem(word: str) -> str:
+    """Very small suffix stripper, enough for goals/goal or scored/scores/score to match."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def content_terms(normalized: str) -> Counter:
+    return Counter(_stem(w) for w in normalized.split() if w not in STOPWORDS)
+
+
+def split_label(label: str) -> list:
+    """playerAssistsSeason -> ['player', 'assists', 'season']"""
+    return [word.lower() for word in CAMEL_RE.findall(label)]
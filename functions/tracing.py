@@ -0,0 +1,246 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "football-chatbot"
+
+
+class Span:
+    """One timed stage of a turn, with the attributes recorded while it ran (tokens, rows, retries...)."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "status", "error")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        """Seconds, up to now if the span hasn't ended."""
+        return ((self.end or time.time_ns()) - self.start) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start / 1e9,
+            "duration_ms": self.duration * 1000,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> dict:
+        """The span in the OTLP JSON encoding of OpenTelemetry."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end or time.time_ns()),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.status == "error" else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _NoSpan:
+    """Stands in for a span while tracing is off, so call sites don't need to check."""
+
+    __slots__ = ()
+    attributes = {}
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NO_SPAN = _NoSpan()
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span():
+    """The span the current code runs in, or NO_SPAN."""
+    span = _current.get()
+    return NO_SPAN if span is None else span
+
+
+class Tracer:
+    """
+    Records spans and hands the finished ones to its exporters. Without exporters tracing is
+    off and span() only yields NO_SPAN. The current span is kept in a ContextVar, so the stages
+    a turn runs in other threads (see pipeline.TurnPipeline) are children of the turn's span.
+    """
+
+    def __init__(self, *exporters):
+        self.exporters = list(exporters)
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter):
+        with self.lock:
+            self.exporters = self.exporters + [exporter]
+
+    def remove_exporter(self, exporter):
+        with self.lock:
+            self.exporters = [e for e in self.exporters if e is not exporter]
+
+    @contextmanager
+    def span(self, name, current=True, **attributes):
+        """
+        Times the block as a child of the current span. With current=False the span doesn't
+        become the parent of the spans inside the block, for generators that are suspended
+        while their caller goes on.
+        """
+        if not self.exporters:
+            yield NO_SPAN
+            return
+        span = Span(name, _current.get(), attributes)
+        token = _current.set(span) if current else None
+        try:
+            yield span
+        except GeneratorExit:
+            # a generator whose consumer stopped reading
+            span.set(closed_early=True)
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.time_ns()
+            if token is not None:
+                _current.reset(token)
+            self.export(span)
+
+    def export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning("Could not export span %s: %s", span.name, e)
+
+
+class JsonLinesExporter:
+    """
+    Appends every finished span to a file as one JSON line: Span.to_dict, or with otlp=True
+    a resourceSpans object in the OTLP JSON encoding, as the OpenTelemetry collector's file
+    exporter writes them (and its otlpjsonfile receiver reads them).
+    """
+
+    def __init__(self, path, otlp=False, service=SERVICE_NAME):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.otlp = otlp
+        self.resource = {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]}
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        if self.otlp:
+            record = {"resourceSpans": [{
+                "resource": self.resource,
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp()]}],
+            }]}
+        else:
+            record = span.to_dict()
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class MemoryExporter:
+    """Keeps the finished spans in a list, for benchmarks and for the stats of a session."""
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+    def summary(self) -> dict:
+        """Count, total and mean milliseconds and the summed numeric attributes of the spans, by name."""
+        summary = defaultdict(lambda: {"count": 0, "errors": 0, "total_ms": 0.0})
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            stats = summary[span.name]
+            stats["count"] += 1
+            stats["errors"] += span.status == "error"
+            stats["total_ms"] += span.duration * 1000
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats[key] = stats.get(key, 0) + value
+        for stats in summary.values():
+            stats["mean_ms"] = stats["total_ms"] / stats["count"]
+        return dict(summary)
+
+
+# the tracer of the process, off until an exporter is added
+tracer = Tracer()
+
+
+def configure_tracing(path=None, otlp=None):
+    """
+    Exports the spans to path (default: the TRACE_FILE environment variable) as JSON lines,
+    in the OTLP encoding if otlp (default: TRACE_FORMAT=otlp). Returns the exporter, or None
+    if no path is set and tracing stays off.
+    """
+    path = path or os.getenv("TRACE_FILE")
+    if not path:
+        return None
+    if otlp is None:
+        otlp = os.getenv("TRACE_FORMAT", "jsonl").lower() == "otlp"
+    exporter = JsonLinesExporter(path, otlp=otlp)
+    tracer.add_exporter(exporter)
+    return exporter
@@ -0,0 +1,184 @@
+from collections import defaultdict
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF, RDFS
+
+# Predicates in these namespaces don't have to be defined in the ontology (same list as incorrect_property_rule)
+STANDARD_NAMESPACES = (
+    "http://www.w3.org/1999/02/22rdf-syntax-ns#",
+    "http://www.w3.org/2002/07/owl#",
+    "http://www.w3.org/2000/01/rdf-schema#",
+    "http://www.w3.org/2004/02/skos/core#",
+)
+
+# 'a' in a query is stored as rdfs:type in the query graph (see sparql_validator.RDFS_TYPE)
+QUERY_TYPE = URIRef("http://www.w3.org/2000/01/rdf-schema#type")
+
+
+class ValidationIndex:
+    """
+    Indexes of an ontology schema that the validation rules need, built once per ontology:
+    the reflexive-transitive closure of rdfs:subClassOf, the IRI domains and ranges of every
+    property and the set of resources that have a type in the ontology.
+    """
+
+    def __init__(self, ontology_graph: Graph):
+        self.domains = defaultdict(list)
+        self.ranges = defaultdict(list)
+        for p, domain in ontology_graph.subject_objects(RDFS.domain):
+            if isinstance(domain, URIRef):
+                self.domains[p].append(domain)
+        for p, range_ in ontology_graph.subject_objects(RDFS.range):
+            if isinstance(range_, URIRef):
+                self.ranges[p].append(range_)
+
+        self.typed = set(ontology_graph.subjects(RDF.type))
+
+        parents = defaultdict(set)
+        for c, parent in ontology_graph.subject_objects(RDFS.subClassOf):
+            parents[c].add(parent)
+        self.superclasses = {}
+        for c in parents:
+            # iterative DFS, the class hierarchy may contain cycles
+            seen = {c}
+            stack = [c]
+            while stack:
+                for parent in parents.get(stack.pop(), ()):
+                    if parent not in seen:
+                        seen.add(parent)
+                        stack.append(parent)
+            self.superclasses[c] = seen
+
+    def is_subclass(self, c, d) -> bool:
+        """c rdfs:subClassOf* d"""
+        return c == d or d in self.superclasses.get(c, ())
+
+    def compatible(self, c, d) -> bool:
+        return self.is_subclass(c, d) or self.is_subclass(d, c)
+
+
+class ConstraintViolation:
+    """
+    One error found by a validation rule: the name of the rule (as registered in
+    sparql_validator.RULES), the message given to the LLM, and the terms the rule matched,
+    keyed by the variable names of the rule's SPARQL query (p, s, o, class, domain, ...).
+    """
+
+    __slots__ = ("rule", "message", "terms")
+
+    def __init__(self, rule: str, message: str, terms: dict = None):
+        self.rule = rule
+        self.message = message
+        self.terms = terms or {}
+
+    def __eq__(self, other):
+        return isinstance(other, ConstraintViolation) and (self.rule, self.message) == (other.rule, other.message)
+
+    def __hash__(self):
+        return hash((self.rule, self.message))
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"ConstraintViolation({self.rule!r}, {self.message!r})"
+
+    def to_dict(self) -> dict:
+        return {"rule": self.rule, "message": self.message, "terms": {k: str(v) for k, v in self.terms.items()}}
+
+
+def check_triples(index: ValidationIndex, triples) -> list:
+    """
+    Checks the triples of a query graph against the ontology index and returns the error
+    messages of every rule in sparql_validator, in the same order and with the same wording.
+    """
+    return [violation.message for violation in find_violations(index, triples)]
+
+
+def find_violations(index: ValidationIndex, triples) -> list:
+    """
+    Like check_triples, but returns a ConstraintViolation for every error.
+    Every rule is answered with set and dict lookups instead of a SPARQL query.
+    """
+    # literals and IRIs don't compare with each other, sort on their text
+    triples = sorted(triples, key=lambda triple: tuple(map(str, triple)))
+    types = defaultdict(list)
+    by_subject = defaultdict(list)
+    by_object = defaultdict(list)
+    for s, p, o in triples:
+        if p == QUERY_TYPE:
+            types[s].append(o)
+        by_subject[s].append(p)
+        by_object[o].append(p)
+
+    domains = index.domains
+    ranges = index.ranges
+    violations = []
+
+    # domain rule
+    for s, p, o in triples:
+        for domain in domains.get(p, ()):
+            for cls in types.get(s, ()):
+                if not index.is_subclass(cls, domain):
+                    violations.append(ConstraintViolation(
+                        "Domain Rule",
+                        f"The property {p} has range {domain}, but its subject {s} is a {cls}, which isn't a subclass of {domain}",
+                        {"p": p, "domain": domain, "s": s, "class": cls},
+                    ))
+
+    # range rule
+    for s, p, o in triples:
+        for range_ in ranges.get(p, ()):
+            for cls in types.get(o, ()):
+                if not index.is_subclass(cls, range_):
+                    violations.append(ConstraintViolation(
+                        "Range Rule",
+                        f"The property {p} has range {range_}, but its object {o} is a {cls}, which isn't a subclass of {range_}",
+                        {"p": p, "range": range_, "o": o, "class": cls},
+                    ))
+
+    # double range rule
+    for s, p, o in triples:
+        for q in by_object[o]:
+            for rangep in ranges.get(p, ()):
+                for rangeq in ranges.get(q, ()):
+                    if not index.compatible(rangep, rangeq):
+                        violations.append(ConstraintViolation(
+                            "Double Range Rule",
+                            f"The property {p} has range {rangep}, and {q} has range {rangeq} and these are incompatible.",
+                            {"p": p, "q": q, "rangep": rangep, "rangeq": rangeq},
+                        ))
+
+    # double domain rule
+    for s, p, o in triples:
+        for q in by_subject[s]:
+            for domp in domains.get(p, ()):
+                for domq in domains.get(q, ()):
+                    if not index.compatible(domp, domq):
+                        violations.append(ConstraintViolation(
+                            "Double Domain Rule",
+                            f"The property {p} has domain {domp}, and {q} has domain {domq} and these are incompatible.",
+                            {"p": p, "q": q, "domp": domp, "domq": domq},
+                        ))
+
+    # domain-range rule
+    for s, p, o in triples:
+        for q in by_subject.get(o, ()):
+            for rangep in ranges.get(p, ()):
+                for domq in domains.get(q, ()):
+                    if not index.compatible(rangep, domq):
+                        violations.append(ConstraintViolation(
+                            "domain-range rule",
+                            f"The property {p} has range {rangep}, and {q} has domain {domq} and these are incompatible. ",
+                            {"p": p, "q": q, "rangep": rangep, "domq": domq},
+                        ))
+
+    # incorrect property rule
+    for s, p, o in triples:
+        if not str(p).startswith(STANDARD_NAMESPACES) and p not in index.typed:
+            violations.append(ConstraintViolation(
+                "incorrect property rule",
+                f"The property {p} isn't defined in the ontology. Please only use properties from the ontology, or from a standard source like rdf:, rdfs:, owl:, or skos:.",
+                {"p": p},
+            ))
+
+    return violations
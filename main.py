@@ -1,82 +1,284 @@
+import logging
 import os
+import sys
+import time
 from dotenv import load_dotenv
-from functions.chat_manager import ChatManager
-from functions.router import should_use_kg
-from functions.sparql_generator import generate_sparql
-from functions.execute_query import execute_sparql
-from functions.beautify import beautify
-from functions.sparql_validator import validate_sparql
+from functions.startup import ImportTimer, Warmup
+from functions.tracing import configure_tracing
+
+# the modules of the pipeline import rdflib, requests and google-genai: they are imported by the
+# warm-up steps (see startup_steps), not before the prompt
 
 MAX_RETRIES = 3
+# where the parsed ontology and the query results are cached between runs
+CACHE_DIR = ".cache"
+# only the first rows of a result are read and given to beautify
+BEAUTIFY_MAX_ROWS = 50
+
+class StreamPrinter:
+    """Prints the streamed answer of a turn as it arrives, after the prefix of its kind."""
+    PREFIXES = {"chat": "Bot: ", "beautify": "After connecting with the KG here is the answer: "}
+
+    def __init__(self):
+        self.started = False
+
+    def __call__(self, kind, chunk):
+        if not self.started:
+            print(self.PREFIXES[kind], end="", flush=True)
+            self.started = True
+        print(chunk, end="", flush=True)
+
+    def finish(self) -> bool:
+        """Ends the answer's line; False if nothing was streamed this turn."""
+        started, self.started = self.started, False
+        if started:
+            print("\n")
+        return started
+
+
+def startup_steps(api_key, graphDb_url, ontology_path, turtle_ontology, base_prompt, printer):
+    """
+    The steps of the startup (see startup.Warmup), in the order the first turn needs them: the
+    LLM client, the GraphDB connection, the ontology indexes, the components of the pipeline and
+    the pipeline. Every step imports what it uses, so nothing heavy is imported before the prompt.
+    """
+
+    def llm_client(warmup):
+        from functions.llm_client import get_llm
+        return get_llm(api_key)
+
+    def graphdb_connection(warmup):
+        if not graphDb_url:
+            return None
+        from functions.execute_query import EMBEDDED_SCHEME, execute_sparql, get_client, set_backend
+        # GRAPH_DB_ENDPOINT=embedded:a.ttl,b.ttl holds the KG in process, it is loaded now
+        if graphDb_url.startswith(EMBEDDED_SCHEME):
+            from functions.embedded_store import EmbeddedStore
+            set_backend(graphDb_url, EmbeddedStore.from_url(graphDb_url, CACHE_DIR))
+            return get_client(graphDb_url)
+        # opens the first connection of the pool
+        execute_sparql(graphDb_url, "ASK {}")
+        return get_client(graphDb_url)
+
+    def ontology_indexes(warmup):
+        from functions.ontology_store import load_ontology
+        from functions.schema_retrieval import load_schema
+        # the indexes of the validator and the schema of the generator's prompt
+        load_ontology(turtle_ontology, CACHE_DIR)
+        load_schema(ontology_path)
+
+    def local_router(warmup):
+        from functions.local_router import LocalRouter
+        # answers the router's question locally when it is obvious, learning from the LLM otherwise
+        return LocalRouter.from_ontology(turtle_ontology, CACHE_DIR, path=os.path.join(CACHE_DIR, "router.json"))
+
+    def renderer(warmup):
+        from functions.answer_renderer import AnswerRenderer
+        # writes the answer of common result shapes without the beautify call
+        return AnswerRenderer(turtle_ontology, CACHE_DIR)
+
+    def repairer(warmup):
+        from functions.sparql_repair import SparqlRepairer
+        # fixes misspelled or reversed terms of a failed query before asking the LLM again
+        return SparqlRepairer(turtle_ontology, CACHE_DIR)
+
+    def entity_index(warmup):
+        from functions.entity_index import EntityIndex
+        # the teams and players of the KG by name and alias, their IRIs are given to the generator
+        return EntityIndex.from_kg(graphDb_url) if graphDb_url else None
+
+    def caches(warmup):
+        from functions.entity_index import alias_terms
+        from functions.question_cache import QuestionCache
+        from functions.result_cache import ResultCache
+        index = warmup.optional("entity index")
+        # results of KG queries, shared between repeated questions, and the validated SPARQL of
+        # earlier questions, so that repeated questions skip generation; questions naming other
+        # teams or players never share a query
+        return (ResultCache(path=os.path.join(CACHE_DIR, "results.sqlite")),
+                QuestionCache(path=os.path.join(CACHE_DIR, "questions.json"),
+                              entity_terms=index.name_terms() if index is not None else alias_terms()))
+
+    def query_guard(warmup):
+        from functions.query_guard import KGStatistics, QueryGuard
+        # estimates the rows of a query from the KG statistics, adds a LIMIT and rejects the expensive ones
+        return QueryGuard(KGStatistics.from_kg(graphDb_url), default_limit=BEAUTIFY_MAX_ROWS) if graphDb_url else None
+
+    def views(warmup):
+        from functions.season_views import SeasonViews
+        # league table, top scorers and assists and form, kept up to date in process
+        return SeasonViews.from_kg(graphDb_url) if graphDb_url else None
+
+    def pipeline(warmup):
+        from functions.chat_manager import ChatManager
+        from functions.pipeline import TurnPipeline
+        warmup.result("GraphDB connection")
+        warmup.result("ontology indexes")
+        # the other components only make turns faster: the pipeline is built without those that failed
+        result_cache, question_cache = warmup.optional("caches", (None, None))
+        # Create the chatbot
+        chat = ChatManager(api_key=api_key, system_prompt=base_prompt, keep_history=True)
+        # the router and the KG branch of a turn run concurrently, answers are printed as they arrive
+        return TurnPipeline(
+            api_key, graphDb_url, ontology_path, turtle_ontology, chat,
+            result_cache=result_cache, question_cache=question_cache, cache_dir=CACHE_DIR,
+            max_retries=MAX_RETRIES, max_rows=BEAUTIFY_MAX_ROWS, local_router=warmup.optional("local router"),
+            on_text=printer, renderer=warmup.optional("answer renderer"), repairer=warmup.optional("SPARQL repairer"),
+            entity_index=warmup.optional("entity index"), query_guard=warmup.optional("query guard"),
+            views=warmup.optional("season views"),
+        )
+
+    return [
+        ("LLM client", llm_client),
+        ("GraphDB connection", graphdb_connection),
+        ("ontology indexes", ontology_indexes),
+        ("local router", local_router),
+        ("answer renderer", renderer),
+        ("SPARQL repairer", repairer),
+        ("entity index", entity_index),
+        ("caches", caches),
+        ("query guard", query_guard),
+        ("season views", views),
+        ("pipeline", pipeline),
+    ]
+
+
+def print_startup_report(import_timer, warmup, prompt_seconds, result):
+    """The import times, the warm-up steps and the stages of the first turn."""
+    print(f"Prompt shown after {prompt_seconds * 1000:.0f} ms")
+    print(import_timer.report())
+    print(warmup.report())
+    stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in result.timings.items()
+                       if stage not in ("total", "first_token") and not stage.endswith("_first_token"))
+    print(f"first turn: waited {warmup.waited * 1000:.0f} ms for the warm-up, then {result.timings['total'] * 1000:.0f} ms "
+          f"({stages or 'no stages'})\n")
+
 
 def main():
+    started = time.perf_counter()
+    # -X importtime for the imports of the startup and of the first turn (STARTUP_REPORT=1)
+    import_timer = ImportTimer().install()
     load_dotenv()
+    # the progress of a turn is logged at INFO, the validation rules at DEBUG (LOG_LEVEL=DEBUG);
+    # the libraries only log their warnings
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stdout)
+    logging.getLogger("functions").setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # spans of every stage of a turn, as JSON lines (TRACE_FILE=.cache/trace.jsonl, TRACE_FORMAT=otlp)
+    trace_exporter = configure_tracing()
     api_key = os.getenv("GEMINI_API_KEY")
     graphDb_url = os.getenv("GRAPH_DB_ENDPOINT")
     ontology_path = "ontology/simple_test.txt"
     turtle_ontology = "ontology/ontology_export.ttl"
+    # the clients, indexes and components are built on a background thread while the user types
+    # the first question; STARTUP=eager builds them before the prompt
+    background = os.getenv("STARTUP", "background").lower() != "eager"
+    report = os.getenv("STARTUP_REPORT", "0") not in ("", "0")
 
     base_prompt = (
         "You are a helpful assistant specialized in football and knowledge graph reasoning about Premier League 25-26. "
         "Decide when to create SPARQL queries based on user questions."
     )
 
-    # Create the chatbot
-    chat = ChatManager(api_key=api_key, system_prompt=base_prompt, keep_history=True)
+    printer = StreamPrinter()
+    warmup = Warmup(startup_steps(api_key, graphDb_url, ontology_path, turtle_ontology, base_prompt, printer),
+                    background=background).start()
 
-    print("Football Chatbot started! Type 'exit' to quit.\n")
+    print("Football Chatbot started! Type 'exit' to quit, 'reload' after the KG data changed.\n")
+    prompt_seconds = time.perf_counter() - started
+    first_turn = True
 
     while True:
         user_input = input("You: ")
+        try:
+            pipeline = warmup.result("pipeline")
+        except Exception as e:
+            # the LLM client, the GraphDB connection or the ontology could not be set up
+            print(f"The chatbot could not start: {e}")
+            break
         if user_input.lower() in ["exit", "quit"]:
+            if pipeline.result_cache is not None:
+                stats = pipeline.result_cache.stats()
+                print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses")
+            if pipeline.question_cache is not None:
+                stats = pipeline.question_cache.stats()
+                print(
+                    f"Question cache: {stats['exact_hits'] + stats['similar_hits']} hits, {stats['misses']} misses, "
+                    f"~{stats['saved_s']:.1f}s of generation saved"
+                )
+            stats = pipeline.chat.history.stats()
+            payloads = pipeline.chat.payload_stats()
+            print(
+                f"Chat history: {stats['messages']} messages kept, {stats['summarized']} summarized, "
+                f"~{payloads['mean_tokens']:.0f} tokens per chat request"
+            )
+            if pipeline.renderer is not None:
+                stats = pipeline.renderer.stats()
+                print(
+                    f"Answer renderer: {stats['local']} answers rendered locally, {stats['fallbacks']} by the LLM, "
+                    f"~{stats['saved_s']:.1f}s saved"
+                )
+            if pipeline.repairer is not None:
+                stats = pipeline.repairer.stats()
+                print(
+                    f"SPARQL repair: {stats['repaired']} queries repaired locally, {stats['failed']} sent back to the LLM, "
+                    f"{stats['mean_ms']:.1f} ms per repair"
+                )
+            if pipeline.entity_index is not None:
+                stats = pipeline.entity_index.stats()
+                print(f"Entity index: {stats['mentions']} names resolved in {stats['questions']} questions, "
+                      f"{stats['mean_ms']:.2f} ms per question")
+            if pipeline.query_guard is not None:
+                stats = pipeline.query_guard.stats()
+                q_error = f"{stats['median_q_error']:.1f}x" if stats["median_q_error"] is not None else "-"
+                print(f"Query guard: {stats['rewritten']} queries rewritten, {stats['rejected']} rejected, "
+                      f"row estimates off by {q_error} (median)")
+            if pipeline.views is not None:
+                stats = pipeline.views.stats()
+                print(f"Season views: {sum(stats['hits'].values())} questions answered, {stats['misses']} not, "
+                      f"{stats['mean_answer_ms']:.2f} ms per question")
+            if pipeline.local_router is not None:
+                stats = pipeline.local_router.stats()
+                print(f"Local router: {stats['llm_calls_saved']} LLM calls saved, {stats['fallbacks']} sent to the LLM")
+                pipeline.local_router.save()
+            llm = warmup.optional("LLM client")
+            for purpose, stats in (llm.stats() if llm is not None else {}).items():
+                first_token = (
+                    f", first token after {stats['first_token_seconds'] / stats['streams']:.2f}s on average"
+                    if stats["streams"] else ""
+                )
+                print(
+                    f"LLM {purpose}: {stats['calls']} calls, {stats['seconds']:.1f}s, "
+                    f"{stats['prompt_tokens']} prompt + {stats['output_tokens']} output tokens{first_token}"
+                )
+            pipeline.close()
+            if trace_exporter is not None:
+                trace_exporter.close()
             print("👋 Goodbye!")
             break
+        if user_input.lower() == "reload":
+            # the data of the KG changed, cached results are stale
+            if pipeline.result_cache is not None:
+                pipeline.result_cache.invalidate()
+            if pipeline.query_guard is not None:
+                from functions.query_guard import KGStatistics
+                pipeline.query_guard.kg = KGStatistics.from_kg(graphDb_url)
+            if pipeline.views is not None:
+                pipeline.views.update(graphDb_url)
+            print("Cleared the cached KG results.")
+            continue
         
-        # flag to understand if the llm generated a sparql or not
-        not_sparql = False
-        # Step 1 — Ask the router
-        use_kg = should_use_kg(api_key, user_input)
-
-        if use_kg:
-            chat.add_message('user',user_input)
-            print("Querying the Knowledge Graph...")
-            for attempt in range(MAX_RETRIES):
-                if attempt == 0:
-                    prompt_for_llm = user_input
-                else:
-                    prompt_for_llm = (
-                        f"The previous SPARQL query failed validation with these errors: {errors}. "
-                        f"Please correct and regenerate a valid SPARQL query for: {user_input}"
-                    )
-                sparql_query = generate_sparql(api_key, ontology_path, prompt_for_llm)
-                print(f"\nAttempt {attempt + 1} — SPARQL generated:\n{sparql_query}\n")
-
-                # validate the query
-                errors = validate_sparql(sparql_query, turtle_ontology)
-                if errors == "Input not SPARQL":
-                    not_sparql = True
-                    break
-                if not errors:
-                    print("SPARQL validated successfully.")
-                    break
-                else:
-                    print(f"Validation failed (attempt {attempt + 1}/{MAX_RETRIES}): {errors}")
-                    attempt += 1
-        
-            if not_sparql is True:
-                print("Cannot answer the question..")
-                continue
-            response = execute_sparql(graphDb_url, sparql_query)
-            if response:
-                reply_text = beautify(api_key,user_input, response)
-                print("After connecting with the KG here is the answer:", reply_text)
-                chat.add_message("assistant", reply_text)
-            else:
-                print("Did not find any results.")
-        else:
-            response = chat.ask(user_input)
-            print(f"Bot: {response}\n")
-
+        result = pipeline.run_sync(user_input)
+        if printer.finish():
+            timings = result.timings
+            print(f"(first words after {timings['first_token'] * 1000:.0f} ms, "
+                  f"answer after {timings['total'] * 1000:.0f} ms)\n")
+        elif result.reply:
+            print(f"Bot: {result.reply}\n")
+        if first_turn:
+            first_turn = False
+            if report:
+                print_startup_report(import_timer, warmup, prompt_seconds, result)
+            import_timer.uninstall()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,312 @@
+"""
+Multi-session server around the chat pipeline.
+
+    python server.py [--host 127.0.0.1] [--port 8765]
+
+WebSocket /ws?session=<id>   send {"question": "..."} (or the plain question), receive
+                             {"type": "chunk", "text": ...} while the answer is written and
+                             then {"type": "answer", ...}; the first message names the session
+GET /chat?session=<id>&q=... the answer as JSON
+GET /stats                   sessions, concurrency limits, caches and LLM calls
+GET /health
+
+Every session has its own ChatManager history and runs one turn at a time. The ontology and
+its indexes, the caches, the local router, the renderer, the repairer, the entity index, the
+query guard, the season views, the LLM client and the GraphDB connection pool are shared by
+all sessions. LLM and GraphDB calls are limited per
+session and for the whole process (see functions/concurrency.py).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from functions.answer_renderer import AnswerRenderer
+from functions.chat_manager import ChatManager
+from functions.entity_index import EntityIndex, alias_terms
+from functions.concurrency import LimitedClient, Limits, session_limits, set_global_limits
+from functions.execute_query import EMBEDDED_SCHEME, set_backend
+from functions.llm_client import get_llm, set_llm
+from functions.local_router import LocalRouter
+from functions.pipeline import TurnPipeline
+from functions.query_guard import KGStatistics, QueryGuard
+from functions.question_cache import QuestionCache
+from functions.result_cache import ResultCache
+from functions.season_views import SeasonViews
+from functions.sparql_repair import SparqlRepairer
+from functions.sparql_validator import validate_sparql
+from functions.tracing import configure_tracing
+
+logger = logging.getLogger("server")
+
+CACHE_DIR = ".cache"
+BASE_PROMPT = (
+    "You are a helpful assistant specialized in football and knowledge graph reasoning about Premier League 25-26. "
+    "Decide when to create SPARQL queries based on user questions."
+)
+
+
+class Session:
+    def __init__(self, session_id: str, limits: Limits):
+        self.id = session_id
+        self.limits = limits
+        self.pipeline = None
+        # one turn at a time, the history is shared by the turns of the session
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        # called with every chunk of the answer of the current turn
+        self.listener = None
+        self.turns = 0
+
+    def emit(self, kind, chunk):
+        listener = self.listener
+        if listener is not None:
+            listener(chunk)
+
+
+class ChatServer:
+    def __init__(self, api_key, graphdb_url, ontology_path="ontology/simple_test.txt",
+                 turtle_ontology="ontology/ontology_export.ttl", cache_dir=CACHE_DIR, persist=True,
+                 max_sessions=1000, session_ttl=1800, llm_limit=32, kg_limit=16, session_llm_limit=2,
+                 session_kg_limit=1, workers=64):
+        self.api_key = api_key
+        self.graphdb_url = graphdb_url
+        self.ontology_path = ontology_path
+        self.turtle_ontology = turtle_ontology
+        self.cache_dir = cache_dir
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.session_llm_limit = session_llm_limit
+        self.session_kg_limit = session_kg_limit
+
+        # shared by every session
+        self.limits = Limits(llm=llm_limit, kg=kg_limit)
+        set_global_limits(self.limits)
+        set_llm(LimitedClient(get_llm(api_key)))
+        self.result_cache = ResultCache(path=os.path.join(cache_dir, "results.sqlite") if persist else None)
+        self.local_router = LocalRouter.from_ontology(
+            turtle_ontology, cache_dir, path=os.path.join(cache_dir, "router.json") if persist else None
+        )
+        self.renderer = AnswerRenderer(turtle_ontology, cache_dir)
+        self.repairer = SparqlRepairer(turtle_ontology, cache_dir)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session")
+        if graphdb_url and graphdb_url.startswith(EMBEDDED_SCHEME):
+            from functions.embedded_store import EmbeddedStore
+            set_backend(graphdb_url, EmbeddedStore.from_url(graphdb_url, cache_dir))
+        self.entity_index = EntityIndex.from_kg(graphdb_url) if graphdb_url else None
+        # questions naming other teams or players never share a cached query
+        self.question_cache = QuestionCache(
+            path=os.path.join(cache_dir, "questions.json") if persist else None,
+            entity_terms=self.entity_index.name_terms() if self.entity_index is not None else alias_terms(),
+        )
+        self.query_guard = QueryGuard(KGStatistics.from_kg(graphdb_url)) if graphdb_url else None
+        self.views = SeasonViews.from_kg(graphdb_url) if graphdb_url else None
+        # parse the ontology and build the validation indexes before the first question
+        validate_sparql("SELECT ?s WHERE { ?s ?p ?o . }", turtle_ontology, cache_dir)
+
+        self.sessions = OrderedDict()
+        self.turns = 0
+        self.errors = 0
+        self.started = time.time()
+
+    def session(self, session_id=None) -> Session:
+        """Returns the session, creating it if it doesn't exist; idle sessions are dropped."""
+        now = time.monotonic()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_used <= self.session_ttl and len(self.sessions) < self.max_sessions:
+                break
+            if oldest.lock.locked():
+                break
+            self._close(self.sessions.popitem(last=False)[1])
+
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = Session(session_id or uuid.uuid4().hex,
+                              Limits(llm=self.session_llm_limit, kg=self.session_kg_limit))
+            chat = ChatManager(api_key=self.api_key, system_prompt=BASE_PROMPT, keep_history=True)
+            session.pipeline = TurnPipeline(
+                self.api_key, self.graphdb_url, self.ontology_path, self.turtle_ontology, chat,
+                result_cache=self.result_cache, question_cache=self.question_cache, cache_dir=self.cache_dir,
+                local_router=self.local_router, renderer=self.renderer, repairer=self.repairer,
+                entity_index=self.entity_index, query_guard=self.query_guard, views=self.views,
+                on_text=session.emit, executor=self.executor, log=self._logger(session),
+            )
+            self.sessions[session.id] = session
+        self.sessions.move_to_end(session.id)
+        session.last_used = now
+        return session
+
+    @staticmethod
+    def _logger(session):
+        session_id = session.id[:8]
+        return lambda message: logger.info("[%s] %s", session_id, message)
+
+    def _close(self, session):
+        session.pipeline.close()
+
+    async def ask(self, session: Session, question: str, on_chunk=None) -> dict:
+        """Runs one turn of the session, on_chunk(text) is called with the streamed answer."""
+        async with session.lock:
+            session.listener = on_chunk
+            token = session_limits.set(session.limits)
+            try:
+                result = await session.pipeline.run(question)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                session_limits.reset(token)
+                session.listener = None
+                session.last_used = time.monotonic()
+        session.turns += 1
+        self.turns += 1
+        return {
+            "session": session.id,
+            "reply": result.reply,
+            "used_kg": result.used_kg,
+            "sparql": result.sparql,
+            "rows": len(result.bindings),
+            "timings": result.timings,
+        }
+
+    async def handle(self, connection):
+        """A WebSocket connection: one session, one turn per received question."""
+        params = parse_qs(urlsplit(connection.request.path).query)
+        session = self.session(params.get("session", [None])[0])
+        loop = asyncio.get_running_loop()
+        await connection.send(json.dumps({"type": "session", "session": session.id}))
+        try:
+            async for message in connection:
+                try:
+                    question = json.loads(message)["question"]
+                except (ValueError, KeyError, TypeError):
+                    question = message
+                chunks = asyncio.Queue()
+
+                async def turn():
+                    try:
+                        return await self.ask(
+                            session, question, lambda chunk: loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                        )
+                    finally:
+                        # after the chunks, which were queued before the turn finished
+                        loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+                task = asyncio.ensure_future(turn())
+                while (chunk := await chunks.get()) is not None:
+                    await connection.send(json.dumps({"type": "chunk", "text": chunk}))
+                try:
+                    answer = await task
+                except Exception as e:
+                    await connection.send(json.dumps({"type": "error", "error": str(e)}))
+                    continue
+                await connection.send(json.dumps({"type": "answer", **answer}))
+        except ConnectionClosed:
+            pass
+
+    @staticmethod
+    def _json(connection, status, body):
+        response = connection.respond(status, json.dumps(body))
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    async def process_request(self, connection, request):
+        """The plain HTTP endpoints; /ws goes on to the WebSocket handshake."""
+        url = urlsplit(request.path)
+        params = parse_qs(url.query)
+        if url.path == "/ws":
+            return None
+        if url.path == "/health":
+            return self._json(connection, HTTPStatus.OK, {"status": "ok"})
+        if url.path == "/stats":
+            return self._json(connection, HTTPStatus.OK, self.stats())
+        if url.path == "/chat":
+            question = params.get("q", [""])[0].strip()
+            if not question:
+                return self._json(connection, HTTPStatus.BAD_REQUEST, {"error": "missing q"})
+            session = self.session(params.get("session", [None])[0])
+            try:
+                answer = await self.ask(session, question)
+            except Exception as e:
+                return self._json(connection, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            return self._json(connection, HTTPStatus.OK, answer)
+        return self._json(connection, HTTPStatus.NOT_FOUND, {"error": f"no endpoint {url.path}"})
+
+    def stats(self) -> dict:
+        return {
+            "uptime_s": time.time() - self.started,
+            "sessions": len(self.sessions),
+            "turns": self.turns,
+            "errors": self.errors,
+            "limits": self.limits.stats(),
+            "result_cache": self.result_cache.stats(),
+            "question_cache": self.question_cache.stats(),
+            "local_router": self.local_router.stats(),
+            "renderer": self.renderer.stats(),
+            "repairer": self.repairer.stats(),
+            "entity_index": self.entity_index.stats() if self.entity_index is not None else None,
+            "query_guard": self.query_guard.stats() if self.query_guard is not None else None,
+            "views": self.views.stats() if self.views is not None else None,
+            "llm": get_llm().stats(),
+        }
+
+    def start(self, host, port):
+        """The websockets server, to be used with async with (port 0 picks a free port)."""
+        return serve(self.handle, host, port, process_request=self.process_request, compression=None)
+
+    async def serve_forever(self, host, port):
+        async with self.start(host, port) as server:
+            print(f"Football Chatbot server on ws://{host}:{port}/ws and http://{host}:{port}/chat")
+            await server.serve_forever()
+
+    def close(self):
+        self.question_cache.save()
+        self.local_router.save()
+        self.result_cache.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session server of the football chatbot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-limit", type=int, default=32, help="LLM calls at the same time, all sessions")
+    parser.add_argument("--kg-limit", type=int, default=16, help="GraphDB queries at the same time, all sessions")
+    parser.add_argument("--session-llm-limit", type=int, default=2)
+    parser.add_argument("--session-kg-limit", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="log the progress of every turn")
+    parser.add_argument("--trace", help="write the spans of every turn to this file as JSON lines")
+    parser.add_argument("--otlp", action="store_true", help="write the spans in the OTLP JSON encoding")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(message)s")
+    logger.setLevel(logging.INFO if args.verbose else logging.WARNING)
+    configure_tracing(args.trace, otlp=args.otlp or None)
+    server = ChatServer(
+        os.getenv("GEMINI_API_KEY"), os.getenv("GRAPH_DB_ENDPOINT"),
+        llm_limit=args.llm_limit, kg_limit=args.kg_limit, session_llm_limit=args.session_llm_limit,
+        session_kg_limit=args.session_kg_limit,
+    )
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Local answer rendering (functions/answer_renderer.py): single values, lists, single rows and
+small tables rendered without beautify, values shown by their labels and types, and the
+results left to beautify (explanations, blank nodes, long texts, too many rows or columns).
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from functions import answer_renderer
+from functions.answer_renderer import AnswerRenderer, beautify_rendered, format_table, humanize
+
+U = "http://semanticweb.org/unitedOntology#"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+
+def uri(name):
+    return {"type": "uri", "value": U + name}
+
+
+def literal(value, datatype=None):
+    term = {"type": "literal", "value": value}
+    if datatype:
+        term["datatype"] = XSD + datatype
+    return term
+
+
+@pytest.fixture(scope="module")
+def renderer():
+    return AnswerRenderer("ontology/ontology_export.ttl")
+
+
+@pytest.mark.parametrize("name, text", [
+    ("Manchester_United", "Manchester United"),
+    ("HomeWin", "Home Win"),
+    ("home_goals", "Home goals"),
+    ("homeGoals", "Home goals"),
+    ("p", "P"),
+])
+def test_humanize(name, text):
+    assert humanize(name) == text
+
+
+@pytest.mark.parametrize("term, text", [
+    (literal("12", "integer"), "12"),
+    (literal("1.50", "decimal"), "1.5"),
+    (literal("2.0", "double"), "2"),
+    (literal("true", "boolean"), "yes"),
+    (literal("2024-08-17T14:00:00Z", "dateTime"), "2024-08-17 14:00:00"),
+    (literal("England"), "England"),
+    (uri("Manchester_United"), "Manchester United"),
+    ({"type": "bnode", "value": "b0"}, None),
+    (literal("x" * 121), None),
+    (literal("twelve", "integer"), None),
+])
+def test_values(renderer, term, text):
+    assert renderer.value(term) == text
+
+
+def test_shapes(renderer):
+    assert renderer.render("How many goals?", [{"goals": literal("12", "integer")}]) == "Goals: 12"
+    players = [{"player": uri(name)} for name in ("Bukayo_Saka", "Declan_Rice", "Bukayo_Saka")]
+    assert renderer.render("Who plays for Arsenal?", players) == "Player (2):\n- Bukayo Saka\n- Declan Rice"
+    row = [{"player": uri("Bukayo_Saka"), "nationality": literal("England")}]
+    assert renderer.render("Where is Saka from?", row) == "Player: Bukayo Saka\nNationality: England"
+    rows = [{"team": uri("Arsenal"), "points": literal("9", "integer")},
+            {"team": uri("Chelsea"), "points": literal("7", "integer")}]
+    assert renderer.render("Points of the top teams?", rows) == format_table(
+        ["Team", "Points"], [["Arsenal", "9"], ["Chelsea", "7"]])
+
+
+def test_missing_values_are_empty(renderer):
+    rows = [{"player": uri("Bukayo_Saka"), "assists": literal("3", "integer")}, {"player": uri("Declan_Rice")}]
+    assert renderer.render("Assists of Arsenal players?", rows) == format_table(
+        ["Player", "Assists"], [["Bukayo Saka", "3"], ["Declan Rice", ""]])
+
+
+@pytest.mark.parametrize("question, bindings", [
+    ("Who plays for Arsenal?", []),
+    ("Why did Arsenal lose?", [{"score": literal("0-1")}]),
+    ("Tell me about Arsenal", [{"team": uri("Arsenal")}]),
+    ("Who plays for Arsenal?", [{"player": {"type": "bnode", "value": "b0"}}]),
+    ("Who plays for Arsenal?", [{"player": uri(f"Player_{i}")} for i in range(21)]),
+    ("Results?", [{"a": literal("1"), "b": literal("2"), "c": literal("3"), "d": literal("4"), "e": literal("5")}]),
+    ("Results?", [{"a": literal(str(i)), "b": literal(str(i))} for i in range(16)]),
+])
+def test_left_to_beautify(renderer, question, bindings):
+    assert renderer.render(question, bindings) is None
+
+
+def test_beautify_rendered(monkeypatch):
+    renderer = AnswerRenderer()
+    calls = []
+    monkeypatch.setattr(answer_renderer, "beautify", lambda api_key, query, answer: calls.append(query) or "Prose.")
+    assert beautify_rendered(renderer, None, "How many goals?", [{"goals": literal("3", "integer")}]) == "Goals: 3"
+    assert beautify_rendered(renderer, None, "Why?", [{"goals": literal("3", "integer")}]) == "Prose."
+    assert calls == ["Why?"]
+    stats = renderer.stats()
+    assert (stats["local"], stats["fallbacks"], stats["local_rate"]) == (1, 1, 0.5)
@@ -0,0 +1,83 @@
+"""
+Chat history under a token budget (functions/chat_history.py) and the requests of the
+ChatManager built on it: the recent messages are kept verbatim, the older ones are summarized
+or dropped, and a long session keeps neither more history nor a per-turn list.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from functions import llm_client
+from functions.chat_history import ChatHistory, estimate_tokens, extractive_summary
+from functions.chat_manager import ChatManager
+
+TEXT = "The match ended two all. Both teams scored late in the second half, after a long VAR check."
+
+
+def fill(history, turns):
+    for turn in range(turns):
+        history.append("user" if turn % 2 == 0 else "model", f"{turn}: {TEXT}")
+    return history
+
+
+def test_unbounded_history_keeps_everything():
+    history = fill(ChatHistory(max_tokens=None), 100)
+    assert len(history.messages) == 100 and history.summary == ""
+    assert history.tokens == sum(message.tokens for message in history.messages)
+
+
+@pytest.mark.parametrize("policy", ["summarize", "drop"])
+def test_history_kept_under_budget(policy):
+    history = fill(ChatHistory(max_tokens=1000, keep_recent=4, policy=policy), 200)
+    assert history.payload_tokens() <= 1000 + 8
+    assert len(history.messages) >= 4
+    # the most recent messages are kept verbatim
+    assert history.messages[-1].text == f"199: {TEXT}"
+    stats = history.stats()
+    if policy == "summarize":
+        assert stats["summarized"] == 200 - stats["messages"] and history.summary
+        assert history.contents()[0].parts[0].text.startswith("Summary of the earlier conversation")
+    else:
+        assert stats["dropped"] == 200 - stats["messages"] and not history.summary
+    assert len(history.contents()) == len(history.messages) + (policy == "summarize")
+
+
+def test_keep_recent_wins_over_budget():
+    history = fill(ChatHistory(max_tokens=10, keep_recent=3, policy="drop"), 10)
+    assert len(history.messages) == 3
+
+
+def test_contents_follow_appends_and_clear():
+    history = fill(ChatHistory(max_tokens=None), 3)
+    assert [content.parts[0].text for content in history.contents()] == [m.text for m in history.messages]
+    history.append("user", "one more")
+    assert history.contents()[-1].parts[0].text == "one more"
+    history.clear()
+    assert history.contents() == [] and history.tokens == 0
+
+
+def test_extractive_summary_keeps_first_sentences_under_budget():
+    messages = fill(ChatHistory(max_tokens=None), 50).messages
+    summary = extractive_summary("", messages, max_tokens=60)
+    assert estimate_tokens(summary) <= 60
+    assert summary.splitlines()[-1] == "model: 49: The match ended two all."
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ChatHistory(policy="forget")
+
+
+def test_chat_payloads_counted_without_a_list(monkeypatch):
+    monkeypatch.setattr(llm_client, "_llm", llm_client.FakeClient(lambda prompt, system_instruction: TEXT))
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.", max_history_tokens=400)
+    for turn in range(100):
+        assert chat.ask(f"Question {turn}: what happened?") == TEXT
+    assert "".join(chat.ask_stream("And then?")) == " ".join(TEXT.split())
+    stats = chat.payload_stats()
+    assert stats["requests"] == 101
+    assert stats["max_tokens"] <= 400 + estimate_tokens(chat.system_prompt) + 8
+    assert 0 < stats["mean_tokens"] <= stats["max_tokens"]
+    assert stats["total_tokens"] == pytest.approx(stats["mean_tokens"] * 101)
+    assert not hasattr(chat, "payload_sizes")
@@ -0,0 +1,75 @@
+"""
+The embedded backend (functions/embedded_store.py) and the timings of the validator rules:
+bindings in GraphDB's JSON form, the prepared query cache, and counters that stay exact when
+several sessions query and validate at once.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import threading
+
+from rdflib import Graph, Literal, URIRef
+
+from functions.embedded_store import EmbeddedStore
+from functions.sparql_validator import RULES, register_rule, rule_timings, unregister_rule, validate_sparql
+
+U = "http://semanticweb.org/unitedOntology#"
+ONTOLOGY = "ontology/ontology_export.ttl"
+QUERY = f"SELECT ?p ?name WHERE {{ ?p <{U}name> ?name }}"
+
+
+def run_threads(target, threads=4):
+    threads = [threading.Thread(target=target) for _ in range(threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def store():
+    graph = Graph()
+    graph.add((URIRef(U + "Bukayo_Saka"), URIRef(U + "name"), Literal("Bukayo Saka", lang="en")))
+    graph.add((URIRef(U + "Bukayo_Saka"), URIRef(U + "age"), Literal(23)))
+    return EmbeddedStore(graph)
+
+
+def test_bindings_like_graphdb():
+    assert list(store().query_stream(QUERY)) == [{
+        "p": {"type": "uri", "value": U + "Bukayo_Saka"},
+        "name": {"type": "literal", "value": "Bukayo Saka", "xml:lang": "en"},
+    }]
+    assert list(store().query_stream(f"ASK {{ ?p <{U}age> 23 }}")) == []
+
+
+def test_counters_shared_between_threads():
+    embedded = store()
+
+    def session():
+        for _ in range(50):
+            list(embedded.query_stream(QUERY))
+            list(embedded.query_stream("SELECT ?p WHERE { broken"))
+
+    run_threads(session)
+    stats = embedded.stats()
+    assert stats["queries"] == 400
+    assert stats["errors"] == 200
+    assert stats["prepared_hits"] == 199
+
+
+def test_rule_timings_shared_between_threads():
+    rule = register_rule("Test Rule", "SELECT ?s WHERE { ?s <urn:never> ?o }", "never")
+    try:
+        query = f"SELECT * WHERE {{ ?p a <{U}Player> }}"
+        results = []
+
+        def session():
+            results.extend(validate_sparql(query, ONTOLOGY) for _ in range(25))
+
+        run_threads(session)
+        assert results == [None] * 100
+        assert rule.calls == 100
+        timings = rule_timings()["Test Rule"]
+        assert timings["calls"] == 100 and timings["max_ms"] >= timings["mean_ms"] > 0
+    finally:
+        unregister_rule("Test Rule")
+    assert "Test Rule" not in RULES
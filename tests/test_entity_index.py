@@ -0,0 +1,81 @@
+"""
+Entity index (functions/entity_index.py) on a handful of entities: exact names and aliases,
+misspelled and truncated names, and the common question words that must not be resolved to an
+entity (the first word of a sentence, short words within a typo of a name, generic words that
+start a name).
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from functions.entity_index import ONTOLOGY_PREFIX, TEAM_ALIASES, EntityIndex, format_mentions
+
+ENTITIES = [
+    ("Manchester_City", "Manchester City", "Team", None),
+    ("Manchester_United", "Manchester United", "Team", None),
+    ("Newcastle_United", "Newcastle United", "Team", None),
+    ("Erling_Haaland", "Erling Haaland", "Player", "Manchester City"),
+    ("Martin_Odegaard", "Martin Ødegaard", "Player", "Arsenal"),
+    ("Bruno_Fernandes", "Bruno Fernandes", "Player", "Manchester United"),
+    ("Virgil_van_Dijk", "Virgil van Dijk", "Player", "Liverpool"),
+    ("Eddie_Howe", "Eddie Howe", "Coach", "Newcastle United"),
+    ("Stadium_of_Light", "Stadium of Light", "Stadium", None),
+    ("Old_Trafford", "Old Trafford", "Stadium", None),
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = EntityIndex()
+    for local_name, label, kind, team in ENTITIES:
+        index.add(ONTOLOGY_PREFIX + local_name, label, kind, team=team)
+    for local_name in ("Manchester_City", "Manchester_United", "Newcastle_United"):
+        for name in TEAM_ALIASES[local_name]:
+            index.add_alias(name, index.entities[ONTOLOGY_PREFIX + local_name])
+    return index
+
+
+def resolved(index, question):
+    return [(mention.text, mention.entities[0].name, mention.match) for mention in index.resolve(question)]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many goals has Haaland scored?", [("Haaland", ":Erling_Haaland", "exact")]),
+    ("Who does Man Utd play next?", [("Man Utd", ":Manchester_United", "exact")]),
+    ("Where does van Dijk play?", [("van Dijk", ":Virgil_van_Dijk", "exact")]),
+    ("How many assists has Martin Odegaard made?", [("Martin Odegaard", ":Martin_Odegaard", "exact")]),
+    ("Who does Bruno Fernandez play for?", [("Bruno Fernandez", ":Bruno_Fernandes", "fuzzy")]),
+    ("How many goals has Halaand scored?", [("Halaand", ":Erling_Haaland", "fuzzy")]),
+    ("How many goals has Haal scored?", [("Haal", ":Erling_Haaland", "prefix")]),
+    ("Haaland goals this season", [("Haaland", ":Erling_Haaland", "exact")]),
+])
+def test_names_resolved(index, question, expected):
+    assert resolved(index, question) == expected
+
+
+@pytest.mark.parametrize("question, expected", [
+    # "Home" is one letter from Howe, and the first word of the question
+    ("Home wins for City", [("City", ":Manchester_City", "exact")]),
+    ("Who won? Home teams scored more", []),
+    # "Stadium" starts only the Stadium of Light, but is far from the whole name
+    ("Stadium of the season", []),
+    ("Which Stadium is the biggest?", []),
+    # capitalised question words
+    ("Show Goals and Assists of the Season", []),
+    ("Most Clean Sheets", []),
+    ("Does City play Newcastle at Home?", [("City", ":Manchester_City", "exact"),
+                                          ("Newcastle", ":Newcastle_United", "exact")]),
+])
+def test_common_words_not_resolved(index, question, expected):
+    assert resolved(index, question) == expected
+
+
+def test_first_word_matched_exactly_only(index):
+    assert resolved(index, "Halaand has how many goals?") == []
+    assert resolved(index, "Haaland has how many goals?") == [("Haaland", ":Erling_Haaland", "exact")]
+
+
+def test_format_mentions(index):
+    assert format_mentions(index.resolve("How many goals has Haaland scored?")) == \
+        '- "Haaland": :Erling_Haaland (Player, Manchester City)'
@@ -0,0 +1,77 @@
+"""
+The local router (functions/local_router.py): questions outside the KG that look like football
+questions go to the LLM router instead of being decided locally, small talk is decided locally
+as chat, and the learned examples and the counters stay consistent.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from functions.local_router import CALIBRATION_EXAMPLES, SEED_EXAMPLES, LocalRouter
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+
+
+@pytest.fixture(scope="module")
+def router():
+    return LocalRouter.from_ontology(ONTOLOGY)
+
+
+@pytest.mark.parametrize("question", [
+    "Who won the World Cup in 2022?",
+    "Who is the best player ever?",
+    "Who is the coach of Real Madrid?",
+    "Who plays for Barcelona?",
+    "Tell me about Bukayo Saka",
+])
+def test_out_of_scope_questions_not_decided_locally(router, question):
+    assert router.decide(question) is None
+
+
+@pytest.mark.parametrize("question", ["thanks", "Thanks a lot", "Hi!", "Tell me a joke"])
+def test_small_talk_decided_as_chat(router, question):
+    assert router.decide(question) is False
+
+
+@pytest.mark.parametrize("question", [
+    "Who scored for Arsenal?",
+    "Which team has the most goals?",
+    "How many yellow cards has Chelsea received?",
+])
+def test_kg_questions_decided_locally(router, question):
+    assert router.decide(question) is True
+
+
+def test_calibration_examples_are_held_out(router):
+    assert not {question for question, _ in CALIBRATION_EXAMPLES} & {question for question, _ in SEED_EXAMPLES}
+    assert router.documents[True] + router.documents[False] == len(SEED_EXAMPLES)
+    for question, use_kg in CALIBRATION_EXAMPLES:
+        assert router.decide(question) in (use_kg, None)
+
+
+def test_learned_examples_rotate():
+    router = LocalRouter(max_learned=3, calibration=None)
+    fresh = LocalRouter(calibration=None)
+    for i in range(10):
+        router.learn(f"zzqq{i} question", i % 2 == 0)
+    assert len(router.learned) == 3
+    for question, use_kg in router.learned:
+        fresh.learn(question, use_kg)
+    assert router.word_counts == fresh.word_counts
+    assert router.documents == fresh.documents
+    assert router.known_features == fresh.known_features
+
+
+def test_counters_shared_between_threads():
+    router = LocalRouter(calibration=None)
+    threads = [threading.Thread(target=lambda: [router.decide("Who scored for Arsenal?") for _ in range(500)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = router.stats()
+    assert stats["local_kg"] + stats["local_chat"] + stats["fallbacks"] == 2000
@@ -0,0 +1,137 @@
+"""
+The turn pipeline (functions/pipeline.py) with stubbed stages: the KG branch runs while the
+router is deciding, a branch the router turns down stops before the query is executed and its
+messages are dropped, and questions routed locally skip the LLM router.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from functions import llm_client, pipeline
+from functions.chat_manager import ChatManager
+from functions.pipeline import TurnPipeline
+
+QUERY = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?p WHERE { ?p a :Player }"
+BINDINGS = [{"p": {"type": "uri", "value": "urn:saka"}}]
+CHAT_REPLY = "Hello there."
+
+
+class Stages:
+    """Stand-ins for the LLM and KG calls of the pipeline, recording what ran."""
+
+    def __init__(self, monkeypatch, use_kg=True, sparql=QUERY):
+        self.use_kg = use_kg
+        self.sparql = sparql
+        self.calls = []
+        self.generating = threading.Event()
+        self.routed = threading.Event()
+        self.chatting = threading.Event()
+        monkeypatch.setattr(pipeline, "should_use_kg", self.should_use_kg)
+        monkeypatch.setattr(pipeline, "generate_sparql", self.generate_sparql)
+        monkeypatch.setattr(pipeline, "validate_sparql", self.validate_sparql)
+        monkeypatch.setattr(pipeline, "execute_sparql_stream", self.execute_sparql_stream)
+        monkeypatch.setattr(pipeline, "beautify", lambda api_key, question, bindings: f"{len(bindings)} rows")
+        monkeypatch.setattr(llm_client, "_llm", llm_client.FakeClient(self.chat))
+
+    def should_use_kg(self, api_key, question):
+        self.calls.append("router")
+        # the router answers only once generation has started, so a turn that doesn't run
+        # them at the same time would wait out the timeout
+        self.calls.append("router saw generation" if self.generating.wait(2) else "router alone")
+        self.routed.set()
+        return self.use_kg
+
+    def generate_sparql(self, api_key, ontology_path, question, mentions=None):
+        self.calls.append("generate")
+        self.generating.set()
+        # the turn has chosen between the KG and the chat before the branch goes on
+        (self.routed if self.use_kg else self.chatting).wait(2)
+        return self.sparql
+
+    def validate_sparql(self, query, ontology, cache_dir=None):
+        self.calls.append("validate")
+        return None if query.startswith("PREFIX") else "Input not SPARQL"
+
+    def execute_sparql_stream(self, url, query, limit=None):
+        self.calls.append("execute")
+        return iter(BINDINGS)
+
+    def chat(self, prompt, system_instruction):
+        self.chatting.set()
+        return CHAT_REPLY
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def turn_pipeline(executor, messages, **kwargs):
+    chat = ChatManager(api_key=None, system_prompt="You are a football assistant.")
+    return TurnPipeline(None, "http://kg", "ontology.txt", "ontology.ttl", chat, executor=executor,
+                        log=messages.append, **kwargs)
+
+
+def test_kg_branch_runs_with_the_router(monkeypatch, executor):
+    stages, messages = Stages(monkeypatch), []
+    result = turn_pipeline(executor, messages).run_sync("Who plays for Arsenal?")
+    assert "router saw generation" in stages.calls
+    assert stages.calls.count("execute") == 1
+    assert result.used_kg and result.bindings == BINDINGS and result.reply == "1 rows"
+    # the branch's messages are shown once the router has chosen it
+    assert any(message.startswith("\nAttempt 1") for message in messages)
+    assert messages.index("Querying the Knowledge Graph...") < messages.index("SPARQL validated successfully.")
+
+
+def test_kg_branch_cancelled_when_the_router_says_chat(monkeypatch, executor):
+    stages, messages = Stages(monkeypatch, use_kg=False), []
+    result = turn_pipeline(executor, messages).run_sync("Hi there!")
+    executor.shutdown(wait=True)
+    assert not result.used_kg and result.reply == CHAT_REPLY
+    assert "generate" in stages.calls and "execute" not in stages.calls
+    assert result.sparql is None and result.bindings == []
+    assert messages == []
+
+
+def test_without_speculation_the_router_runs_first(monkeypatch, executor):
+    stages, messages = Stages(monkeypatch, use_kg=False), []
+    # nothing to wait for
+    stages.generating.set()
+    result = turn_pipeline(executor, messages, speculative=False).run_sync("Hi there!")
+    assert "router" in stages.calls and "generate" not in stages.calls
+    assert result.reply == CHAT_REPLY
+
+
+class LocalRouter:
+    def __init__(self, decision):
+        self.decision = decision
+
+    def decide(self, question):
+        return self.decision
+
+    def learn(self, question, use_kg):
+        raise AssertionError("a local decision isn't learned")
+
+
+@pytest.mark.parametrize("decision", [True, False])
+def test_local_decision_skips_the_router(monkeypatch, executor, decision):
+    stages, messages = Stages(monkeypatch), []
+    stages.routed.set()
+    result = turn_pipeline(executor, messages, local_router=LocalRouter(decision)).run_sync("Who plays for Arsenal?")
+    assert "router" not in stages.calls
+    assert result.used_kg is decision
+    assert ("generate" in stages.calls) is decision
+
+
+def test_question_not_turned_into_sparql(monkeypatch, executor):
+    stages, messages = Stages(monkeypatch, sparql="I can't answer that."), []
+    result = turn_pipeline(executor, messages).run_sync("Who plays for Arsenal?")
+    assert result.used_kg and result.reply is None
+    assert "execute" not in stages.calls
+    assert "Cannot answer the question.." in messages
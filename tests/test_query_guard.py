@@ -0,0 +1,113 @@
+"""
+The query cost guard (functions/query_guard.py) on hand-made KG statistics: the LIMIT added to
+SELECT queries, the disconnected, unbounded and self-joined patterns it flags, the rewrites it
+makes (FILTER, join order), the queries it rejects, and the statistics read from a KG.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import json
+
+import pytest
+from rdflib import RDF, Graph, URIRef
+
+from functions import query_guard
+from functions.query_guard import KGStatistics, QueryGuard
+
+U = "http://semanticweb.org/unitedOntology#"
+PREFIX = f"PREFIX : <{U}>\n"
+
+
+def u(name):
+    return URIRef(U + name)
+
+
+@pytest.fixture
+def guard():
+    kg = KGStatistics(
+        {u("playsFor"): (500, 500, 20), u("hasNationality"): (500, 500, 50), RDF.type: (900, 900, 3)},
+        {u("Player"): 500, u("Team"): 20, u("Match"): 380},
+    )
+    return QueryGuard(kg)
+
+
+def check(guard, query):
+    plan = guard.check(PREFIX + query)
+    return plan, plan.query[len(PREFIX):]
+
+
+@pytest.mark.parametrize("query, rewritten, estimated", [
+    ("SELECT ?p WHERE { ?p a :Player }", "SELECT ?p WHERE { ?p a :Player }\nLIMIT 1000", 500),
+    ("SELECT ?p WHERE { ?p a :Player } LIMIT 5", "SELECT ?p WHERE { ?p a :Player } LIMIT 5", 5),
+    ("ASK { ?p a :Player }", "ASK { ?p a :Player }", None),
+    ("SELECT (COUNT(?p) AS ?n) WHERE { ?p a :Player }", "SELECT (COUNT(?p) AS ?n) WHERE { ?p a :Player }\nLIMIT 1000",
+     None),
+])
+def test_limit_and_estimate(guard, query, rewritten, estimated):
+    plan, text = check(guard, query)
+    assert text == rewritten
+    assert plan.estimated_rows == estimated and not plan.rejected and plan.issues == []
+
+
+def test_disconnected_patterns(guard):
+    plan, text = check(guard, "SELECT * WHERE { ?p a :Player . ?t a :Team }")
+    assert plan.issues[0].startswith("disconnected patterns: ?p")
+    # the most selective pattern first
+    assert text == "SELECT * WHERE { ?t a :Team . ?p a :Player }\nLIMIT 1000"
+    assert plan.changes == ["reordered", "LIMIT 1000"]
+    assert plan.cost == 20 + 20 * 500
+
+
+def test_unbounded_pattern(guard):
+    plan, _ = check(guard, "SELECT * WHERE { ?s ?p ?o }")
+    assert plan.issues == ["unbounded pattern: ?s ?p ?o"]
+
+
+def test_self_join_filtered(guard):
+    plan, text = check(guard, "SELECT ?a ?b WHERE { ?p :playsFor ?a . ?p :playsFor ?b }")
+    assert plan.issues == ["self-join: ?a and ?b can be the same value"]
+    assert text == "SELECT ?a ?b WHERE { ?p :playsFor ?a . ?p :playsFor ?b\n  FILTER(?a != ?b) }\nLIMIT 1000"
+    # told apart by a filter or by what they are joined to, the variables are left alone
+    assert check(guard, "SELECT * WHERE { ?p :playsFor ?a . ?p :playsFor ?b FILTER(?a != ?b) }")[0].issues == []
+    assert check(guard, "SELECT * WHERE { ?p :playsFor ?a . ?p :playsFor ?b . ?a a :Team }")[0].issues == []
+
+
+def test_join_order_by_selectivity(guard):
+    plan, text = check(guard, "SELECT ?n WHERE {\n  ?p :hasNationality ?n .\n  ?p :playsFor :Arsenal .\n}")
+    assert text == "SELECT ?n WHERE {\n  ?p :playsFor :Arsenal .\n  ?p :hasNationality ?n .\n}\nLIMIT 1000"
+    assert plan.estimated_rows == 25
+    # already in the best order
+    plan, _ = check(guard, "SELECT ?n WHERE { ?p :playsFor :Arsenal . ?p :hasNationality ?n } LIMIT 10")
+    assert plan.changes == []
+
+
+def test_expensive_query_rejected(guard):
+    plan, _ = check(guard, "SELECT * WHERE { ?m a :Match . ?p a :Player . ?t a :Team . ?x a :Match }")
+    assert plan.rejected and plan.cost > guard.max_cost
+    assert plan.error.startswith("The query is too expensive to run") and "disconnected patterns" in plan.error
+
+
+def test_stats(guard):
+    plans = [guard.check(PREFIX + query) for query in (
+        "SELECT ?p WHERE { ?p a :Player } LIMIT 5",
+        "SELECT * WHERE { ?s ?p ?o }",
+        "SELECT * WHERE { ?m a :Match . ?p a :Player . ?t a :Team . ?x a :Match }",
+    )]
+    guard.record(plans[0], 5)
+    guard.record(plans[1], 4000)
+    stats = guard.stats()
+    assert (stats["checked"], stats["rejected"], stats["rewritten"], stats["executed"]) == (3, 1, 2, 2)
+    assert stats["issues"] == {"unbounded pattern": 1, "disconnected patterns": 1}
+
+
+def test_statistics_from_kg(monkeypatch):
+    graph = Graph()
+    for player, team in (("Bukayo_Saka", "Arsenal"), ("Declan_Rice", "Arsenal"), ("Cole_Palmer", "Chelsea")):
+        graph.add((u(player), RDF.type, u("Player")))
+        graph.add((u(player), u("playsFor"), u(team)))
+    monkeypatch.setattr(query_guard, "execute_sparql", lambda url, query: json.loads(
+        graph.query(query).serialize(format="json"))["results"]["bindings"])
+    kg = KGStatistics.from_kg("kg")
+    assert kg.predicates[u("playsFor")] == (3, 3, 2)
+    assert kg.classes == {u("Player"): 3}
+    assert (kg.triples, kg.subjects, kg.objects) == (6, 3, 3)
@@ -0,0 +1,80 @@
+"""
+Question -> SPARQL cache (functions/question_cache.py): exact and similar questions are hits,
+questions about another gameweek or team are not, only valid queries are remembered, the
+oldest entries are evicted, and the cache file survives a restart.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from functions import question_cache
+from functions.question_cache import QuestionCache, generate_sparql_cached
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+QUESTION = "How many goals did Arsenal score in gameweek 5?"
+VALID = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?p WHERE { ?p a :Player ; :playsFor ?t }"
+INVALID = "PREFIX : <http://semanticweb.org/unitedOntology#>\nSELECT ?p WHERE { ?p :zzzqqq ?t }"
+
+
+@pytest.fixture
+def cache():
+    cache = QuestionCache(entity_terms=["arsenal", "chelsea"])
+    assert cache.remember(QUESTION, VALID, ONTOLOGY)
+    return cache
+
+
+@pytest.mark.parametrize("question, score", [
+    (QUESTION, 1.0),
+    ("how many goals did arsenal score in gameweek 5", 1.0),
+    ("How many goals has Arsenal scored in gameweek 5?", pytest.approx(1.0)),
+])
+def test_hits(cache, question, score):
+    assert cache.lookup(question) == (VALID, score)
+
+
+@pytest.mark.parametrize("question", [
+    # another number or team must not share the query
+    "How many goals did Arsenal score in gameweek 6?",
+    "How many goals did Chelsea score in gameweek 5?",
+    "Who is the coach of Arsenal?",
+])
+def test_misses(cache, question):
+    assert cache.lookup(question) is None
+
+
+def test_only_valid_queries_remembered(cache):
+    assert not cache.remember("Who plays for Chelsea?", INVALID, ONTOLOGY)
+    assert cache.lookup("Who plays for Chelsea?") is None
+    assert len(cache.entries) == 1
+
+
+def test_oldest_entries_evicted():
+    cache = QuestionCache(max_entries=2)
+    for gameweek in (1, 2, 3):
+        cache._add(f"Results of gameweek {gameweek}", f"Q{gameweek}")
+    assert cache.lookup("Results of gameweek 1") is None
+    assert cache.lookup("Results of gameweek 3") == ("Q3", 1.0)
+    assert "1" not in cache.postings
+
+
+def test_file_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "questions.json")
+    QuestionCache(path=path).remember(QUESTION, VALID, ONTOLOGY)
+    assert QuestionCache(path=path).lookup(QUESTION) == (VALID, 1.0)
+
+
+def test_generate_sparql_cached(cache, monkeypatch):
+    generated = []
+
+    def generate(api_key, ontology_path, question, mentions=None):
+        generated.append(question)
+        return INVALID
+
+    monkeypatch.setattr(question_cache, "generate_sparql", generate)
+    assert generate_sparql_cached(cache, None, ONTOLOGY, QUESTION) == VALID
+    assert generate_sparql_cached(cache, None, ONTOLOGY, "Who plays for Chelsea?") == INVALID
+    assert generated == ["Who plays for Chelsea?"]
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["similar_hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_rate"] == 0.5 and cache.generations == 1
@@ -0,0 +1,94 @@
+"""
+Result cache of executed SPARQL queries (functions/result_cache.py): equivalent queries share an
+entry and get the bindings under their own variable names, entries expire and are evicted, the
+sqlite file survives a restart, and empty results aren't cached.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from functions import result_cache
+from functions.result_cache import ResultCache, execute_sparql_cached
+
+URL = "http://localhost:7200/repositories/test"
+PREFIX = "PREFIX : <http://semanticweb.org/unitedOntology#>\n"
+QUERY = PREFIX + "SELECT ?p ?n WHERE { ?p a :Player ; :hasNationality ?n }"
+# the same query with other names and layout
+SAME = "prefix u: <http://semanticweb.org/unitedOntology#>\nselect ?player ?country where {\n" \
+       "  ?player a u:Player ; u:hasNationality ?country .\n}"
+BINDINGS = [{"p": {"type": "uri", "value": "urn:saka"}, "n": {"type": "literal", "value": "England"}}]
+
+
+def test_equivalent_queries_share_an_entry():
+    cache = ResultCache()
+    assert cache.get(URL, QUERY) is None
+    cache.put(URL, QUERY, BINDINGS)
+    assert cache.get(URL, QUERY) == BINDINGS
+    assert cache.get(URL, SAME) == [{"player": BINDINGS[0]["p"], "country": BINDINGS[0]["n"]}]
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+@pytest.mark.parametrize("url, query, limit", [
+    ("http://localhost:7200/repositories/other", QUERY, None),
+    (URL, QUERY + " LIMIT 1", None),
+    (URL, QUERY, 10),
+])
+def test_different_queries_miss(url, query, limit):
+    cache = ResultCache()
+    cache.put(URL, QUERY, BINDINGS)
+    assert cache.get(url, query, limit) is None
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache = ResultCache(ttl=60)
+    cache.put(URL, QUERY, BINDINGS)
+    now[0] += 59
+    assert cache.get(URL, QUERY) == BINDINGS
+    now[0] += 2
+    assert cache.get(URL, QUERY) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_evicted():
+    cache = ResultCache(max_entries=2)
+    queries = [PREFIX + f"SELECT ?p WHERE {{ ?p :hasAge {age} }}" for age in (20, 21, 22)]
+    cache.put(URL, queries[0], [])
+    cache.put(URL, queries[1], [])
+    cache.get(URL, queries[0])
+    cache.put(URL, queries[2], [])
+    assert cache.get(URL, queries[1]) is None
+    assert cache.get(URL, queries[0]) == [] and cache.get(URL, queries[2]) == []
+
+
+def test_sqlite_file_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "results.sqlite")
+    cache = ResultCache(path=path)
+    cache.put(URL, QUERY, BINDINGS)
+    cache.close()
+    restarted = ResultCache(path=path)
+    assert restarted.get(URL, SAME)[0]["country"]["value"] == "England"
+    restarted.invalidate()
+    restarted.close()
+    assert ResultCache(path=path).get(URL, QUERY) is None
+
+
+def test_execute_sparql_cached(monkeypatch):
+    executed = []
+
+    def execute(url, query, limit=None):
+        executed.append(query)
+        return iter(BINDINGS if "Player" in query else [])
+
+    monkeypatch.setattr(result_cache, "execute_sparql_stream", execute)
+    cache = ResultCache()
+    assert execute_sparql_cached(cache, URL, QUERY) == BINDINGS
+    assert execute_sparql_cached(cache, URL, SAME)[0]["player"]["value"] == "urn:saka"
+    assert len(executed) == 1
+    # a failed request also returns no bindings, so empty results are executed again
+    empty = PREFIX + "SELECT ?c WHERE { ?c a :Coach }"
+    assert execute_sparql_cached(cache, URL, empty) == []
+    assert execute_sparql_cached(cache, URL, empty) == []
+    assert len(executed) == 3
@@ -0,0 +1,151 @@
+"""
+Season views (functions/season_views.py) over a small KG queried in process: the table, the
+scorers and the form built from the matches and goals, the updates that apply only what is
+new (including a goal loaded after its match), and the questions answered by a view.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import json
+
+import pytest
+from rdflib import RDFS, Graph, Literal, URIRef
+from rdflib.namespace import RDF
+
+from functions import season_views
+from functions.entity_index import ONTOLOGY_PREFIX
+from functions.season_views import SeasonViews
+
+
+def u(name):
+    return URIRef(ONTOLOGY_PREFIX + name)
+
+
+class KG:
+    """An rdflib graph standing in for GraphDB, with the queries it was asked."""
+
+    def __init__(self):
+        self.graph = Graph()
+        self.queries = []
+        for team, label in (("Arsenal", "Arsenal"), ("Chelsea", "Chelsea"), ("Manchester_United", "Manchester United")):
+            self.graph.add((u(team), RDF.type, u("Team")))
+            self.graph.add((u(team), RDFS.label, Literal(label)))
+
+    def player(self, name, team):
+        self.graph.add((u(name), RDF.type, u("Player")))
+        self.graph.add((u(name), RDFS.label, Literal(name.replace("_", " "))))
+        self.graph.add((u(name), u("playsFor"), u(team)))
+
+    def match(self, name, gameweek, home, away, home_goals, away_goals):
+        g, match = self.graph, u(name)
+        g.add((match, RDF.type, u("Match")))
+        g.add((match, u("matchGameweek"), Literal(gameweek)))
+        g.add((match, u("hasHomeTeam"), u(home)))
+        g.add((match, u("hasAwayTeam"), u(away)))
+        for team, goals in ((home, home_goals), (away, away_goals)):
+            stats = u(f"{name}_{team}")
+            g.add((match, u("matchHasTeamStats"), stats))
+            g.add((stats, u("statsOfTeam"), u(team)))
+            g.add((stats, u("teamGoalsScored"), Literal(goals)))
+
+    def goal(self, name, match, scorer, assistant=None, own_goal=False):
+        g, goal = self.graph, u(name)
+        g.add((goal, RDF.type, u("Goal")))
+        g.add((goal, u("goalInMatch"), u(match)))
+        g.add((goal, u("goalScoredBy"), u(scorer)))
+        if assistant:
+            g.add((goal, u("assistedBy"), u(assistant)))
+        if own_goal:
+            g.add((goal, u("isOwnGoal"), Literal(True)))
+
+    def execute_sparql(self, url, query):
+        self.queries.append(query)
+        return json.loads(self.graph.query(query).serialize(format="json"))["results"]["bindings"]
+
+
+@pytest.fixture
+def kg(monkeypatch):
+    kg = KG()
+    kg.player("Bukayo_Saka", "Arsenal")
+    kg.player("Martin_Odegaard", "Arsenal")
+    kg.player("Cole_Palmer", "Chelsea")
+    kg.player("Bruno_Fernandes", "Manchester_United")
+    kg.match("m1", 1, "Arsenal", "Chelsea", 2, 1)
+    kg.goal("g1", "m1", "Bukayo_Saka", "Martin_Odegaard")
+    kg.goal("g2", "m1", "Bukayo_Saka")
+    kg.goal("g3", "m1", "Cole_Palmer")
+    kg.match("m2", 2, "Chelsea", "Manchester_United", 1, 1)
+    kg.goal("g4", "m2", "Cole_Palmer", own_goal=True)
+    kg.goal("g5", "m2", "Bruno_Fernandes")
+    monkeypatch.setattr(season_views, "execute_sparql", kg.execute_sparql)
+    return kg
+
+
+def test_views_built_from_matches_and_goals(kg):
+    views = SeasonViews.from_kg("kg")
+    arsenal, chelsea, united = (views.team_index[ONTOLOGY_PREFIX + team]
+                                for team in ("Arsenal", "Chelsea", "Manchester_United"))
+    assert views.table["wins"][arsenal] == 1 and views.table["losses"][chelsea] == 1
+    assert views.table["draws"][united] == 1 and views.table["played"][chelsea] == 2
+    assert views.gameweek == 2
+    answer = views.answer("Show the league table")
+    assert [binding["team"]["value"] for binding in answer.bindings] == [
+        ONTOLOGY_PREFIX + team for team in ("Arsenal", "Manchester_United", "Chelsea")]
+    # the own goal isn't counted for its scorer
+    scorers = views.answer("Who are the top scorers?").bindings
+    assert [(b["player"]["value"].rsplit("#")[-1], int(b["goals"]["value"])) for b in scorers] == [
+        ("Bukayo_Saka", 2), ("Bruno_Fernandes", 1), ("Cole_Palmer", 1)]
+    assert views.answer("Top scorers of Chelsea").text.count("Cole Palmer") == 1
+    assert views.answer("Who has the most assists?").bindings[0]["player"]["value"].endswith("Martin_Odegaard")
+    assert views.answer("What is Chelsea's form?").text.startswith("Form of Chelsea: L D")
+
+
+def test_update_applies_only_what_is_new(kg):
+    views = SeasonViews.from_kg("kg")
+    assert views.update("kg") == 0
+    # nothing new: no names to fetch
+    assert len(kg.queries) == 3 + 2
+    kg.match("m3", 3, "Manchester_United", "Arsenal", 0, 1)
+    kg.goal("g6", "m3", "Martin_Odegaard")
+    assert views.update("kg") == 2
+    assert views.table["played"][views.team_index[ONTOLOGY_PREFIX + "Arsenal"]] == 2
+    # only the teams and players of the new rows are named again
+    assert "Cole_Palmer" not in kg.queries[-1] and "Martin_Odegaard" in kg.queries[-1]
+
+
+def test_goal_loaded_after_its_match(kg):
+    views = SeasonViews.from_kg("kg")
+    kg.goal("g7", "m1", "Martin_Odegaard", "Bukayo_Saka")
+    assert views.update("kg") == 1
+    saka = views.player_index[ONTOLOGY_PREFIX + "Bukayo_Saka"]
+    odegaard = views.player_index[ONTOLOGY_PREFIX + "Martin_Odegaard"]
+    assert views.goals[odegaard] == 1 and views.assists[saka] == 1
+    assert views.update("kg") == 0
+
+
+def test_postponed_match_played_late(kg):
+    views = SeasonViews.from_kg("kg")
+    kg.match("m4", 3, "Arsenal", "Manchester_United", 3, 0)
+    views.update("kg")
+    kg.match("m0", 1, "Manchester_United", "Chelsea", 0, 0)
+    views.update("kg")
+    united = views.team_index[ONTOLOGY_PREFIX + "Manchester_United"]
+    assert [result[0] for result in views.results[united]] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("question", [
+    "Who scored the most goals against Arsenal?",
+    "Who has the most goals in gameweek 3?",
+    "What is their form?",
+    "Show the table and the top scorers",
+])
+def test_other_questions_not_answered(kg, question):
+    assert SeasonViews.from_kg("kg").answer(question) is None
+
+
+def test_apply_without_a_kg():
+    views = SeasonViews()
+    assert views.apply_match("m", 1, "x#A", "x#B", 1, 0)
+    assert not views.apply_match("m", 1, "x#A", "x#B", 1, 0)
+    assert views.apply_goal("g", "x#P") and not views.apply_goal("g", "x#P")
+    assert views.goals[views.player_index["x#P"]] == 1
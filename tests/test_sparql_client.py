@@ -0,0 +1,156 @@
+"""
+SparqlClient and AsyncSparqlClient (functions/execute_query.py) against the stub endpoint of
+the benchmarks: timeouts, retries of 5xx answers and not of 4xx ones, connection pooling, and
+the same bindings from the async client as from the sync one; and execute_sparql without an
+endpoint URL.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from benchmarks.stub_endpoint import StubEndpoint, make_result
+from functions.execute_query import AsyncSparqlClient, SparqlClient, execute_sparql, execute_sparql_stream
+
+QUERY = "SELECT ?player ?team WHERE { ?player <http://semanticweb.org/unitedOntology#playsFor> ?team }"
+ROWS = 5
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def async_query(url, **options):
+    client = AsyncSparqlClient(url, **options)
+    try:
+        return await client.query(QUERY)
+    finally:
+        await client.close()
+
+
+@pytest.fixture
+def unreachable_url():
+    """A port whose accept queue is full, so that connecting to it hangs until the connect timeout."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(0)
+    pending = []
+    for _ in range(3):
+        client = socket.socket()
+        client.setblocking(False)
+        client.connect_ex(server.getsockname())
+        pending.append(client)
+    time.sleep(0.05)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/repositories/united"
+    for client in pending:
+        client.close()
+    server.close()
+
+
+def test_connect_timeout(unreachable_url):
+    client = SparqlClient(unreachable_url, connect_timeout=0.2, max_retries=0)
+    start = time.perf_counter()
+    assert client.query(QUERY) == []
+    assert time.perf_counter() - start < 2
+
+
+def test_connect_timeout_async(unreachable_url):
+    start = time.perf_counter()
+    assert run(async_query(unreachable_url, connect_timeout=0.2, max_retries=0)) == []
+    assert time.perf_counter() - start < 2
+
+
+def test_read_timeout():
+    with StubEndpoint(delay=1.0) as endpoint:
+        client = SparqlClient(endpoint.url, read_timeout=0.2, max_retries=0)
+        start = time.perf_counter()
+        assert client.query(QUERY) == []
+        assert time.perf_counter() - start < 0.9
+        assert run(async_query(endpoint.url, read_timeout=0.2, max_retries=0)) == []
+
+
+def test_read_timeout_not_retried():
+    with StubEndpoint(delay=0.5) as endpoint:
+        assert SparqlClient(endpoint.url, read_timeout=0.1, max_retries=2, backoff=0.01).query(QUERY) == []
+        assert run(async_query(endpoint.url, read_timeout=0.1, max_retries=2, backoff=0.01)) == []
+        assert endpoint.requests == 2
+
+
+def test_connect_retried(unreachable_url):
+    client = SparqlClient(unreachable_url, connect_timeout=0.1, max_retries=2, backoff=0.01)
+    start = time.perf_counter()
+    assert client.query(QUERY) == []
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_post_retried_after_5xx():
+    with StubEndpoint(rows=ROWS, fail_first=2) as endpoint:
+        client = SparqlClient(endpoint.url, max_retries=2, backoff=0.01)
+        assert client.query(QUERY) == make_result(ROWS)["results"]["bindings"]
+        assert endpoint.requests == 3
+
+
+def test_post_retried_after_5xx_async():
+    with StubEndpoint(rows=ROWS, fail_first=2) as endpoint:
+        assert run(async_query(endpoint.url, max_retries=2, backoff=0.01)) == make_result(ROWS)["results"]["bindings"]
+        assert endpoint.requests == 3
+
+
+def test_gives_up_after_max_retries():
+    with StubEndpoint(fail_first=10) as endpoint:
+        assert SparqlClient(endpoint.url, max_retries=2, backoff=0.01).query(QUERY) == []
+        assert endpoint.requests == 3
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_4xx_not_retried(status):
+    with StubEndpoint(fail_first=10, status=status) as endpoint:
+        assert SparqlClient(endpoint.url, max_retries=2, backoff=0.01).query(QUERY) == []
+        assert endpoint.requests == 1
+        assert run(async_query(endpoint.url, max_retries=2, backoff=0.01)) == []
+        assert endpoint.requests == 2
+
+
+def test_connections_pooled_across_calls():
+    with StubEndpoint(rows=ROWS) as endpoint:
+        client = SparqlClient(endpoint.url)
+        for _ in range(10):
+            assert len(client.query(QUERY)) == ROWS
+        assert len(list(client.query_stream(QUERY, limit=2))) == 2
+        client.close()
+        assert endpoint.requests == 11
+        assert endpoint.connections == 1
+
+
+def test_async_connections_pooled_across_calls():
+    async def queries(url):
+        client = AsyncSparqlClient(url, pool_size=2)
+        try:
+            # ten queries, at most two at a time on the two connections of the pool
+            return await asyncio.gather(*(client.query(QUERY) for _ in range(10)))
+        finally:
+            await client.close()
+
+    with StubEndpoint(rows=ROWS, delay=0.02) as endpoint:
+        assert all(len(bindings) == ROWS for bindings in run(queries(endpoint.url)))
+        assert endpoint.requests == 10
+        assert endpoint.connections <= 2
+
+
+@pytest.mark.parametrize("rows", [0, 1, 50])
+def test_async_matches_sync(rows):
+    with StubEndpoint(rows=rows) as endpoint:
+        sync = SparqlClient(endpoint.url).query(QUERY)
+        assert run(async_query(endpoint.url)) == sync
+        assert sync == make_result(rows)["results"]["bindings"]
+
+
+@pytest.mark.parametrize("url", [None, ""])
+def test_missing_endpoint_url(url, caplog):
+    assert execute_sparql(url, QUERY) == []
+    assert list(execute_sparql_stream(url, QUERY, limit=2)) == []
+    assert "GRAPH_DB_ENDPOINT" in caplog.text
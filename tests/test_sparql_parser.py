@@ -0,0 +1,104 @@
+"""
+The SPARQL parser and canonicaliser (functions/sparql_parser.py): the triples of every group
+pattern, property paths, blank nodes, the structure the query guard works on, the terms the
+repairer rewrites, and the canonical text shared by equivalent queries.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+from rdflib import RDF, URIRef, Variable
+
+from functions.sparql_parser import (
+    canonicalize_query, locate_terms, parse_bgps, parse_patterns, tokenize, where_block_span,
+)
+
+U = "http://semanticweb.org/unitedOntology#"
+PREFIX = f"PREFIX : <{U}>\n"
+
+
+def u(name):
+    return URIRef(U + name)
+
+
+def test_tokenize_kinds():
+    tokens = tokenize('SELECT ?p WHERE { ?p :name "Bukayo"@en ; :age 23 . _:b a <x:Y> . [] ?q () } # comment')
+    kinds = [token.kind for token in tokens]
+    assert kinds == ["WORD", "VAR", "WORD", "PUNCT", "VAR", "PNAME", "STRING", "LANG", "PUNCT", "PNAME", "NUMBER",
+                     "PUNCT", "BNODE", "WORD", "IRI", "PUNCT", "ANON", "VAR", "NIL", "PUNCT"]
+
+
+def test_triples_of_every_group():
+    query = PREFIX + """SELECT ?p WHERE {
+        ?p a :Player ; :playsFor ?t .
+        OPTIONAL { ?p :hasNationality ?n }
+        { ?t a :Team } UNION { ?t a :Coach }
+        FILTER NOT EXISTS { ?p :hasHeight ?h }
+        { SELECT ?t WHERE { ?t :teamHasCode ?c } }
+    }"""
+    assert parse_bgps(query) == [
+        (Variable("p"), RDF.type, u("Player")),
+        (Variable("p"), u("playsFor"), Variable("t")),
+        (Variable("p"), u("hasNationality"), Variable("n")),
+        (Variable("t"), RDF.type, u("Team")),
+        (Variable("t"), RDF.type, u("Coach")),
+        (Variable("p"), u("hasHeight"), Variable("h")),
+        (Variable("t"), u("teamHasCode"), Variable("c")),
+    ]
+    patterns = parse_patterns(query)
+    assert patterns.form == "SELECT"
+    assert [kind for kind, _ in patterns.groups] == ["WHERE", "OPTIONAL", "GROUP", "UNION", "EXISTS", "GROUP", "SELECT"]
+    assert patterns.group_path(patterns.triple_groups[2]) == ["OPTIONAL", "WHERE"]
+    assert patterns.filters == [{"p", "h"}]
+
+
+def test_property_paths():
+    triples = parse_bgps(PREFIX + "SELECT * WHERE { ?p :playsFor/:teamHasCode ?c . ?p ^:hasPlayer|:playsFor ?t . }")
+    assert triples == [
+        (Variable("p"), u("playsFor"), Variable("_b1")),
+        (Variable("_b1"), u("teamHasCode"), Variable("c")),
+        (Variable("t"), u("hasPlayer"), Variable("p")),
+        (Variable("p"), u("playsFor"), Variable("t")),
+    ]
+
+
+def test_blank_nodes_are_variables():
+    query = PREFIX + "SELECT ?n WHERE { _:p a :Player ; :hasNationality ?n . _:p :playsFor _:t . [] :hasPlayer _:p }"
+    triples = parse_bgps(query)
+    player, team, anonymous = triples[0][0], triples[2][2], triples[3][0]
+    assert all(isinstance(term, Variable) for term in (player, team, anonymous))
+    # the same label is the same node, different labels and [] are different nodes
+    assert triples[1][0] == triples[2][0] == triples[3][2] == player
+    assert len({player, team, anonymous}) == 3
+    _, iris, _ = locate_terms(query)
+    assert [str(iri) for _, iri in iris] == [U + "Player", U + "hasNationality", U + "playsFor", U + "hasPlayer"]
+
+
+def test_undeclared_and_well_known_prefixes():
+    triples = parse_bgps("SELECT * WHERE { ?p rdf:type ex:Player ; rdfs:label ?l }")
+    assert triples == [(Variable("p"), RDF.type, u("Player")),
+                       (Variable("p"), URIRef("http://www.w3.org/2000/01/rdf-schema#label"), Variable("l"))]
+
+
+def test_where_block_span():
+    query = PREFIX + "SELECT ?p WHERE { ?p a :Player } LIMIT 5"
+    start, end = where_block_span(query)
+    assert query[start:end].strip() == "?p a :Player"
+    assert where_block_span("not a query") is None
+
+
+@pytest.mark.parametrize("other", [
+    # whitespace, comments, keyword case, variable names, prefix names and a final dot
+    "prefix u: <http://semanticweb.org/unitedOntology#>\nselect ?x where {\n  ?x a u:Player . # players\n}",
+    "SELECT ?player WHERE { ?player a <http://semanticweb.org/unitedOntology#Player> }",
+])
+def test_canonical_text_of_equivalent_queries(other):
+    canonical, variables = canonicalize_query(PREFIX + "SELECT ?p WHERE { ?p a :Player }")
+    assert canonicalize_query(other)[0] == canonical
+    assert variables == {"p": "v0"}
+
+
+def test_canonical_text_keeps_differences():
+    one = canonicalize_query(PREFIX + "SELECT ?p WHERE { ?p a :Player }")[0]
+    assert canonicalize_query(PREFIX + "SELECT ?p WHERE { ?p a :Coach }")[0] != one
+    assert canonicalize_query(PREFIX + "SELECT ?p WHERE { ?p a :Player } LIMIT 1")[0] != one
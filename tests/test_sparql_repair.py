@@ -0,0 +1,77 @@
+"""
+Local SPARQL repair (functions/sparql_repair.py): misspelled properties and classes replaced by
+the closest names of the ontology, properties used the wrong way round turned around, the
+queries left alone, and the cache and counters shared by concurrent sessions.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from functions.sparql_repair import SparqlRepairer, similarity
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+PREFIX = "PREFIX : <http://semanticweb.org/unitedOntology#>\n"
+
+
+@pytest.fixture(scope="module")
+def repairer():
+    return SparqlRepairer(ONTOLOGY)
+
+
+@pytest.mark.parametrize("query, fixed, changes", [
+    ("SELECT ?n WHERE { ?p a :Player ; :hasNationalty ?n }",
+     "SELECT ?n WHERE { ?p a :Player ; :hasNationality ?n }", ["hasNationalty -> hasNationality"]),
+    ("SELECT ?g WHERE { ?g a :Goal ; :scoredBy ?p }",
+     "SELECT ?g WHERE { ?g a :Goal ; :goalScoredBy ?p }", ["scoredBy -> goalScoredBy"]),
+    ("SELECT ?g WHERE { ?s :statsOfTeam ?t ; :goalsScored ?g }",
+     "SELECT ?g WHERE { ?s :statsOfTeam ?t ; :teamGoalsScored ?g }", ["goalsScored -> teamGoalsScored"]),
+    ("SELECT ?p WHERE { ?p a :Players ; :playsFor ?t }",
+     "SELECT ?p WHERE { ?p a :Player ; :playsFor ?t }", ["Players -> Player"]),
+    ("SELECT ?p WHERE { ?t :playsFor ?p . ?p a :Player . ?t a :Team }",
+     "SELECT ?p WHERE { ?t :hasPlayer ?p . ?p a :Player . ?t a :Team }", ["playsFor reversed -> hasPlayer"]),
+])
+def test_repaired(repairer, query, fixed, changes):
+    repair = repairer.repair(PREFIX + query)
+    assert repair.query == PREFIX + fixed
+    assert repair.changes == changes
+
+
+@pytest.mark.parametrize("query", [
+    # valid, nothing to repair
+    "SELECT ?p WHERE { ?p a :Player ; :playsFor ?t }",
+    # no name of the ontology is close
+    "SELECT ?p WHERE { ?p :zzzqqq ?t }",
+    "not a query",
+])
+def test_not_repaired(repairer, query):
+    assert repairer.repair(PREFIX + query) is None
+
+
+def test_similarity():
+    assert similarity("goalsScored", "teamGoalsScored") >= 0.9
+    assert similarity("Player", "player") == 1.0
+    assert similarity("Team", "Goal") < 0.75
+
+
+def test_cache_and_counters_shared_between_threads():
+    repairer = SparqlRepairer(ONTOLOGY)
+    queries = [PREFIX + "SELECT ?n WHERE { ?p a :Player ; :hasNationalty ?n }",
+               PREFIX + "SELECT ?p WHERE { ?p :zzzqqq ?t }"]
+    results = []
+
+    def session():
+        for _ in range(10):
+            results.extend(repairer.repair(query) is not None for query in queries)
+
+    threads = [threading.Thread(target=session) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = repairer.stats()
+    assert stats["repaired"] == results.count(True) == 40
+    assert stats["failed"] == results.count(False) == 40
+    assert len(repairer._candidates) == 2
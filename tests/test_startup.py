@@ -0,0 +1,107 @@
+"""
+Startup (functions/startup.py and main.startup_steps): the warm-up steps run in order in the
+background, a failed optional step leaves the pipeline without that component, and the cache
+files of an earlier run are ignored when they are corrupt.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import importlib
+import sys
+import threading
+
+import pytest
+
+import main
+from functions import llm_client
+from functions.local_router import LocalRouter
+from functions.question_cache import QuestionCache
+from functions.startup import ImportTimer, Warmup
+
+
+def test_steps_run_in_order_and_see_earlier_results():
+    order = []
+
+    def step(name, value):
+        def function(warmup):
+            order.append(name)
+            return value
+        return function
+
+    warmup = Warmup([("a", step("a", 1)), ("b", lambda w: w.result("a") + 1), ("c", step("c", None))]).start()
+    assert warmup.result("b") == 2
+    assert warmup.result("c") is None
+    warmup.thread.join()
+    assert order == ["a", "c"]
+    assert warmup.is_done() and set(warmup.timings) == {"a", "b", "c"}
+
+
+def test_background_start_returns_before_the_steps():
+    release = threading.Event()
+    warmup = Warmup([("slow", lambda w: release.wait(5) and "done")]).start()
+    assert not warmup.done["slow"].is_set()
+    release.set()
+    assert warmup.result("slow") == "done"
+    assert warmup.waited >= 0
+
+
+def test_eager_start_runs_every_step():
+    warmup = Warmup([("a", lambda w: 1)], background=False).start()
+    assert warmup.is_done() and warmup.thread is None
+
+
+def test_failed_step():
+    def fail(warmup):
+        raise RuntimeError("broken")
+
+    warmup = Warmup([("optional", fail), ("after", lambda w: w.optional("optional", "default"))]).start()
+    assert warmup.result("after") == "default"
+    assert warmup.optional("optional") is None
+    with pytest.raises(RuntimeError):
+        warmup.result("optional")
+    assert "(failed)" in warmup.report()
+
+
+def test_pipeline_built_without_failed_components(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_client, "_llm", llm_client.FakeClient())
+    steps = main.startup_steps(None, None, "ontology/simple_test.txt", "ontology/ontology_export.ttl", "", None)
+    broken = {"local router", "answer renderer", "SPARQL repairer", "caches"}
+
+    def fail(warmup):
+        raise RuntimeError("broken")
+
+    warmup = Warmup([(name, fail if name in broken else function) for name, function in steps]).start()
+    pipeline = warmup.result("pipeline")
+    try:
+        assert pipeline.local_router is None and pipeline.renderer is None and pipeline.repairer is None
+        assert pipeline.result_cache is None and pipeline.question_cache is None
+        assert set(warmup.errors) == broken
+    finally:
+        pipeline.close()
+
+
+def test_corrupt_cache_files_ignored(tmp_path):
+    router_file = tmp_path / "router.json"
+    router_file.write_text("{not json")
+    router = LocalRouter(path=str(router_file))
+    assert len(router.learned) == 0
+    router.learn("Who scored for Arsenal?", True)
+    router.save()
+    assert len(LocalRouter(path=str(router_file)).learned) == 1
+
+    questions_file = tmp_path / "questions.json"
+    questions_file.write_text("[[1, 2, 3]]")
+    assert len(QuestionCache(path=str(questions_file)).entries) == 0
+
+
+def test_import_timer_records_imports():
+    timer = ImportTimer().install()
+    try:
+        sys.modules.pop("colorsys", None)
+        importlib.import_module("colorsys")
+    finally:
+        timer.uninstall()
+    assert "colorsys" in {record.name for record in timer.records}
+    assert timer.total() >= 0
+    assert "colorsys" in timer.report()
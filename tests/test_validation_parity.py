@@ -0,0 +1,81 @@
+"""
+The native validation engine (validation_engine.find_violations) against the reference rdflib
+rule queries: the same errors on a corpus of generated queries, and the exact messages of
+hand-written domain, range and subclass cases.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import pytest
+
+from benchmarks.bench_validation import generate_queries
+from functions.sparql_validator import validate_sparql
+
+ONTOLOGY = "ontology/ontology_export.ttl"
+U = "http://semanticweb.org/unitedOntology#"
+Q = "http://example.org/query-vars#"
+PREFIX = f"PREFIX : <{U}>\n"
+
+CASES = [
+    # a Match isn't a Player, the domain of playsFor
+    (
+        "SELECT * WHERE { ?m a :Match . ?m :playsFor ?t . }",
+        [f"The property {U}playsFor has range {U}Player, but its subject {Q}m is a {U}Match, "
+         f"which isn't a subclass of {U}Player"],
+    ),
+    # a Match isn't a Player, the range of hasPlayer
+    (
+        "SELECT * WHERE { ?t :hasPlayer ?m . ?m a :Match . }",
+        [f"The property {U}hasPlayer has range {U}Player, but its object {Q}m is a {U}Match, "
+         f"which isn't a subclass of {U}Player"],
+    ),
+    # Player and Coach are subclasses of Human, the domain of hasNationality and hasHeight
+    ("SELECT * WHERE { ?p a :Player . ?p :hasNationality ?n . }", None),
+    ("SELECT * WHERE { ?c a :Coach . ?c :hasHeight ?h . }", None),
+    (
+        "SELECT * WHERE { ?m a :Match . ?m :hasNationality ?n . }",
+        [f"The property {U}hasNationality has range {U}Human, but its subject {Q}m is a {U}Match, "
+         f"which isn't a subclass of {U}Human"],
+    ),
+    # the superclass doesn't satisfy a range of the subclass
+    (
+        "SELECT * WHERE { ?p a :Human . ?t :hasPlayer ?p . }",
+        [f"The property {U}hasPlayer has range {U}Player, but its object {Q}p is a {U}Human, "
+         f"which isn't a subclass of {U}Player"],
+    ),
+    (
+        "SELECT * WHERE { ?x :playsFor ?t . ?x :hasPlayer ?p . }",
+        [f"The property {U}hasPlayer has domain {U}Team, and {U}playsFor has domain {U}Player "
+         f"and these are incompatible.",
+         f"The property {U}playsFor has domain {U}Player, and {U}hasPlayer has domain {U}Team "
+         f"and these are incompatible."],
+    ),
+    (
+        "SELECT * WHERE { ?p :playsFor ?t . ?t :playsFor ?q . }",
+        [f"The property {U}playsFor has range {U}Team, and {U}playsFor has domain {U}Player "
+         f"and these are incompatible. "],
+    ),
+    (
+        "SELECT * WHERE { ?p :playsForr ?t . }",
+        [f"The property {U}playsForr isn't defined in the ontology. Please only use properties from the ontology, "
+         f"or from a standard source like rdf:, rdfs:, owl:, or skos:."],
+    ),
+    ("SELECT * WHERE { ?p a :Player . ?p :playsFor ?t . ?t a :Team . }", None),
+]
+
+
+def _sorted(errors):
+    return sorted(errors) if errors is not None else None
+
+
+@pytest.mark.parametrize("query", generate_queries(300))
+def test_native_engine_matches_rdflib_rules(query):
+    native = validate_sparql(query, ONTOLOGY, engine="native")
+    reference = validate_sparql(query, ONTOLOGY, engine="rdflib")
+    assert _sorted(native) == _sorted(reference)
+
+
+@pytest.mark.parametrize("engine", ["native", "rdflib"])
+@pytest.mark.parametrize("query, expected", CASES)
+def test_violation_messages(query, expected, engine):
+    assert _sorted(validate_sparql(PREFIX + query, ONTOLOGY, engine=engine)) == _sorted(expected)